@@ -0,0 +1,140 @@
+"""
+Admission.py
+------------
+Control de admisión del servidor.
+
+Durante una tormenta de reconexiones cada conexión nueva arranca un hilo y
+una derivación completa de llaves (generate_key_table), y el kernel descarta
+SYN si la cola de listen() es chica. El controlador de admisión limita:
+
+ - Sesiones simultáneas (max_sessions).
+ - Handshakes FCM concurrentes (max_handshakes), que son la parte cara.
+
+Y aplica una política cuando se alcanza el límite:
+
+ - "queue":  esperar (las conexiones quedan en la cola del kernel o esperan
+             un turno de handshake, hasta queue_timeout).
+ - "reject": rechazar de inmediato con una trama [REJECTED].
+
+Así la sobrecarga degrada el servicio de forma ordenada en lugar de
+colapsar el proceso. Los contadores se exponen con stats().
+"""
+
+import threading
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+POLICY_QUEUE = "queue"
+POLICY_REJECT = "reject"
+
+POLICIES = (POLICY_QUEUE, POLICY_REJECT)
+
+# Valores por defecto
+DEFAULT_MAX_HANDSHAKES = 4
+DEFAULT_QUEUE_TIMEOUT = 5.0
+
+# Trama enviada (en claro) al rechazar una conexión
+REJECTED_PREFIX = b"[REJECTED]"
+
+
+def rejection_frame(reason: str) -> bytes:
+    """Contenido de la trama de rechazo."""
+    return REJECTED_PREFIX + b" " + reason.encode()
+
+
+# ============================================================
+# Controlador de admisión
+# ============================================================
+
+class AdmissionController:
+    """Límites de sesiones y handshakes con política de cola o rechazo."""
+
+    def __init__(self, max_sessions: int = None, max_handshakes: int = DEFAULT_MAX_HANDSHAKES,
+                 policy: str = POLICY_QUEUE, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy}")
+        if max_sessions is not None and max_sessions < 1:
+            raise ValueError("max_sessions debe ser >= 1")
+        if max_handshakes < 1:
+            raise ValueError("max_handshakes debe ser >= 1")
+        self.max_sessions = max_sessions
+        self.max_handshakes = max_handshakes
+        self.policy = policy
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._handshakes = threading.BoundedSemaphore(max_handshakes)
+        self.counters = {
+            "admitted": 0,
+            "rejected_sessions": 0,
+            "rejected_handshakes": 0,
+            "queued_handshakes": 0,
+            "active_sessions": 0,
+            "active_handshakes": 0,
+            "peak_sessions": 0,
+        }
+
+    # ---------------------------- Sesiones ----------------------------
+
+    def has_capacity(self) -> bool:
+        with self._cond:
+            return self._has_capacity()
+
+    def _has_capacity(self) -> bool:
+        return self.max_sessions is None or self.counters["active_sessions"] < self.max_sessions
+
+    def wait_for_capacity(self, timeout: float) -> bool:
+        """Espera (hasta timeout) a que haya lugar para otra sesión."""
+        with self._cond:
+            return self._cond.wait_for(self._has_capacity, timeout=timeout)
+
+    def try_admit(self) -> bool:
+        """Reserva un lugar de sesión sin esperar. Cuenta el rechazo si no hay."""
+        with self._cond:
+            if not self._has_capacity():
+                self.counters["rejected_sessions"] += 1
+                return False
+            self.counters["admitted"] += 1
+            self.counters["active_sessions"] += 1
+            if self.counters["active_sessions"] > self.counters["peak_sessions"]:
+                self.counters["peak_sessions"] = self.counters["active_sessions"]
+            return True
+
+    def release_session(self):
+        """Libera un lugar de sesión (al cerrar la conexión)."""
+        with self._cond:
+            self.counters["active_sessions"] -= 1
+            self._cond.notify_all()
+
+    # ---------------------------- Handshakes ----------------------------
+
+    def acquire_handshake(self) -> bool:
+        """
+        Obtiene un turno de handshake según la política.
+        Retorna False si hay que rechazar la conexión.
+        """
+        acquired = self._handshakes.acquire(blocking=False)
+        if not acquired and self.policy == POLICY_QUEUE:
+            with self._cond:
+                self.counters["queued_handshakes"] += 1
+            acquired = self._handshakes.acquire(timeout=self.queue_timeout)
+        with self._cond:
+            if acquired:
+                self.counters["active_handshakes"] += 1
+            else:
+                self.counters["rejected_handshakes"] += 1
+        return acquired
+
+    def release_handshake(self):
+        with self._cond:
+            self.counters["active_handshakes"] -= 1
+        self._handshakes.release()
+
+    # ---------------------------- Estadísticas ----------------------------
+
+    def stats(self) -> dict:
+        """Copia de los contadores de admisión."""
+        with self._cond:
+            return dict(self.counters)
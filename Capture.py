@@ -0,0 +1,159 @@
+"""
+Capture.py
+----------
+Captura de tramas del servidor en un archivo binario de solo anexado.
+
+Sin tráfico grabado no hay forma de reproducir un problema de rendimiento de
+producción. Con un CaptureWriter el backend (ServerEngine.BaseBackend,
+opción capture=) escribe cada trama que entra o sale de una conexión:
+
+    cabecera del archivo:  "CRYCAP" || versión (1)
+    cada registro:         dirección (1) || marca de tiempo (8, float) ||
+                           conexión (4) || longitud (4) || trama
+
+(enteros sin signo en big endian; la marca de tiempo es time.time()).
+La conexión es un número que el backend asigna al aceptarla: agrupa también
+las tramas anteriores a que exista la sesión (parámetros FCM, [RESUME]).
+
+Cada CaptureWriter abre una corrida nueva con un registro DIRECTION_RUN
+(sin trama). Al reiniciar el servidor sobre el mismo archivo la numeración
+de conexiones vuelve a 1, así que el lector numera las corridas y las
+conexiones se identifican por (corrida, conexión). Cada corrida puede tener
+además sus propios parámetros de servidor.
+
+replay.py vuelve a pasar una captura por el pipeline de descifrado o contra
+un servidor en vivo.
+
+OJO: la captura incluye los parámetros FCM de ambos lados, así que quien la
+tenga puede derivar las llaves de las sesiones grabadas. Tratarla como un
+secreto del servidor.
+"""
+
+import struct
+import threading
+import time
+from dataclasses import dataclass
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+CAPTURE_MAGIC = b"CRYCAP"
+CAPTURE_VERSION = 2  # 1: sin marcas de corrida (todo es la corrida 0)
+_READABLE_VERSIONS = (1, CAPTURE_VERSION)
+
+DIRECTION_IN = 0   # cliente -> servidor
+DIRECTION_OUT = 1  # servidor -> cliente
+DIRECTION_RUN = 2  # inicio de una corrida del servidor (solo en el archivo)
+
+# Buffer del archivo: una caída pierde a lo sumo esto (el lector tolera el corte)
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+_RECORD = struct.Struct(">BdII")
+
+
+class CaptureError(ValueError):
+    """Archivo que no es una captura o de una versión desconocida."""
+
+
+@dataclass
+class CaptureRecord:
+    direction: int
+    timestamp: float
+    connection: int
+    frame: bytes
+    run: int = 0
+
+
+# ============================================================
+# Escritura
+# ============================================================
+
+class CaptureWriter:
+    """Escribe registros de captura; se puede usar desde varios hilos."""
+
+    def __init__(self, path: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "ab", buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC + bytes([CAPTURE_VERSION]))
+        else:
+            try:
+                _check_header(path)
+            except CaptureError:
+                self._file.close()
+                raise
+        self._file.write(_RECORD.pack(DIRECTION_RUN, time.time(), 0, 0))
+
+    def record(self, direction: int, connection: int, frame: bytes):
+        header = _RECORD.pack(direction, time.time(), connection, len(frame))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(header)
+            self._file.write(frame)
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# ============================================================
+# Lectura
+# ============================================================
+
+def _check_header(path: str):
+    header_size = len(CAPTURE_MAGIC) + 1
+    with open(path, "rb") as f:
+        header = f.read(header_size)
+    if header[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC or len(header) != header_size:
+        raise CaptureError(f"{path} no es una captura")
+    if header[-1] not in _READABLE_VERSIONS:
+        raise CaptureError(f"Versión de captura desconocida: {header[-1]}")
+    return header[-1]
+
+
+def read_capture(path: str):
+    """
+    Genera los CaptureRecord del archivo en orden, con su número de corrida
+    (1, 2, ... en el orden del archivo; 0 en capturas de la versión 1). Un
+    último registro incompleto (servidor caído a mitad de escritura) se ignora.
+    """
+    _check_header(path)
+    run = 0
+    with open(path, "rb") as f:
+        f.seek(len(CAPTURE_MAGIC) + 1)
+        while True:
+            raw = f.read(_RECORD.size)
+            if len(raw) < _RECORD.size:
+                return
+            direction, timestamp, connection, length = _RECORD.unpack(raw)
+            frame = f.read(length)
+            if len(frame) < length:
+                return
+            if direction == DIRECTION_RUN:
+                run += 1
+                continue
+            yield CaptureRecord(direction, timestamp, connection, frame, run)
+
+
+def group_by_connection(records) -> dict:
+    """(corrida, conexión) -> {"in": [tramas], "out": [tramas], "start": primera marca de tiempo}"""
+    connections = {}
+    for record in records:
+        key = (record.run, record.connection)
+        conn = connections.get(key)
+        if conn is None:
+            conn = connections[key] = {"in": [], "out": [], "start": record.timestamp}
+        conn["in" if record.direction == DIRECTION_IN else "out"].append(record.frame)
+    return connections
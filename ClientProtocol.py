@@ -0,0 +1,305 @@
+"""
+ClientProtocol.py
+-----------------
+Lógica del protocolo del lado cliente, sin sockets ni interfaz gráfica.
+
+ClientProtocol guarda el estado de una sesión cliente (tablas de llaves,
+índices y PSN de cada dirección, tabla de grupo, ticket de reanudación,
+parámetros del servidor para el handshake de 0.5-RTT) y convierte mensajes
+en tramas y tramas en eventos. Quien la use pone el transporte: client.py
+(Tk), loadgen.py (dispositivos simulados) o cualquier otro.
+
+Reglas de hilos: seal() (flujo de envío) y receive()/open() (flujo de
+recepción) no comparten estado, así que pueden llamarse desde hilos
+distintos sin lock, siempre que cada flujo lo use un solo hilo. En modo
+segmentado seal_seq() agrega al final de las secuencias en vuelo y
+receive() saca del principio (operaciones atómicas de deque).
+
+Secuencia típica:
+    frames = protocol.hello_frames()            # parámetros (+ [EARLY] si se puede)
+    frames = protocol.accept_server_params(f)   # lo que haya que enviar después
+    kind, value = protocol.receive(f)           # respuesta al contacto, [GROUPKEY], [TICKET]...
+    frame = protocol.seal(b"...")               # mensajes RM
+    frame = protocol.seal_batch([b"...", ...])  # varios RM en una trama [BATCH] (Coalescing.py)
+    frame = protocol.seal_seq(b"...")           # RM segmentado [SEQ], sin esperar la respuesta (Pipeline.py)
+    frame = protocol.farewell()                 # LCM
+
+NO incluye:
+ - Sockets, hilos ni temporizadores.
+ - Interfaz gráfica (va en client.py).
+"""
+
+import collections
+
+from Admission import REJECTED_PREFIX
+from Coalescing import encode_batch_frame, pack_batch
+from Compression import CODEC_ZLIB, DEFAULT_COMPRESS_THRESHOLD
+from GroupChannel import GROUPCAST_PREFIX, GROUPKEY_PREFIX, KEY_INDEX_SIZE, decrypt_groupcast, unpack_key_table
+from Handshake import EARLY_PREFIX, EARLY_REJECTED_PREFIX, encode_params, parse_params
+from KeyGenerator import generate_directional_key_tables
+from Pipeline import (DIRECTION_REQUEST, DIRECTION_RESPONSE, SEQ_PREFIX, SequenceError, encode_seq_frame,
+                      parse_seq_frame, seq_aad)
+from PSN import ESQUEMAS, encrypt_message, decrypt_message, extract_psn_from_plaintext_using_instruction
+from Resumption import RESUMED_PREFIX, TICKET_PREFIX, parse_ticket_frame, resume_frame
+from SeedAndPrimes import DEFAULT_N_KEYS, SharedParams, generate_node_id, generate_prime, generate_seed
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Mensajes de control del protocolo (en texto plano, antes de cifrar)
+FIRST_MESSAGE = b"First Message Contact"
+LAST_MESSAGE = b"Last Message Contact"
+
+# Prefijos de mensajes no cifrados
+PLAINTEXT_PREFIX = b"[PLAINTEXT]"
+BROADCAST_PREFIX = b"[BROADCAST] "
+
+# Tipos de trama recibida (primer elemento de receive())
+FRAME_RESPONSE = "response"              # respuesta cifrada con el flujo de recepción
+FRAME_GROUPKEY = "groupkey"              # tabla de grupo recibida
+FRAME_TICKET = "ticket"                  # ticket de reanudación guardado
+FRAME_GROUPCAST = "groupcast"            # broadcast cifrado con la tabla de grupo
+FRAME_BROADCAST = "broadcast"            # broadcast en texto claro
+FRAME_PLAINTEXT = "plaintext"            # respuesta en texto claro
+FRAME_EARLY_REJECTED = "early_rejected"  # datos tempranos rechazados (ya reenviados)
+
+
+class ClientProtocol:
+    """Estado y reglas del protocolo de un cliente, independiente del transporte."""
+
+    def __init__(self, node_id: int = None, P: int = None, S: int = None,
+                 compression: bool = True, n_keys: int = DEFAULT_N_KEYS, rng=None):
+        # Proveedor de aleatoriedad (Randomness.py) de parámetros y nonces; None = el del proceso
+        self.rng = rng
+        self.node_id = node_id if node_id is not None else generate_node_id(tag="client", rng=rng)
+        self.P = P if P is not None else generate_prime(tag="client", rng=rng)
+        self.S_client = S if S is not None else generate_seed(tag="client", rng=rng)
+        self.compression = compression
+        self.n_keys = n_keys
+        # Flujo de envío (cliente->servidor)
+        self.key_table = []
+        self.key_index = 0
+        self.next_psn = 0
+        self.next_extraction_instruction = None
+        self.key_regeneration_count = 0
+        self.next_seq = 0  # Secuencia del próximo mensaje cifrado de la conexión (Pipeline.py)
+        # Flujo de recepción (servidor->cliente)
+        self.recv_key_table = []
+        self.recv_index = 0
+        self.recv_psn = 0
+        self.in_flight = collections.deque()  # Secuencias [SEQ] enviadas sin respuesta, en orden
+        self.group_key_table = []     # Tabla de llaves de grupo (broadcast cifrado)
+        self.resumption_ticket = None  # Último ticket de reanudación (Resumption.ClientTicket)
+        self.compress_threshold = None  # Umbral de compresión si el servidor la aceptó
+        self.server_params = None      # Parámetros del servidor del último FCM (0.5-RTT)
+        self._early_sent = None        # Parámetros del servidor con que se cifraron datos tempranos
+        self._pending_contact = None   # Mensaje de contacto (para reenviarlo si se rechaza)
+        self._derived = False          # Ya se derivaron tablas con S_client
+
+    @property
+    def established(self) -> bool:
+        return bool(self.key_table)
+
+    # ---------------------------- Tablas ----------------------------
+
+    def derive(self, Q_server: int, S_server: int):
+        """
+        Deriva las tablas de la sesión (una por dirección) y reinicia ambos
+        flujos. El ticket anterior deja de valer: llega uno nuevo tras el contacto.
+        """
+        self.resumption_ticket = None
+        self._derived = True
+        shared_params = SharedParams(id=self.node_id, P=self.P, Q=Q_server,
+                                     S=self.S_client ^ S_server, N=self.n_keys)
+        self.key_table, self.recv_key_table = generate_directional_key_tables(shared_params)
+        self.key_index = 0
+        self.next_psn = 0
+        self.key_regeneration_count = 0
+        self.recv_index = 0
+        self.recv_psn = 0
+        self._new_connection()
+
+    def reset(self):
+        """
+        Olvida las tablas de la sesión (LCM completado o conexión perdida).
+        El ticket conserva la posición alcanzada para reanudar desde ahí.
+        """
+        self._save_position()
+        self.key_table = []
+        self.key_index = 0
+        self.next_psn = 0
+        self.key_regeneration_count = 0
+        self.recv_key_table = []
+        self.recv_index = 0
+        self.recv_psn = 0
+        self._new_connection()
+
+    def _new_connection(self):
+        """La secuencia es por conexión: vuelve a 0 y sin mensajes en vuelo (sus respuestas ya no llegan)."""
+        self.next_seq = 0
+        self.in_flight.clear()
+
+    # ---------------------------- Handshake ----------------------------
+
+    def hello_frames(self, first_message: bytes = FIRST_MESSAGE) -> list:
+        """
+        Primeras tramas del FCM: los parámetros del cliente y, si ya se
+        conocen los del servidor, el primer mensaje como datos tempranos.
+        """
+        if self._derived:
+            # Semilla nueva en cada FCM: con la misma se repetirían las llaves ya usadas
+            self.S_client = generate_seed(tag="client", rng=self.rng)
+        codecs = (CODEC_ZLIB,) if self.compression else ()
+        frames = [encode_params(self.node_id, self.P, self.S_client, codecs)]
+        self._pending_contact = first_message
+        self._early_sent = None
+        if self.server_params is not None:
+            self.derive(self.server_params.prime, self.server_params.seed)
+            frames.append(EARLY_PREFIX + self.seal(first_message, compress=False))
+            self._early_sent = (self.server_params.prime, self.server_params.seed)
+        return frames
+
+    def accept_server_params(self, frame: bytes) -> list:
+        """
+        Procesa los parámetros del servidor y retorna las tramas a enviar
+        (vacía si los datos tempranos siguen valiendo). Lanza ConnectionError
+        si el servidor rechazó la conexión.
+        """
+        if frame is None or frame.startswith(REJECTED_PREFIX):
+            raise ConnectionError(frame.decode() if frame else "conexión cerrada por el servidor")
+        params = parse_params(frame)
+        self.server_params = params
+        self.compress_threshold = (DEFAULT_COMPRESS_THRESHOLD
+                                   if self.compression and CODEC_ZLIB in params.codecs else None)
+        if self._early_sent == (params.prime, params.seed):
+            return []
+        # Sin datos tempranos, o el servidor cambió de parámetros (responderá [EARLY_REJECTED])
+        self.derive(params.prime, params.seed)
+        return [self.seal(self._pending_contact, compress=False)]
+
+    def _save_position(self):
+        """Copia al ticket la posición actual de ambos flujos (las llaves ya usadas no se repiten)."""
+        ticket = self.resumption_ticket
+        if ticket is None or not self.key_table:
+            return
+        ticket.key_index, ticket.next_psn = self.key_index, self.next_psn
+        ticket.recv_index, ticket.recv_psn = self.recv_index, self.recv_psn
+        ticket.key_regeneration_count = self.key_regeneration_count
+
+    def resume_frame(self):
+        """Trama [RESUME] con el ticket guardado y la posición alcanzada, o None si no hay ticket."""
+        if self.resumption_ticket is None:
+            return None
+        self._save_position()
+        return resume_frame(self.resumption_ticket)
+
+    def accept_resume(self, frame: bytes) -> bool:
+        """Respuesta a [RESUME]: True si se reanudó; si no, hay que hacer el FCM completo."""
+        if frame is None:
+            raise ConnectionError("conexión cerrada por el servidor")
+        ticket = self.resumption_ticket
+        if not frame.startswith(RESUMED_PREFIX):
+            self.resumption_ticket = None
+            return False
+        self.key_table = list(ticket.key_table)
+        self.key_index = ticket.key_index
+        self.next_psn = ticket.next_psn
+        self.key_regeneration_count = ticket.key_regeneration_count
+        self.recv_key_table = list(ticket.recv_key_table)
+        self.recv_index = ticket.recv_index
+        self.recv_psn = ticket.recv_psn
+        self._new_connection()
+        return True
+
+    # ---------------------------- Envío ----------------------------
+
+    def seal(self, plaintext: bytes, compress: bool = True, associated_data: bytes = None) -> bytes:
+        """Cifra con el flujo de envío y lo avanza (PSN según el mensaje ENVIADO, como el servidor)."""
+        instruction = ESQUEMAS[self.next_psn]["next_extraction"]
+        # Primero lo que puede fallar, para no dejar el estado a medias
+        next_psn = extract_psn_from_plaintext_using_instruction(plaintext, instruction)
+        ciphertext = encrypt_message(plaintext, self.next_psn, self.key_table[self.key_index].to_bytes(8, "big"),
+                                     associated_data,
+                                     compress_threshold=self.compress_threshold if compress else None,
+                                     rng=self.rng)
+        old_index = self.key_index
+        self.next_psn = next_psn
+        self.next_extraction_instruction = instruction
+        self.key_index = (old_index + 1) % len(self.key_table)
+        if old_index == len(self.key_table) - 1:
+            self.key_regeneration_count += 1
+        self.next_seq = (self.next_seq + 1) & 0xFFFFFFFF
+        return ciphertext
+
+    def seal_seq(self, plaintext: bytes, compress: bool = True) -> bytes:
+        """
+        Trama [SEQ] del modo segmentado (Pipeline.py): la secuencia va
+        autenticada y queda en vuelo hasta que receive() procesa su respuesta.
+        """
+        seq = self.next_seq
+        frame = encode_seq_frame(seq, self.seal(plaintext, compress, seq_aad(seq, DIRECTION_REQUEST)))
+        self.in_flight.append(seq)
+        return frame
+
+    def seal_batch(self, messages: list, compress: bool = True) -> bytes:
+        """
+        Trama [BATCH] con varios mensajes cifrados juntos (Coalescing.py):
+        consume una sola llave y un solo PSN, y el servidor responde una vez
+        por lote. Lanza BatchError si el lote no es válido (sin avanzar el flujo).
+        """
+        return encode_batch_frame(self.seal(pack_batch(messages), compress))
+
+    def farewell(self) -> bytes:
+        """Trama del LCM."""
+        return self.seal(LAST_MESSAGE, compress=False)
+
+    # ---------------------------- Recepción ----------------------------
+
+    def open(self, ciphertext: bytes, associated_data: bytes = None) -> dict:
+        """Descifra con el flujo de recepción y lo avanza."""
+        key = self.recv_key_table[self.recv_index].to_bytes(8, "big")
+        result = decrypt_message(ciphertext, key, associated_data)
+        self.recv_psn = extract_psn_from_plaintext_using_instruction(
+            result["plaintext"], result["next_extraction_instruction"])
+        self.recv_index = (self.recv_index + 1) % len(self.recv_key_table)
+        return result
+
+    def receive(self, frame: bytes) -> tuple:
+        """
+        Clasifica una trama del servidor y actualiza el estado.
+
+        Retorna:
+            tuple: (tipo FRAME_*, valor) — el texto plano para respuestas y
+                   broadcasts, None para [GROUPKEY], [TICKET] y [EARLY_REJECTED]
+        """
+        if frame.startswith(BROADCAST_PREFIX):
+            return FRAME_BROADCAST, frame[len(BROADCAST_PREFIX):]
+        if frame.startswith(GROUPKEY_PREFIX):
+            result = self.open(frame[len(GROUPKEY_PREFIX) + KEY_INDEX_SIZE:])
+            self.group_key_table = unpack_key_table(result["plaintext"])
+            return FRAME_GROUPKEY, None
+        if frame.startswith(TICKET_PREFIX):
+            self.resumption_ticket = parse_ticket_frame(frame, self.key_table, self.recv_key_table)
+            return FRAME_TICKET, None
+        if frame.startswith(GROUPCAST_PREFIX):
+            if not self.group_key_table:
+                return FRAME_GROUPCAST, None
+            return FRAME_GROUPCAST, decrypt_groupcast(frame, self.group_key_table)
+        if frame.startswith(PLAINTEXT_PREFIX):
+            return FRAME_PLAINTEXT, frame[len(PLAINTEXT_PREFIX):]
+        if frame.startswith(EARLY_REJECTED_PREFIX):
+            return FRAME_EARLY_REJECTED, None
+        if self.in_flight and frame.startswith(SEQ_PREFIX):
+            return FRAME_RESPONSE, self._open_seq(frame)
+        return FRAME_RESPONSE, self.open(frame)["plaintext"]
+
+    def _open_seq(self, frame: bytes) -> bytes:
+        """Respuesta [SEQ]: debe ser la de la petición en vuelo más antigua."""
+        seq, ciphertext = parse_seq_frame(frame)
+        expected = self.in_flight[0]
+        if seq != expected:
+            raise SequenceError(f"Respuesta fuera de orden: {seq} (se esperaba {expected})")
+        plaintext = self.open(ciphertext, seq_aad(seq, DIRECTION_RESPONSE))["plaintext"]
+        self.in_flight.popleft()
+        return plaintext
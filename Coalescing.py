@@ -0,0 +1,187 @@
+"""
+Coalescing.py
+-------------
+Agrupación (coalescing) de mensajes pequeños en una sola trama cifrada.
+
+Los sensores envían muchas lecturas de 10-40 bytes y cada una pagaba por
+separado 12 bytes de nonce, 16 de etiqueta GCM, una preparación de AES, un
+índice de llave y una llamada a send(). En modo agrupado el cliente junta
+los mensajes durante hasta T ms o B bytes, los empaqueta en un solo texto
+plano con longitudes y lo cifra una vez; el servidor lo descifra y lo
+separa en los mensajes originales.
+
+Formato del texto plano de un lote:
+    m1 || m2 || ... || mN || len(m1) || ... || len(mN) || N
+    (longitudes y N en 2 bytes, big endian)
+
+Los mensajes van primero para que la extracción del próximo PSN (que mira
+los primeros bytes) siga dependiendo del contenido y no de las longitudes.
+
+Formato de la trama:
+    [BATCH] || encrypt_message(lote, psn, llave)
+
+El lote consume una sola llave y un solo PSN del flujo cliente->servidor.
+
+Lado cliente: ClientProtocol.seal_batch() cifra un lote con el flujo de
+envío de la sesión y DeviceClient.send_batch() lo envía; Coalescer junta
+los mensajes por tiempo o tamaño y llama a send_batch con cada lote:
+
+    coalescer = Coalescer(client.send_batch, max_delay=0.005, max_bytes=1024)
+    coalescer.add(b"t=21.5")
+"""
+
+import struct
+import threading
+import time
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+BATCH_PREFIX = b"[BATCH]"
+
+# Espera máxima antes de enviar un lote incompleto (segundos)
+DEFAULT_MAX_DELAY = 0.005
+
+# Bytes acumulados a partir de los cuales se envía el lote sin esperar
+DEFAULT_MAX_BYTES = 1024
+
+# Tamaño máximo de cada mensaje dentro de un lote
+MAX_BATCH_MESSAGE = 0xFFFF
+
+_LENGTH = struct.Struct(">H")
+
+
+class BatchError(ValueError):
+    """Lote mal formado."""
+
+
+# ============================================================
+# Empaquetado
+# ============================================================
+
+def pack_batch(messages: list) -> bytes:
+    """Lista de mensajes -> texto plano del lote."""
+    if not messages or len(messages) > 0xFFFF:
+        raise BatchError("Un lote lleva entre 1 y 65535 mensajes")
+    lengths = []
+    for message in messages:
+        if len(message) > MAX_BATCH_MESSAGE:
+            raise BatchError("Mensaje demasiado grande para un lote")
+        lengths.append(_LENGTH.pack(len(message)))
+    return b"".join(messages) + b"".join(lengths) + _LENGTH.pack(len(messages))
+
+
+def unpack_batch(payload: bytes) -> list:
+    """Texto plano del lote -> lista de mensajes. Lanza BatchError si no cuadra."""
+    if len(payload) < _LENGTH.size:
+        raise BatchError("Lote demasiado corto")
+    (count,) = _LENGTH.unpack_from(payload, len(payload) - _LENGTH.size)
+    trailer = _LENGTH.size * (count + 1)
+    if count == 0 or trailer > len(payload):
+        raise BatchError("Lote mal formado")
+    lengths_at = len(payload) - trailer
+    messages = []
+    offset = 0
+    for i in range(count):
+        (length,) = _LENGTH.unpack_from(payload, lengths_at + i * _LENGTH.size)
+        messages.append(payload[offset:offset + length])
+        offset += length
+    if offset != lengths_at:
+        raise BatchError("Las longitudes del lote no cuadran")
+    return messages
+
+
+def encode_batch_frame(ciphertext: bytes) -> bytes:
+    return BATCH_PREFIX + ciphertext
+
+
+# ============================================================
+# Agrupador (lado cliente)
+# ============================================================
+
+class Coalescer:
+    """
+    Junta mensajes y llama a send_batch(mensajes) cuando se cumple la
+    espera máxima (max_delay) o se acumulan max_bytes.
+
+    send_batch se llama siempre en orden y nunca en paralelo: puede cifrar
+    con el flujo de envío sin más sincronización. Puede llamarse desde el
+    hilo que hace add() (lote lleno) o desde el hilo del temporizador.
+    """
+
+    def __init__(self, send_batch, max_delay: float = DEFAULT_MAX_DELAY,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_delay <= 0 or max_bytes <= 0:
+            raise ValueError("max_delay y max_bytes deben ser > 0")
+        self.send_batch = send_batch
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self.batches = 0
+        self.error = None  # Excepción de send_batch en el hilo del temporizador
+        self._pending = []
+        self._pending_bytes = 0
+        self._deadline = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="coalescer")
+        self._thread.start()
+
+    def add(self, message: bytes):
+        """Agrega un mensaje al lote en curso."""
+        if len(message) > MAX_BATCH_MESSAGE:
+            raise BatchError("Mensaje demasiado grande para un lote")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Coalescer cerrado: {self.error}" if self.error else "Coalescer cerrado")
+            self._pending.append(message)
+            self._pending_bytes += len(message) + _LENGTH.size
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.max_delay
+                self._cond.notify()
+            full = self._pending_bytes >= self.max_bytes
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Envía ya lo acumulado (si hay algo)."""
+        with self._flush_lock:
+            with self._cond:
+                batch = self._pending
+                self._pending = []
+                self._pending_bytes = 0
+                self._deadline = None
+            if batch:
+                self.batches += 1
+                self.send_batch(batch)
+
+    def close(self):
+        """Envía lo pendiente y detiene el temporizador."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._deadline is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # Sin envío no hay lote que esperar: se cierra y add() lo reporta
+                with self._cond:
+                    self.error = e
+                    self._closed = True
+                return
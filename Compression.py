@@ -0,0 +1,70 @@
+"""
+Compression.py
+--------------
+Compresión opcional del texto plano antes de las funciones reversibles.
+
+La telemetría en texto o JSON se comprime bien, pero encrypt_message pasaba
+el texto completo por apply_sequence y AES-GCM. Con la compresión acordada
+en el handshake, los mensajes de al menos `threshold` bytes se comprimen con
+zlib antes de aplicar el esquema del PSN; si no se gana nada se envían tal
+cual. Un bit junto al nibble del PSN (FLAG_COMPRESSED, ver
+PSN.pack_payload_with_psn) indica al receptor que debe descomprimir.
+
+El PSN siguiente se sigue extrayendo del texto plano original, así que la
+compresión no cambia la contabilidad de llaves/PSN.
+
+Negociación (FCM, ver Handshake.py): el cliente ofrece el códec "zlib" en
+sus parámetros y el servidor lo repite en los suyos si lo acepta.
+"""
+
+import zlib
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Códec ofrecido en el FCM
+CODEC_ZLIB = "zlib"
+
+# Bit de la cabecera del payload que marca un texto comprimido
+FLAG_COMPRESSED = 0x10
+
+# Tamaño mínimo para intentar comprimir (bytes)
+DEFAULT_COMPRESS_THRESHOLD = 128
+
+# Nivel de zlib: 1 es el más barato en CPU y ya gana casi todo en JSON
+DEFAULT_COMPRESS_LEVEL = 1
+
+# Límite al descomprimir (protege contra bombas de compresión)
+MAX_DECOMPRESSED_SIZE = 1 << 20
+
+
+# ============================================================
+# Compresión
+# ============================================================
+
+def compress_payload(plaintext: bytes, threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+                     level: int = DEFAULT_COMPRESS_LEVEL) -> tuple:
+    """
+    Retorna (datos, flags): comprimidos con FLAG_COMPRESSED si el texto llega
+    al umbral y la compresión lo achica; si no, el texto original y 0.
+    """
+    if threshold is None or len(plaintext) < threshold:
+        return plaintext, 0
+    compressed = zlib.compress(plaintext, level)
+    if len(compressed) >= len(plaintext):
+        return plaintext, 0
+    return compressed, FLAG_COMPRESSED
+
+
+def decompress_payload(data: bytes, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """Inversa de compress_payload() para datos con FLAG_COMPRESSED."""
+    decompressor = zlib.decompressobj()
+    try:
+        plaintext = decompressor.decompress(data, max_size)
+    except zlib.error as e:
+        raise ValueError(f"Payload comprimido inválido: {e}")
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        raise ValueError("Payload comprimido demasiado grande o incompleto")
+    return plaintext
+
@@ -0,0 +1,406 @@
+"""
+DeviceClient.py
+---------------
+Biblioteca cliente sin interfaz gráfica, en versión bloqueante y asyncio.
+
+Para hablar con el servidor desde código (pruebas, integraciones, un
+simulador de miles de dispositivos) había que copiar el manejo de sockets
+de client.py o de loadgen.py. Aquí queda una API mínima sobre el mismo
+motor de sesión (ClientProtocol.py):
+
+    client = DeviceClient(host, port)
+    client.connect()                      # [RESUME] con ticket, o FCM (0.5-RTT si se puede)
+    client.send(b"lectura", timeout=1.0)  # mensaje RM cifrado
+    client.send_batch([b"t=21", b"h=40"]) # varios mensajes en una trama [BATCH]
+    kind, data = client.recv(timeout=5.0) # respuesta, broadcast, groupcast o texto claro
+    client.close()                        # LCM (guarda el ticket para la próxima conexión)
+
+    async with AsyncDeviceClient(host, port) as client:
+        await client.send(b"lectura", timeout=1.0)
+        kind, data = await client.recv()
+
+recv() retorna (tipo FRAME_*, contenido) como ClientProtocol.receive();
+[GROUPKEY], [TICKET] y [EARLY_REJECTED] se procesan sin entregarse.
+
+Modo segmentado (Pipeline.py): con window=W > 1, send() envía tramas [SEQ]
+y deja hasta W mensajes sin respuesta. Con la ventana llena, send() lee
+tramas hasta que llega una respuesta; lo que lee queda para recv().
+
+Plazos (timeout en segundos, None = sin límite):
+ - connect(): conexión TCP y handshake completo.
+ - send() y send_batch(): si vence al enviar, se aborta la conexión (TimeoutError). El flujo de
+   llaves ya avanzó y el servidor pudo recibir parte de la trama, así que
+   la sesión no se puede seguir usando; el ticket guardado sigue valiendo.
+   Si vence esperando lugar en la ventana no se envió nada y la sesión sigue.
+ - recv(): si vence no se pierde nada (lanza TimeoutError y los bytes ya
+   leídos quedan en el decodificador de tramas).
+
+Reglas de hilos: un DeviceClient se usa desde un solo hilo (como un socket
+con timeout). Para agrupar por tiempo o tamaño, Coalescing.Coalescer(
+client.send_batch) envía los lotes desde su temporizador: entonces solo se
+envía por el agrupador, y recv() con timeout=None puede ir en otro hilo. AsyncDeviceClient no usa hilos: un proceso puede mantener
+miles de sesiones en un solo event loop.
+"""
+
+import asyncio
+import collections
+import socket
+import time
+
+from ClientProtocol import (FRAME_BROADCAST, FRAME_GROUPCAST, FRAME_PLAINTEXT, FRAME_RESPONSE,
+                            ClientProtocol)
+from Framing import FrameDecoder, encode_frame
+from Randomness import get_randomness
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Plazo por defecto de connect() y close() (segundos)
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_CLOSE_TIMEOUT = 5.0
+
+# Bytes pedidos al socket en cada lectura
+READ_SIZE = 64 * 1024
+
+# Tipos de trama que recv() entrega a quien usa la biblioteca
+USER_FRAMES = frozenset((FRAME_RESPONSE, FRAME_BROADCAST, FRAME_GROUPCAST, FRAME_PLAINTEXT))
+
+# Reconexión: primera espera y tope del backoff exponencial (segundos)
+DEFAULT_BACKOFF_INITIAL = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+
+# ============================================================
+# Flujo común (sin E/S)
+# ============================================================
+
+def _handshake(protocol: ClientProtocol, resume: bool):
+    """
+    Handshake de connect() sin E/S: genera listas de tramas a enviar y recibe
+    (con send()) cada trama leída, hasta la respuesta al contacto o [RESUMED].
+    """
+    if resume and protocol.resumption_ticket is not None:
+        frame = yield [protocol.resume_frame()]
+        if protocol.accept_resume(frame):
+            return
+        # Ticket rechazado: el FCM completo sigue por la misma conexión
+    frame = yield protocol.hello_frames()
+    frame = yield protocol.accept_server_params(frame)
+    while protocol.receive(frame)[0] != FRAME_RESPONSE:
+        frame = yield []
+
+
+def _user_message(protocol: ClientProtocol, frame: bytes):
+    """Procesa una trama; retorna (tipo, contenido) si es para el usuario o None."""
+    kind, value = protocol.receive(frame)
+    if kind in USER_FRAMES and not (kind == FRAME_GROUPCAST and value is None):
+        return kind, value
+    return None
+
+
+def backoff_delays(initial: float = DEFAULT_BACKOFF_INITIAL, maximum: float = DEFAULT_BACKOFF_MAX, rng=None):
+    """
+    Esperas entre intentos de reconexión (generador infinito): backoff
+    exponencial con jitter. El tope se duplica en cada intento hasta
+    `maximum` y la espera es uniforme entre la mitad del tope y el tope,
+    para que los dispositivos que perdieron la conexión a la vez no vuelvan
+    todos juntos.
+    """
+    rng = rng if rng is not None else get_randomness()
+    cap = initial
+    while True:
+        half_ms = int(cap * 500)
+        yield (half_ms + rng.below(half_ms + 1)) / 1000
+        cap = min(cap * 2, maximum)
+
+
+def _remaining(deadline):
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Plazo vencido")
+    return remaining
+
+
+# ============================================================
+# Versión bloqueante
+# ============================================================
+
+class DeviceClient:
+    """Sesión de un dispositivo sobre un socket bloqueante."""
+
+    def __init__(self, host: str, port: int, protocol: ClientProtocol = None,
+                 compression: bool = True, rng=None, window: int = 1):
+        if window < 1:
+            raise ValueError("window debe ser >= 1")
+        self.address = (host, port)
+        # El protocolo sobrevive a close(): guarda el ticket y los parámetros del servidor
+        self.protocol = protocol if protocol is not None else ClientProtocol(compression=compression, rng=rng)
+        self.window = window  # > 1: modo segmentado con hasta `window` mensajes en vuelo
+        self.sock = None
+        self._decoder = FrameDecoder()
+        self._frames = []
+        self._messages = collections.deque()  # mensajes leídos por send() con la ventana llena
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def __enter__(self):
+        if not self.connected:
+            self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------------------- E/S ----------------------------
+    # Multiplex.MuxStream reemplaza estos métodos para usar una corriente de una conexión compartida
+
+    def _open(self, timeout):
+        self.sock = socket.create_connection(self.address, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send_frames(self, frames, timeout):
+        self.sock.settimeout(timeout)
+        self.sock.sendall(b"".join(encode_frame(frame) for frame in frames))
+
+    def _read_frame(self, deadline):
+        while not self._frames:
+            self.sock.settimeout(_remaining(deadline))
+            data = self.sock.recv(READ_SIZE)
+            if not data:
+                raise ConnectionError("Conexión cerrada por el servidor")
+            self._frames.extend(self._decoder.feed(data))
+        return self._frames.pop(0)
+
+    def _abort(self):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            sock.close()
+        self._decoder = FrameDecoder()
+        self._frames = []
+        self._messages.clear()
+        self.protocol.reset()
+
+    # ---------------------------- API ----------------------------
+
+    def connect(self, timeout: float = DEFAULT_CONNECT_TIMEOUT, resume: bool = True):
+        """
+        Conecta y establece la sesión: con ticket intenta [RESUME]; si no
+        (o si resume=False), FCM con datos tempranos si ya se conocen los
+        parámetros del servidor.
+        """
+        if self.connected:
+            raise RuntimeError("Ya está conectado")
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self._open(timeout)
+        try:
+            steps = _handshake(self.protocol, resume)
+            frames = next(steps)
+            while True:
+                if frames:
+                    self._send_frames(frames, _remaining(deadline))
+                try:
+                    frames = steps.send(self._read_frame(deadline))
+                except StopIteration:
+                    return
+        except BaseException:
+            self._abort()
+            raise
+
+    def send(self, data: bytes, timeout: float = None):
+        """Envía un mensaje cifrado. Si vence el plazo aborta la conexión y lanza TimeoutError."""
+        if not self.connected:
+            raise ConnectionError("No está conectado")
+        if self.window == 1:
+            self._send_sealed(self.protocol.seal(data), timeout)
+            return
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while len(self.protocol.in_flight) >= self.window:
+            self._keep(_user_message(self.protocol, self._read_frame(deadline)))
+        self._send_sealed(self.protocol.seal_seq(data), _remaining(deadline))
+
+    def send_batch(self, messages: list, timeout: float = None):
+        """Envía varios mensajes en una sola trama [BATCH]; el servidor responde una vez por lote."""
+        if not self.connected:
+            raise ConnectionError("No está conectado")
+        self._send_sealed(self.protocol.seal_batch(messages), timeout)
+
+    def _send_sealed(self, frame: bytes, timeout):
+        try:
+            self._send_frames((frame,), timeout)
+        except OSError:
+            self._abort()
+            raise
+
+    def _keep(self, message):
+        if message is not None:
+            self._messages.append(message)
+
+    def recv(self, timeout: float = None) -> tuple:
+        """Siguiente mensaje para el usuario: (tipo FRAME_*, contenido)."""
+        if not self.connected:
+            raise ConnectionError("No está conectado")
+        if self._messages:
+            return self._messages.popleft()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            message = _user_message(self.protocol, self._read_frame(deadline))
+            if message is not None:
+                return message
+
+    def close(self, timeout: float = DEFAULT_CLOSE_TIMEOUT):
+        """
+        Envía el LCM y procesa lo que llegue hasta que el servidor cierre
+        (respuesta y ticket final). Los mensajes sin leer se descartan.
+        """
+        if not self.connected:
+            return
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            if self.protocol.established:
+                self._send_frames((self.protocol.farewell(),), _remaining(deadline))
+                while True:
+                    self.protocol.receive(self._read_frame(deadline))
+        except (OSError, ValueError):
+            # Incluye el cierre del servidor (ConnectionError) y el plazo vencido
+            pass
+        finally:
+            self._abort()
+
+
+# ============================================================
+# Versión asyncio
+# ============================================================
+
+class AsyncDeviceClient:
+    """Sesión de un dispositivo sobre streams de asyncio (misma API, con await)."""
+
+    def __init__(self, host: str, port: int, protocol: ClientProtocol = None,
+                 compression: bool = True, rng=None, window: int = 1):
+        if window < 1:
+            raise ValueError("window debe ser >= 1")
+        self.address = (host, port)
+        self.protocol = protocol if protocol is not None else ClientProtocol(compression=compression, rng=rng)
+        self.window = window
+        self.reader = None
+        self.writer = None
+        self._decoder = FrameDecoder()
+        self._frames = []
+        self._messages = collections.deque()
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    async def __aenter__(self):
+        if self.writer is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ---------------------------- E/S ----------------------------
+
+    async def _send_frames(self, frames, timeout):
+        self.writer.write(b"".join(encode_frame(frame) for frame in frames))
+        await asyncio.wait_for(self.writer.drain(), timeout)
+
+    async def _read_frame(self, deadline):
+        while not self._frames:
+            # Cancelar read() no consume bytes: un plazo vencido no corta tramas
+            data = await asyncio.wait_for(self.reader.read(READ_SIZE), _remaining(deadline))
+            if not data:
+                raise ConnectionError("Conexión cerrada por el servidor")
+            self._frames.extend(self._decoder.feed(data))
+        return self._frames.pop(0)
+
+    def _abort(self):
+        writer, self.writer, self.reader = self.writer, None, None
+        if writer is not None:
+            writer.transport.abort()
+        self._decoder = FrameDecoder()
+        self._frames = []
+        self._messages.clear()
+        self.protocol.reset()
+
+    # ---------------------------- API ----------------------------
+
+    async def connect(self, timeout: float = DEFAULT_CONNECT_TIMEOUT, resume: bool = True):
+        """Igual que DeviceClient.connect()."""
+        if self.writer is not None:
+            raise RuntimeError("Ya está conectado")
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(*self.address), timeout)
+        try:
+            self.writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            steps = _handshake(self.protocol, resume)
+            frames = next(steps)
+            while True:
+                if frames:
+                    await self._send_frames(frames, _remaining(deadline))
+                try:
+                    frames = steps.send(await self._read_frame(deadline))
+                except StopIteration:
+                    return
+        except BaseException:
+            self._abort()
+            raise
+
+    async def send(self, data: bytes, timeout: float = None):
+        """Igual que DeviceClient.send()."""
+        if self.writer is None:
+            raise ConnectionError("No está conectado")
+        if self.window == 1:
+            await self._send_sealed(self.protocol.seal(data), timeout)
+            return
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while len(self.protocol.in_flight) >= self.window:
+            message = _user_message(self.protocol, await self._read_frame(deadline))
+            if message is not None:
+                self._messages.append(message)
+        await self._send_sealed(self.protocol.seal_seq(data), _remaining(deadline))
+
+    async def send_batch(self, messages: list, timeout: float = None):
+        """Igual que DeviceClient.send_batch()."""
+        if self.writer is None:
+            raise ConnectionError("No está conectado")
+        await self._send_sealed(self.protocol.seal_batch(messages), timeout)
+
+    async def _send_sealed(self, frame: bytes, timeout):
+        try:
+            await self._send_frames((frame,), timeout)
+        except (OSError, asyncio.TimeoutError):
+            self._abort()
+            raise
+
+    async def recv(self, timeout: float = None) -> tuple:
+        """Siguiente mensaje para el usuario: (tipo FRAME_*, contenido)."""
+        if self.writer is None:
+            raise ConnectionError("No está conectado")
+        if self._messages:
+            return self._messages.popleft()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            message = _user_message(self.protocol, await self._read_frame(deadline))
+            if message is not None:
+                return message
+
+    async def close(self, timeout: float = DEFAULT_CLOSE_TIMEOUT):
+        """Igual que DeviceClient.close()."""
+        if self.writer is None:
+            return
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            if self.protocol.established:
+                await self._send_frames((self.protocol.farewell(),), _remaining(deadline))
+                while True:
+                    self.protocol.receive(await self._read_frame(deadline))
+        except (OSError, ValueError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._abort()
@@ -0,0 +1,232 @@
+"""
+FanOut.py
+---------
+Difusión (broadcast) no bloqueante con una cola de salida por conexión.
+
+Antes, el broadcast recorría los clientes en el hilo de Tk haciendo un
+`sendall` bloqueante por socket: un cliente lento o caído congelaba la GUI
+y retrasaba a todos los demás. Ahora cada conexión tiene una cola de salida
+acotada que vacía su propio bucle de E/S, y el broadcast solo encola.
+
+El archivo se encarga únicamente de:
+ - OutboundQueue: cola acotada con política de contrapresión
+   (descartar el más antiguo, desconectar o esperar espacio con límite de
+   tiempo). La espera es de la cola de esa conexión, no de quien encola:
+   un cliente lento nunca retrasa el broadcast a los demás.
+ - BroadcastStats: resultado de un broadcast.
+ - FanOutService: reparte un mensaje a todas las colas desde un hilo
+   propio y retorna de inmediato un Future con las estadísticas.
+
+NO incluye el envío real por socket (lo hace cada backend de ServerEngine.py).
+"""
+
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Políticas de contrapresión cuando la cola de una conexión está llena
+POLICY_DROP_OLDEST = "drop_oldest"  # descartar el mensaje más antiguo
+POLICY_DISCONNECT = "disconnect"    # desconectar al cliente lento
+POLICY_BLOCK = "block"              # el mensaje espera espacio en su cola (hasta block_timeout)
+
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DISCONNECT, POLICY_BLOCK)
+
+# Valores por defecto
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BLOCK_TIMEOUT = 1.0
+
+# Resultado de OutboundQueue.put()
+QUEUED = "queued"
+DROPPED_OLDEST = "dropped_oldest"
+OVERFLOW = "overflow"
+WAITING = "waiting"
+CLOSED = "closed"
+
+
+# ============================================================
+# Cola de salida por conexión
+# ============================================================
+
+class OutboundQueue:
+    """
+    Cola de salida acotada de una conexión (segura entre hilos).
+
+    Con POLICY_BLOCK put() no espera: si la cola está llena el mensaje pasa
+    a una lista de espera propia de la conexión y entra a la cola en orden
+    cuando el escritor libera espacio. Los que siguen esperando al cumplirse
+    block_timeout se descartan (contador timed_out).
+    """
+
+    __slots__ = ("maxlen", "policy", "block_timeout", "dropped", "timed_out", "overflowed",
+                 "closed", "_items", "_waiting", "_cond")
+
+    def __init__(self, maxlen: int = DEFAULT_QUEUE_SIZE, policy: str = POLICY_DROP_OLDEST,
+                 block_timeout: float = DEFAULT_BLOCK_TIMEOUT):
+        if maxlen < 1:
+            raise ValueError("maxlen debe ser >= 1")
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy}")
+        self.maxlen = maxlen
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.timed_out = 0
+        self.overflowed = False
+        self.closed = False
+        self._items = collections.deque()
+        self._waiting = collections.deque()  # (plazo, mensaje) con POLICY_BLOCK y la cola llena
+        self._cond = threading.Condition()
+
+    def put(self, payload: bytes) -> str:
+        """
+        Encola un mensaje aplicando la política si la cola está llena.
+
+        Nunca bloquea a quien llama.
+
+        Retorna:
+            str: QUEUED, DROPPED_OLDEST, OVERFLOW, WAITING o CLOSED.
+        """
+        with self._cond:
+            if self.closed:
+                return CLOSED
+            result = QUEUED
+            if self.policy == POLICY_BLOCK:
+                self._expire()
+                if self._waiting or len(self._items) >= self.maxlen:
+                    self._waiting.append((time.monotonic() + self.block_timeout, payload))
+                    return WAITING
+            elif len(self._items) >= self.maxlen:
+                if self.policy == POLICY_DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                    result = DROPPED_OLDEST
+                else:
+                    self.overflowed = True
+                    self.closed = True
+                    self._cond.notify_all()
+                    return OVERFLOW
+            self._items.append(payload)
+            self._cond.notify_all()
+            return result
+
+    def _expire(self):
+        """Descarta los mensajes en espera cuyo plazo ya venció (con el lock tomado)."""
+        now = time.monotonic()
+        while self._waiting and self._waiting[0][0] <= now:
+            self._waiting.popleft()
+            self.timed_out += 1
+
+    def _pop(self):
+        """Saca el siguiente mensaje y pasa a la cola los que esperaban espacio (con el lock tomado)."""
+        payload = self._items.popleft()
+        if self._waiting:
+            self._expire()
+            while self._waiting and len(self._items) < self.maxlen:
+                self._items.append(self._waiting.popleft()[1])
+        return payload
+
+    def get(self, timeout: float = None):
+        """Espera y retorna el siguiente mensaje (None si la cola se cerró)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self._items, timeout=timeout)
+            if not self._items:
+                return None
+            return self._pop()
+
+    def get_nowait(self):
+        """Retorna el siguiente mensaje o None si la cola está vacía."""
+        with self._cond:
+            if not self._items:
+                return None
+            return self._pop()
+
+    def close(self):
+        """Cierra la cola y despierta a quien esté esperando."""
+        with self._cond:
+            self.closed = True
+            self._items.clear()
+            self._waiting.clear()
+            self._cond.notify_all()
+
+    def pending_bytes(self) -> int:
+        """Bytes encolados o en espera pendientes de envío."""
+        with self._cond:
+            return (sum(len(payload) for payload in self._items)
+                    + sum(len(payload) for _, payload in self._waiting))
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items) + len(self._waiting)
+
+
+# ============================================================
+# Broadcast
+# ============================================================
+
+@dataclass
+class BroadcastStats:
+    targets: int = 0          # conexiones con sesión al momento del broadcast
+    queued: int = 0           # encolado sin incidentes
+    dropped_oldest: int = 0   # encolado descartando un mensaje antiguo
+    disconnected: int = 0     # desconectados por desbordar su cola
+    waiting: int = 0          # en espera de espacio en su cola (POLICY_BLOCK)
+    closed: int = 0           # la conexión se cerró mientras tanto
+    elapsed: float = 0.0      # segundos que tomó repartir el mensaje
+
+    @property
+    def delivered(self) -> int:
+        """Conexiones a las que se les encoló el mensaje."""
+        return self.queued + self.dropped_oldest
+
+
+class FanOutService:
+    """
+    Reparte un mensaje a las colas de salida de todas las conexiones.
+
+    El backend debe ofrecer:
+        fanout_targets() -> conexiones con atributo `outbound`
+        wake_writer(conn) -> avisar al bucle de E/S que hay datos
+        disconnect(conn)  -> cerrar la conexión (seguro entre hilos)
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        # Un solo hilo: los broadcasts salen en orden y nunca en el hilo de Tk.
+        # Ningún put() espera, así que un cliente lento no retrasa a los demás.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fanout")
+
+    def broadcast(self, payload: bytes):
+        """Retorna de inmediato un Future que se resuelve con BroadcastStats."""
+        return self._executor.submit(self._dispatch, payload)
+
+    def _dispatch(self, payload: bytes) -> BroadcastStats:
+        start = time.perf_counter()
+        stats = BroadcastStats()
+        for conn in self.backend.fanout_targets():
+            stats.targets += 1
+            result = conn.outbound.put(payload)
+            if result == QUEUED:
+                stats.queued += 1
+            elif result == DROPPED_OLDEST:
+                stats.dropped_oldest += 1
+            elif result == OVERFLOW:
+                stats.disconnected += 1
+                self.backend.disconnect(conn)
+                continue
+            elif result == WAITING:
+                stats.waiting += 1
+            else:
+                stats.closed += 1
+                continue
+            self.backend.wake_writer(conn)
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,116 @@
+"""
+Framing.py
+----------
+Delimitación de mensajes sobre TCP para el protocolo de cifrado polimórfico.
+
+TCP es un flujo de bytes: un `recv(2048)` puede devolver medio mensaje o
+varios mensajes pegados. Cada mensaje del protocolo (parámetros FCM,
+mensajes RM cifrados, LCM, broadcast, texto claro) viaja como una trama:
+
+    longitud (4 bytes, big endian) || contenido
+
+El archivo se encarga únicamente de:
+ - Codificar tramas.
+ - Decodificar tramas de forma incremental (para sockets no bloqueantes).
+ - Enviar/recibir tramas completas sobre sockets bloqueantes.
+"""
+
+import struct
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Cabecera: longitud del contenido en 4 bytes (network byte order)
+FRAME_HEADER = struct.Struct(">I")
+
+# Tamaño máximo aceptado para una trama (protege contra longitudes basura)
+MAX_FRAME_SIZE = 1 << 20
+
+
+# ============================================================
+# Codificación / decodificación
+# ============================================================
+
+def encode_frame(payload: bytes) -> bytes:
+    """Antepone la longitud al contenido."""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError("Trama demasiado grande")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """
+    Decodificador incremental de tramas.
+
+    Se le entregan los bytes tal como llegan del socket con feed() y
+    retorna las tramas completas; el resto queda en el buffer de lectura.
+    """
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """Agrega bytes al buffer y retorna la lista de tramas completas."""
+        self._buffer += data
+        frames = []
+        header_size = FRAME_HEADER.size
+        while len(self._buffer) >= header_size:
+            (length,) = FRAME_HEADER.unpack_from(self._buffer)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError("Trama demasiado grande")
+            end = header_size + length
+            if len(self._buffer) < end:
+                break
+            frames.append(bytes(self._buffer[header_size:end]))
+            del self._buffer[:end]
+        return frames
+
+    def pending(self) -> int:
+        """Bytes en el buffer que aún no forman una trama completa."""
+        return len(self._buffer)
+
+
+# ============================================================
+# Sockets bloqueantes
+# ============================================================
+
+def recv_exact(sock, n: int):
+    """
+    Lee exactamente n bytes del socket.
+
+    Retorna None si el otro extremo cerró antes de enviar el primer byte.
+    Lanza ConnectionError si cerró a mitad de lectura.
+    """
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            if not data:
+                return None
+            raise ConnectionError("Conexión cerrada a mitad de trama")
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Recibe una trama completa. Retorna None si la conexión se cerró."""
+    header = recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError("Trama demasiado grande")
+    if length == 0:
+        return b""
+    payload = recv_exact(sock, length)
+    if payload is None:
+        raise ConnectionError("Conexión cerrada a mitad de trama")
+    return payload
+
+
+def send_frame(sock, payload: bytes):
+    """Envía una trama completa."""
+    sock.sendall(encode_frame(payload))
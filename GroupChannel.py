@@ -0,0 +1,134 @@
+"""
+GroupChannel.py
+---------------
+Canal de broadcast cifrado "una sola vez" para todos los clientes.
+
+Cifrar un broadcast por cliente, con el PSN y la llave de cada sesión,
+cuesta O(clientes) cifrados AES. En su lugar el servidor deriva una única
+tabla de llaves de grupo, se la entrega a cada cliente cifrada con su propia
+sesión (mensaje [GROUPKEY]) y luego cifra cada broadcast una sola vez con
+encrypt_message; los mismos bytes se escriben en todos los sockets.
+Costo: un cifrado + N escrituras.
+
+Formato de las tramas:
+    [GROUPKEY]  || índice de llave de la sesión (4 bytes) || encrypt_message(tabla de grupo)
+    [GROUPCAST] || índice de llave de grupo (4 bytes)     || encrypt_message(mensaje)
+
+El índice (big endian) viaja en claro para que un cliente que se une a mitad
+de la secuencia sepa qué llave usar; el PSN va dentro del cifrado como
+siempre, así que solo el servidor sigue la secuencia de PSN del grupo.
+"""
+
+import struct
+import threading
+
+from KeyGenerator import generate_key_table
+from PSN import ESQUEMAS, encrypt_message, decrypt_message, extract_psn_from_plaintext_using_instruction
+from SeedAndPrimes import DEFAULT_N_KEYS, SharedParams, generate_prime, generate_seed
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+GROUPKEY_PREFIX = b"[GROUPKEY]"
+GROUPCAST_PREFIX = b"[GROUPCAST]"
+
+# Índice de llave en claro tras el prefijo (tablas de cualquier tamaño)
+_KEY_INDEX = struct.Struct(">I")
+KEY_INDEX_SIZE = _KEY_INDEX.size
+
+# Bytes que puede leer una instrucción de extracción de ESQUEMAS
+_EXTRACTION_WINDOW = 6
+
+
+# ============================================================
+# Empaquetado de la tabla de grupo
+# ============================================================
+
+def pack_key_table(key_table: list) -> bytes:
+    """Tabla de llaves de 64 bits -> bytes (8 bytes por llave, big endian)."""
+    return b"".join(key.to_bytes(8, "big") for key in key_table)
+
+
+def unpack_key_table(data: bytes) -> list:
+    """Inversa de pack_key_table()."""
+    if len(data) == 0 or len(data) % 8:
+        raise ValueError("Tabla de llaves de grupo inválida")
+    return [int.from_bytes(data[i:i + 8], "big") for i in range(0, len(data), 8)]
+
+
+# ============================================================
+# Lado servidor
+# ============================================================
+
+class GroupChannel:
+    """
+    Tabla de llaves de grupo del servidor.
+
+    Se deriva una sola vez (fs/fg/fm como cualquier sesión) a partir de Q
+    del servidor y de un primo y una semilla propios del grupo.
+    """
+
+    def __init__(self, node_id: int, Q: int, n_keys: int = DEFAULT_N_KEYS, rng=None):
+        self.rng = rng  # Proveedor de aleatoriedad (Randomness.py); None = el del proceso
+        params = SharedParams(
+            id=node_id,
+            P=generate_prime(tag="group", rng=rng),
+            Q=Q,
+            S=generate_seed(tag="group", rng=rng),
+            N=n_keys,
+        )
+        self.key_table = generate_key_table(params)
+        self.packed_table = pack_key_table(self.key_table)
+        self.key_index = 0
+        self.next_psn = 0
+        self._lock = threading.Lock()
+
+    def key_delivery_frame(self, session_key_index: int, session_key: bytes, psn: int) -> bytes:
+        """Trama [GROUPKEY] con la tabla de grupo cifrada con la llave de la sesión."""
+        ciphertext = encrypt_message(self.packed_table, psn, session_key, rng=self.rng)
+        return GROUPKEY_PREFIX + _KEY_INDEX.pack(session_key_index) + ciphertext
+
+    def encrypt(self, message: bytes) -> bytes:
+        """
+        Cifra un broadcast una sola vez y retorna la trama [GROUPCAST].
+        Avanza el índice de llave y el PSN del grupo.
+        """
+        with self._lock:
+            index = self.key_index
+            psn = self.next_psn
+            self.next_psn = _next_group_psn(message, psn)
+            self.key_index = (index + 1) % len(self.key_table)
+        ciphertext = encrypt_message(message, psn, self.key_table[index].to_bytes(8, "big"), rng=self.rng)
+        return GROUPCAST_PREFIX + _KEY_INDEX.pack(index) + ciphertext
+
+
+def _next_group_psn(message: bytes, psn: int) -> int:
+    """
+    PSN del siguiente broadcast. Los receptores leen el PSN de cada trama,
+    así que basta con que sea determinista: los mensajes más cortos que la
+    ventana de extracción se completan con ceros en vez de fallar.
+    """
+    if len(message) < _EXTRACTION_WINDOW:
+        message = message.ljust(_EXTRACTION_WINDOW, b"\x00")
+    return extract_psn_from_plaintext_using_instruction(message, ESQUEMAS[psn]["next_extraction"])
+
+
+# ============================================================
+# Lado cliente
+# ============================================================
+
+def open_key_delivery(frame: bytes, session_key_table: list) -> list:
+    """Descifra una trama [GROUPKEY] con la tabla de la sesión y retorna la tabla de grupo."""
+    body = frame[len(GROUPKEY_PREFIX):]
+    (index,) = _KEY_INDEX.unpack_from(body)
+    result = decrypt_message(body[KEY_INDEX_SIZE:], session_key_table[index].to_bytes(8, "big"))
+    return unpack_key_table(result["plaintext"])
+
+
+def decrypt_groupcast(frame: bytes, group_key_table: list) -> bytes:
+    """Descifra una trama [GROUPCAST] con la tabla de grupo y retorna el mensaje."""
+    body = frame[len(GROUPCAST_PREFIX):]
+    (index,) = _KEY_INDEX.unpack_from(body)
+    result = decrypt_message(body[KEY_INDEX_SIZE:], group_key_table[index].to_bytes(8, "big"))
+    return result["plaintext"]
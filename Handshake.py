@@ -0,0 +1,132 @@
+"""
+Handshake.py
+------------
+Codificación de los parámetros del "First Message Contact" (FCM).
+
+Antes cada lado enviaba "P,S" y "Q,S_server" en decimal ASCII y el otro los
+separaba con split(',') e int(). Ahora los parámetros viajan en un formato
+binario de disposición fija, en orden de red, con un byte de versión y
+longitudes explícitas:
+
+    versión (1) || flags (1) || len(id) (2) || len(primo) (2) || len(semilla) (2)
+    || id || primo || semilla            (enteros sin signo, big endian)
+
+ - Los tamaños de los primos y semillas no están fijos: basta cambiar
+   DEFAULT_PRIME_BITS / DEFAULT_KEY_BITS en SeedAndPrimes.py (la derivación
+   de KeyGenerator.py acepta enteros de cualquier tamaño; las llaves
+   derivadas siguen siendo de 64 bits).
+ - flags lleva los códecs ofrecidos/aceptados (bit 0: zlib, ver Compression.py).
+ - El mensaje llega completo gracias a Framing.py; aquí solo se valida que
+   las longitudes cuadren.
+
+El servidor sigue aceptando el formato ASCII anterior ("P,S[,códecs]") y
+responde en el mismo formato en que le hablaron. El primer byte distingue
+ambos: HANDSHAKE_VERSION en el binario y un dígito en el ASCII. Cualquier
+otro primer byte es una versión binaria que no se conoce y se rechaza (las
+versiones futuras no deben usar los valores 0x30-0x39, los dígitos ASCII).
+
+Handshake de 0.5-RTT: los parámetros del servidor (Q, S_server) no cambian
+mientras el servidor vive, así que un cliente que ya los conoce puede
+derivar sus tablas antes de recibirlos y enviar, en el mismo vuelo que sus
+parámetros, su primer mensaje cifrado como [EARLY] || encrypt_message(...).
+El servidor lo trata como el mensaje de contacto (entrega la tabla de grupo
+y el ticket). Si los parámetros guardados ya no valen, el servidor no puede
+descifrarlo y responde [EARLY_REJECTED]; el cliente reenvía el mensaje con
+las tablas derivadas de los parámetros nuevos.
+"""
+
+import struct
+from dataclasses import dataclass
+
+from Compression import CODEC_ZLIB
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+HANDSHAKE_VERSION = 1
+
+# Datos tempranos (0.5-RTT)
+EARLY_PREFIX = b"[EARLY]"
+EARLY_REJECTED_PREFIX = b"[EARLY_REJECTED]"
+
+# Bits de flags -> códec
+FLAG_ZLIB = 0x01
+_CODEC_FLAGS = {CODEC_ZLIB: FLAG_ZLIB}
+
+# Tamaño máximo de cada campo (bytes)
+MAX_FIELD_SIZE = 0xFFFF
+
+_HEADER = struct.Struct(">BBHHH")
+
+
+class HandshakeError(ValueError):
+    """Parámetros FCM mal formados o de una versión desconocida."""
+
+
+@dataclass
+class HandshakeParams:
+    """Parámetros que envía cada lado: (id, P, S) el cliente y (id, Q, S_server) el servidor."""
+    node_id: int
+    prime: int
+    seed: int
+    codecs: tuple = ()
+    binary: bool = True  # Formato en que llegó (para responder igual)
+
+
+# ============================================================
+# Codificación
+# ============================================================
+
+def _int_bytes(value: int) -> bytes:
+    if value < 0:
+        raise HandshakeError("Los parámetros del FCM no pueden ser negativos")
+    data = value.to_bytes((value.bit_length() + 7) // 8 or 1, "big")
+    if len(data) > MAX_FIELD_SIZE:
+        raise HandshakeError("Parámetro del FCM demasiado grande")
+    return data
+
+
+def encode_params(node_id: int, prime: int, seed: int, codecs=(), binary: bool = True) -> bytes:
+    """Trama de parámetros del FCM (binaria, o ASCII "P,S[,códecs]" con binary=False)."""
+    if not binary:
+        return ",".join([str(prime), str(seed), *codecs]).encode()
+    flags = 0
+    for codec in codecs:
+        flags |= _CODEC_FLAGS.get(codec, 0)
+    fields = [_int_bytes(node_id), _int_bytes(prime), _int_bytes(seed)]
+    header = _HEADER.pack(HANDSHAKE_VERSION, flags, *(len(field) for field in fields))
+    return header + b"".join(fields)
+
+
+def parse_params(data: bytes) -> HandshakeParams:
+    """Trama de parámetros del FCM -> HandshakeParams. Lanza HandshakeError si no cuadra."""
+    if not data:
+        raise HandshakeError("Parámetros FCM vacíos")
+    if data[0] != HANDSHAKE_VERSION:
+        if data[:1].isdigit():
+            return _parse_ascii(data)
+        raise HandshakeError(f"Versión de handshake no soportada: {data[0]}")
+    if len(data) < _HEADER.size:
+        raise HandshakeError("Parámetros FCM incompletos")
+    _, flags, id_len, prime_len, seed_len = _HEADER.unpack_from(data)
+    if len(data) != _HEADER.size + id_len + prime_len + seed_len:
+        raise HandshakeError("Las longitudes del FCM no cuadran")
+    offset = _HEADER.size
+    node_id = int.from_bytes(data[offset:offset + id_len], "big")
+    offset += id_len
+    prime = int.from_bytes(data[offset:offset + prime_len], "big")
+    offset += prime_len
+    seed = int.from_bytes(data[offset:offset + seed_len], "big")
+    codecs = tuple(codec for codec, flag in _CODEC_FLAGS.items() if flags & flag)
+    return HandshakeParams(node_id, prime, seed, codecs, binary=True)
+
+
+def _parse_ascii(data: bytes) -> HandshakeParams:
+    """Formato anterior: "P,S[,códecs...]" en decimal ASCII."""
+    try:
+        fields = data.decode().split(',')
+        prime, seed = int(fields[0]), int(fields[1])
+    except (UnicodeDecodeError, ValueError, IndexError):
+        raise HandshakeError("Parámetros FCM inválidos")
+    return HandshakeParams(0, prime, seed, tuple(fields[2:]), binary=False)
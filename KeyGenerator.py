@@ -9,6 +9,8 @@ El archivo se encarga únicamente de:
  - Definir funciones auxiliares de 64 bits.
  - Implementar las funciones fs, fg y fm descritas en el modelo.
  - Construir tablas de llaves a partir de parámetros compartidos (P, Q, S, N).
+ - Derivar dos tablas independientes, una por dirección (cliente->servidor y
+   servidor->cliente), para tráfico full-duplex.
 
 NO incluye:
  - Funciones polimórficas reversibles (van en ReversibleFunctions.py).
@@ -22,6 +24,9 @@ Fecha: 2025
 
 import hashlib
 import hmac
+from types import SimpleNamespace
+
+from Profiling import HOOKS
 
 # ============================================================
 # Constantes globales
@@ -33,6 +38,10 @@ KEY_BITS = 64
 # Máscara para forzar valores a 64 bits
 KEY_MASK = (1 << KEY_BITS) - 1
 
+# Etiquetas de dirección para derivar un flujo de llaves por sentido
+DIRECTION_CLIENT_TO_SERVER = b"client->server"
+DIRECTION_SERVER_TO_CLIENT = b"server->client"
+
 
 # ============================================================
 # Funciones auxiliares (bitwise)
@@ -61,6 +70,16 @@ def _ror(x: int, n: int) -> int:
     return _u64((x >> n) | (x << (KEY_BITS - n)))
 
 
+def _int_bytes(x: int) -> bytes:
+    """
+    Entero -> bytes big endian, mínimo 8 bytes.
+
+    Con primos de hasta 64 bits da lo mismo que x.to_bytes(8), así que las
+    tablas no cambian; con primos más grandes usa los bytes que hagan falta.
+    """
+    return x.to_bytes(max(8, (x.bit_length() + 7) // 8), "big")
+
+
 # ============================================================
 # Funciones principales del modelo (fs, fg, fm)
 # ============================================================
@@ -102,7 +121,7 @@ def fg_generation(p0: int, q: int, counter: int) -> int:
     """
     data = (
         p0.to_bytes(8, "big")
-        + q.to_bytes(8, "big")
+        + _int_bytes(q)
         + counter.to_bytes(4, "big")
     )
     h = hashlib.sha256(data).digest()
@@ -128,7 +147,7 @@ def fm_mutation(s: int, q: int, counter: int) -> int:
     x = _rol(x, (counter & 63) or 1)
     data = (
         x.to_bytes(8, "big")
-        + q.to_bytes(8, "big")
+        + _int_bytes(q)
         + counter.to_bytes(4, "big")
     )
     h = hashlib.sha256(data).digest()
@@ -139,6 +158,7 @@ def fm_mutation(s: int, q: int, counter: int) -> int:
 # Generación de tabla de llaves
 # ============================================================
 
+@HOOKS.hooked("generate_key_table")
 def generate_key_table(shared_params, n_keys: int = None):
     """
     Genera una tabla de llaves de 64 bits a partir de parámetros compartidos.
@@ -181,6 +201,38 @@ def generate_key_table(shared_params, n_keys: int = None):
     return keys
 
 
+def direction_seed(s: int, label: bytes) -> int:
+    """
+    Semilla de un flujo direccional: HMAC-SHA256(S, etiqueta) reducido a 64 bits.
+    Con etiquetas distintas las dos tablas no comparten ninguna llave.
+    """
+    key = s.to_bytes((s.bit_length() + 7) // 8 or 1, "big")
+    h = hmac.new(key, label, hashlib.sha256).digest()
+    return int.from_bytes(h[:8], "big") & KEY_MASK
+
+
+def generate_directional_key_tables(shared_params, n_keys: int = None):
+    """
+    Genera las dos tablas de llaves de una sesión, una por dirección.
+
+    Cada tabla sale de generate_key_table() con la semilla S mezclada con la
+    etiqueta de dirección; P, Q y N son los mismos. Así cada lado envía con
+    una tabla y recibe con la otra, con contadores independientes.
+
+    Retorna:
+        tuple: (tabla cliente->servidor, tabla servidor->cliente)
+    """
+    if n_keys is None:
+        n_keys = getattr(shared_params, "N", 16)
+    S = int(shared_params.S)
+    tables = []
+    for label in (DIRECTION_CLIENT_TO_SERVER, DIRECTION_SERVER_TO_CLIENT):
+        params = SimpleNamespace(P=shared_params.P, Q=shared_params.Q,
+                                 S=direction_seed(S, label), N=n_keys)
+        tables.append(generate_key_table(params, n_keys))
+    return tuple(tables)
+
+
 # ============================================================
 # Prueba rápida (ejecución directa)
 # ============================================================
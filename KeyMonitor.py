@@ -0,0 +1,300 @@
+"""
+KeyMonitor.py
+-------------
+Ventana del monitor de llaves del servidor (Tk).
+
+Antes, cada segundo se destruían y recreaban los frames de todas las llaves
+del cliente seleccionado, se recalculaba hash() de cada llave y el combobox
+se buscaba por ruta de widget. Con tablas grandes o muchos clientes el
+monitor se comía el hilo de Tk.
+
+Ahora:
+ - Los widgets se crean una sola vez.
+ - La lista está virtualizada: un Canvas con un conjunto fijo de filas
+   (las visibles) que se reasignan al hacer scroll, sin importar N.
+ - Las actualizaciones vienen del feed de eventos del registro
+   (Session.SessionEvents): solo se redibujan las filas que cambiaron.
+ - Las huellas de las llaves se calculan al derivar la tabla (Session).
+
+NO incluye lógica del protocolo ni de sockets.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+from Session import EVENT_ADVANCED, EVENT_CLOSED, EVENT_OPENED
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Cada cuánto se vacía el feed de eventos (ms)
+POLL_INTERVAL_MS = 200
+
+# Alto de cada fila de llave (px)
+ROW_HEIGHT = 30
+
+# Colores
+BG = '#2b2b2b'
+LIST_BG = '#1e1e1e'
+ROW_BG = '#3c3c3c'
+ROW_CURRENT_BG = '#4a4a00'
+
+# Estados de una llave: (texto, color)
+STATUS_CURRENT = ('🎯 ACTUAL', '#ffb900')
+STATUS_USED = ('✅ Usada', '#888888')
+STATUS_AVAILABLE = ('🔑 Disponible', '#107c10')
+
+
+def key_status(i: int, key_index: int) -> tuple:
+    if i == key_index:
+        return STATUS_CURRENT
+    if i < key_index:
+        return STATUS_USED
+    return STATUS_AVAILABLE
+
+
+class KeyMonitorWindow:
+    """Monitor de llaves incremental y virtualizado para un SessionRegistry."""
+
+    def __init__(self, root, registry):
+        self.registry = registry
+        self.events = registry.events
+        self.session_id = None
+        self.fingerprints = ()
+        self.key_index = 0
+        self.next_psn = 0
+        self.top = 0             # primera fila visible
+        self._rows = []          # filas del pool: (rect, nombre, huella, estado)
+        self._drawn = []         # lo dibujado en cada fila del pool (para no repetir)
+        self._labels = {}        # session_id -> etiqueta del combobox
+
+        self.window = tk.Toplevel(root)
+        self.window.title("🔑 Monitor de Llaves - Servidor")
+        self.window.geometry("700x600")
+        self.window.configure(bg=BG)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self._build()
+        self.events.watch()
+        self._load_sessions()
+        self._poll()
+
+    # ---------------------------- Construcción ----------------------------
+
+    def _build(self):
+        header_frame = tk.Frame(self.window, bg=BG)
+        header_frame.pack(fill='x', padx=10, pady=10)
+        tk.Label(header_frame, text="🔑 Monitor de Llaves - Servidor",
+                 font=('Arial', 16, 'bold'), fg='white', bg=BG).pack(side='left')
+
+        client_frame = tk.Frame(self.window, bg=BG)
+        client_frame.pack(fill='x', padx=10, pady=(0, 10))
+        tk.Label(client_frame, text="Cliente:", font=('Arial', 12, 'bold'),
+                 fg='white', bg=BG).pack(side='left')
+        self.client_var = tk.StringVar()
+        self.client_combo = ttk.Combobox(client_frame, textvariable=self.client_var,
+                                         state='readonly', width=24)
+        self.client_combo.pack(side='left', padx=(10, 0))
+        self.client_combo.bind('<<ComboboxSelected>>', self._on_client_selected)
+
+        sync_frame = tk.Frame(self.window, bg=BG)
+        sync_frame.pack(fill='x', padx=10, pady=(0, 10))
+        self.current_key_label = tk.Label(sync_frame, text="Llave Actual: K0",
+                                          font=('Arial', 12, 'bold'), fg='#ffb900', bg=BG)
+        self.current_key_label.pack(side='left')
+        self.psn_label = tk.Label(sync_frame, text="PSN Actual: 0",
+                                  font=('Arial', 12, 'bold'), fg='#0078d4', bg=BG)
+        self.psn_label.pack(side='right')
+
+        main_frame = tk.Frame(self.window, bg=BG)
+        main_frame.pack(expand=True, fill='both', padx=10, pady=(0, 10))
+        self.canvas = tk.Canvas(main_frame, bg=LIST_BG, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self._on_scroll)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.bind("<Configure>", self._on_resize)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self._scroll_to(self.top - 3))
+        self.canvas.bind("<Button-5>", lambda e: self._scroll_to(self.top + 3))
+
+    def _ensure_rows(self):
+        """Crea las filas del pool que faltan para llenar el alto visible."""
+        needed = max(1, self.canvas.winfo_height() // ROW_HEIGHT + 1)
+        width = max(self.canvas.winfo_width(), 200)
+        while len(self._rows) < needed:
+            y = len(self._rows) * ROW_HEIGHT
+            rect = self.canvas.create_rectangle(4, y + 2, width - 4, y + ROW_HEIGHT - 2,
+                                                fill=ROW_BG, outline='#555555')
+            name = self.canvas.create_text(20, y + ROW_HEIGHT // 2, anchor='w', fill='white',
+                                           font=('Consolas', 11, 'bold'))
+            fingerprint = self.canvas.create_text(100, y + ROW_HEIGHT // 2, anchor='w', fill='#cccccc',
+                                                  font=('Consolas', 10))
+            status = self.canvas.create_text(width - 20, y + ROW_HEIGHT // 2, anchor='e',
+                                             font=('Arial', 10, 'bold'))
+            self._rows.append((rect, name, fingerprint, status))
+            self._drawn.append(None)
+        for slot, (rect, _, _, status) in enumerate(self._rows):
+            y = slot * ROW_HEIGHT
+            self.canvas.coords(rect, 4, y + 2, width - 4, y + ROW_HEIGHT - 2)
+            self.canvas.coords(status, width - 20, y + ROW_HEIGHT // 2)
+
+    # ---------------------------- Dibujo ----------------------------
+
+    def _draw_row(self, slot: int):
+        """Dibuja en la fila `slot` del pool la llave top+slot (solo si cambió)."""
+        i = self.top + slot
+        if i < len(self.fingerprints):
+            state = (i, key_status(i, self.key_index))
+        else:
+            state = None
+        if self._drawn[slot] == state:
+            return
+        self._drawn[slot] = state
+        rect, name, fingerprint, status = self._rows[slot]
+        if state is None:
+            for item in self._rows[slot]:
+                self.canvas.itemconfigure(item, state='hidden')
+            return
+        text, color = state[1]
+        self.canvas.itemconfigure(rect, state='normal',
+                                  fill=ROW_CURRENT_BG if i == self.key_index else ROW_BG)
+        self.canvas.itemconfigure(name, state='normal', text=f"K{i:02d}")
+        self.canvas.itemconfigure(fingerprint, state='normal', text=f"Hash: {self.fingerprints[i]}")
+        self.canvas.itemconfigure(status, state='normal', text=text, fill=color)
+
+    def _draw_visible(self):
+        for slot in range(len(self._rows)):
+            self._draw_row(slot)
+        self._update_scrollbar()
+
+    def _draw_index(self, i: int):
+        slot = i - self.top
+        if 0 <= slot < len(self._rows):
+            self._draw_row(slot)
+
+    def _update_scrollbar(self):
+        n = len(self.fingerprints)
+        if n == 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        self.scrollbar.set(self.top / n, min(1.0, (self.top + len(self._rows)) / n))
+
+    def _set_position(self, key_index: int, next_psn: int):
+        """Aplica un avance de llave/PSN redibujando solo las filas afectadas."""
+        old_index = self.key_index
+        self.key_index = key_index
+        self.next_psn = next_psn
+        self.current_key_label.config(text=f"Llave Actual: K{key_index}")
+        self.psn_label.config(text=f"PSN Actual: {next_psn}")
+        if key_index < old_index:
+            # Cerró un ciclo: todas las filas visibles pasan a "Disponible"
+            self._draw_visible()
+        else:
+            for i in range(old_index, key_index + 1):
+                self._draw_index(i)
+
+    # ---------------------------- Scroll ----------------------------
+
+    def _scroll_to(self, top: int):
+        visible = len(self._rows)
+        top = max(0, min(top, max(0, len(self.fingerprints) - visible + 1)))
+        if top != self.top:
+            self.top = top
+            self._draw_visible()
+
+    def _on_scroll(self, *args):
+        if args[0] == 'moveto':
+            self._scroll_to(int(float(args[1]) * len(self.fingerprints)))
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (len(self._rows) if args[2] == 'pages' else 1)
+            self._scroll_to(self.top + step)
+
+    def _on_wheel(self, event):
+        self._scroll_to(self.top - (1 if event.delta > 0 else -1) * 3)
+
+    def _on_resize(self, event):
+        self._ensure_rows()
+        self._drawn = [None] * len(self._rows)
+        self._draw_visible()
+
+    # ---------------------------- Sesiones ----------------------------
+
+    def _load_sessions(self):
+        """Lectura completa del registro (al abrir o si se perdieron eventos)."""
+        sessions = self.registry.sessions()
+        self._labels = {session.session_id: session.label() for session in sessions}
+        self._refresh_combo()
+        if self.session_id not in self._labels:
+            self.session_id = sessions[0].session_id if sessions else None
+        self._select(self.session_id)
+
+    def _refresh_combo(self):
+        self.client_combo['values'] = [self._labels[sid] for sid in sorted(self._labels)]
+
+    def _select(self, session_id):
+        self.session_id = session_id
+        session = self.registry.get(session_id) if session_id is not None else None
+        if session is None:
+            return
+        state = session.snapshot()
+        self.client_var.set(self._labels.get(session_id, session.label()))
+        self.fingerprints = state['key_fingerprints']
+        self.top = 0
+        self.key_index = state['key_index']
+        self._set_position(state['key_index'], state['next_psn'])
+        self._ensure_rows()
+        self._drawn = [None] * len(self._rows)
+        self._draw_visible()
+
+    def _on_client_selected(self, event):
+        selected_text = self.client_var.get()
+        if selected_text:
+            # Formato de la etiqueta: '#<session_id> ip:puerto'
+            self._select(int(selected_text.split()[0][1:]))
+
+    def _poll(self):
+        """Vacía el feed y aplica solo los cambios."""
+        if not self.window.winfo_exists():
+            return
+        events, overflowed = self.events.drain()
+        if overflowed:
+            self._load_sessions()
+        else:
+            combo_changed = False
+            position = None
+            for kind, session_id, key_index, next_psn in events:
+                if kind == EVENT_ADVANCED:
+                    if session_id == self.session_id:
+                        position = (key_index, next_psn)
+                elif kind == EVENT_OPENED:
+                    session = self.registry.get(session_id)
+                    if session is not None:
+                        self._labels[session_id] = session.label()
+                        combo_changed = True
+                elif kind == EVENT_CLOSED:
+                    combo_changed |= self._labels.pop(session_id, None) is not None
+            if combo_changed:
+                self._refresh_combo()
+                if self.session_id is None and self._labels:
+                    self._select(min(self._labels))
+            # Solo importa el último avance de la sesión mostrada
+            if position is not None and position != (self.key_index, self.next_psn):
+                self._set_position(*position)
+        self.window.after(POLL_INTERVAL_MS, self._poll)
+
+    # ---------------------------- Ventana ----------------------------
+
+    def exists(self) -> bool:
+        try:
+            return bool(self.window.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def lift(self):
+        self.window.lift()
+
+    def close(self):
+        self.events.unwatch()
+        if self.exists():
+            self.window.destroy()
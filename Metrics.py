@@ -0,0 +1,341 @@
+"""
+Metrics.py
+----------
+Registro de métricas en proceso: contadores, histogramas de latencia y
+valores calculados al momento de leer (colectores).
+
+El archivo se encarga únicamente de:
+ - Counter / Histogram: baratos para dejarlos activos en el camino crítico
+   (un lock, un bisect y dos sumas por observación).
+ - MetricsRegistry: crea las métricas por nombre y produce una instantánea
+   (snapshot) como diccionario de Python.
+ - render_prometheus(): instantánea -> formato de texto de Prometheus.
+ - merge_snapshots(): suma instantáneas de varios procesos (supervisor).
+ - MetricsServer: endpoint HTTP local (/metrics) en un hilo propio; también
+   enciende y apaga el perfilador de Profiling.py (/profile/start, /profile/stop).
+
+REGISTRY es el registro por defecto del proceso.
+"""
+
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from Profiling import DEFAULT_REPORT_LIMIT, DEFAULT_SAMPLE_INTERVAL, PROFILE_HOOKS, PROFILER
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Límites superiores (segundos) de los buckets de latencia: 5 µs .. 1 s
+DEFAULT_BUCKETS = (
+    5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+)
+
+# Puerto por defecto del endpoint HTTP
+DEFAULT_METRICS_PORT = 9464
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ============================================================
+# Métricas
+# ============================================================
+
+class Counter:
+    """Contador monótono."""
+
+    __slots__ = ("name", "help", "value", "_lock")
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Histograma de buckets fijos (acumulables entre procesos)."""
+
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager que observa la duración del bloque."""
+        return _Timer(self)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "help": self.help,
+                "buckets": list(self.buckets),
+                "counts": list(self.counts),
+                "sum": self.sum,
+                "count": self.count,
+            }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def quantile(histogram_snapshot: dict, q: float) -> float:
+    """
+    Estima el cuantil q (0..1) de un histograma, interpolando dentro del
+    bucket. Retorna 0.0 si no hay observaciones.
+    """
+    total = histogram_snapshot["count"]
+    if total == 0:
+        return 0.0
+    target = q * total
+    buckets = histogram_snapshot["buckets"]
+    seen = 0
+    for i, n in enumerate(histogram_snapshot["counts"]):
+        if seen + n >= target and n:
+            if i == len(buckets):
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (target - seen) / n
+        seen += n
+    return buckets[-1]
+
+
+# ============================================================
+# Registro
+# ============================================================
+
+class MetricsRegistry:
+    """
+    Métricas por nombre. counter() e histogram() retornan la existente si
+    ya se creó, así varios módulos pueden pedir la misma métrica.
+
+    Los colectores son funciones que se llaman al leer y retornan un número
+    o una lista de (etiquetas: dict, valor) para métricas con etiquetas.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        with self._lock:
+            metric = self._counters.get(name)
+            if metric is None:
+                metric = self._counters[name] = Counter(name, help)
+            return metric
+
+    def histogram(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            metric = self._histograms.get(name)
+            if metric is None:
+                metric = self._histograms[name] = Histogram(name, help, buckets)
+            return metric
+
+    def register_collector(self, name: str, help: str, fn, kind: str = "gauge"):
+        """Registra (o reemplaza) una métrica calculada al leer."""
+        if kind not in ("gauge", "counter"):
+            raise ValueError(f"Tipo de colector desconocido: {kind}")
+        with self._lock:
+            self._collectors[name] = (help, fn, kind)
+
+    def unregister_collector(self, name: str):
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def snapshot(self) -> dict:
+        """Instantánea de todas las métricas como diccionario."""
+        with self._lock:
+            counters = list(self._counters.values())
+            histograms = list(self._histograms.values())
+            collectors = list(self._collectors.items())
+
+        result = {"counters": {}, "gauges": {}, "histograms": {}}
+        for metric in counters:
+            result["counters"][metric.name] = {"help": metric.help, "samples": [({}, metric.value)]}
+        for name, (help, fn, kind) in collectors:
+            value = fn()
+            samples = value if isinstance(value, list) else [({}, value)]
+            section = "counters" if kind == "counter" else "gauges"
+            result[section][name] = {"help": help, "samples": samples}
+        for metric in histograms:
+            result["histograms"][metric.name] = metric.snapshot()
+        return result
+
+
+# Registro por defecto del proceso
+REGISTRY = MetricsRegistry()
+
+
+# ============================================================
+# Instantáneas: combinar y exportar
+# ============================================================
+
+def merge_snapshots(snapshots: list) -> dict:
+    """Suma contadores, gauges e histogramas de varias instantáneas."""
+    result = {"counters": {}, "gauges": {}, "histograms": {}}
+    for snap in snapshots:
+        for section in ("counters", "gauges"):
+            for name, metric in snap.get(section, {}).items():
+                merged = result[section].setdefault(name, {"help": metric["help"], "samples": []})
+                for labels, value in metric["samples"]:
+                    for i, (other_labels, other_value) in enumerate(merged["samples"]):
+                        if other_labels == labels:
+                            merged["samples"][i] = (labels, other_value + value)
+                            break
+                    else:
+                        merged["samples"].append((dict(labels), value))
+        for name, hist in snap.get("histograms", {}).items():
+            merged = result["histograms"].get(name)
+            if merged is None:
+                result["histograms"][name] = {**hist, "counts": list(hist["counts"])}
+                continue
+            merged["counts"] = [a + b for a, b in zip(merged["counts"], hist["counts"])]
+            merged["sum"] += hist["sum"]
+            merged["count"] += hist["count"]
+    return result
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Instantánea -> formato de texto de exposición de Prometheus."""
+    lines = []
+    for section, kind in (("counters", "counter"), ("gauges", "gauge")):
+        for name, metric in sorted(snapshot.get(section, {}).items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in metric["samples"]:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    for name, hist in sorted(snapshot.get("histograms", {}).items()):
+        lines.append(f"# HELP {name} {hist['help']}")
+        lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(hist["buckets"], hist["counts"]):
+            cumulative += n
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {hist["count"]}')
+        lines.append(f"{name}_sum {hist['sum']}")
+        lines.append(f"{name}_count {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# Endpoint HTTP
+# ============================================================
+
+class MetricsServer:
+    """
+    Sirve GET /metrics (formato Prometheus) y GET /metrics.json en un hilo.
+
+    snapshot_source es una función sin argumentos que retorna la instantánea
+    (por defecto REGISTRY.snapshot; el supervisor pasa la agregada).
+
+    Con un perfilador (Profiling.Profiler, por defecto el del proceso) sirve
+    además GET /profile/start?mode=hooks|sampling|tracemalloc[&interval=s] y
+    GET /profile/stop[?limit=n], que responde el reporte en JSON.
+    """
+
+    def __init__(self, snapshot_source=None, host: str = "127.0.0.1", port: int = DEFAULT_METRICS_PORT,
+                 profiler=PROFILER):
+        source = snapshot_source or REGISTRY.snapshot
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                if profiler is not None and path in ("/profile/start", "/profile/stop"):
+                    self._profile(path, parse_qs(query))
+                    return
+                if path == "/metrics":
+                    body = render_prometheus(source()).encode()
+                    content_type = PROMETHEUS_CONTENT_TYPE
+                elif path == "/metrics.json":
+                    body = json.dumps(source()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _profile(self, path, params):
+                try:
+                    if path == "/profile/start":
+                        mode = params.get("mode", [PROFILE_HOOKS])[0]
+                        interval = float(params.get("interval", [DEFAULT_SAMPLE_INTERVAL])[0])
+                        profiler.start(mode, interval)
+                        report = {"mode": mode, "running": True}
+                    else:
+                        report = profiler.stop(int(params.get("limit", [DEFAULT_REPORT_LIMIT])[0]))
+                except (RuntimeError, ValueError) as e:
+                    self.send_error(409, str(e))
+                    return
+                body = json.dumps(report).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.address = self._httpd.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True,
+                                        name="metrics-http")
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
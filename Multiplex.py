@@ -0,0 +1,403 @@
+"""
+Multiplex.py
+------------
+Varias sesiones lógicas (corrientes) sobre una sola conexión TCP.
+
+Un gateway que agrupa cientos de sensores necesitaba una conexión, un hilo
+del servidor y un handshake por sensor. Con la conexión multiplexada cada
+trama lleva el número de corriente y cada corriente es una sesión completa
+e independiente: sus propios SharedParams, tablas de llaves y PSN en ambos
+extremos, su FCM (o [RESUME], o 0.5-RTT) y su LCM.
+
+Formato:
+    primera trama del cliente:   [MUX]        (el servidor responde [MUX_OK])
+    después, cada trama:         corriente (4 bytes, big endian) || trama interna
+
+La trama interna es exactamente la del protocolo sin multiplexar. Una
+corriente nueva se abre con su primera trama (parámetros FCM o [RESUME]) y
+termina con el LCM; una trama interna vacía marca el fin de la corriente
+(el servidor la envía después del ticket final y el cliente la envía para
+abandonar una corriente sin LCM). El número se puede reutilizar después.
+
+Las corrientes van de 1 a MAX_STREAM_ID, así que el primer byte de una
+trama de corriente siempre es 0x00. Las tramas que empiezan con otro byte
+son de la conexión entera (broadcasts de FanOut.py) y el cliente las
+entrega a todas sus corrientes.
+
+Lado servidor: ServerEngine.open_session() responde a [MUX] con un
+Multiplexer, que ocupa el lugar de la sesión en la conexión del backend y
+reparte las tramas en sesiones por corriente. Cada corriente pasa por el
+control de admisión del backend (Admission.py) como una conexión más: ocupa
+un lugar de sesión mientras está abierta y su FCM toma un turno de
+handshake; si no hay lugar se rechaza la corriente con [REJECTED] y la
+conexión sigue. La expulsión (Reaper.py) trata la conexión multiplexada
+como una sola.
+
+Lado cliente: MuxClient abre la conexión y crea corrientes (MuxStream), que
+tienen la misma API que DeviceClient.DeviceClient. Todo desde un solo hilo:
+leer para una corriente deja en su buzón lo que llega para las demás.
+"""
+
+import collections
+import itertools
+import socket
+import struct
+import threading
+import time
+
+from Admission import rejection_frame
+from ClientProtocol import ClientProtocol
+from DeviceClient import DEFAULT_CLOSE_TIMEOUT, DEFAULT_CONNECT_TIMEOUT, READ_SIZE, DeviceClient, _remaining
+from Framing import FrameDecoder, encode_frame
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+MUX_PREFIX = b"[MUX]"
+MUX_ACCEPTED = b"[MUX_OK]"
+
+# Corrientes válidas: 1..MAX_STREAM_ID (primer byte 0x00)
+MAX_STREAM_ID = 0xFFFFFF
+
+# Corrientes abiertas a la vez por conexión en el servidor
+DEFAULT_MAX_STREAMS = 4096
+
+_STREAM = struct.Struct(">I")
+
+
+class MuxError(ValueError):
+    """Trama que no pertenece a ninguna corriente válida."""
+
+
+# ============================================================
+# Tramas
+# ============================================================
+
+def encode_stream_frame(stream_id: int, frame: bytes) -> bytes:
+    return _STREAM.pack(stream_id) + frame
+
+
+def parse_stream_frame(frame: bytes) -> tuple:
+    """(corriente, trama interna); corriente None para las tramas de la conexión entera."""
+    if len(frame) < _STREAM.size or frame[0] != 0:
+        return None, frame
+    (stream_id,) = _STREAM.unpack_from(frame)
+    if stream_id == 0:
+        raise MuxError("Corriente 0 inválida")
+    return stream_id, frame[_STREAM.size:]
+
+
+# ============================================================
+# Lado servidor
+# ============================================================
+
+class Multiplexer:
+    """
+    Sesiones por corriente de una conexión multiplexada.
+
+    Para el backend es la sesión de la conexión: ServerEngine.handle_message()
+    le pasa las tramas y close_session() cierra todas sus corrientes.
+    """
+
+    def __init__(self, engine, address, max_streams: int = DEFAULT_MAX_STREAMS, admission=None):
+        self.engine = engine
+        self.address = address
+        self.max_streams = max_streams
+        self.admission = admission  # Admission.AdmissionController o None (sin límites)
+        # corriente -> Session, o None si espera el FCM tras un [RESUME] rechazado
+        self.streams = {}
+        self._admitted = set()  # corrientes con un lugar de sesión reservado
+        self.created_at = self.last_activity = time.monotonic()
+        self._lock = threading.Lock()
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            sessions = [s for s in self.streams.values() if s is not None]
+        return sum(session.resident_bytes() for session in sessions)
+
+    def _stream_address(self, stream_id: int):
+        return (self.address[0], f"{self.address[1]}/{stream_id}")
+
+    def handle(self, frame: bytes):
+        """
+        Procesa una trama de la conexión.
+
+        Retorna:
+            tuple: (tramas a enviar, cerrar_conexión: bool)
+        """
+        try:
+            stream_id, inner = parse_stream_frame(frame)
+            if stream_id is None:
+                raise MuxError("Trama sin corriente en una conexión multiplexada")
+        except MuxError as e:
+            self.engine.count(errors=1)
+            self.engine.log("Error", f"Error con cliente {self.address[0]}: {str(e)}", "#d13438")
+            return [], True
+        self.last_activity = time.monotonic()
+
+        session = self.streams.get(stream_id)
+        if not inner:
+            # El cliente abandona la corriente sin LCM
+            self._end(stream_id)
+            return [], False
+        if session is None:
+            replies = self._open_stream(stream_id, inner)
+        else:
+            replies, close = self.engine.handle_message(session, inner)
+            if close:
+                self._end(stream_id)
+                replies.append(b"")
+        return [encode_stream_frame(stream_id, reply) for reply in replies], False
+
+    def _open_stream(self, stream_id: int, inner: bytes) -> list:
+        if stream_id not in self.streams and len(self.streams) >= self.max_streams:
+            return [rejection_frame("Máximo de corrientes alcanzado"), b""]
+        if inner.startswith(MUX_PREFIX):
+            return [rejection_frame("Corriente multiplexada anidada"), b""]
+        if not self._admit(stream_id):
+            return self._reject(stream_id, "máximo de sesiones alcanzado")
+        # Limitar las derivaciones de llaves concurrentes (la reanudación no deriva)
+        derive = self.admission is not None and self.engine.needs_key_derivation(inner)
+        if derive and not self.admission.acquire_handshake():
+            self._end(stream_id)
+            return self._reject(stream_id, "demasiados handshakes simultáneos")
+        try:
+            session, replies = self.engine.open_session(self._stream_address(stream_id), inner)
+        except Exception as e:
+            self.engine.count(errors=1)
+            self.engine.log("Error", f"Error con cliente {self.address[0]} (corriente {stream_id}): {str(e)}",
+                            "#d13438")
+            self._end(stream_id)
+            return [rejection_frame("Parámetros inválidos"), b""]
+        finally:
+            if derive:
+                self.admission.release_handshake()
+        with self._lock:
+            self.streams[stream_id] = session
+        return replies
+
+    def _admit(self, stream_id: int) -> bool:
+        """
+        Reserva un lugar de sesión para la corriente (sin esperar: una
+        corriente sin lugar no debe detener a las demás de la conexión).
+        """
+        if stream_id in self._admitted:
+            return True  # [RESUME] rechazado: el FCM usa el lugar ya reservado
+        if self.admission is not None and not self.admission.try_admit():
+            return False
+        with self._lock:
+            self._admitted.add(stream_id)
+        return True
+
+    def _reject(self, stream_id: int, reason: str) -> list:
+        self.engine.log("Admisión", f"Corriente {stream_id} de {self.address[0]}:{self.address[1]} "
+                                    f"rechazada: {reason}", "#ff8c00")
+        return [rejection_frame("Servidor saturado, reintente más tarde"), b""]
+
+    def _end(self, stream_id: int):
+        with self._lock:
+            session = self.streams.pop(stream_id, None)
+            admitted = stream_id in self._admitted
+            self._admitted.discard(stream_id)
+        self.engine.close_session(session)
+        self._release(1 if admitted else 0)
+
+    def _release(self, count: int):
+        if self.admission is not None:
+            for _ in range(count):
+                self.admission.release_session()
+
+    def close(self):
+        """Cierra todas las corrientes (conexión cerrada o expulsada)."""
+        with self._lock:
+            sessions, self.streams = list(self.streams.values()), {}
+            admitted, self._admitted = len(self._admitted), set()
+        for session in sessions:
+            self.engine.close_session(session)
+        self._release(admitted)
+
+
+# ============================================================
+# Lado cliente
+# ============================================================
+
+class MuxStream(DeviceClient):
+    """Una corriente de un MuxClient, con la API de DeviceClient."""
+
+    def __init__(self, mux, stream_id: int, protocol: ClientProtocol, window: int = 1):
+        super().__init__(*mux.address, protocol=protocol, window=window)
+        self.mux = mux
+        self.stream_id = stream_id
+        self.inbox = collections.deque()
+        self._attached = False
+
+    @property
+    def connected(self) -> bool:
+        return self._attached
+
+    def _open(self, timeout):
+        if not self.mux.connected:
+            self.mux.connect(timeout)
+        self.mux.streams[self.stream_id] = self
+        self._attached = True
+
+    def _send_frames(self, frames, timeout):
+        self.mux.send_frames([encode_stream_frame(self.stream_id, frame) for frame in frames], timeout)
+
+    def _read_frame(self, deadline):
+        while not self.inbox:
+            self.mux.pump(deadline)
+        frame = self.inbox.popleft()
+        if not frame:
+            self._detach()
+            raise ConnectionError("Corriente cerrada por el servidor")
+        return frame
+
+    def _detach(self):
+        self._attached = False
+        if self.mux.streams.get(self.stream_id) is self:
+            del self.mux.streams[self.stream_id]
+
+    def _abort(self):
+        if self._attached:
+            self._detach()
+            # Avisar al servidor para que libere la sesión de la corriente (mejor esfuerzo)
+            try:
+                self.mux.send_frames([encode_stream_frame(self.stream_id, b"")], DEFAULT_CLOSE_TIMEOUT)
+            except OSError:
+                pass
+        self.inbox.clear()
+        self._messages.clear()
+        self.protocol.reset()
+
+
+class MuxClient:
+    """
+    Conexión multiplexada del lado cliente (socket bloqueante, un solo hilo
+    para todas las corrientes).
+    """
+
+    def __init__(self, host: str, port: int, compression: bool = True, rng=None):
+        self.address = (host, port)
+        self.compression = compression
+        self.rng = rng
+        self.sock = None
+        self.streams = {}  # corriente -> MuxStream conectada
+        self._decoder = FrameDecoder()
+        self._ids = itertools.count(1)
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def __enter__(self):
+        if self.sock is None:
+            self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connect(self, timeout: float = DEFAULT_CONNECT_TIMEOUT):
+        """Abre la conexión y espera [MUX_OK]. Lanza ConnectionError si el servidor la rechaza."""
+        if self.sock is not None:
+            raise RuntimeError("Ya está conectado")
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self.sock = socket.create_connection(self.address, timeout=timeout)
+        try:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.sendall(encode_frame(MUX_PREFIX))
+            frames = []
+            while not frames:
+                self.sock.settimeout(_remaining(deadline))
+                data = self.sock.recv(READ_SIZE)
+                if not data:
+                    raise ConnectionError("Conexión cerrada por el servidor")
+                frames = self._decoder.feed(data)
+            if frames[0] != MUX_ACCEPTED:
+                raise ConnectionError(frames[0].decode(errors="replace"))
+        except BaseException:
+            self._lost()
+            raise
+
+    def stream(self, protocol: ClientProtocol = None, window: int = 1) -> MuxStream:
+        """Corriente nueva (sin conectar). Cada una tiene su propio ClientProtocol (window como en DeviceClient)."""
+        stream_id = next(self._ids)
+        if stream_id > MAX_STREAM_ID:
+            raise RuntimeError("Se agotaron los números de corriente")
+        if protocol is None:
+            rng = self.rng.fork(f"corriente-{stream_id}") if self.rng is not None else None
+            protocol = ClientProtocol(compression=self.compression, rng=rng)
+        return MuxStream(self, stream_id, protocol, window)
+
+    # ---------------------------- E/S compartida ----------------------------
+
+    def send_frames(self, frames, timeout):
+        """Envía tramas ya marcadas con su corriente. Un error o plazo vencido cierra la conexión entera."""
+        if self.sock is None:
+            raise ConnectionError("No está conectado")
+        try:
+            self.sock.settimeout(timeout)
+            self.sock.sendall(b"".join(encode_frame(frame) for frame in frames))
+        except OSError:
+            self._lost()
+            raise
+
+    def pump(self, deadline):
+        """Una lectura del socket: reparte las tramas en los buzones de las corrientes."""
+        if self.sock is None:
+            raise ConnectionError("No está conectado")
+        try:
+            self.sock.settimeout(_remaining(deadline))
+            data = self.sock.recv(READ_SIZE)
+        except TimeoutError:
+            raise
+        except OSError:
+            data = b""
+        if not data:
+            self._lost()
+            return
+        for frame in self._decoder.feed(data):
+            stream_id, inner = parse_stream_frame(frame)
+            if stream_id is None:
+                for stream in self.streams.values():
+                    stream.inbox.append(frame)
+                continue
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream.inbox.append(inner)
+
+    def _lost(self):
+        """Conexión perdida: cada corriente recibe su fin y se cierra el socket."""
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            sock.close()
+        for stream in self.streams.values():
+            stream.inbox.append(b"")
+        self._decoder = FrameDecoder()
+
+    def close(self, timeout: float = DEFAULT_CLOSE_TIMEOUT):
+        """LCM de todas las corrientes en un solo envío, espera sus tickets y cierra la conexión."""
+        if self.sock is None:
+            return
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        streams = [stream for stream in self.streams.values() if stream.protocol.established]
+        try:
+            self.send_frames([encode_stream_frame(stream.stream_id, stream.protocol.farewell())
+                              for stream in streams], _remaining(deadline))
+            for stream in streams:
+                try:
+                    while True:
+                        stream.protocol.receive(stream._read_frame(deadline))
+                except (OSError, ValueError):
+                    pass
+        except OSError:
+            pass
+        finally:
+            for stream in streams + list(self.streams.values()):
+                stream._detach()
+                stream.inbox.clear()
+                stream._messages.clear()
+                stream.protocol.reset()
+            self._lost()
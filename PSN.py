@@ -1,7 +1,9 @@
 # PSN.py
-import os
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from ReversibleFunctions import apply_sequence, undo_sequence
+from Compression import FLAG_COMPRESSED, compress_payload, decompress_payload
+from Profiling import HOOKS
+from Randomness import get_randomness
 
 # Esquemas
 ESQUEMAS = {
@@ -23,10 +25,11 @@ ESQUEMAS = {
     0xF: {"func_ids": [8,5,1,3], "next_extraction": {"type":"byte_index","param":5}},
 }
 
-def pack_payload_with_psn(psn: int, processed_plaintext: bytes) -> bytes:
+def pack_payload_with_psn(psn: int, processed_plaintext: bytes, flags: int = 0) -> bytes:
+    # flags: bits altos del byte del PSN (p. ej. FLAG_COMPRESSED)
     if not (0 <= psn <= 0xF):
         raise ValueError("PSN debe estar entre 0 y 15 (4 bits)")
-    psn_byte = psn & 0x0F
+    psn_byte = (psn & 0x0F) | (flags & 0xF0)
     return bytes([psn_byte]) + processed_plaintext
 
 def unpack_psn_and_payload(payload: bytes):
@@ -36,22 +39,32 @@ def unpack_psn_and_payload(payload: bytes):
     data = payload[1:]
     return psn, data
 
-def encrypt_message(plaintext: bytes, psn: int, key: bytes) -> bytes:
+def payload_flags(payload: bytes) -> int:
+    return payload[0] & 0xF0 if payload else 0
+
+@HOOKS.hooked("encrypt_message")
+def encrypt_message(plaintext: bytes, psn: int, key: bytes, associated_data: bytes = None,
+                    compress_threshold: int = None, rng=None) -> bytes:
     # key: 8 bytes (64 bits) de KeyGenerator
+    # associated_data: datos autenticados pero no cifrados (p. ej. número de secuencia)
+    # compress_threshold: si se acordó compresión, tamaño mínimo para comprimir (Compression.py)
+    # rng: proveedor del nonce (Randomness.py); por defecto el del proceso
     # Convertir a 16 bytes para AES-128 (concatenar con sí mismo)
     aes_key = key + key  # 16 bytes para AES-128
     
     scheme = ESQUEMAS[psn]
     func_ids = scheme["func_ids"]
-    processed = apply_sequence(plaintext, func_ids)
-    payload = pack_payload_with_psn(psn, processed)
+    data, flags = compress_payload(plaintext, compress_threshold)
+    processed = apply_sequence(data, func_ids)
+    payload = pack_payload_with_psn(psn, processed, flags)
     aesgcm = AESGCM(aes_key)
-    nonce = os.urandom(12)  # 96-bit recommended for GCM
-    ciphertext = aesgcm.encrypt(nonce, payload, associated_data=None)
+    nonce = (rng if rng is not None else get_randomness()).bytes(12)  # 96-bit recommended for GCM
+    ciphertext = aesgcm.encrypt(nonce, payload, associated_data=associated_data)
     # mensaje final: nonce || ciphertext
     return nonce + ciphertext
 
-def decrypt_message(message: bytes, key: bytes):
+@HOOKS.hooked("decrypt_message")
+def decrypt_message(message: bytes, key: bytes, associated_data: bytes = None):
     # key: 8 bytes (64 bits) de KeyGenerator
     # Convertir a 16 bytes para AES-128 (concatenar con sí mismo)
     aes_key = key + key  # 16 bytes para AES-128
@@ -61,11 +74,13 @@ def decrypt_message(message: bytes, key: bytes):
     nonce = message[:12]
     ciphertext = message[12:]
     aesgcm = AESGCM(aes_key)
-    payload = aesgcm.decrypt(nonce, ciphertext, associated_data=None)
+    payload = aesgcm.decrypt(nonce, ciphertext, associated_data=associated_data)
     psn, processed = unpack_psn_and_payload(payload)
     scheme = ESQUEMAS[psn]
     func_ids = scheme["func_ids"]
     plaintext = undo_sequence(processed, func_ids)
+    if payload_flags(payload) & FLAG_COMPRESSED:
+        plaintext = decompress_payload(plaintext)
     return {
         "psn": psn,
         "plaintext": plaintext,
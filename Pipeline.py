@@ -0,0 +1,77 @@
+"""
+Pipeline.py
+-----------
+Modo segmentado (pipelined) de petición/respuesta con números de secuencia.
+
+El índice de llave y el PSN avanzan al mismo paso en ambos lados, así que el
+cliente tenía que recibir cada respuesta antes de volver a enviar: un ida y
+vuelta por mensaje limita el caudal a 1/RTT por dispositivo.
+
+Las peticiones van por el flujo de llaves cliente->servidor y las respuestas
+por el flujo servidor->cliente (KeyGenerator.generate_directional_key_tables),
+cada uno con su propio índice y PSN, así que el cliente puede enviar varios
+mensajes sin esperar las respuestas. En modo segmentado cada trama lleva un
+número de secuencia, autenticado como dato asociado (AAD) de AES-GCM junto
+con la dirección: una trama reordenada, repetida o reflejada no pasa.
+
+La secuencia no elige la llave: ambos flujos avanzan una llave por mensaje,
+en orden, como en el modo normal. El servidor solo exige que la secuencia
+sea la esperada (session.next_seq) y responde en el mismo orden; si no lo
+es, cierra la conexión.
+
+Formato de la trama:
+    [SEQ] || secuencia (4 bytes, big endian) || encrypt_message(..., aad)
+    aad = secuencia || dirección (0x00 cliente->servidor, 0x01 respuesta)
+
+La secuencia es por conexión y cuenta todos los mensajes cifrados que el
+cliente envió por ella, con o sin [SEQ] (el "First Message Contact" es la
+0). Una conexión reanudada con [RESUME] empieza de nuevo en 0: la posición
+de las llaves sí continúa, así que una trama de la conexión anterior no se
+puede repetir en la nueva.
+
+Lado cliente: ClientProtocol.seal_seq() cifra una petición y la deja en
+vuelo hasta que receive() procesa su respuesta; DeviceClient(window=W)
+mantiene hasta W peticiones en vuelo.
+"""
+
+import struct
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+SEQ_PREFIX = b"[SEQ]"
+
+# Dirección incluida en el dato asociado
+DIRECTION_REQUEST = b"\x00"
+DIRECTION_RESPONSE = b"\x01"
+
+# Mensajes en vuelo por defecto
+DEFAULT_WINDOW = 8
+
+_SEQ = struct.Struct(">I")
+_HEADER_SIZE = len(SEQ_PREFIX) + _SEQ.size
+
+
+class SequenceError(ValueError):
+    """Trama fuera de orden o con una secuencia que no estaba en vuelo."""
+
+
+# ============================================================
+# Tramas
+# ============================================================
+
+def seq_aad(seq: int, direction: bytes) -> bytes:
+    return _SEQ.pack(seq) + direction
+
+
+def encode_seq_frame(seq: int, ciphertext: bytes) -> bytes:
+    return SEQ_PREFIX + _SEQ.pack(seq) + ciphertext
+
+
+def parse_seq_frame(frame: bytes) -> tuple:
+    """Trama [SEQ] -> (secuencia, nonce || ciphertext)."""
+    if len(frame) < _HEADER_SIZE:
+        raise SequenceError("Trama [SEQ] demasiado corta")
+    (seq,) = _SEQ.unpack_from(frame, len(SEQ_PREFIX))
+    return seq, frame[_HEADER_SIZE:]
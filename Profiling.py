@@ -0,0 +1,320 @@
+"""
+Profiling.py
+------------
+Ganchos (hooks) de perfilado en los caminos críticos del protocolo y un
+perfilador que se enciende y apaga en tiempo de ejecución.
+
+Cuando sube la latencia hay que saber si la culpa es de la derivación de
+llaves, de la cadena de funciones reversibles o de AES. Las funciones
+críticas están decoradas con HOOKS.hooked(punto):
+
+    generate_key_table      KeyGenerator.py
+    apply_sequence          ReversibleFunctions.py
+    undo_sequence           ReversibleFunctions.py
+    encrypt_message         PSN.py
+    decrypt_message         PSN.py
+    fcm                     ServerEngine.open_session (parámetros o ticket)
+    rm                      ServerEngine._handle_session_message (cualquier trama de una sesión)
+    lcm                     ServerEngine: ticket final y cierre tras el LCM
+
+Cada punto acepta callbacks pre(punto, args, kwargs) -> estado y
+post(punto, estado, segundos, error). Sin callbacks registrados el decorador
+solo agrega una llamada y la lectura de una tupla vacía.
+
+PROFILER (Profiler) ofrece tres modos que se activan con start(modo) y cuyo
+reporte (diccionario) se obtiene con stop():
+ - "hooks": tiempo acumulado, máximo y llamadas por punto de gancho.
+ - "sampling": hilo que toma muestras de las pilas de todos los hilos cada
+   pocos milisegundos (cProfile solo vería el hilo que lo activa).
+ - "tracemalloc": instantánea de memoria por línea de código al detener.
+
+Apagado no cuesta nada más que los ganchos vacíos. MetricsServer lo expone en
+/profile/start?mode=... y /profile/stop.
+"""
+
+import functools
+import sys
+import threading
+import time
+import tracemalloc
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+HOOK_POINTS = (
+    "generate_key_table",
+    "apply_sequence",
+    "undo_sequence",
+    "encrypt_message",
+    "decrypt_message",
+    "fcm",
+    "rm",
+    "lcm",
+)
+
+# Modos del perfilador
+PROFILE_HOOKS = "hooks"
+PROFILE_SAMPLING = "sampling"
+PROFILE_MEMORY = "tracemalloc"
+PROFILE_MODES = (PROFILE_HOOKS, PROFILE_SAMPLING, PROFILE_MEMORY)
+
+# Intervalo entre muestras del modo "sampling" (segundos)
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Entradas en los reportes
+DEFAULT_REPORT_LIMIT = 20
+
+# Marcos guardados por asignación en el modo "tracemalloc"
+TRACEMALLOC_FRAMES = 1
+
+
+# ============================================================
+# Registro de ganchos
+# ============================================================
+
+class _HookPoint:
+    """Callbacks de un punto; se reemplaza la tupla entera para leerla sin lock."""
+
+    __slots__ = ("name", "callbacks")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.callbacks = ()
+
+
+class HookRegistry:
+    """Callbacks pre/post por punto de gancho."""
+
+    def __init__(self, points=HOOK_POINTS):
+        self._points = {name: _HookPoint(name) for name in points}
+        self._lock = threading.Lock()
+
+    def _point(self, name: str) -> _HookPoint:
+        try:
+            return self._points[name]
+        except KeyError:
+            raise ValueError(f"Punto de gancho desconocido: {name}")
+
+    def register(self, point: str, pre=None, post=None):
+        """
+        Registra callbacks en un punto. Retorna un identificador para unregister().
+
+        pre(punto, args, kwargs) se llama antes y su resultado llega a
+        post(punto, estado, segundos, error), que se llama siempre después
+        (error es la excepción o None).
+        """
+        if pre is None and post is None:
+            raise ValueError("Se necesita pre, post o ambos")
+        hook_point = self._point(point)
+        entry = (pre, post)
+        with self._lock:
+            hook_point.callbacks = hook_point.callbacks + (entry,)
+        return point, entry
+
+    def unregister(self, handle):
+        """Quita los callbacks registrados (idempotente)."""
+        point, entry = handle
+        hook_point = self._point(point)
+        with self._lock:
+            hook_point.callbacks = tuple(e for e in hook_point.callbacks if e is not entry)
+
+    @property
+    def points(self) -> tuple:
+        return tuple(self._points)
+
+    def clear(self):
+        with self._lock:
+            for hook_point in self._points.values():
+                hook_point.callbacks = ()
+
+    def active(self, point: str) -> bool:
+        return bool(self._point(point).callbacks)
+
+    def hooked(self, point: str):
+        """Decorador: ejecuta los callbacks del punto alrededor de la función."""
+        hook_point = self._point(point)
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                callbacks = hook_point.callbacks
+                if not callbacks:
+                    return func(*args, **kwargs)
+                return _call_hooked(point, callbacks, func, args, kwargs)
+            return wrapper
+        return decorator
+
+
+def _call_hooked(point, callbacks, func, args, kwargs):
+    states = [pre(point, args, kwargs) if pre is not None else None for pre, _ in callbacks]
+    error = None
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        for (_, post), state in zip(callbacks, states):
+            if post is not None:
+                post(point, state, elapsed, error)
+
+
+# Registro del proceso (lo usan los decoradores de los módulos del protocolo)
+HOOKS = HookRegistry()
+
+
+# ============================================================
+# Perfilador
+# ============================================================
+
+class _PointTimes:
+    """Modo "hooks": llamadas, tiempo total y máximo por punto."""
+
+    def __init__(self, registry: HookRegistry):
+        self.registry = registry
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._handles = [registry.register(point, post=self._post) for point in registry.points]
+
+    def _post(self, point, state, elapsed, error):
+        with self._lock:
+            stats = self.stats.get(point)
+            if stats is None:
+                stats = self.stats[point] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+            if error is not None:
+                stats[3] += 1
+
+    def stop(self, limit: int) -> dict:
+        for handle in self._handles:
+            self.registry.unregister(handle)
+        with self._lock:
+            points = {
+                point: {"calls": calls, "total_s": total, "mean_us": total / calls * 1e6,
+                        "max_us": maximum * 1e6, "errors": errors}
+                for point, (calls, total, maximum, errors) in self.stats.items()
+            }
+        return {"points": dict(sorted(points.items(), key=lambda item: -item[1]["total_s"]))}
+
+
+class _StackSampler:
+    """Modo "sampling": muestras periódicas de las pilas de todos los hilos."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.own = {}        # función en la cima de la pila -> muestras
+        self.inclusive = {}  # función en cualquier parte de la pila -> muestras
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profiler-sampler")
+        self._thread.start()
+
+    @staticmethod
+    def _label(code) -> str:
+        return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno}({code.co_name})"
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                self.samples += 1
+                top = self._label(frame.f_code)
+                self.own[top] = self.own.get(top, 0) + 1
+                seen = set()
+                while frame is not None:
+                    label = self._label(frame.f_code)
+                    if label not in seen:
+                        seen.add(label)
+                        self.inclusive[label] = self.inclusive.get(label, 0) + 1
+                    frame = frame.f_back
+
+    def stop(self, limit: int) -> dict:
+        self._stop.set()
+        self._thread.join()
+        total = max(self.samples, 1)
+
+        def top(counts):
+            ranked = sorted(counts.items(), key=lambda item: -item[1])[:limit]
+            return [{"function": label, "samples": n, "fraction": n / total} for label, n in ranked]
+
+        return {"samples": self.samples, "interval_s": self.interval,
+                "own": top(self.own), "inclusive": top(self.inclusive)}
+
+
+class _MemorySnapshot:
+    """Modo "tracemalloc": asignaciones por línea desde start() hasta stop()."""
+
+    def __init__(self):
+        self.started_here = not tracemalloc.is_tracing()
+        if self.started_here:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.baseline = tracemalloc.take_snapshot()
+
+    def stop(self, limit: int) -> dict:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.started_here:
+            tracemalloc.stop()
+        diff = snapshot.compare_to(self.baseline, "lineno")[:limit]
+        return {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [{"location": str(stat.traceback), "size_diff": stat.size_diff,
+                     "count_diff": stat.count_diff} for stat in diff],
+        }
+
+
+class Profiler:
+    """Un perfilador a la vez, encendido y apagado en tiempo de ejecución."""
+
+    def __init__(self, registry: HookRegistry = HOOKS):
+        self.registry = registry
+        self.mode = None
+        self.started_at = None
+        self._active = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._active is not None
+
+    def start(self, mode: str = PROFILE_HOOKS, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        """Activa el modo pedido. Lanza RuntimeError si ya hay uno activo."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de perfilado desconocido: {mode}")
+        with self._lock:
+            if self._active is not None:
+                raise RuntimeError(f"El perfilador ya está activo (modo {self.mode})")
+            if mode == PROFILE_HOOKS:
+                self._active = _PointTimes(self.registry)
+            elif mode == PROFILE_SAMPLING:
+                self._active = _StackSampler(interval)
+            else:
+                self._active = _MemorySnapshot()
+            self.mode = mode
+            self.started_at = time.monotonic()
+
+    def stop(self, limit: int = DEFAULT_REPORT_LIMIT) -> dict:
+        """Detiene el perfilador y retorna su reporte. Lanza RuntimeError si no hay uno activo."""
+        with self._lock:
+            if self._active is None:
+                raise RuntimeError("El perfilador no está activo")
+            report = self._active.stop(limit)
+            report["mode"] = self.mode
+            report["duration_s"] = time.monotonic() - self.started_at
+            self._active = None
+            self.mode = None
+            self.started_at = None
+        return report
+
+
+# Perfilador del proceso
+PROFILER = Profiler()
@@ -0,0 +1,112 @@
+"""
+Randomness.py
+-------------
+Proveedor de aleatoriedad inyectable.
+
+encrypt_message usaba os.urandom para el nonce y SeedAndPrimes mezclaba
+time.time_ns, el PID y la MAC en cada valor: dos corridas de un benchmark
+nunca procesaban los mismos bytes, y la varianza de los caminos que dependen
+de los datos (PSN extraído, compresión, primos) tapaba las regresiones.
+
+Todo lo aleatorio del protocolo sale ahora de un proveedor:
+ - SecureRandomness: os.urandom / secrets (producción, por defecto).
+ - SeededRandomness(semilla): flujo SHA-256 en modo contador a partir de la
+   semilla. Misma semilla y mismo orden de llamadas -> mismos bytes: sesiones
+   reproducibles bit a bit para benchmarks y pruebas diferenciales.
+   NUNCA en producción: los nonces y parámetros son predecibles.
+
+Uso:
+ - Proceso completo: set_randomness(SeededRandomness(42)).
+ - Por objeto: generate_prime(rng=...), encrypt_message(..., rng=...),
+   ClientProtocol(rng=...), ServerEngine(..., rng=...). Sin rng se usa el
+   proveedor del proceso en el momento de la llamada.
+ - Con varios hilos el orden de las llamadas a un proveedor compartido
+   cambia entre corridas: cada dispositivo o sesión debe usar su propio
+   flujo con rng.fork("etiqueta").
+ - Los tickets de reanudación (Resumption.py) siguen usando la hora y
+   os.urandom: caducan, así que no tiene sentido reproducirlos.
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+
+# ============================================================
+# Proveedores
+# ============================================================
+
+class SecureRandomness:
+    """Aleatoriedad del sistema operativo (criptográficamente segura)."""
+
+    deterministic = False
+
+    def bytes(self, n: int) -> bytes:
+        return os.urandom(n)
+
+    def below(self, n: int) -> int:
+        """Entero uniforme en [0, n)."""
+        return secrets.randbelow(n)
+
+    def fork(self, label: str):
+        # Todos los flujos seguros son independientes de por sí
+        return self
+
+
+class SeededRandomness:
+    """Flujo determinista: SHA-256(llave || contador) con llave derivada de la semilla."""
+
+    deterministic = True
+
+    def __init__(self, seed):
+        if isinstance(seed, int):
+            seed = seed.to_bytes((seed.bit_length() + 8) // 8, "big", signed=True)
+        elif isinstance(seed, str):
+            seed = seed.encode()
+        self.seed = bytes(seed)
+        self._key = hashlib.sha256(b"SeededRandomness|" + self.seed).digest()
+        self._counter = 0
+        self._buffer = b""
+        self._lock = threading.Lock()
+
+    def bytes(self, n: int) -> bytes:
+        with self._lock:
+            while len(self._buffer) < n:
+                self._buffer += hashlib.sha256(self._key + self._counter.to_bytes(8, "big")).digest()
+                self._counter += 1
+            out, self._buffer = self._buffer[:n], self._buffer[n:]
+        return out
+
+    def below(self, n: int) -> int:
+        """Entero uniforme en [0, n) (muestreo con rechazo)."""
+        if n <= 0:
+            raise ValueError("n debe ser > 0")
+        bits = n.bit_length()
+        size = (bits + 7) // 8
+        while True:
+            value = int.from_bytes(self.bytes(size), "big") >> (size * 8 - bits)
+            if value < n:
+                return value
+
+    def fork(self, label: str):
+        """Flujo independiente derivado de la semilla y la etiqueta (no consume de este)."""
+        return SeededRandomness(self.seed + b"|" + label.encode())
+
+
+# ============================================================
+# Proveedor del proceso
+# ============================================================
+
+_current = SecureRandomness()
+
+
+def get_randomness():
+    """Proveedor del proceso."""
+    return _current
+
+
+def set_randomness(provider):
+    """Reemplaza el proveedor del proceso y retorna el anterior."""
+    global _current
+    previous, _current = _current, provider
+    return previous
@@ -0,0 +1,153 @@
+"""
+Reaper.py
+---------
+Expulsión de sesiones inactivas y presupuesto de memoria por proceso.
+
+Las sesiones solo desaparecían con un LCM o un error de socket: una conexión
+IoT medio abierta conservaba su tabla de llaves (y su hilo) para siempre.
+SessionReaper revisa periódicamente las conexiones de un backend y:
+
+ - Expulsa las que llevan más de idle_timeout segundos sin actividad
+   (también las que nunca completaron el handshake).
+ - Si la memoria residente estimada supera memory_budget bytes, expulsa
+   primero a las de actividad más antigua (LRU) hasta volver al límite.
+
+Cada expulsión se registra en el log como un LCM sintético. La detección de
+pares muertos a nivel TCP la hace keepalive (ver ServerEngine.configure_keepalive).
+
+Reporta el número de sesiones vivas y los bytes residentes por sesión.
+"""
+
+import sys
+import threading
+import time
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Cada cuánto se revisan las conexiones (segundos)
+DEFAULT_REAP_INTERVAL = 5.0
+
+# Motivos de expulsión
+REASON_IDLE = "inactividad"
+REASON_HANDSHAKE = "handshake incompleto"
+REASON_MEMORY = "presupuesto de memoria"
+
+
+def connection_bytes(conn) -> int:
+    """Bytes residentes estimados de una conexión: sesión + buffers de salida."""
+    total = sys.getsizeof(conn)
+    if conn.session is not None:
+        total += conn.session.resident_bytes()
+    outbuf = getattr(conn, "outbuf", None)
+    if outbuf is not None:
+        total += len(outbuf)
+    total += conn.outbound.pending_bytes()
+    return total
+
+
+class SessionReaper:
+    """
+    Revisa las conexiones de un backend en un hilo propio.
+
+    El backend debe ofrecer connections() (conexiones con `session`,
+    `accepted_at` y `outbound`) y disconnect(conn) seguro entre hilos.
+    """
+
+    def __init__(self, backend, idle_timeout: float = None, memory_budget: int = None,
+                 interval: float = DEFAULT_REAP_INTERVAL):
+        self.backend = backend
+        self.engine = backend.engine
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.interval = interval
+        self.counters = {
+            "evicted_idle": 0,
+            "evicted_handshake": 0,
+            "evicted_memory": 0,
+        }
+        self._stop = threading.Event()
+        self._thread = None
+        self.engine.metrics.register_collector(
+            "crypto_resident_bytes", "Memoria residente estimada de las conexiones",
+            lambda: self.stats()["resident_bytes"])
+        self.engine.metrics.register_collector(
+            "crypto_resident_bytes_per_session", "Memoria residente estimada por sesión",
+            lambda: self.stats()["resident_bytes_per_session"])
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle_timeout is not None or self.memory_budget is not None
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="session-reaper")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reap()
+            except Exception as e:
+                self.engine.log("Error", f"Error revisando sesiones inactivas: {str(e)}", "#d13438")
+
+    # ---------------------------- Expulsión ----------------------------
+
+    def reap(self, now: float = None) -> int:
+        """Una pasada de revisión. Retorna cuántas conexiones se expulsaron."""
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        live = []
+        for conn in self.backend.connections():
+            if conn.outbound.closed:
+                continue  # ya se está cerrando (p. ej. expulsada en la pasada anterior)
+            session = conn.session
+            last_activity = session.last_activity if session is not None else conn.accepted_at
+            if self.idle_timeout is not None and now - last_activity > self.idle_timeout:
+                self._evict(conn, REASON_IDLE if session is not None else REASON_HANDSHAKE)
+                evicted += 1
+            else:
+                live.append((last_activity, conn))
+
+        if self.memory_budget is not None:
+            sizes = [(last_activity, connection_bytes(conn), conn) for last_activity, conn in live]
+            resident = sum(size for _, size, _ in sizes)
+            # Menos recientemente activas primero
+            sizes.sort(key=lambda item: item[0])
+            for _, size, conn in sizes:
+                if resident <= self.memory_budget:
+                    break
+                self._evict(conn, REASON_MEMORY)
+                resident -= size
+                evicted += 1
+        return evicted
+
+    def _evict(self, conn, reason: str):
+        if reason == REASON_IDLE:
+            self.counters["evicted_idle"] += 1
+        elif reason == REASON_HANDSHAKE:
+            self.counters["evicted_handshake"] += 1
+        else:
+            self.counters["evicted_memory"] += 1
+        self.engine.evict_session(conn.session, conn.address, reason)
+        conn.outbound.close()
+        self.backend.disconnect(conn)
+
+    # ---------------------------- Estadísticas ----------------------------
+
+    def stats(self) -> dict:
+        """Expulsiones, sesiones vivas y memoria residente estimada."""
+        connections = self.backend.connections()
+        resident = sum(connection_bytes(conn) for conn in connections)
+        live_sessions = sum(1 for conn in connections if conn.session is not None)
+        result = dict(self.counters)
+        result["live_sessions"] = live_sessions
+        result["resident_bytes"] = resident
+        result["resident_bytes_per_session"] = resident // live_sessions if live_sessions else 0
+        return result
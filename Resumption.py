@@ -0,0 +1,210 @@
+"""
+Resumption.py
+-------------
+Tickets de reanudación de sesión.
+
+Cada reconexión repetía el intercambio completo: "P,S" -> "Q,S_server",
+generate_key_table() y el ida y vuelta del "First Message Contact". Con un
+ticket, el cliente que vuelve presenta el estado guardado y sigue en el
+índice de llave y PSN donde quedó, sin derivar de nuevo: una reconexión
+masiva cuesta un ida y vuelta por cliente.
+
+El ticket lo emite el servidor tras el FCM y tras el LCM. Es opaco para el
+cliente: va cifrado con AES-GCM usando una llave de tickets que solo conoce
+el servidor (y que comparten los workers de ServerSupervisor.py), así que el
+servidor no guarda estado por ticket.
+
+Formato de las tramas:
+    [TICKET]        || posición || ticket
+    [RESUME]        || posición || ticket       (primera trama del cliente)
+    [RESUMED]                                   (reanudación aceptada)
+    [RESUME_FAILED] motivo                      (el cliente hace el FCM completo)
+
+    posición = índice (uint32) || PSN (1) del flujo cliente->servidor
+               || índice (uint32) || PSN (1) del flujo servidor->cliente
+               || ciclos de regeneración (uint32)
+
+Contenido del ticket (antes de cifrar):
+    emitido_en (double) || índice (uint32) || PSN || índice de envío (uint32)
+    || PSN de envío || opciones (bit 0: compresión) || ciclos de regeneración (uint32)
+    || tabla cliente->servidor || tabla servidor->cliente
+
+El ticket solo se emite tras el FCM y el LCM, pero la sesión sigue avanzando
+entre ambos. Para no volver a llaves ya usadas tras una caída, el cliente
+reanuda desde su propia posición (la que tenía al perder la conexión) y el
+ticket aporta las tablas y la posición mínima: el servidor rechaza una
+posición del flujo cliente->servidor anterior a la del ticket.
+"""
+
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from GroupChannel import pack_key_table, unpack_key_table
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+TICKET_PREFIX = b"[TICKET]"
+RESUME_PREFIX = b"[RESUME]"
+RESUMED_PREFIX = b"[RESUMED]"
+RESUME_FAILED_PREFIX = b"[RESUME_FAILED]"
+
+# Vigencia de un ticket (segundos)
+DEFAULT_TICKET_LIFETIME = 3600.0
+
+# Tamaño de la llave de tickets (AES-256-GCM)
+TICKET_KEY_SIZE = 32
+
+_NONCE_SIZE = 12
+_TICKET_HEADER = struct.Struct(">dIBIBBI")
+_POSITION = struct.Struct(">IBIBI")
+
+# Bits del byte de opciones del ticket
+_OPTION_COMPRESSION = 0x01
+
+
+class TicketError(ValueError):
+    """Ticket inválido, alterado, de otro servidor o vencido."""
+
+
+def generate_ticket_key() -> bytes:
+    """Llave aleatoria para cifrar tickets."""
+    return os.urandom(TICKET_KEY_SIZE)
+
+
+# ============================================================
+# Lado servidor
+# ============================================================
+
+@dataclass
+class TicketState:
+    """Estado de sesión contenido en un ticket (vista del servidor)."""
+    key_table: list
+    key_index: int
+    next_psn: int
+    send_table: list
+    send_index: int
+    send_psn: int
+    key_regeneration_count: int = 0
+    issued_at: float = 0.0
+    compression: bool = False
+
+
+class TicketIssuer:
+    """
+    Emite y abre tickets con la llave de tickets del servidor.
+
+    El ID de nodo del servidor va como dato asociado (AAD): un ticket de
+    otro servidor no se puede abrir aunque comparta la llave por error.
+    """
+
+    def __init__(self, node_id: int, ticket_key: bytes = None,
+                 lifetime: float = DEFAULT_TICKET_LIFETIME):
+        self.ticket_key = ticket_key if ticket_key is not None else generate_ticket_key()
+        self.lifetime = lifetime
+        self._aesgcm = AESGCM(self.ticket_key)
+        self._aad = str(node_id).encode()
+
+    def issue(self, session) -> bytes:
+        """Ticket con el estado actual de la sesión."""
+        with session.lock:
+            header = _TICKET_HEADER.pack(time.time(), session.key_index, session.next_psn,
+                                         session.send_index, session.send_psn,
+                                         _OPTION_COMPRESSION if session.compress_threshold is not None else 0,
+                                         session.key_regeneration_count)
+            tables = pack_key_table(session.key_table) + pack_key_table(session.send_table)
+        nonce = os.urandom(_NONCE_SIZE)
+        return nonce + self._aesgcm.encrypt(nonce, header + tables, self._aad)
+
+    def ticket_frame(self, session) -> bytes:
+        """Trama [TICKET] con los índices y PSN de ambos flujos en claro para el cliente."""
+        ticket = self.issue(session)
+        with session.lock:
+            position = _POSITION.pack(session.key_index, session.next_psn, session.send_index, session.send_psn,
+                                      session.key_regeneration_count)
+        return TICKET_PREFIX + position + ticket
+
+    def open(self, ticket: bytes) -> TicketState:
+        """Descifra y valida un ticket. Lanza TicketError si no sirve."""
+        if len(ticket) <= _NONCE_SIZE:
+            raise TicketError("Ticket demasiado corto")
+        try:
+            plain = self._aesgcm.decrypt(ticket[:_NONCE_SIZE], ticket[_NONCE_SIZE:], self._aad)
+            (issued_at, key_index, next_psn, send_index, send_psn,
+             options, regenerations) = _TICKET_HEADER.unpack_from(plain)
+            tables = unpack_key_table(plain[_TICKET_HEADER.size:])
+            key_table, send_table = tables[:len(tables) // 2], tables[len(tables) // 2:]
+        except TicketError:
+            raise
+        except Exception:
+            raise TicketError("Ticket inválido")
+        if time.time() - issued_at > self.lifetime:
+            raise TicketError("Ticket vencido")
+        if (not key_table or len(key_table) != len(send_table) or key_index >= len(key_table)
+                or send_index >= len(send_table) or next_psn > 0xF or send_psn > 0xF):
+            raise TicketError("Ticket inválido")
+        return TicketState(key_table, key_index, next_psn, send_table, send_index, send_psn,
+                           regenerations, issued_at, bool(options & _OPTION_COMPRESSION))
+
+    def resume(self, body: bytes) -> TicketState:
+        """
+        Cuerpo de una trama [RESUME] (posición del cliente || ticket) -> estado
+        de la sesión en la posición del cliente. Lanza TicketError si el ticket
+        no sirve o la posición es anterior a la del ticket.
+        """
+        if len(body) < _POSITION.size:
+            raise TicketError("Trama de reanudación inválida")
+        key_index, next_psn, send_index, send_psn, regenerations = _POSITION.unpack_from(body)
+        state = self.open(body[_POSITION.size:])
+        if key_index >= len(state.key_table) or send_index >= len(state.send_table) or next_psn > 0xF or send_psn > 0xF:
+            raise TicketError("Posición de reanudación inválida")
+        if (regenerations, key_index) < (state.key_regeneration_count, state.key_index):
+            raise TicketError("Posición anterior al ticket")
+        state.key_index, state.next_psn = key_index, next_psn
+        state.send_index, state.send_psn = send_index, send_psn
+        state.key_regeneration_count = regenerations
+        return state
+
+
+# ============================================================
+# Lado cliente
+# ============================================================
+
+@dataclass
+class ClientTicket:
+    """
+    Lo que el cliente guarda para reanudar: el ticket y su propio estado.
+    key_* es su flujo de envío (cliente->servidor) y recv_* el de recepción.
+    La posición la mantiene al día ClientProtocol mientras la sesión avanza.
+    """
+    ticket: bytes
+    key_table: list = field(repr=False)
+    key_index: int
+    next_psn: int
+    recv_key_table: list = field(repr=False)
+    recv_index: int
+    recv_psn: int
+    key_regeneration_count: int = 0
+
+
+def parse_ticket_frame(frame: bytes, key_table: list, recv_key_table: list) -> ClientTicket:
+    """Trama [TICKET] -> ClientTicket (las tablas de llaves las aporta el cliente)."""
+    body = frame[len(TICKET_PREFIX):]
+    if len(body) <= _POSITION.size:
+        raise TicketError("Trama de ticket inválida")
+    key_index, next_psn, recv_index, recv_psn, regenerations = _POSITION.unpack_from(body)
+    return ClientTicket(ticket=body[_POSITION.size:], key_table=list(key_table), key_index=key_index,
+                        next_psn=next_psn, recv_key_table=list(recv_key_table), recv_index=recv_index,
+                        recv_psn=recv_psn, key_regeneration_count=regenerations)
+
+
+def resume_frame(client_ticket: ClientTicket) -> bytes:
+    """Primera trama del cliente para reanudar con un ticket, desde la posición guardada."""
+    position = _POSITION.pack(client_ticket.key_index, client_ticket.next_psn, client_ticket.recv_index,
+                              client_ticket.recv_psn, client_ticket.key_regeneration_count)
+    return RESUME_PREFIX + position + client_ticket.ticket
@@ -1,6 +1,8 @@
 # ReversibleFunctions.py
 from typing import Callable
 
+from Profiling import HOOKS
+
 # Helpers
 def xor_bytes(data: bytes, b: int) -> bytes:
     return bytes([x ^ b for x in data])
@@ -81,12 +83,14 @@ FUNC_MAP = {
     8: (F8, inv_F8),
 }
 
+@HOOKS.hooked("apply_sequence")
 def apply_sequence(data: bytes, func_ids: list) -> bytes:
     for fid in func_ids:
         f, _ = FUNC_MAP[fid]
         data = f(data)
     return data
 
+@HOOKS.hooked("undo_sequence")
 def undo_sequence(data: bytes, func_ids: list) -> bytes:
     # aplicar inversas en orden inverso
     for fid in reversed(func_ids):
@@ -3,13 +3,14 @@ from __future__ import annotations
 import hashlib
 import os
 import platform
-import secrets
 import struct
 import time
 import uuid
 from dataclasses import dataclass
 from typing import Iterable, Tuple
 
+from Randomness import get_randomness
+
 # ---------------------------- Parámetros fijos ----------------------------
 DEFAULT_KEY_BITS = 64    # Tamaño de la semilla S en bits
 DEFAULT_PRIME_BITS = 64  # Tamaño de los primos P y Q en bits
@@ -18,15 +19,19 @@ DEFAULT_N_KEYS = 16       # Número de llaves a generar
 
 # ---------------------------- Recolección de entropía ----------------------------
 
-def _collect_entropy(tag: str = "") -> bytes:
+def _collect_entropy(tag: str = "", rng=None) -> bytes:
     """
     Recopila varias fuentes de entropía del sistema para generar números impredecibles.
     Se mezclan bytes aleatorios del SO, tiempos de ejecución, PID, MAC y huella del sistema.
     El parámetro `tag` permite diferenciar (cliente o servidor).
+    Con un proveedor determinista (Randomness.SeededRandomness) solo se usan sus bytes y la etiqueta.
     """
+    rng = rng if rng is not None else get_randomness()
+    if rng.deterministic:
+        return rng.bytes(32) + b"|" + tag.encode()
     pieces = []
     # Bytes aleatorios cripto-seguros
-    pieces.append(secrets.token_bytes(32))
+    pieces.append(rng.bytes(32))
     # Tiempos, MAC y PID empacados en binario
     pieces.append(struct.pack(
         ">QQQI",
@@ -44,14 +49,14 @@ def _collect_entropy(tag: str = "") -> bytes:
     return b"|".join(pieces)
 
 
-def _int_from_entropy(bits: int, *, tag: str = "") -> int:
+def _int_from_entropy(bits: int, *, tag: str = "", rng=None) -> int:
     """
     Deriva un entero con los bits indicados a partir de entropía.
     Se usa SHA-256 repetidamente hasta completar el tamaño en bits requerido.
     """
     if bits < 8:
         raise ValueError("bits debe ser >= 8")
-    ent = _collect_entropy(tag)
+    ent = _collect_entropy(tag, rng)
     out = 0
     need = bits
     counter = 0
@@ -108,7 +113,7 @@ def _miller_rabin(n: int, bases: Iterable[int]) -> bool:
     return True
 
 
-def is_probable_prime(n: int, *, rounds: int = 8) -> bool:
+def is_probable_prime(n: int, *, rounds: int = 8, rng=None) -> bool:
     """
     Verifica si un número es un primo probable usando Miller-Rabin.
     Usa algunas bases fijas y varias aleatorias (según 'rounds').
@@ -122,15 +127,16 @@ def is_probable_prime(n: int, *, rounds: int = 8) -> bool:
     # Bases deterministas pequeñas
     bases = [2, 3, 5, 7, 11, 13, 17][:max(0, 7 - rounds)]
     # Añadir bases aleatorias
+    rng = rng if rng is not None else get_randomness()
     for _ in range(rounds):
         a = 0
         while a < 2 or a > n - 2:
-            a = 2 + secrets.randbelow(max(2, n - 3))
+            a = 2 + rng.below(max(2, n - 3))
         bases.append(a)
     return _miller_rabin(n, bases)
 
 
-def next_probable_prime(n: int) -> int:
+def next_probable_prime(n: int, rng=None) -> int:
     """
     Encuentra el siguiente número primo probable mayor o igual a n.
     Avanza de 2 en 2 (solo prueba impares).
@@ -138,23 +144,23 @@ def next_probable_prime(n: int) -> int:
     if n <= 2:
         return 2
     n |= 1  # asegurar impar
-    while not is_probable_prime(n):
+    while not is_probable_prime(n, rng=rng):
         n += 2
     return n
 
 # ---------------------------- Generadores públicos ----------------------------
 
-def generate_node_id(bits: int = DEFAULT_ID_BITS, *, tag: str = "") -> int:
+def generate_node_id(bits: int = DEFAULT_ID_BITS, *, tag: str = "", rng=None) -> int:
     """Genera un ID de nodo único con 32 bits."""
-    return _int_from_entropy(bits, tag=f"node_id|{tag}")
+    return _int_from_entropy(bits, tag=f"node_id|{tag}", rng=rng)
 
 
-def generate_seed(bits: int = DEFAULT_KEY_BITS, *, tag: str = "") -> int:
+def generate_seed(bits: int = DEFAULT_KEY_BITS, *, tag: str = "", rng=None) -> int:
     """Genera la semilla S de 64 bits."""
-    return _int_from_entropy(bits, tag=f"seed|{tag}")
+    return _int_from_entropy(bits, tag=f"seed|{tag}", rng=rng)
 
 
-def generate_prime(bits: int = DEFAULT_PRIME_BITS, *, tag: str = "") -> int:
+def generate_prime(bits: int = DEFAULT_PRIME_BITS, *, tag: str = "", rng=None) -> int:
     """
     Genera un primo probable de 64 bits.
     Si se pasa del tamaño deseado, busca un primo dentro del rango permitido.
@@ -162,13 +168,13 @@ def generate_prime(bits: int = DEFAULT_PRIME_BITS, *, tag: str = "") -> int:
     if bits < 8:
         raise ValueError("bits de primo debe ser >= 8")
     # Número aleatorio de 'bits' bits, asegurado impar
-    start = _int_from_entropy(bits, tag=f"prime|{tag}") | 1
-    p = next_probable_prime(start)
+    start = _int_from_entropy(bits, tag=f"prime|{tag}", rng=rng) | 1
+    p = next_probable_prime(start, rng)
     # Ajuste si se excede el número de bits
     if p.bit_length() > bits:
         candidate = (1 << bits) - 1
         candidate |= 1
-        while candidate > 2 and not is_probable_prime(candidate):
+        while candidate > 2 and not is_probable_prime(candidate, rng=rng):
             candidate -= 2
         p = candidate
     return p
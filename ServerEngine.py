@@ -0,0 +1,1064 @@
+"""
+ServerEngine.py
+---------------
+Motor del servidor del modelo de cifrado polimórfico, independiente de la
+interfaz gráfica.
+
+El archivo se encarga únicamente de:
+ - ServerEngine: lógica del protocolo (FCM, RM, KUM, LCM, texto claro)
+   sobre tramas ya delimitadas, sin tocar sockets.
+ - Backends de E/S que conectan el motor con la red:
+     * ThreadedBackend: un hilo por cliente con sockets bloqueantes.
+     * SelectorBackend: un solo hilo con selectors.DefaultSelector
+       (epoll en Linux), sockets no bloqueantes y buffers por conexión.
+
+Ambos backends exponen la misma interfaz (BaseBackend): start(), stop(),
+stop_accepting(), connections(), connection_count(), stats(), el atributo
+`address` con el puerto real tras bind, `fanout` (FanOut.FanOutService) para
+el broadcast no bloqueante, `admission` (Admission.AdmissionController) y
+`reaper` (Reaper.SessionReaper). Cada conexión tiene una cola de salida
+acotada que vacía su propio bucle de E/S. Con la opción capture
+(Capture.CaptureWriter) cada trama que entra o sale queda grabada.
+
+NO incluye:
+ - Interfaz gráfica (va en server.py).
+ - Generación de llaves ni cifrado (van en KeyGenerator.py y PSN.py).
+"""
+
+import itertools
+import selectors
+import socket
+import threading
+import time
+
+from Admission import POLICY_QUEUE, AdmissionController, rejection_frame
+from Capture import DIRECTION_IN, DIRECTION_OUT
+from Coalescing import BATCH_PREFIX, unpack_batch
+from Compression import CODEC_ZLIB, DEFAULT_COMPRESS_THRESHOLD
+from FanOut import (DEFAULT_BLOCK_TIMEOUT, DEFAULT_QUEUE_SIZE, POLICY_DROP_OLDEST,
+                    FanOutService, OutboundQueue)
+from Framing import FrameDecoder, encode_frame, recv_frame, send_frame
+from GroupChannel import GroupChannel
+from Handshake import EARLY_PREFIX, EARLY_REJECTED_PREFIX, encode_params, parse_params
+from KeyGenerator import generate_directional_key_tables
+from MessageTypes import MessageType, get_message_info, format_message_log
+from Metrics import REGISTRY
+from Multiplex import MUX_ACCEPTED, MUX_PREFIX, Multiplexer
+from Pipeline import DIRECTION_REQUEST, DIRECTION_RESPONSE, SEQ_PREFIX, SequenceError, encode_seq_frame, parse_seq_frame, seq_aad
+from Profiling import HOOKS
+from PSN import encrypt_message, decrypt_message
+from Reaper import SessionReaper
+from Resumption import RESUME_FAILED_PREFIX, RESUME_PREFIX, RESUMED_PREFIX, TicketError, TicketIssuer
+from SeedAndPrimes import DEFAULT_N_KEYS, SharedParams
+from Session import SessionRegistry
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Cola de conexiones pendientes pasada a listen(). Con 5 el kernel descarta
+# SYN durante una tormenta de reconexiones; es configurable por backend.
+DEFAULT_BACKLOG = 128
+
+# TCP keepalive de las conexiones aceptadas: (inactividad, intervalo, sondas).
+# Detecta pares muertos en ~2 minutos en lugar de las 2 horas del kernel.
+DEFAULT_KEEPALIVE = (60, 10, 5)
+
+# Bytes pendientes en el buffer de escritura a partir de los cuales el
+# backend con selectors deja de sacar mensajes de la cola de salida
+OUTBUF_HIGH_WATER = 64 * 1024
+
+# Mensajes de control del protocolo (en texto plano, antes de cifrar)
+FIRST_MESSAGE = "First Message Contact"
+LAST_MESSAGE = "Last Message Contact"
+
+# Prefijos de mensajes no cifrados
+PLAINTEXT_PREFIX = b"[PLAINTEXT]"
+BROADCAST_PREFIX = b"[BROADCAST] "
+
+
+# ============================================================
+# Motor del protocolo
+# ============================================================
+
+class ServerEngine:
+    """
+    Lógica del protocolo del servidor, sin sockets ni Tk.
+
+    Los backends le entregan tramas completas y envían lo que retorna.
+    Los eventos del log se notifican con on_log(remitente, mensaje, color).
+    """
+
+    def __init__(self, node_id: int, Q: int, S_server: int, on_log=None, registry=None,
+                 ticket_key: bytes = None, metrics=None,
+                 compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD, rng=None):
+        self.node_id = node_id
+        self.Q = Q
+        self.S_server = S_server
+        self.on_log = on_log
+        # Umbral de compresión para quien la ofrezca en el FCM (None = nunca comprimir)
+        self.compress_threshold = compress_threshold
+        # Proveedor de aleatoriedad (Randomness.py) de los nonces; None = el del proceso
+        self.rng = rng
+        self.sessions = registry if registry is not None else SessionRegistry()
+        # Tabla de llaves de grupo para broadcasts cifrados una sola vez
+        self.group = GroupChannel(node_id, Q, rng=rng)
+        # Tickets de reanudación (la llave se comparte entre workers)
+        self.tickets = TicketIssuer(node_id, ticket_key)
+        # Contadores acumulados del motor (sobreviven al cierre de sesiones)
+        self.counters = {
+            "handshakes": 0,
+            "resumptions": 0,
+            "resumption_failures": 0,
+            "early_data": 0,
+            "early_data_rejected": 0,
+            "messages_in": 0,
+            "batched_messages": 0,
+            "messages_out": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "errors": 0,
+            "evictions": 0,
+        }
+        self._counters_lock = threading.Lock()
+        self._register_metrics(metrics if metrics is not None else REGISTRY)
+
+    def _register_metrics(self, metrics):
+        """Histogramas de latencia y colectores en el registro de métricas."""
+        self.metrics = metrics
+        self.h_key_table = metrics.histogram("crypto_key_table_seconds", "Tiempo de generate_directional_key_tables()")
+        self.h_handshake = metrics.histogram("crypto_handshake_seconds", "Tiempo del handshake FCM en el servidor")
+        self.h_encrypt = metrics.histogram("crypto_encrypt_seconds", "Tiempo de encrypt_message()")
+        self.h_decrypt = metrics.histogram("crypto_decrypt_seconds", "Tiempo de decrypt_message()")
+        self.h_message = metrics.histogram("crypto_message_seconds", "Tiempo total de procesar un mensaje cifrado")
+
+        def counter_collector(name):
+            return lambda: self.counters[name]
+
+        for name in self.counters:
+            metrics.register_collector(f"crypto_{name}_total", f"Contador del motor: {name}",
+                                       counter_collector(name), kind="counter")
+        metrics.register_collector("crypto_active_sessions", "Sesiones activas", lambda: len(self.sessions))
+        metrics.register_collector("crypto_session_messages_per_second",
+                                   "Mensajes recibidos por segundo de cada sesión", self._session_rates)
+
+    def _session_rates(self) -> list:
+        now = time.monotonic()
+        return [
+            ({"session": session.session_id, "address": f"{session.address[0]}:{session.address[1]}"},
+             session.messages_in / max(now - session.created_at, 1e-9))
+            for session in self.sessions.sessions()
+        ]
+
+    def count(self, **increments):
+        """Incrementa contadores del motor: count(messages_in=1, bytes_in=n)."""
+        with self._counters_lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def stats(self) -> dict:
+        """Instantánea de los contadores más el número de sesiones activas."""
+        with self._counters_lock:
+            result = dict(self.counters)
+        result["active_sessions"] = len(self.sessions)
+        return result
+
+    def log(self, sender, message, color="#ffffff"):
+        """Notifica un evento del log (si hay alguien escuchando)."""
+        if self.on_log is not None:
+            self.on_log(sender, message, color)
+
+    def _log_type(self, msg_type: MessageType, info: str):
+        self.log("Sistema", format_message_log(msg_type, info), get_message_info(msg_type)["color"])
+
+    # ---------------------------- FCM ----------------------------
+
+    @staticmethod
+    def needs_key_derivation(first_frame: bytes) -> bool:
+        """True si la primera trama inicia un FCM completo (no una reanudación ni una conexión multiplexada)."""
+        return not first_frame.startswith((RESUME_PREFIX, MUX_PREFIX))
+
+    @HOOKS.hooked("fcm")
+    def open_session(self, address, params_data: bytes, admission=None):
+        """
+        Procesa la primera trama del cliente: parámetros FCM (Handshake.py),
+        un ticket de reanudación ([RESUME]) o [MUX] (Multiplex.py).
+
+        `admission` (Admission.AdmissionController del backend) se le pasa al
+        Multiplexer para que cada corriente pase por el control de admisión.
+
+        Retorna:
+            tuple: (Session registrada, Multiplexer o None si la reanudación
+                    falló, lista de tramas a enviar)
+        """
+        if params_data.startswith(RESUME_PREFIX):
+            return self.resume_session(address, params_data[len(RESUME_PREFIX):])
+        if params_data == MUX_PREFIX:
+            self._log_type(MessageType.FCM, f"Conexión multiplexada de {address[0]}")
+            return Multiplexer(self, address, admission=admission), [MUX_ACCEPTED]
+
+        start = time.perf_counter()
+        self._log_type(MessageType.FCM, f"Recibiendo parámetros de {address[0]}")
+
+        hello = parse_params(params_data)
+        compression = self.compress_threshold is not None and CODEC_ZLIB in hello.codecs
+
+        # Semilla compartida y tablas de llaves de la sesión (una por dirección)
+        shared_params = SharedParams(
+            id=self.node_id,
+            P=hello.prime,
+            Q=self.Q,
+            S=self.S_server ^ hello.seed,
+            N=DEFAULT_N_KEYS,
+        )
+        derive_start = time.perf_counter()
+        recv_table, send_table = generate_directional_key_tables(shared_params)
+        self.h_key_table.observe(time.perf_counter() - derive_start)
+        session = self.sessions.create(address, recv_table, send_table)
+        if compression:
+            session.compress_threshold = self.compress_threshold
+        self.count(handshakes=1)
+        self.h_handshake.observe(time.perf_counter() - start)
+
+        self._log_type(MessageType.FCM, f"Handshake completado con {address[0]}" + (" (compresión zlib)" if compression else ""))
+        reply = encode_params(self.node_id, self.Q, self.S_server,
+                              (CODEC_ZLIB,) if compression else (), binary=hello.binary)
+        return session, [reply]
+
+    def resume_session(self, address, body: bytes):
+        """
+        Reanuda una sesión a partir de un ticket (en la posición que indica
+        el cliente), sin derivar llaves. Si el ticket no sirve responde
+        [RESUME_FAILED] y el cliente puede enviar sus parámetros FCM por la
+        misma conexión.
+        """
+        try:
+            state = self.tickets.resume(body)
+        except TicketError as e:
+            self.count(resumption_failures=1)
+            self._log_type(MessageType.FCM, f"Reanudación rechazada de {address[0]}: {e}")
+            return None, [RESUME_FAILED_PREFIX + b" " + str(e).encode()]
+
+        session = self.sessions.create(address, state.key_table, state.send_table)
+        session.restore(state.key_index, state.next_psn, state.send_index, state.send_psn,
+                        state.key_regeneration_count)
+        if state.compression and self.compress_threshold is not None:
+            session.compress_threshold = self.compress_threshold
+        self.count(resumptions=1)
+        self._log_type(MessageType.FCM, f"Sesión reanudada con {address[0]} (K{state.key_index:02d}, PSN={state.next_psn})")
+
+        # La tabla de grupo pudo cambiar si el servidor se reinició con la misma llave de tickets
+        replies = [RESUMED_PREFIX]
+        replies.append(self._group_key_delivery(session))
+        return session, replies
+
+    # ---------------------------- Flujo de envío ----------------------------
+
+    def _encrypt_for(self, session, plaintext: bytes, associated_data: bytes = None) -> bytes:
+        """Cifra un mensaje para el cliente con el flujo servidor->cliente y lo avanza."""
+        psn, index = session.advance_send(plaintext)
+        return encrypt_message(plaintext, psn, session.send_table[index].to_bytes(8, "big"), associated_data,
+                               session.compress_threshold, self.rng)
+
+    def _group_key_delivery(self, session) -> bytes:
+        """Trama [GROUPKEY] cifrada con el flujo servidor->cliente de la sesión."""
+        psn, index = session.advance_send(self.group.packed_table)
+        return self.group.key_delivery_frame(index, session.send_table[index].to_bytes(8, "big"), psn)
+
+    # ---------------------------- RM / LCM ----------------------------
+
+    def handle_message(self, session, data: bytes):
+        """
+        Procesa una trama recibida de un cliente con sesión establecida
+        (o de una conexión multiplexada, que la reparte en sus corrientes).
+
+        Retorna:
+            tuple: (lista de tramas a enviar, cerrar_conexión: bool)
+        """
+        if session.__class__ is Multiplexer:
+            return session.handle(data)
+        return self._handle_session_message(session, data)
+
+    @HOOKS.hooked("rm")
+    def _handle_session_message(self, session, data: bytes):
+        """Procesa una trama de una sesión (RM, lote, segmentada, datos tempranos, LCM o texto claro)."""
+        address = session.address
+        try:
+            # Verificar si es un mensaje en texto claro
+            if data.startswith(PLAINTEXT_PREFIX):
+                message = data[len(PLAINTEXT_PREFIX):].decode()
+                session.touch()
+                self.log(f"Cliente {address[0]} 🔓", f"Dice: {message}", "#ff9900")
+                return [PLAINTEXT_PREFIX + b"Mensaje en texto claro recibido correctamente"], False
+
+            # Mensaje cifrado - procesar normalmente
+            start = time.perf_counter()
+            session.record_in(len(data))
+            self.count(messages_in=1, bytes_in=len(data))
+
+            seq = request_aad = response_aad = None
+            batch = data.startswith(BATCH_PREFIX)
+            early = data.startswith(EARLY_PREFIX)
+            if early:
+                # 0.5-RTT: primer mensaje enviado junto con los parámetros FCM (Handshake.py)
+                if session.next_seq != 0:
+                    raise ValueError("Datos tempranos después del primer mensaje")
+                data = data[len(EARLY_PREFIX):]
+            elif batch:
+                # Lote de mensajes pequeños cifrado una sola vez (Coalescing.py)
+                data = data[len(BATCH_PREFIX):]
+            elif data.startswith(SEQ_PREFIX):
+                # Modo segmentado: la secuencia (autenticada como AAD) fija llave y PSN
+                seq, data = parse_seq_frame(data)
+                if seq != session.next_seq:
+                    raise SequenceError(f"Secuencia {seq} fuera de orden (se esperaba {session.next_seq})")
+                request_aad = seq_aad(seq, DIRECTION_REQUEST)
+                response_aad = seq_aad(seq, DIRECTION_RESPONSE)
+            key_index = session.key_index
+            key = session.current_key()
+
+            # Verificar si necesitamos regenerar llaves
+            if key_index == 0 and session.key_regeneration_count > 0:
+                self._log_type(MessageType.KUM, f"Cliente {address[0]} regeneró tabla de llaves (ciclo #{session.key_regeneration_count + 1})")
+
+            self._log_type(MessageType.RM, f"Cliente {address[0]} - Llave K{key_index:02d}, PSN={session.next_psn}")
+
+            # Desencriptar mensaje
+            decrypt_start = time.perf_counter()
+            try:
+                result = decrypt_message(data, key, request_aad)
+            except Exception:
+                if not early:
+                    raise
+                # Cifrado con parámetros del servidor desactualizados: el cliente lo reenviará
+                self.count(early_data_rejected=1)
+                self._log_type(MessageType.FCM, f"Datos tempranos de {address[0]} rechazados (parámetros desactualizados)")
+                return [EARLY_REJECTED_PREFIX], False
+            self.h_decrypt.observe(time.perf_counter() - decrypt_start)
+            plaintext = result["plaintext"]
+            if batch:
+                messages = [m.decode() for m in unpack_batch(plaintext)]
+                message = f"<lote de {len(messages)} mensajes>"
+            else:
+                message = plaintext.decode()
+
+            self.log("Debug", f"Servidor antes: PSN={session.next_psn}, Key=K{key_index}, Mensaje='{message}'", "#888888")
+
+            # Actualizar estado de la sesión (PSN, índice de llave y ciclo)
+            old_psn, old_key_index = session.advance(plaintext, result["next_extraction_instruction"])
+
+            self.log("Debug", f"Servidor después: PSN {old_psn}→{session.next_psn}, Key K{old_key_index}→K{session.key_index}", "#888888")
+
+            # El primer mensaje (contacto o datos tempranos) completa el FCM
+            contact = early or message == FIRST_MESSAGE
+            if early:
+                self.count(early_data=1)
+            close = False
+            if batch:
+                for item in messages:
+                    self.log(f"Cliente {address[0]} 🔐📦", f"Dice: {item}", "#ffffff")
+                self.count(batched_messages=len(messages))
+                response = f"Lote de {len(messages)} mensajes recibido correctamente"
+            elif message == FIRST_MESSAGE:
+                response = "Conexión establecida correctamente"
+                self.log(f"Cliente {address[0]} 🔐", "Mensaje de contacto inicial recibido", "#0078d4")
+            elif message == LAST_MESSAGE:
+                self._log_type(MessageType.LCM, f"Cliente {address[0]} cerrando conexión")
+                response = "Desconexión confirmada"
+                close = True
+            else:
+                response = "Mensaje cifrado recibido correctamente"
+                self.log(f"Cliente {address[0]} 🔐", f"Dice: {message}", "#ffffff")
+
+            # Respuesta cifrada con el flujo servidor->cliente (independiente del de recepción)
+            encrypt_start = time.perf_counter()
+            cipher_response = self._encrypt_for(session, response.encode(), response_aad)
+            self.h_encrypt.observe(time.perf_counter() - encrypt_start)
+            if seq is not None:
+                cipher_response = encode_seq_frame(seq, cipher_response)
+            session.record_out(len(cipher_response))
+            self.count(messages_out=1, bytes_out=len(cipher_response))
+            replies = [cipher_response]
+
+            if contact:
+                # Entregar la tabla de grupo cifrada con el flujo de envío de la sesión
+                replies.append(self._group_key_delivery(session))
+
+            if close:
+                replies.append(self._finish_session(session))
+            elif contact:
+                # Ticket de reanudación con el estado ya avanzado
+                replies.append(self.tickets.ticket_frame(session))
+            self.h_message.observe(time.perf_counter() - start)
+            return replies, close
+
+        except SequenceError as e:
+            # Sin orden no hay forma de saber qué llave sigue: se cierra la conexión
+            self.count(errors=1)
+            self.log("Error", f"Error procesando mensaje de {address[0]}: {str(e)}", "#d13438")
+            self.close_session(session)
+            return [b"Error procesando mensaje"], True
+
+        except Exception as e:
+            self.count(errors=1)
+            self.log("Error", f"Error procesando mensaje de {address[0]}: {str(e)}", "#d13438")
+            return [b"Error procesando mensaje"], False
+
+    @HOOKS.hooked("lcm")
+    def _finish_session(self, session) -> bytes:
+        """LCM: ticket con el estado final y eliminación del estado del cliente."""
+        ticket = self.tickets.ticket_frame(session)
+        self.close_session(session)
+        self._log_type(MessageType.LCM, f"Tabla de llaves de {session.address[0]} eliminada")
+        return ticket
+
+    def close_session(self, session):
+        """Elimina la sesión del registro, o todas las de un Multiplexer (idempotente)."""
+        if session is None:
+            return
+        if session.__class__ is Multiplexer:
+            session.close()
+            return
+        self.sessions.remove(session.session_id)
+
+    def evict_session(self, session, address, reason: str):
+        """Expulsión por el servidor: se registra como un LCM sintético."""
+        self.count(evictions=1)
+        self._log_type(MessageType.LCM, f"Sesión de {address[0]}:{address[1]} expulsada por {reason}")
+        if session is not None:
+            self.close_session(session)
+            self._log_type(MessageType.LCM, f"Tabla de llaves de {address[0]} eliminada")
+
+
+# ============================================================
+# Socket de escucha
+# ============================================================
+
+def listen_socket(address, backlog: int, reuse_port: bool = False):
+    """
+    Crea el socket de escucha.
+
+    Con reuse_port=True activa SO_REUSEPORT para que varios procesos puedan
+    hacer bind al mismo host:puerto y el kernel reparta las conexiones.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        if not hasattr(socket, "SO_REUSEPORT"):
+            sock.close()
+            raise OSError("SO_REUSEPORT no está disponible en esta plataforma")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(address)
+    sock.listen(backlog)
+    return sock
+
+
+def configure_keepalive(sock, keepalive):
+    """
+    Activa TCP keepalive en una conexión aceptada.
+    keepalive = (inactividad, intervalo, sondas) en segundos, o None.
+    Las opciones finas solo existen en algunas plataformas (Linux).
+    """
+    if keepalive is None:
+        return
+    idle, interval, count = keepalive
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+# ============================================================
+# Backend con hilos (un hilo por cliente)
+# ============================================================
+
+class ThreadedConnection:
+    """Conexión del backend con hilos."""
+
+    __slots__ = ("sock", "address", "conn_id", "session", "send_lock", "outbound", "accepted_at")
+
+    def __init__(self, sock, address, outbound: OutboundQueue, conn_id: int = 0):
+        self.sock = sock
+        self.address = address
+        self.conn_id = conn_id
+        self.session = None
+        self.send_lock = threading.Lock()
+        self.outbound = outbound
+        self.accepted_at = time.monotonic()
+
+    def send(self, payload: bytes):
+        with self.send_lock:
+            send_frame(self.sock, payload)
+
+
+class BaseBackend:
+    """Configuración y utilidades comunes a todos los backends de E/S."""
+
+    name = None
+
+    def __init__(self, engine: ServerEngine, host: str, port: int, *,
+                 backlog: int = DEFAULT_BACKLOG, reuse_port: bool = False,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, backpressure: str = POLICY_DROP_OLDEST,
+                 block_timeout: float = DEFAULT_BLOCK_TIMEOUT, admission: AdmissionController = None,
+                 keepalive=DEFAULT_KEEPALIVE, idle_timeout: float = None, memory_budget: int = None,
+                 on_connections_changed=None, capture=None):
+        self.engine = engine
+        self.address = (host, port)
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.admission = admission if admission is not None else AdmissionController()
+        self.keepalive = keepalive
+        self.reaper = SessionReaper(self, idle_timeout, memory_budget)
+        self.on_connections_changed = on_connections_changed
+        self.fanout = FanOutService(self)
+        self.capture = capture  # Capture.CaptureWriter o None
+        self._conn_ids = itertools.count(1)
+        self.server_socket = None
+        self.running = False
+        self.accepting = False
+
+    def stats(self) -> dict:
+        """
+        Contadores del motor más los de admisión (prefijo 'admission_') y
+        los de expulsión y memoria (prefijo 'reaper_').
+        """
+        result = self.engine.stats()
+        result["connections"] = self.connection_count()
+        for name, value in self.admission.stats().items():
+            result[f"admission_{name}"] = value
+        for name, value in self.reaper.stats().items():
+            result[f"reaper_{name}"] = value
+        return result
+
+    def _new_queue(self) -> OutboundQueue:
+        return OutboundQueue(self.queue_size, self.backpressure, self.block_timeout)
+
+    def _capture(self, conn, direction: int, frame: bytes):
+        if self.capture is not None:
+            self.capture.record(direction, conn.conn_id, frame)
+
+    def _changed(self):
+        if self.on_connections_changed is not None:
+            self.on_connections_changed()
+
+    def _log_rejected(self, address, reason: str):
+        self.engine.log("Admisión", f"Conexión de {address[0]}:{address[1]} rechazada: {reason}", "#ff8c00")
+
+
+class ThreadedBackend(BaseBackend):
+    """Backend clásico: hilo de aceptación + un hilo bloqueante por cliente."""
+
+    name = "threaded"
+
+    def __init__(self, engine: ServerEngine, host: str, port: int, **options):
+        super().__init__(engine, host, port, **options)
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def start(self):
+        """Abre el socket de escucha e inicia el hilo de aceptación."""
+        self.server_socket = listen_socket(self.address, self.backlog, self.reuse_port)
+        self.address = self.server_socket.getsockname()
+        self.running = True
+        self.accepting = True
+        threading.Thread(target=self.accept_connections, daemon=True).start()
+        self.reaper.start()
+
+    def stop(self):
+        """Cierra el socket de escucha y todas las conexiones."""
+        self.running = False
+        self.reaper.stop()
+        for conn in self.connections():
+            conn.outbound.close()
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+                conn.sock.close()
+            except OSError:
+                pass
+        with self._connections_lock:
+            self._connections.clear()
+        self._close_listener()
+        self.fanout.shutdown()
+        self.engine.sessions.clear()
+
+    def stop_accepting(self):
+        """Deja de aceptar conexiones nuevas; las actuales siguen activas."""
+        self.accepting = False
+        self._close_listener()
+
+    def _close_listener(self):
+        if self.server_socket:
+            # shutdown() despierta al hilo bloqueado en accept() (close() solo no lo hace en Linux)
+            try:
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+
+    def connections(self) -> list:
+        with self._connections_lock:
+            return list(self._connections)
+
+    def connection_count(self) -> int:
+        with self._connections_lock:
+            return len(self._connections)
+
+    def accept_connections(self):
+        """Aceptar conexiones de clientes en un hilo separado"""
+        while self.running and self.accepting:
+            # Política "queue": sin lugar, no se llama a accept() y las
+            # conexiones esperan en la cola del kernel (backlog)
+            if self.admission.policy == POLICY_QUEUE and not self.admission.wait_for_capacity(0.5):
+                continue
+            try:
+                client_socket, client_address = self.server_socket.accept()
+                if not self.admission.try_admit():
+                    self._reject(client_socket, client_address, "máximo de sesiones alcanzado")
+                    continue
+                # Sin Nagle: las respuestas segmentadas salen sin esperar al ACK
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                configure_keepalive(client_socket, self.keepalive)
+                conn = ThreadedConnection(client_socket, client_address, self._new_queue(), next(self._conn_ids))
+                with self._connections_lock:
+                    self._connections.append(conn)
+                self._changed()
+
+                # Iniciar hilos para manejar este cliente: lectura y cola de salida
+                threading.Thread(target=self.handle_client, args=(conn,), daemon=True).start()
+                threading.Thread(target=self._writer, args=(conn,), daemon=True).start()
+
+            except Exception as e:
+                if self.running and self.accepting:
+                    self.engine.log("Error", f"Error aceptando conexión: {str(e)}", "#d13438")
+                break
+
+    def handle_client(self, conn: ThreadedConnection):
+        """Manejar la comunicación con un cliente específico"""
+        client_address = conn.address
+        try:
+            # Una reanudación fallida deja la conexión esperando el FCM completo
+            while self.running and conn.session is None:
+                params_data = recv_frame(conn.sock)
+                if params_data is None:
+                    return
+                self._capture(conn, DIRECTION_IN, params_data)
+                # Limitar las derivaciones de llaves concurrentes (la reanudación no deriva)
+                derive = self.engine.needs_key_derivation(params_data)
+                if derive and not self.admission.acquire_handshake():
+                    self._log_rejected(client_address, "demasiados handshakes simultáneos")
+                    self._send(conn, rejection_frame("Servidor saturado, reintente más tarde"))
+                    return
+                try:
+                    conn.session, replies = self.engine.open_session(client_address, params_data, self.admission)
+                finally:
+                    if derive:
+                        self.admission.release_handshake()
+                for reply in replies:
+                    self._send(conn, reply)
+
+            while self.running:
+                data = recv_frame(conn.sock)
+                if data is None:
+                    break
+                self._capture(conn, DIRECTION_IN, data)
+                replies, close = self.engine.handle_message(conn.session, data)
+                for reply in replies:
+                    self._send(conn, reply)
+                if close:
+                    break
+
+        except Exception as e:
+            if self.running:
+                self.engine.log("Error", f"Error con cliente {client_address[0]}: {str(e)}", "#d13438")
+        finally:
+            self._drop(conn)
+
+    def _writer(self, conn: ThreadedConnection):
+        """Vacía la cola de salida de la conexión (broadcasts)."""
+        while True:
+            payload = conn.outbound.get()
+            if payload is None:
+                break
+            try:
+                self._send(conn, payload)
+            except OSError:
+                self._drop(conn)
+                break
+
+    def _send(self, conn: ThreadedConnection, payload: bytes):
+        self._capture(conn, DIRECTION_OUT, payload)
+        conn.send(payload)
+
+    def _drop(self, conn):
+        with self._connections_lock:
+            if conn not in self._connections:
+                return
+            self._connections.remove(conn)
+        self.admission.release_session()
+        conn.outbound.close()
+        self.engine.close_session(conn.session)
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+        self.engine.log("Desconexión", f"Cliente {conn.address[0]}:{conn.address[1]} desconectado", "#ffb900")
+        self._changed()
+
+    def _reject(self, sock, address, reason: str):
+        """Rechaza una conexión ya aceptada con una trama [REJECTED]."""
+        self._log_rejected(address, reason)
+        try:
+            sock.settimeout(1.0)
+            send_frame(sock, rejection_frame("Servidor saturado, reintente más tarde"))
+        except OSError:
+            pass
+        finally:
+            sock.close()
+
+    # ---------------------------- Interfaz de FanOutService ----------------------------
+
+    def fanout_targets(self) -> list:
+        return [conn for conn in self.connections() if conn.session is not None]
+
+    def wake_writer(self, conn):
+        # El hilo escritor ya está esperando en la cola
+        pass
+
+    def disconnect(self, conn):
+        # Cerrar el socket hace que el hilo lector salga y llame a _drop()
+        try:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+# ============================================================
+# Backend con selectors (un solo hilo, no bloqueante)
+# ============================================================
+
+class SelectorConnection:
+    """Conexión del backend con selectors: buffers de lectura y escritura."""
+
+    __slots__ = ("sock", "fd", "address", "conn_id", "session", "decoder", "outbuf", "outbound", "closing",
+                 "accepted_at")
+
+    def __init__(self, sock, address, outbound: OutboundQueue, conn_id: int = 0):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.address = address
+        self.conn_id = conn_id
+        self.session = None
+        self.decoder = FrameDecoder()
+        self.outbuf = bytearray()
+        self.outbound = outbound
+        self.closing = False
+        self.accepted_at = time.monotonic()
+
+
+class SelectorBackend(BaseBackend):
+    """
+    Backend de mínima sobrecarga: un hilo, sockets no bloqueantes y
+    selectors.DefaultSelector. El pipeline de descifrado se llama en línea
+    desde el bucle de eventos.
+    """
+
+    name = "selector"
+
+    def __init__(self, engine: ServerEngine, host: str, port: int, **options):
+        super().__init__(engine, host, port, **options)
+        self.selector = None
+        # Con política "queue" y sin lugar se deja de escuchar el socket de
+        # escucha: las conexiones esperan en la cola del kernel
+        self._accept_paused = False
+        self._connections = {}
+        # Conexiones con trabajo pedido desde otros hilos (cola de salida / cierre)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._wake_r = None
+        self._wake_w = None
+        self._thread = None
+
+    def start(self):
+        """Abre el socket de escucha e inicia el bucle de eventos."""
+        self.server_socket = listen_socket(self.address, self.backlog, self.reuse_port)
+        self.server_socket.setblocking(False)
+        self.address = self.server_socket.getsockname()
+
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server_socket, selectors.EVENT_READ, None)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._wake_r)
+
+        self.running = True
+        self.accepting = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.reaper.start()
+
+    def stop(self):
+        """Detiene el bucle de eventos y cierra todo."""
+        self.running = False
+        self.reaper.stop()
+        self._wake()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    def stop_accepting(self):
+        """
+        Deja de aceptar conexiones nuevas; las actuales siguen activas.
+        El socket de escucha se cierra desde el bucle de eventos.
+        """
+        self.accepting = False
+        self._wake()
+
+    def connections(self) -> list:
+        return list(self._connections.values())
+
+    def connection_count(self) -> int:
+        return len(self._connections)
+
+    # ---------------------------- Interfaz de FanOutService ----------------------------
+
+    def fanout_targets(self) -> list:
+        return [conn for conn in self.connections() if conn.session is not None]
+
+    def wake_writer(self, conn):
+        with self._pending_lock:
+            self._pending.add(conn)
+        self._wake()
+
+    def disconnect(self, conn):
+        # La cola ya quedó marcada como desbordada; el bucle la cierra
+        conn.outbound.close()
+        self.wake_writer(conn)
+
+    def _wake(self):
+        if self._wake_w is not None:
+            try:
+                self._wake_w.send(b"\0")
+            except OSError:
+                pass
+
+    # ---------------------------- Bucle de eventos ----------------------------
+
+    def _run(self):
+        try:
+            while self.running:
+                for key, mask in self.selector.select(timeout=0.5):
+                    if key.data is None:
+                        self._accept()
+                    elif key.data is self._wake_r:
+                        self._drain_wake()
+                    else:
+                        conn = key.data
+                        if mask & selectors.EVENT_READ:
+                            self._read(conn)
+                        if mask & selectors.EVENT_WRITE and self._is_open(conn):
+                            self._flush(conn)
+        except Exception as e:
+            if self.running:
+                self.engine.log("Error", f"Error en el bucle de eventos: {str(e)}", "#d13438")
+        finally:
+            self._shutdown()
+
+    def _accept(self):
+        while True:
+            if self.admission.policy == POLICY_QUEUE and not self.admission.has_capacity():
+                self._pause_accepting()
+                return
+            try:
+                sock, address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            if not self.admission.try_admit():
+                self._log_rejected(address, "máximo de sesiones alcanzado")
+                try:
+                    # Mejor esfuerzo: la trama es chica y el buffer del socket está vacío
+                    sock.send(encode_frame(rejection_frame("Servidor saturado, reintente más tarde")))
+                except OSError:
+                    pass
+                sock.close()
+                continue
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            configure_keepalive(sock, self.keepalive)
+            conn = SelectorConnection(sock, address, self._new_queue(), next(self._conn_ids))
+            self._connections[conn.fd] = conn
+            self.selector.register(sock, selectors.EVENT_READ, conn)
+            self._changed()
+
+    def _drain_wake(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        if not self.accepting and self.server_socket is not None:
+            self._close_listener()
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        for conn in pending:
+            if not self._is_open(conn):
+                continue
+            if conn.outbound.closed:
+                self._close(conn)
+            elif not conn.outbuf:
+                # Si ya hay datos pendientes, EVENT_WRITE está registrado y
+                # _flush() sacará más mensajes de la cola cuando haya espacio
+                self._flush(conn)
+
+    def _close_listener(self):
+        if not self._accept_paused:
+            try:
+                self.selector.unregister(self.server_socket)
+            except (KeyError, ValueError):
+                pass
+        self.server_socket.close()
+        self.server_socket = None
+
+    def _pause_accepting(self):
+        if not self._accept_paused:
+            self.selector.unregister(self.server_socket)
+            self._accept_paused = True
+
+    def _resume_accepting(self):
+        if self._accept_paused and self.accepting and self.server_socket is not None:
+            self.selector.register(self.server_socket, selectors.EVENT_READ, None)
+            self._accept_paused = False
+
+    def _read(self, conn: SelectorConnection):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(conn)
+            return
+        try:
+            frames = conn.decoder.feed(data)
+        except ValueError as e:
+            self.engine.log("Error", f"Error con cliente {conn.address[0]}: {str(e)}", "#d13438")
+            self._close(conn)
+            return
+        for frame in frames:
+            if conn.closing or not self._is_open(conn):
+                return
+            self._capture(conn, DIRECTION_IN, frame)
+            if conn.session is None:
+                # Un solo hilo: el turno de handshake siempre está libre aquí,
+                # pero se toma igual para que los contadores sean comparables
+                derive = self.engine.needs_key_derivation(frame)
+                if derive:
+                    self.admission.acquire_handshake()
+                try:
+                    conn.session, replies = self.engine.open_session(conn.address, frame, self.admission)
+                except Exception as e:
+                    self.engine.log("Error", f"Error con cliente {conn.address[0]}: {str(e)}", "#d13438")
+                    self._close(conn)
+                    return
+                finally:
+                    if derive:
+                        self.admission.release_handshake()
+                for reply in replies:
+                    self._queue(conn, reply)
+            else:
+                replies, close = self.engine.handle_message(conn.session, frame)
+                for reply in replies:
+                    self._queue(conn, reply)
+                if close:
+                    conn.closing = True
+        if conn.closing and not conn.outbuf:
+            self._close(conn)
+
+    def _is_open(self, conn: SelectorConnection) -> bool:
+        return self._connections.get(conn.fd) is conn
+
+    def _queue(self, conn: SelectorConnection, payload: bytes):
+        had_pending = bool(conn.outbuf)
+        self._capture(conn, DIRECTION_OUT, payload)
+        conn.outbuf += encode_frame(payload)
+        if not had_pending:
+            # Intentar enviar de inmediato; solo se pide EVENT_WRITE si queda resto
+            self._flush(conn)
+
+    def _flush(self, conn: SelectorConnection):
+        # Sacar mensajes de la cola de salida mientras el buffer tenga espacio
+        while len(conn.outbuf) < OUTBUF_HIGH_WATER:
+            payload = conn.outbound.get_nowait()
+            if payload is None:
+                break
+            self._capture(conn, DIRECTION_OUT, payload)
+            conn.outbuf += encode_frame(payload)
+        sent = 0
+        if conn.outbuf:
+            try:
+                sent = conn.sock.send(conn.outbuf)
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self._close(conn)
+                return
+        del conn.outbuf[:sent]
+        events = selectors.EVENT_READ
+        if conn.outbuf or len(conn.outbound):
+            events |= selectors.EVENT_WRITE
+        elif conn.closing:
+            self._close(conn)
+            return
+        self.selector.modify(conn.sock, events, conn)
+
+    def _close(self, conn: SelectorConnection):
+        if not self._is_open(conn):
+            return
+        del self._connections[conn.fd]
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        self.admission.release_session()
+        self._resume_accepting()
+        conn.outbound.close()
+        self.engine.close_session(conn.session)
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+        self.engine.log("Desconexión", f"Cliente {conn.address[0]}:{conn.address[1]} desconectado", "#ffb900")
+        self._changed()
+
+    def _shutdown(self):
+        for conn in list(self._connections.values()):
+            conn.outbound.close()
+            try:
+                conn.sock.close()
+            except OSError:
+                pass
+        self._connections.clear()
+        self.fanout.shutdown()
+        self.engine.sessions.clear()
+        for sock in (self.server_socket, self._wake_r, self._wake_w):
+            if sock is not None:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+        if self.selector is not None:
+            self.selector.close()
+
+
+# Backends disponibles por nombre
+BACKENDS = {
+    ThreadedBackend.name: ThreadedBackend,
+    SelectorBackend.name: SelectorBackend,
+}
@@ -0,0 +1,320 @@
+"""
+ServerSupervisor.py
+-------------------
+Modo supervisor del servidor: reparte la carga entre N procesos.
+
+La derivación de llaves y las funciones reversibles son Python puro, así que
+un solo proceso queda limitado por el GIL a un núcleo. El supervisor crea N
+procesos worker; cada uno hace bind a host:puerto con SO_REUSEPORT (el kernel
+reparte las conexiones entre ellos) y tiene su propio ServerEngine con su
+propio registro de sesiones.
+
+El archivo se encarga únicamente de:
+ - Lanzar y supervisar los workers (relanza los que terminan solos).
+ - Recoger y agregar las estadísticas que cada worker reporta.
+ - Vaciado ordenado (graceful drain) al detener: los workers dejan de
+   aceptar conexiones y esperan a que terminen las activas (con límite).
+
+USO: python ServerSupervisor.py --workers 4 --backend selector
+"""
+
+import argparse
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+from Admission import DEFAULT_MAX_HANDSHAKES, POLICIES as ADMISSION_POLICIES, POLICY_QUEUE, AdmissionController
+from Capture import CaptureWriter
+from Metrics import MetricsRegistry, MetricsServer, merge_snapshots
+from Resumption import generate_ticket_key
+from SeedAndPrimes import generate_node_id, generate_prime, generate_seed
+from ServerEngine import BACKENDS, DEFAULT_BACKLOG, ServerEngine
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Cada cuánto reporta un worker sus estadísticas (segundos)
+STATS_INTERVAL = 1.0
+
+# Tiempo máximo de espera para que terminen las conexiones al detener
+DEFAULT_DRAIN_TIMEOUT = 10.0
+
+
+# ============================================================
+# Proceso worker
+# ============================================================
+
+def _worker_main(index, host, port, server_params, backend_name, backlog, admission_options,
+                 backend_options, stats_queue, stop_conn, drain_timeout, verbose, capture_path):
+    """Punto de entrada de cada proceso worker."""
+    # El supervisor decide cuándo parar: el worker ignora Ctrl+C directo
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    on_log = None
+    if verbose:
+        def on_log(sender, message, color="#ffffff"):
+            print(f"[worker {index}] {sender}: {message}", flush=True)
+
+    node_id, Q, S_server, ticket_key = server_params
+    # Registro propio: con fork se heredarían las observaciones del supervisor
+    engine = ServerEngine(node_id, Q, S_server, on_log=on_log, ticket_key=ticket_key,
+                          metrics=MetricsRegistry())
+    # Un archivo de captura por worker (PREFIJO.N)
+    capture = CaptureWriter(f"{capture_path}.{index}") if capture_path else None
+    backend = BACKENDS[backend_name](engine, host, port, backlog=backlog, reuse_port=True,
+                                     admission=AdmissionController(**admission_options),
+                                     capture=capture, **backend_options)
+    backend.start()
+
+    def report(state):
+        stats = backend.stats()
+        stats.update(worker=index, state=state, metrics=engine.metrics.snapshot())
+        stats_queue.put(stats)
+
+    try:
+        # El supervisor escribe en el pipe para pedir la parada
+        while not stop_conn.poll(STATS_INTERVAL):
+            report("running")
+
+        # Vaciado: no aceptar más y esperar a las conexiones activas
+        backend.stop_accepting()
+        deadline = time.monotonic() + drain_timeout
+        while backend.connection_count() and time.monotonic() < deadline:
+            report("draining")
+            time.sleep(min(STATS_INTERVAL, max(0.0, deadline - time.monotonic())))
+    finally:
+        backend.stop()
+        if capture is not None:
+            capture.close()
+        report("stopped")
+
+
+# ============================================================
+# Supervisor
+# ============================================================
+
+class ServerSupervisor:
+    """Lanza N workers con SO_REUSEPORT y agrega sus estadísticas."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 65432, *, workers: int = None,
+                 backend: str = "selector", backlog: int = DEFAULT_BACKLOG,
+                 max_sessions: int = None, max_handshakes: int = DEFAULT_MAX_HANDSHAKES,
+                 admission_policy: str = POLICY_QUEUE,
+                 idle_timeout: float = None, memory_budget: int = None,
+                 drain_timeout: float = DEFAULT_DRAIN_TIMEOUT, verbose: bool = False,
+                 capture_path: str = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend}")
+        self.host = host
+        self.port = port
+        self.workers = workers or multiprocessing.cpu_count()
+        self.backend = backend
+        self.backlog = backlog
+        # Límites por worker (cada proceso tiene su propio controlador)
+        self.admission_options = {
+            "max_sessions": max_sessions,
+            "max_handshakes": max_handshakes,
+            "policy": admission_policy,
+        }
+        # Expulsión de sesiones inactivas y presupuesto de memoria (por worker)
+        self.backend_options = {
+            "idle_timeout": idle_timeout,
+            "memory_budget": memory_budget,
+        }
+        self.drain_timeout = drain_timeout
+        self.verbose = verbose
+        self.capture_path = capture_path  # Prefijo de los archivos de captura (None = sin captura)
+
+        # Todos los workers presentan la misma identidad de servidor (Q, S) y
+        # comparten la llave de tickets: un cliente puede reanudar en cualquiera
+        self.server_params = (
+            generate_node_id(tag="server"),
+            generate_prime(tag="server"),
+            generate_seed(tag="server"),
+            generate_ticket_key(),
+        )
+
+        self._ctx = multiprocessing.get_context("fork")
+        self._stats_queue = self._ctx.Queue()
+        # Aviso de parada: un pipe por worker. Con un Event compartido, un
+        # worker que muere mientras lo espera deja set() bloqueado para siempre
+        self._stop_pipes = []
+        self._stopping = False
+        self._processes = []
+        self.restarts = 0
+        self._latest = {}
+        self._poll_lock = threading.Lock()
+
+    def _spawn(self, index: int) -> tuple:
+        """Lanza el worker `index`; retorna (proceso, extremo del pipe de parada)."""
+        stop_reader, stop_writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.host, self.port, self.server_params, self.backend,
+                  self.backlog, self.admission_options, self.backend_options, self._stats_queue, stop_reader,
+                  self.drain_timeout, self.verbose, self.capture_path),
+            name=f"crypto-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        stop_reader.close()
+        return process, stop_writer
+
+    def start(self):
+        """Crea los procesos worker."""
+        self._processes, self._stop_pipes = [], []
+        for index in range(self.workers):
+            process, stop_writer = self._spawn(index)
+            self._processes.append(process)
+            self._stop_pipes.append(stop_writer)
+
+    def restart_dead(self) -> int:
+        """
+        Relanza los workers que terminaron sin que se pidiera detenerlos
+        (p. ej. un fallo o una señal). Retorna cuántos se relanzaron.
+
+        El worker nuevo hace bind al mismo puerto y reporta con el mismo
+        índice; sus contadores empiezan de cero.
+        """
+        if self._stopping:
+            return 0
+        restarted = 0
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            process.join()
+            self._stop_pipes[index].close()
+            self._processes[index], self._stop_pipes[index] = self._spawn(index)
+            restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def poll_stats(self) -> dict:
+        """Lee los reportes pendientes y retorna las estadísticas agregadas."""
+        with self._poll_lock:
+            while True:
+                try:
+                    stats = self._stats_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._latest[stats["worker"]] = stats
+        return self.aggregate_stats()
+
+    def aggregate_stats(self) -> dict:
+        """Suma los últimos contadores de cada worker."""
+        total = {"workers": len(self._latest), "restarts": self.restarts}
+        for stats in self._latest.values():
+            for name, value in stats.items():
+                if name in ("worker", "state", "metrics"):
+                    continue
+                if name in ("admission_peak_sessions", "reaper_resident_bytes_per_session"):
+                    total[name] = max(total.get(name, 0), value)
+                else:
+                    total[name] = total.get(name, 0) + value
+        total["per_worker"] = {index: {k: v for k, v in stats.items() if k != "metrics"}
+                               for index, stats in sorted(self._latest.items())}
+        return total
+
+    def metrics_snapshot(self) -> dict:
+        """Métricas (contadores e histogramas) sumadas de todos los workers."""
+        self.poll_stats()
+        return merge_snapshots([stats["metrics"] for stats in list(self._latest.values())
+                                if "metrics" in stats])
+
+    def alive(self) -> int:
+        return sum(1 for process in self._processes if process.is_alive())
+
+    def stop(self):
+        """Vaciado ordenado: avisa a los workers y espera a que terminen."""
+        self._stopping = True
+        for stop_writer in self._stop_pipes:
+            try:
+                stop_writer.send(True)
+            except OSError:
+                pass  # el worker ya terminó
+        deadline = time.monotonic() + self.drain_timeout + 2 * STATS_INTERVAL
+        for process in self._processes:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        return self.poll_stats()
+
+
+# ============================================================
+# Ejecución directa
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor multi-proceso con SO_REUSEPORT")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--workers", type=int, default=None, help="por defecto: número de CPUs")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="selector")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG)
+    parser.add_argument("--max-sessions", type=int, default=None, help="por worker")
+    parser.add_argument("--max-handshakes", type=int, default=DEFAULT_MAX_HANDSHAKES, help="por worker")
+    parser.add_argument("--admission-policy", choices=ADMISSION_POLICIES, default=POLICY_QUEUE)
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="expulsar sesiones sin actividad tras N segundos")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="MiB por worker; al superarlo se expulsa a las menos activas")
+    parser.add_argument("--drain-timeout", type=float, default=DEFAULT_DRAIN_TIMEOUT)
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="servir las métricas agregadas en http://127.0.0.1:PUERTO/metrics")
+    parser.add_argument("--verbose", action="store_true", help="mostrar el log de cada worker")
+    parser.add_argument("--capture", default=None, metavar="PREFIJO",
+                        help="grabar las tramas de cada worker en PREFIJO.N (ver replay.py)")
+    args = parser.parse_args()
+
+    supervisor = ServerSupervisor(args.host, args.port, workers=args.workers,
+                                  backend=args.backend, backlog=args.backlog,
+                                  max_sessions=args.max_sessions, max_handshakes=args.max_handshakes,
+                                  admission_policy=args.admission_policy,
+                                  idle_timeout=args.idle_timeout,
+                                  memory_budget=int(args.memory_budget * 1024 * 1024) if args.memory_budget else None,
+                                  drain_timeout=args.drain_timeout, verbose=args.verbose,
+                                  capture_path=args.capture)
+    supervisor.start()
+    print(f"Supervisor: {supervisor.workers} workers ({args.backend}) en {args.host}:{args.port}")
+
+    metrics_server = None
+    if args.metrics_port is not None:
+        # El perfilador vería al supervisor y no a los workers: sin /profile/*
+        metrics_server = MetricsServer(supervisor.metrics_snapshot, port=args.metrics_port, profiler=None)
+        metrics_server.start()
+        print(f"Métricas en http://127.0.0.1:{metrics_server.address[1]}/metrics")
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        while not stopping and supervisor.alive():
+            time.sleep(5 * STATS_INTERVAL)
+            restarted = supervisor.restart_dead()
+            if restarted:
+                print(f"Supervisor: {restarted} worker(s) relanzado(s)", flush=True)
+            stats = supervisor.poll_stats()
+            print(f"Sesiones activas: {stats.get('active_sessions', 0)} | "
+                  f"handshakes: {stats.get('handshakes', 0)} | "
+                  f"reanudaciones: {stats.get('resumptions', 0)} | "
+                  f"mensajes: {stats.get('messages_in', 0)} | "
+                  f"expulsiones: {stats.get('evictions', 0)} | "
+                  f"rechazos: {stats.get('admission_rejected_sessions', 0) + stats.get('admission_rejected_handshakes', 0)} | "
+                  f"errores: {stats.get('errors', 0)}", flush=True)
+    except KeyboardInterrupt:
+        pass
+
+    print("Supervisor: vaciando conexiones...")
+    if metrics_server is not None:
+        metrics_server.stop()
+    stats = supervisor.stop()
+    print(f"Supervisor detenido. Handshakes: {stats.get('handshakes', 0)}, "
+          f"mensajes: {stats.get('messages_in', 0)}")
+
+
+if __name__ == "__main__":
+    main()
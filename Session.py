@@ -0,0 +1,359 @@
+"""
+Session.py
+----------
+Estado por sesión del modelo de cifrado polimórfico y registro de sesiones
+compartido entre los hilos del servidor.
+
+El archivo se encarga únicamente de:
+ - Definir la clase Session (con __slots__) que guarda las dos tablas de
+   llaves (una por dirección), sus índices y PSN, y los contadores de cada sesión.
+ - Definir SessionRegistry, un registro particionado (sharded) y protegido
+   con locks, con búsqueda O(1) por ID de sesión.
+ - Definir SessionEvents, el feed de cambios (apertura, avance de llave/PSN,
+   cierre) que consume el monitor de llaves.
+
+NO incluye:
+ - Generación de llaves (va en KeyGenerator.py).
+ - Cifrado ni manejo del PSN (va en PSN.py).
+ - Lógica de sockets o de interfaz gráfica.
+"""
+
+import collections
+import itertools
+import sys
+import threading
+import time
+
+from PSN import ESQUEMAS, extract_psn_from_plaintext_using_instruction
+
+# ============================================================
+# Constantes globales
+# ============================================================
+
+# Número de particiones del registro (cada una con su propio lock)
+DEFAULT_SHARDS = 16
+
+# Eventos pendientes que guarda el feed antes de descartar los más antiguos
+DEFAULT_EVENT_BACKLOG = 4096
+
+# Tipos de evento del feed
+EVENT_OPENED = "opened"
+EVENT_ADVANCED = "advanced"
+EVENT_CLOSED = "closed"
+
+
+def key_fingerprint(key: int) -> str:
+    """Huella visual de una llave (8 dígitos hex), la que muestra el monitor."""
+    return f"{hash(key) & 0xFFFFFFFF:08X}"
+
+
+# ============================================================
+# Feed de eventos
+# ============================================================
+
+class SessionEvents:
+    """
+    Feed de cambios de sesión (apertura, avance de llave/PSN, cierre).
+
+    Mientras nadie lo observa (enabled=False) publicar no cuesta más que
+    leer un atributo. El monitor lo activa, lo vacía periódicamente con
+    drain() y solo actualiza lo que cambió.
+    """
+
+    def __init__(self, maxlen: int = DEFAULT_EVENT_BACKLOG):
+        self.enabled = False
+        self.overflowed = False
+        self._events = collections.deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def publish(self, kind: str, session_id: int, key_index: int = 0, next_psn: int = 0):
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.overflowed = True
+            self._events.append((kind, session_id, key_index, next_psn))
+
+    def drain(self) -> tuple:
+        """
+        Retorna (eventos pendientes, se_perdieron_eventos). Si se perdieron,
+        quien observa debe releer el estado completo.
+        """
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            overflowed, self.overflowed = self.overflowed, False
+        return events, overflowed
+
+    def watch(self):
+        with self._lock:
+            self._events.clear()
+            self.overflowed = False
+        self.enabled = True
+
+    def unwatch(self):
+        self.enabled = False
+        with self._lock:
+            self._events.clear()
+
+
+# ============================================================
+# Sesión
+# ============================================================
+
+class Session:
+    """
+    Estado de una sesión cliente-servidor.
+
+    Usa __slots__ para reducir la memoria por sesión y concentra en un solo
+    lugar la contabilidad de llave/PSN y los contadores por sesión.
+    Las mutaciones se hacen bajo `self.lock`, de modo que el monitor pueda
+    leer una instantánea consistente desde otro hilo.
+
+    Vista desde el servidor hay dos flujos independientes:
+     - Recepción (cliente->servidor): key_table, key_index, next_psn.
+     - Envío (servidor->cliente): send_table, send_index, send_psn.
+    """
+
+    __slots__ = (
+        "session_id",
+        "address",
+        "key_table",
+        "key_fingerprints",
+        "table_bytes",
+        "key_index",
+        "next_psn",
+        "next_instruction",
+        "next_seq",
+        "key_regeneration_count",
+        "send_table",
+        "send_index",
+        "send_psn",
+        "compress_threshold",
+        "messages_in",
+        "messages_out",
+        "bytes_in",
+        "bytes_out",
+        "created_at",
+        "last_activity",
+        "lock",
+        "events",
+    )
+
+    def __init__(self, session_id: int, address, key_table: list, send_table: list,
+                 events: SessionEvents = None):
+        self.session_id = session_id
+        self.address = address
+        self.key_table = key_table
+        self.send_table = send_table
+        # Se calculan una vez al derivar la tabla (el monitor no rehace hash())
+        self.key_fingerprints = tuple(key_fingerprint(key) for key in key_table)
+        # La tabla no cambia: su tamaño se mide una vez
+        self.table_bytes = (sys.getsizeof(key_table) + sum(sys.getsizeof(key) for key in key_table)
+                            + sys.getsizeof(send_table) + sum(sys.getsizeof(key) for key in send_table)
+                            + sys.getsizeof(self.key_fingerprints)
+                            + sum(sys.getsizeof(fp) for fp in self.key_fingerprints))
+        self.key_index = 0
+        self.next_psn = 0
+        self.next_instruction = None
+        self.next_seq = 0  # Secuencia esperada en modo segmentado (por conexión)
+        self.key_regeneration_count = 0
+        self.send_index = 0
+        self.send_psn = 0
+        self.compress_threshold = None  # Umbral de compresión si se acordó en el FCM (Compression.py)
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.created_at = time.monotonic()
+        self.last_activity = self.created_at
+        self.lock = threading.Lock()
+        self.events = events
+
+    def current_key(self) -> bytes:
+        """Llave de recepción actual como 8 bytes (big endian)."""
+        return self.key_table[self.key_index].to_bytes(8, "big")
+
+    def current_send_key(self) -> bytes:
+        """Llave de envío actual como 8 bytes (big endian)."""
+        return self.send_table[self.send_index].to_bytes(8, "big")
+
+    def advance(self, plaintext: bytes, instruction: dict):
+        """
+        Avanza el flujo de recepción tras procesar un mensaje del cliente.
+
+        - Calcula el próximo PSN a partir del texto plano y la instrucción.
+        - Avanza el índice de llave (circular) y la secuencia.
+        - Incrementa el contador de regeneración al cerrar un ciclo.
+
+        Retorna:
+            tuple: (psn_anterior, indice_anterior)
+        """
+        next_psn = extract_psn_from_plaintext_using_instruction(plaintext, instruction)
+        with self.lock:
+            old_psn = self.next_psn
+            old_index = self.key_index
+            self.next_psn = next_psn
+            self.next_instruction = instruction
+            self.key_index = (old_index + 1) % len(self.key_table)
+            self.next_seq = (self.next_seq + 1) & 0xFFFFFFFF
+            if old_index == len(self.key_table) - 1:
+                self.key_regeneration_count += 1
+            new_index = self.key_index
+        if self.events is not None:
+            self.events.publish(EVENT_ADVANCED, self.session_id, new_index, next_psn)
+        return old_psn, old_index
+
+    def advance_send(self, plaintext: bytes):
+        """
+        Avanza el flujo de envío tras cifrar un mensaje para el cliente.
+        El próximo PSN sale del texto enviado con el esquema del PSN usado.
+
+        Retorna:
+            tuple: (psn_usado, indice_usado)
+        """
+        with self.lock:
+            old_psn = self.send_psn
+            old_index = self.send_index
+            self.send_psn = extract_psn_from_plaintext_using_instruction(
+                plaintext, ESQUEMAS[old_psn]["next_extraction"])
+            self.send_index = (old_index + 1) % len(self.send_table)
+        return old_psn, old_index
+
+    def restore(self, key_index: int, next_psn: int, send_index: int = 0, send_psn: int = 0,
+                key_regeneration_count: int = 0):
+        """Coloca la sesión en un punto guardado (reanudación con ticket)."""
+        with self.lock:
+            self.key_index = key_index % len(self.key_table)
+            self.next_psn = next_psn
+            self.send_index = send_index % len(self.send_table)
+            self.send_psn = send_psn
+            self.key_regeneration_count = key_regeneration_count
+        if self.events is not None:
+            self.events.publish(EVENT_ADVANCED, self.session_id, self.key_index, next_psn)
+
+    def touch(self):
+        """Marca actividad sin contar un mensaje cifrado (p. ej. texto claro)."""
+        self.last_activity = time.monotonic()
+
+    def resident_bytes(self) -> int:
+        """Bytes residentes estimados de la sesión (objeto + tabla de llaves)."""
+        return sys.getsizeof(self) + self.table_bytes
+
+    def record_in(self, nbytes: int):
+        """Registra un mensaje recibido de `nbytes` bytes."""
+        with self.lock:
+            self.messages_in += 1
+            self.bytes_in += nbytes
+            self.last_activity = time.monotonic()
+
+    def record_out(self, nbytes: int):
+        """Registra un mensaje enviado de `nbytes` bytes."""
+        with self.lock:
+            self.messages_out += 1
+            self.bytes_out += nbytes
+            self.last_activity = time.monotonic()
+
+    def snapshot(self) -> dict:
+        """Copia consistente del estado para lectura desde otros hilos."""
+        with self.lock:
+            return {
+                "session_id": self.session_id,
+                "address": self.address,
+                "key_table": tuple(self.key_table),
+                "key_fingerprints": self.key_fingerprints,
+                "key_index": self.key_index,
+                "next_psn": self.next_psn,
+                "key_regeneration_count": self.key_regeneration_count,
+                "send_index": self.send_index,
+                "send_psn": self.send_psn,
+                "messages_in": self.messages_in,
+                "messages_out": self.messages_out,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "last_activity": self.last_activity,
+            }
+
+    def label(self) -> str:
+        """Etiqueta legible de la sesión: '#id ip:puerto'."""
+        return f"#{self.session_id} {self.address[0]}:{self.address[1]}"
+
+
+# ============================================================
+# Registro de sesiones
+# ============================================================
+
+class SessionRegistry:
+    """
+    Registro de sesiones particionado por ID.
+
+    Cada partición tiene su propio diccionario y su propio lock, así los
+    hilos de distintos clientes no compiten por un único lock global.
+    La búsqueda por ID es O(1): partición = session_id % n_shards.
+    """
+
+    def __init__(self, shards: int = DEFAULT_SHARDS):
+        if shards < 1:
+            raise ValueError("shards debe ser >= 1")
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._ids = itertools.count(1)
+        self._ids_lock = threading.Lock()
+        self.events = SessionEvents()
+
+    def _shard(self, session_id: int) -> int:
+        return session_id % len(self._shards)
+
+    def create(self, address, key_table: list, send_table: list) -> Session:
+        """Crea y registra una nueva sesión con un ID único."""
+        with self._ids_lock:
+            session_id = next(self._ids)
+        session = Session(session_id, address, key_table, send_table, self.events)
+        i = self._shard(session_id)
+        with self._locks[i]:
+            self._shards[i][session_id] = session
+        self.events.publish(EVENT_OPENED, session_id)
+        return session
+
+    def get(self, session_id: int):
+        """Retorna la sesión con ese ID, o None si no existe."""
+        i = self._shard(session_id)
+        with self._locks[i]:
+            return self._shards[i].get(session_id)
+
+    def remove(self, session_id: int):
+        """Elimina la sesión y la retorna (None si ya no existía)."""
+        i = self._shard(session_id)
+        with self._locks[i]:
+            session = self._shards[i].pop(session_id, None)
+        if session is not None:
+            self.events.publish(EVENT_CLOSED, session_id)
+        return session
+
+    def sessions(self) -> list:
+        """Lista de sesiones activas ordenada por ID (copia segura para iterar)."""
+        result = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                result.extend(shard.values())
+        result.sort(key=lambda s: s.session_id)
+        return result
+
+    def clear(self):
+        """Elimina todas las sesiones."""
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                removed = list(shard)
+                shard.clear()
+            for session_id in removed:
+                self.events.publish(EVENT_CLOSED, session_id)
+
+    def __len__(self):
+        total = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                total += len(shard)
+        return total
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
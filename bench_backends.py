@@ -0,0 +1,174 @@
+# bench_backends.py
+# Compara la latencia (p50 / p99) de los backends del servidor de ServerEngine.py.
+# Levanta cada backend en un puerto libre de 127.0.0.1, conecta varios clientes
+# concurrentes que hacen el handshake FCM y envían mensajes RM cifrados,
+# y mide el tiempo de ida y vuelta de cada mensaje.
+# Con ventana > 1 usa el modo segmentado de Pipeline.py (DeviceClient con hasta W mensajes en vuelo).
+# Con lote > 0 agrupa los mensajes en tramas [BATCH] de hasta ese número de bytes (Coalescing.Coalescer
+# sobre DeviceClient.send_batch).
+# USO: python bench_backends.py [clientes] [mensajes_por_cliente] [ventana] [lote_bytes]
+
+import collections
+import queue
+import socket
+import sys
+import threading
+import time
+
+from tabulate import tabulate
+
+from ClientProtocol import ClientProtocol
+from Coalescing import Coalescer
+from DeviceClient import DeviceClient
+from Framing import FRAME_HEADER, recv_frame, send_frame
+from Handshake import encode_params, parse_params
+from KeyGenerator import generate_directional_key_tables
+from PSN import ESQUEMAS, encrypt_message, decrypt_message, extract_psn_from_plaintext_using_instruction
+from SeedAndPrimes import DEFAULT_N_KEYS, SharedParams, generate_node_id, generate_prime, generate_seed
+from ServerEngine import BACKENDS, ServerEngine
+
+NUM_CLIENTES = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+NUM_MENSAJES = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+VENTANA = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+LOTE = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+MENSAJE = b"sensor=23.5C;hum=41%;bat=3.71V"
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+def cliente(address, P, S_client, latencias, lock):
+    """Handshake FCM + NUM_MENSAJES mensajes RM cifrados (segmentados o agrupados: con DeviceClient)."""
+    if LOTE > 0 or VENTANA > 1:
+        propias = agrupado(address, P, S_client) if LOTE > 0 else segmentado(address, P, S_client)
+        with lock:
+            latencias.extend(propias)
+        return
+    with socket.create_connection(address) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_frame(sock, encode_params(0, P, S_client))
+        server_params = parse_params(recv_frame(sock))
+        Q_server, S_server = server_params.prime, server_params.seed
+        shared = SharedParams(id=0, P=P, Q=Q_server, S=S_client ^ S_server, N=DEFAULT_N_KEYS)
+        key_table, recv_table = generate_directional_key_tables(shared)
+
+        key_index = recv_index = 0
+        psn = 0
+        propias = []
+        for _ in range(NUM_MENSAJES):
+            inicio = time.perf_counter()
+            send_frame(sock, encrypt_message(MENSAJE, psn, key_table[key_index].to_bytes(8, "big")))
+            decrypt_message(recv_frame(sock), recv_table[recv_index].to_bytes(8, "big"))
+            propias.append(time.perf_counter() - inicio)
+
+            # Misma contabilidad que el servidor: PSN según el esquema usado, un flujo por dirección
+            instruction = ESQUEMAS[psn]["next_extraction"]
+            psn = extract_psn_from_plaintext_using_instruction(MENSAJE, instruction)
+            key_index = (key_index + 1) % len(key_table)
+            recv_index = (recv_index + 1) % len(recv_table)
+    with lock:
+        latencias.extend(propias)
+
+
+def segmentado(address, P, S_client):
+    """
+    Envía con hasta VENTANA mensajes en vuelo (DeviceClient en modo segmentado);
+    la latencia incluye la espera en la ventana.
+    """
+    client = DeviceClient(*address, protocol=ClientProtocol(P=P, S=S_client, compression=False), window=VENTANA)
+    client.connect(resume=False)
+    enviados = collections.deque()  # momento de envío de cada mensaje en vuelo, en orden
+    propias = []
+
+    def recibir():
+        client.recv()
+        propias.append(time.perf_counter() - enviados.popleft())
+
+    for _ in range(NUM_MENSAJES):
+        # Leer antes de que send() tenga que esperar lugar: así cada respuesta se mide al llegar
+        if len(client.protocol.in_flight) >= VENTANA:
+            recibir()
+        enviados.append(time.perf_counter())
+        client.send(MENSAJE)
+    while enviados:
+        recibir()
+    client.close()
+    return propias
+
+
+def agrupado(address, P, S_client):
+    """
+    Agrupa los mensajes en lotes de hasta LOTE bytes con DeviceClient.send_batch();
+    la latencia incluye la espera en el lote.
+    """
+    # Sin compresión, como los demás modos (el cliente mínimo no la ofrece)
+    client = DeviceClient(*address, protocol=ClientProtocol(P=P, S=S_client, compression=False))
+    client.connect(resume=False)
+    instantes = collections.deque()  # momento en que se agregó cada mensaje, en orden
+    lotes = queue.Queue()            # mensajes por lote enviado, en orden
+
+    def enviar_lote(mensajes):
+        lotes.put(len(mensajes))
+        client.send_batch(mensajes)
+
+    propias = []
+
+    def recibir():
+        while len(propias) < NUM_MENSAJES:
+            client.recv()
+            ahora = time.perf_counter()
+            for _ in range(lotes.get()):
+                propias.append(ahora - instantes.popleft())
+
+    # El temporizador del agrupador envía y este hilo recibe (flujos separados, sin plazos)
+    receptor = threading.Thread(target=recibir)
+    receptor.start()
+    coalescer = Coalescer(enviar_lote, max_bytes=LOTE)
+    for _ in range(NUM_MENSAJES):
+        instantes.append(time.perf_counter())
+        coalescer.add(MENSAJE)
+    coalescer.close()
+    receptor.join()
+    client.close()
+    return propias
+
+
+def medir(nombre):
+    engine = ServerEngine(generate_node_id(), generate_prime(), generate_seed())
+    backend = BACKENDS[nombre](engine, "127.0.0.1", 0, backlog=128)
+    backend.start()
+    try:
+        params = [(generate_prime(), generate_seed()) for _ in range(NUM_CLIENTES)]
+        latencias = []
+        lock = threading.Lock()
+        hilos = [threading.Thread(target=cliente, args=(backend.address, P, S, latencias, lock))
+                 for P, S in params]
+        inicio = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        total = time.perf_counter() - inicio
+        stats = engine.stats()
+    finally:
+        backend.stop()
+    return [
+        nombre,
+        len(latencias),
+        f"{percentil(latencias, 50) * 1e6:.1f} µs",
+        f"{percentil(latencias, 99) * 1e6:.1f} µs",
+        f"{len(latencias) / total:.0f}",
+        # Bytes en el cable cliente->servidor por mensaje (con la cabecera de la trama)
+        f"{(stats['bytes_in'] + FRAME_HEADER.size * stats['messages_in']) / len(latencias):.1f}",
+    ]
+
+
+if __name__ == "__main__":
+    resultados = [medir(nombre) for nombre in BACKENDS]
+    print(f"=== Latencia por backend ({NUM_CLIENTES} clientes x {NUM_MENSAJES} mensajes, ventana {VENTANA}, lote {LOTE} B) ===")
+    print(tabulate(resultados,
+                   headers=["Backend", "Mensajes", "p50", "p99", "Mensajes/s", "Bytes/mensaje"],
+                   tablefmt="fancy_grid"))
@@ -0,0 +1,64 @@
+# bench_compression.py
+# Mide el efecto de la compresión opcional (Compression.py) sobre encrypt_message / decrypt_message.
+# Para cada tipo de carga compara los bytes en el cable (nonce + payload cifrado + etiqueta GCM)
+# y el tiempo de CPU de cifrar + descifrar, sin compresión y con compresión zlib.
+# USO: python bench_compression.py [repeticiones] [umbral_bytes]
+
+import json
+import os
+import sys
+import time
+
+from tabulate import tabulate
+
+from Compression import DEFAULT_COMPRESS_THRESHOLD
+from PSN import encrypt_message, decrypt_message
+
+REPETICIONES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+UMBRAL = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_COMPRESS_THRESHOLD
+LLAVE = os.urandom(8)
+
+
+def lectura(i):
+    return {"sensor": f"nodo-{i:03d}", "temp": 23.5 + i % 7, "hum": 41 + i % 5, "bat": 3.71, "ts": 1700000000 + i}
+
+
+CARGAS = [
+    ("Lectura corta", b"sensor=23.5C;hum=41%;bat=3.71V"),
+    ("JSON ~200 B", json.dumps({"lecturas": [lectura(i) for i in range(2)]}).encode()),
+    ("JSON ~1 KB", json.dumps({"lecturas": [lectura(i) for i in range(10)]}).encode()),
+    ("Log ~4 KB", "\n".join(f"2025-01-01T00:00:{i % 60:02d} INFO nodo-{i % 8} lectura ok temp=23.{i % 10}"
+                            for i in range(64)).encode()),
+    ("Aleatorio 1 KB", os.urandom(1024)),
+]
+
+
+def medir(plaintext, threshold):
+    """Bytes del mensaje cifrado y µs por cifrar + descifrar."""
+    mensaje = encrypt_message(plaintext, 0, LLAVE, compress_threshold=threshold)
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        cifrado = encrypt_message(plaintext, 0, LLAVE, compress_threshold=threshold)
+        assert decrypt_message(cifrado, LLAVE)["plaintext"] == plaintext
+    return len(mensaje), (time.perf_counter() - inicio) / REPETICIONES * 1e6
+
+
+if __name__ == "__main__":
+    resultados = []
+    for nombre, plaintext in CARGAS:
+        bytes_sin, us_sin = medir(plaintext, None)
+        bytes_con, us_con = medir(plaintext, UMBRAL)
+        resultados.append([
+            nombre,
+            len(plaintext),
+            bytes_sin,
+            bytes_con,
+            f"{bytes_con / bytes_sin:.0%}",
+            f"{us_sin:.1f} µs",
+            f"{us_con:.1f} µs",
+        ])
+    print(f"=== Compresión zlib (umbral {UMBRAL} B, {REPETICIONES} repeticiones) ===")
+    print(tabulate(resultados,
+                   headers=["Carga", "Texto", "Cable sin", "Cable con", "Tamaño",
+                            "CPU sin", "CPU con"],
+                   tablefmt="fancy_grid"))
@@ -0,0 +1,245 @@
+# bench_suite.py
+# Suite de benchmarks de punta a punta con comparación contra una línea base.
+# Casos: generate_key_table para varios N, cada esquema de ESQUEMAS (apply_sequence + undo_sequence)
+# para varios tamaños de payload, encrypt_message / decrypt_message, generate_prime y un ida y vuelta
+# cliente/servidor por loopback (handshake FCM y mensaje RM) con ClientProtocol.py y ServerEngine.py.
+# Cada caso se repite en varias rondas y se guarda la mediana del tiempo por operación (µs).
+# Los resultados se escriben en JSON; si existe la línea base se comparan y cualquier caso más lento
+# que base * (1 + tolerancia) se marca como regresión (código de salida 1).
+# La aleatoriedad es determinista (Randomness.SeededRandomness con --semilla, 0 por defecto): cada corrida
+# procesa los mismos primos, llaves, nonces y PSN. --sin-semilla usa la del sistema.
+# USO: python bench_suite.py [--salida F] [--baseline F] [--guardar-baseline] [--tolerancia 0.15]
+#                            [--filtro TEXTO] [--rondas R] [--tiempo-ronda S] [--semilla N | --sin-semilla]
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import time
+
+from tabulate import tabulate
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from Framing import encode_frame, recv_frame, send_frame
+from KeyGenerator import generate_key_table
+from PSN import ESQUEMAS, encrypt_message, decrypt_message
+from Randomness import SeededRandomness, get_randomness, set_randomness
+from ReversibleFunctions import apply_sequence, undo_sequence
+from SeedAndPrimes import SharedParams, generate_node_id, generate_prime, generate_seed
+from ServerEngine import ServerEngine, SelectorBackend
+
+FORMATO = 1
+TAMANOS_LLAVES = [16, 64, 256, 1024]
+TAMANOS_PAYLOAD = [32, 256, 4096]
+LLAVE = bytes.fromhex("0123456789abcdef")
+
+
+def payload(tamano):
+    """Telemetría repetida (mismo contenido en cada corrida, para que sean comparables)."""
+    base = b"sensor=23.5C;hum=41%;bat=3.71V;"
+    return (base * (tamano // len(base) + 1))[:tamano]
+
+
+# ============================================================
+# Casos
+# ============================================================
+
+def casos_keygen():
+    shared = SharedParams(id=generate_node_id(), P=generate_prime(), Q=generate_prime(), S=generate_seed(), N=16)
+    for n in TAMANOS_LLAVES:
+        yield f"keygen/N={n}", lambda n=n: generate_key_table(shared, n_keys=n)
+
+
+def casos_esquemas():
+    for psn, esquema in ESQUEMAS.items():
+        for tamano in TAMANOS_PAYLOAD:
+            datos = payload(tamano)
+            ids = esquema["func_ids"]
+            yield (f"esquema/0x{psn:X}/{tamano}B",
+                   lambda datos=datos, ids=ids: undo_sequence(apply_sequence(datos, ids), ids))
+
+
+def casos_cifrado():
+    for tamano in TAMANOS_PAYLOAD:
+        datos = payload(tamano)
+        cifrado = encrypt_message(datos, 0, LLAVE)
+        yield f"encrypt/{tamano}B", lambda datos=datos: encrypt_message(datos, 0, LLAVE)
+        yield f"decrypt/{tamano}B", lambda cifrado=cifrado: decrypt_message(cifrado, LLAVE)
+
+
+def casos_primos():
+    yield "generate_prime/64", generate_prime
+
+
+class Loopback:
+    """Servidor local (backend selector) y un cliente ClientProtocol por loopback."""
+
+    def __init__(self):
+        # Un flujo por hilo (servidor y cliente) para que el orden de las llamadas no dependa del planificador
+        rng = get_randomness().fork("servidor")
+        self.engine = ServerEngine(generate_node_id(rng=rng), generate_prime(rng=rng), generate_seed(rng=rng), rng=rng)
+        self.backend = SelectorBackend(self.engine, "127.0.0.1", 0)
+        self.backend.start()
+        self.protocol = ClientProtocol(rng=get_randomness().fork("cliente"))
+        self.sock = None
+        self.mensaje = payload(32)
+
+    def _respuesta(self):
+        while True:
+            kind, value = self.protocol.receive(recv_frame(self.sock))
+            if kind == FRAME_RESPONSE:
+                return value
+
+    def conectar(self):
+        self.sock = socket.create_connection(self.backend.address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(b"".join(encode_frame(frame) for frame in self.protocol.hello_frames()))
+        for frame in self.protocol.accept_server_params(recv_frame(self.sock)):
+            send_frame(self.sock, frame)
+        self._respuesta()
+
+    def cerrar(self):
+        send_frame(self.sock, self.protocol.farewell())
+        self._respuesta()
+        self.sock.close()
+        self.protocol.reset()
+
+    def handshake(self):
+        """FCM completo + LCM (sin 0.5-RTT: se olvidan los parámetros del servidor)."""
+        self.protocol.server_params = None
+        self.conectar()
+        self.cerrar()
+
+    def mensaje_rm(self):
+        send_frame(self.sock, self.protocol.seal(self.mensaje))
+        self._respuesta()
+
+    def detener(self):
+        self.backend.stop()
+
+
+# ============================================================
+# Medición
+# ============================================================
+
+def medir(funcion, rondas, tiempo_ronda):
+    """Mediana y mínimo del tiempo por operación (µs) en `rondas` rondas de ~tiempo_ronda s."""
+    funcion()  # calentamiento
+    inicio = time.perf_counter()
+    funcion()
+    una = max(time.perf_counter() - inicio, 1e-7)
+    repeticiones = max(1, int(tiempo_ronda / una))
+    tiempos = []
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) / repeticiones * 1e6)
+    return {"us": statistics.median(tiempos), "min_us": min(tiempos), "repeticiones": repeticiones * rondas}
+
+
+def ejecutar(filtro, rondas, tiempo_ronda):
+    resultados = {}
+
+    def correr(nombre, funcion):
+        if filtro and filtro not in nombre:
+            return
+        resultados[nombre] = medir(funcion, rondas, tiempo_ronda)
+        print(f"  {nombre}: {resultados[nombre]['us']:.1f} µs", file=sys.stderr)
+
+    for casos in (casos_keygen(), casos_esquemas(), casos_cifrado(), casos_primos()):
+        for nombre, funcion in casos:
+            correr(nombre, funcion)
+
+    if not filtro or "loopback" in filtro:
+        loopback = Loopback()
+        try:
+            correr("loopback/handshake", loopback.handshake)
+            loopback.conectar()
+            correr("loopback/rm_32B", loopback.mensaje_rm)
+            loopback.cerrar()
+        finally:
+            loopback.detener()
+    return resultados
+
+
+# ============================================================
+# Línea base
+# ============================================================
+
+def comparar(resultados, baseline, tolerancia):
+    """Filas para la tabla y lista de casos con regresión."""
+    filas, regresiones = [], []
+    for nombre, actual in resultados.items():
+        base = baseline.get(nombre)
+        if base is None:
+            filas.append([nombre, "-", f"{actual['us']:.1f}", "-", "nuevo"])
+            continue
+        cambio = actual["us"] / base["us"] - 1
+        estado = "ok"
+        if cambio > tolerancia:
+            estado = "REGRESIÓN"
+            regresiones.append(nombre)
+        elif cambio < -tolerancia:
+            estado = "mejora"
+        filas.append([nombre, f"{base['us']:.1f}", f"{actual['us']:.1f}", f"{cambio:+.1%}", estado])
+    return filas, regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks con comparación contra una línea base")
+    parser.add_argument("--salida", default="bench_results.json", help="JSON con los resultados de esta corrida")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="JSON de referencia")
+    parser.add_argument("--guardar-baseline", action="store_true", help="guardar esta corrida como línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.15,
+                        help="fracción de aumento tolerada antes de marcar regresión (0.15 = 15%%)")
+    parser.add_argument("--filtro", default=None, help="solo los casos cuyo nombre contenga este texto")
+    parser.add_argument("--rondas", type=int, default=5)
+    parser.add_argument("--tiempo-ronda", type=float, default=0.05, help="segundos por ronda y caso")
+    parser.add_argument("--semilla", type=int, default=0, help="semilla de la aleatoriedad determinista")
+    parser.add_argument("--sin-semilla", action="store_true", help="usar la aleatoriedad del sistema")
+    args = parser.parse_args()
+    if not args.sin_semilla:
+        set_randomness(SeededRandomness(args.semilla))
+
+    resultados = ejecutar(args.filtro, args.rondas, args.tiempo_ronda)
+    reporte = {
+        "formato": FORMATO,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "semilla": None if args.sin_semilla else args.semilla,
+        "resultados": resultados,
+    }
+    with open(args.salida, "w") as f:
+        json.dump(reporte, f, indent=2)
+
+    if args.guardar_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(reporte, f, indent=2)
+        print(f"Línea base guardada en {args.baseline} ({len(resultados)} casos)")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"Sin línea base ({args.baseline}); usa --guardar-baseline para crearla")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("formato") != FORMATO:
+        print(f"Formato de línea base desconocido en {args.baseline}")
+        return 2
+    filas, regresiones = comparar(resultados, baseline["resultados"], args.tolerancia)
+    print(f"=== Comparación con {args.baseline} (tolerancia {args.tolerancia:.0%}) ===")
+    print(tabulate(filas, headers=["Caso", "Base µs", "Actual µs", "Cambio", "Estado"], tablefmt="fancy_grid"))
+    if regresiones:
+        print(f"{len(regresiones)} regresiones: {', '.join(regresiones)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
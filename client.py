@@ -1,21 +1,26 @@
+import bisect
+import itertools
+import queue
 import socket
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import threading
 import time
-from PSN import encrypt_message, decrypt_message, extract_psn_from_plaintext_using_instruction
-from SeedAndPrimes import generate_prime, generate_seed, generate_node_id
-from KeyGenerator import generate_key_table
 from MessageTypes import MessageType, get_message_info, format_message_log
-from dataclasses import dataclass
+from Framing import encode_frame, recv_frame, send_frame
+from ClientProtocol import (FRAME_BROADCAST, FRAME_EARLY_REJECTED, FRAME_GROUPCAST, FRAME_GROUPKEY,
+                            FRAME_PLAINTEXT, FRAME_RESPONSE, PLAINTEXT_PREFIX, ClientProtocol)
+from DeviceClient import backoff_delays
 
-@dataclass
-class SharedParams:
-    id: int
-    P: int
-    Q: int
-    S: int
-    N: int = 16  # Número de llaves a generar
+# Mensajes esperando al hilo de envío (si se llena, la interfaz avisa en vez de bloquearse)
+OUTBOUND_QUEUE_SIZE = 256
+
+# Segundos de espera de la confirmación del LCM antes de cerrar la conexión igualmente
+LCM_TIMEOUT = 5.0
+
+# Reconexión automática: intentos antes de rendirse y plazo de cada intento (segundos)
+RECONNECT_MAX_ATTEMPTS = 20
+RECONNECT_TIMEOUT = 10.0
 
 class CryptographyClient:
     def __init__(self):
@@ -34,18 +39,21 @@ class CryptographyClient:
         self.host = "127.0.0.1"
         self.port = 65432
         
-        # Generar parámetros del cliente
-        self.node_id = generate_node_id(tag="client")
-        self.P = generate_prime(tag="client")  # Primo del cliente
-        self.S_client = generate_seed(tag="client")  # Semilla del cliente
+        # Estado del protocolo (parámetros P, S, tablas de llaves, tickets...) sin Tk ni sockets
+        # Flujo de envío: solo lo toca el hilo de envío (tras el FCM); flujo de recepción: solo el hilo receptor
+        self.protocol = ClientProtocol()
         
-        # Variables para el estado de cifrado
-        self.key_table = []
-        self.key_index = 0
-        self.next_psn = 0
-        self.next_extraction_instruction = None
+        # Cola de salida: la interfaz encola (cifrado?, texto) y el hilo de envío cifra y envía
+        self.outbound = None
+        self.farewell_requested = threading.Event()  # LCM pedido: se envía al vaciar la cola
+        self.destroy_on_disconnect = False           # Cerrar la ventana al terminar el LCM
+        
+        # Reconexión: sin enlace el hilo de envío acumula la cola y la manda en ráfaga al volver
+        self.link_up = threading.Event()
+        self.reconnecting = False
+        self.stop_reconnect = threading.Event()
+        self.stream_lock = threading.Lock()  # Flujo de envío: hilo de envío o handshake de reconexión
         self.encryption_enabled = True  # Control de cifrado
-        self.key_regeneration_count = 0  # Contador de regeneraciones
         
         # Variables para monitoreo visual
         self.key_monitor_window = None
@@ -168,79 +176,78 @@ class CryptographyClient:
             # Cambiar a la interfaz de chat PRIMERO
             self.create_chat_interface()
             
-            # Ahora mostrar mensaje FCM
-            fcm_msg = format_message_log(MessageType.FCM, "Enviando parámetros P y S al servidor")
-            self.add_message_to_chat("Sistema", fcm_msg, get_message_info(MessageType.FCM)["color"])
-            
-            # Enviar parámetros del cliente al servidor
-            client_params = f"{self.P},{self.S_client}"
-            self.client_socket.sendall(client_params.encode())
-            
-            # Recibir parámetros del servidor
-            server_params = self.client_socket.recv(1024).decode()
-            Q_server, S_server = map(int, server_params.split(','))
-            
-            # Confirmar FCM completado
-            fcm_complete = format_message_log(MessageType.FCM, "Parámetros intercambiados exitosamente")
-            self.add_message_to_chat("Sistema", fcm_complete, get_message_info(MessageType.FCM)["color"])
-            
-            # Calcular semilla compartida
-            S_shared = self.S_client ^ S_server
-            
-            # Crear parámetros compartidos
-            shared_params = SharedParams(
-                id=self.node_id,
-                P=self.P,
-                Q=Q_server,
-                S=S_shared
-            )
-            
-            # Generar tabla de claves
-            self.key_table = generate_key_table(shared_params)
-            self.key_index = 0
-            
-            # Enviar mensaje inicial encriptado
-            initial_message = b"First Message Contact"
-            key = self.key_table[self.key_index].to_bytes(8, 'big')
-            self.add_message_to_chat("Debug", f"Cliente enviando FCM: PSN={self.next_psn}, Key=K{self.key_index}", "#888888")
-            ciphertext = encrypt_message(initial_message, self.next_psn, key)
-            self.client_socket.sendall(ciphertext)
-            
-            # ¡CORRECCIÓN! El cliente debe calcular PSN basándose en SU mensaje enviado, no en la respuesta
-            # Esto mantiene la sincronización con el servidor
-            old_psn = self.next_psn
-            old_key_index = self.key_index
-            
-            # Actualizar PSN basándose en el mensaje que ENVIAMOS (como hace el servidor)
-            instruction = {"type": "byte_index", "param": 0}  # Esquema por defecto para PSN=0
-            self.next_psn = extract_psn_from_plaintext_using_instruction(initial_message, instruction)
-            self.next_extraction_instruction = instruction
-            
-            # Actualizar índice de llave
-            self.key_index = (self.key_index + 1) % len(self.key_table)
-            
-            self.add_message_to_chat("Debug", f"Cliente después FCM: PSN {old_psn}→{self.next_psn}, Key K{old_key_index}→K{self.key_index}", "#888888")
-            
-            # Recibir respuesta (solo para confirmar, no para actualizar estado)
-            response = self.client_socket.recv(2048)
-            result = decrypt_message(response, key)
-            server_response = result["plaintext"].decode()
-            self.add_message_to_chat("Debug", f"Respuesta del servidor: '{server_response}'", "#888888")
-            
-            # Agregar mensajes de bienvenida
-            self.add_message_to_chat("Sistema", "Conexión establecida correctamente", "#107c10")
-            self.add_message_to_chat("Sistema", "🔐 Modo cifrado activado - Los mensajes se envían encriptados", "#107c10")
+            self.establish_session(self.client_socket, self.add_message_to_chat)
             
             # Inicializar el monitor de llaves
             self.init_key_monitor_data()
             
-            # Iniciar hilo para recibir mensajes
+            # Iniciar hilos para recibir y enviar mensajes
             self.start_receiving_thread()
+            self.start_sender_thread()
             
         except Exception as e:
             messagebox.showerror("Error de Conexión", 
                                f"No se pudo conectar al servidor:\n{str(e)}")
     
+    def establish_session(self, sock, log):
+        """
+        Handshake sobre un socket recién conectado: reanudación con ticket o FCM
+        (0.5-RTT si ya se conocen los parámetros del servidor). `log` agrega al chat:
+        add_message_to_chat desde el hilo de Tk o post_to_chat desde la reconexión.
+        """
+        # Con un ticket guardado se evita el FCM completo
+        if self.protocol.resumption_ticket is not None and self.resume_session(sock, log):
+            return
+        
+        # Ahora mostrar mensaje FCM
+        fcm_msg = format_message_log(MessageType.FCM, "Enviando parámetros P y S al servidor")
+        log("Sistema", fcm_msg, get_message_info(MessageType.FCM)["color"])
+        
+        # Parámetros del cliente (ofreciendo compresión). Con los parámetros del servidor
+        # ya conocidos, el primer mensaje cifrado viaja en el mismo vuelo (0.5-RTT)
+        frames = self.protocol.hello_frames()
+        if len(frames) > 1:
+            log("Debug", "Cliente enviando FCM con datos tempranos (K0, PSN=0)", "#888888")
+        sock.sendall(b"".join(encode_frame(frame) for frame in frames))
+        
+        # Recibir parámetros del servidor (o rechazo por control de admisión)
+        for frame in self.protocol.accept_server_params(recv_frame(sock)):
+            log("Debug", "Cliente enviando FCM: PSN=0, Key=K0", "#888888")
+            send_frame(sock, frame)
+        
+        # Confirmar FCM completado
+        fcm_complete = format_message_log(MessageType.FCM, "Parámetros intercambiados exitosamente")
+        log("Sistema", fcm_complete, get_message_info(MessageType.FCM)["color"])
+        log("Debug", f"Cliente después FCM: PSN={self.protocol.next_psn}, Key=K{self.protocol.key_index}", "#888888")
+        
+        # Recibir respuesta (cifrada con el flujo servidor->cliente)
+        kind, server_response = self.protocol.receive(recv_frame(sock))
+        if kind == FRAME_EARLY_REJECTED:
+            # El servidor cambió de parámetros: el mensaje inicial ya se reenvió
+            log("Sistema", "⚠️ Datos tempranos rechazados - se reenvió el primer mensaje", "#ff8c00")
+            kind, server_response = self.protocol.receive(recv_frame(sock))
+        log("Debug", f"Respuesta del servidor: '{server_response.decode()}'", "#888888")
+        
+        # Agregar mensajes de bienvenida
+        log("Sistema", "Conexión establecida correctamente", "#107c10")
+        log("Sistema", "🔐 Modo cifrado activado - Los mensajes se envían encriptados", "#107c10")
+    
+    def resume_session(self, sock, log):
+        """Intentar reanudar la sesión con el ticket guardado (un ida y vuelta)"""
+        ticket = self.protocol.resumption_ticket
+        fcm_msg = format_message_log(MessageType.FCM, f"Reanudando sesión con ticket (K{ticket.key_index:02d}, PSN={ticket.next_psn})")
+        log("Sistema", fcm_msg, get_message_info(MessageType.FCM)["color"])
+        send_frame(sock, self.protocol.resume_frame())
+        
+        response = recv_frame(sock)
+        if not self.protocol.accept_resume(response):
+            # Ticket rechazado: se sigue con el FCM completo por la misma conexión
+            log("Sistema", f"⚠️ {response.decode()} - se hará el handshake completo", "#ff8c00")
+            return False
+        
+        log("Sistema", "Sesión reanudada sin derivar llaves", "#107c10")
+        return True
+    
     def create_chat_interface(self):
         """Crear la interfaz de chat"""
         # Ocultar la pantalla inicial
@@ -361,8 +368,8 @@ class CryptographyClient:
             self.add_message_to_chat("Sistema", "🔓 Modo texto claro activado - Los mensajes se envían sin cifrar", "#d13438")
     
     def send_message(self, event=None):
-        """Enviar mensaje al servidor"""
-        if not self.connected:
+        """Encolar el mensaje para el hilo de envío (la interfaz no espera al socket)"""
+        if not self.connected or self.farewell_requested.is_set():
             return
             
         message = self.message_entry.get().strip()
@@ -370,188 +377,279 @@ class CryptographyClient:
             return
         
         try:
-            if self.encryption_enabled:
-                # Verificar si necesitamos regenerar llaves
-                if self.key_index == 0 and self.key_regeneration_count > 0:
-                    kum_msg = format_message_log(MessageType.KUM, f"Regenerando tabla de llaves (ciclo #{self.key_regeneration_count + 1})")
-                    self.add_message_to_chat("Sistema", kum_msg, get_message_info(MessageType.KUM)["color"])
-                
-                # Mostrar mensaje RM
-                rm_msg = format_message_log(MessageType.RM, f"Enviando con llave K{self.key_index:02d}, PSN={self.next_psn}")
-                self.add_message_to_chat("Sistema", rm_msg, get_message_info(MessageType.RM)["color"])
-                
-                # Modo cifrado: usar el algoritmo de cifrado polimórfico
-                key = self.key_table[self.key_index].to_bytes(8, 'big')
-                message_bytes = message.encode()
-                ciphertext = encrypt_message(message_bytes, self.next_psn, key)
-                self.client_socket.sendall(ciphertext)
-                
-                # ¡CORRECCIÓN CRÍTICA! Actualizar PSN basándose en el mensaje enviado (como hace el servidor)
-                old_psn = self.next_psn
-                old_key_index = self.key_index
-                
-                # Usar la instrucción de extracción actual para calcular el próximo PSN
-                if self.next_extraction_instruction:
-                    self.next_psn = extract_psn_from_plaintext_using_instruction(
-                        message_bytes, 
-                        self.next_extraction_instruction
-                    )
-                else:
-                    # Usar esquema por defecto si no hay instrucción
-                    instruction = {"type": "byte_index", "param": 0}
-                    self.next_psn = extract_psn_from_plaintext_using_instruction(message_bytes, instruction)
-                
-                # Actualizar índice de llave
-                self.key_index = (self.key_index + 1) % len(self.key_table)
-                
-                # Debug: mostrar actualización
-                self.add_message_to_chat("Debug", f"Cliente actualizó: PSN {old_psn}→{self.next_psn}, Key K{old_key_index}→K{self.key_index}", "#888888")
-                
-                # Si volvemos al inicio, incrementar contador de regeneración
-                if old_key_index == len(self.key_table) - 1:
-                    self.key_regeneration_count += 1
+            self.outbound.put_nowait((self.encryption_enabled, message))
+        except queue.Full:
+            self.add_message_to_chat("Error", "Cola de envío llena - espera a que salgan los mensajes pendientes", "#d13438")
+            return
+        
+        # Limpiar campo de entrada
+        self.message_entry.delete(0, tk.END)
+    
+    def post_to_chat(self, sender, message, color="#ffffff"):
+        """Agregar un mensaje al chat desde otro hilo (lo dibuja el hilo de Tk)"""
+        self.root.after(0, lambda: self.add_message_to_chat(sender, message, color))
+    
+    def start_sender_thread(self):
+        """Iniciar el hilo de envío con una cola de salida nueva"""
+        self.outbound = queue.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self.farewell_requested.clear()
+        self.link_up.set()
+        sender_thread = threading.Thread(target=self.send_messages, daemon=True)
+        sender_thread.start()
+    
+    def seal_outbound(self, encrypted, message, echo=True):
+        """
+        Convertir un mensaje encolado en su trama (en el hilo de envío: avanza llave y PSN).
+        echo=False al reenviarlo tras una reconexión: ya se mostró en el chat.
+        """
+        if not encrypted:
+            # Modo texto claro: enviar con prefijo especial
+            if echo:
+                self.post_to_chat("Tú 🔓", message, "#ff9900")
+            return PLAINTEXT_PREFIX + message.encode()
+        
+        # Verificar si necesitamos regenerar llaves
+        if self.protocol.key_index == 0 and self.protocol.key_regeneration_count > 0:
+            kum_msg = format_message_log(MessageType.KUM, f"Regenerando tabla de llaves (ciclo #{self.protocol.key_regeneration_count + 1})")
+            self.post_to_chat("Sistema", kum_msg, get_message_info(MessageType.KUM)["color"])
+        
+        # Mostrar mensaje RM
+        rm_msg = format_message_log(MessageType.RM, f"Enviando con llave K{self.protocol.key_index:02d}, PSN={self.protocol.next_psn}")
+        self.post_to_chat("Sistema", rm_msg, get_message_info(MessageType.RM)["color"])
+        
+        # Modo cifrado: usar el algoritmo de cifrado polimórfico
+        # (el PSN siguiente sale del mensaje enviado, como hace el servidor)
+        old_psn = self.protocol.next_psn
+        old_key_index = self.protocol.key_index
+        frame = self.protocol.seal(message.encode())
+        self.post_to_chat("Debug", f"Cliente actualizó: PSN {old_psn}→{self.protocol.next_psn}, Key K{old_key_index}→K{self.protocol.key_index}", "#888888")
+        if echo:
+            self.post_to_chat("Tú 🔐", message, "#0078d4")
+        return frame
+    
+    def send_messages(self):
+        """
+        Hilo de envío: vacía la cola y envía todo lo pendiente en una sola ráfaga.
+        
+        Si la conexión se cae a mitad de una ráfaga, las tramas que el socket ya
+        aceptó completas no se reenvían: pueden haber llegado al servidor y
+        reenviarlas las duplicaría (si se perdieron en el camino, se pierden: a
+        lo sumo una vez). Las demás se vuelven a cifrar y se envían una sola vez
+        con la sesión restablecida.
+        """
+        outbound = self.outbound
+        batch = []
+        replayed = 0  # Mensajes al inicio del lote que ya se mostraron (envío fallido)
+        while self.connected:
+            if not batch:
+                batch.append(outbound.get())
+            # Sin enlace (reconectando) los mensajes se acumulan y salen juntos al volver
+            self.link_up.wait()
+            while True:
+                try:
+                    batch.append(outbound.get_nowait())
+                except queue.Empty:
+                    break
+            if not self.connected:
+                dropped = sum(1 for item in batch if item is not None)
+                if dropped:
+                    self.post_to_chat("Sistema", f"{dropped} mensajes sin enviar descartados", "#ff8c00")
+                return
+            
+            with self.stream_lock:
+                sock = self.client_socket
+                if replayed:
+                    self.post_to_chat("Sistema", f"Reenviando {replayed} mensajes con la sesión restablecida", "#ff8c00")
+                # Solo el texto se conserva entre intentos: se cifra de nuevo con el estado actual
+                sealed = []
+                frames = []
+                for item in batch:
+                    if item is None:
+                        continue  # Solo despierta al hilo (LCM pedido)
+                    try:
+                        frames.append(self.seal_outbound(*item, echo=len(sealed) >= replayed))
+                    except Exception as e:
+                        self.post_to_chat("Error", f"No se pudo cifrar el mensaje: {str(e)}", "#d13438")
+                        continue
+                    sealed.append(item)
                 
-                # Agregar mensaje al chat con indicador de cifrado
-                self.add_message_to_chat("Tú 🔐", message, "#0078d4")
-            else:
-                # Modo texto claro: enviar con prefijo especial
-                plaintext_message = f"[PLAINTEXT]{message}"
-                self.client_socket.sendall(plaintext_message.encode())
+                # El LCM sale después de todo lo que se encoló antes de desconectar
+                farewell = self.farewell_requested.is_set() and outbound.empty()
+                if farewell:
+                    frames.append(self.protocol.farewell())
                 
-                # Agregar mensaje al chat con indicador de texto claro
-                self.add_message_to_chat("Tú 🔓", message, "#ff9900")
-            
-            # Limpiar campo de entrada
-            self.message_entry.delete(0, tk.END)
-            
-        except Exception as e:
-            self.add_message_to_chat("Error", f"No se pudo enviar el mensaje: {str(e)}", "#d13438")
+                encoded = [encode_frame(frame) for frame in frames]
+                data = memoryview(b"".join(encoded))
+                written = 0
+                try:
+                    # send() en lugar de sendall(): si falla se sabe cuántos bytes aceptó el socket
+                    while written < len(data):
+                        written += sock.send(data[written:])
+                except Exception as e:
+                    # Solo los mensajes que no salieron completos se vuelven a cifrar con el
+                    # estado de la sesión reanudada (el LCM, si iba, es la última trama)
+                    self.link_up.clear()
+                    delivered = bisect.bisect_right(list(itertools.accumulate(map(len, encoded))), written)
+                    batch = sealed[delivered:]
+                    replayed = len(batch)
+                    if delivered:
+                        self.post_to_chat("Sistema", f"{delivered} mensajes de la ráfaga ya habían salido: no se reenvían", "#ff8c00")
+                    error_msg = f"No se pudo enviar el mensaje: {str(e)}"
+                    self.root.after(0, lambda msg=error_msg: self.connection_lost(sock, msg))
+                    continue
+            batch = []
+            replayed = 0
+            if farewell:
+                return
     
     def start_receiving_thread(self):
-        """Iniciar hilo para recibir mensajes del servidor"""
-        receive_thread = threading.Thread(target=self.receive_messages, daemon=True)
+        """Iniciar hilo para recibir mensajes del servidor (por el socket actual)"""
+        receive_thread = threading.Thread(target=self.receive_messages, args=(self.client_socket,), daemon=True)
         receive_thread.start()
     
-    def receive_messages(self):
-        """Recibir mensajes del servidor en un hilo separado"""
-        while self.connected:
+    def receive_messages(self, sock):
+        """Recibir mensajes del servidor en un hilo separado (termina si el socket se reemplaza)"""
+        while self.connected and sock is self.client_socket:
             try:
-                response = self.client_socket.recv(2048)
+                response = recv_frame(sock)
                 if response:
-                    # Verificar si es un mensaje broadcast (no encriptado)
-                    if response.startswith(b"[BROADCAST]"):
-                        message = response.decode()[12:]  # Remover prefijo [BROADCAST] 
+                    kind, value = self.protocol.receive(response)
+                    if kind == FRAME_BROADCAST:
+                        message = value.decode()
                         self.root.after(0, lambda msg=message: self.add_message_to_chat("📢 Broadcast", msg, "#ff9900"))
-                        continue
-                    
-                    # Verificar si es un mensaje en texto claro
-                    if response.startswith(b"[PLAINTEXT]"):
-                        message = response.decode()[11:]  # Remover prefijo [PLAINTEXT]
+                    elif kind == FRAME_GROUPKEY:
+                        self.root.after(0, lambda: self.add_message_to_chat("Sistema", "🔐 Tabla de llaves de grupo recibida (broadcast cifrado)", "#107c10"))
+                    elif kind == FRAME_GROUPCAST and value is not None:
+                        message = value.decode()
+                        self.root.after(0, lambda msg=message: self.add_message_to_chat("📢 Broadcast 🔐", msg, "#ff9900"))
+                    elif kind == FRAME_PLAINTEXT:
+                        message = value.decode()
                         self.root.after(0, lambda msg=message: self.add_message_to_chat("Servidor 🔓", msg, "#ff9900"))
-                        continue
-                    
-                    # Mensaje cifrado - desencriptar
-                    key = self.key_table[self.key_index].to_bytes(8, 'big')
-                    
-                    result = decrypt_message(response, key)
-                    message = result["plaintext"].decode()
-                    
-                    # Actualizar próximo PSN
-                    self.next_psn = extract_psn_from_plaintext_using_instruction(
-                        result["plaintext"], 
-                        result["next_extraction_instruction"]
-                    )
-                    self.next_extraction_instruction = result["next_extraction_instruction"]
-                    
-                    # Actualizar índice de clave
-                    self.key_index = (self.key_index + 1) % len(self.key_table)
-                    
-                    # Mostrar mensaje cifrado
-                    self.root.after(0, lambda msg=message: self.add_message_to_chat("Servidor 🔐", msg, "#ffb900"))
+                    elif kind == FRAME_RESPONSE:
+                        message = value.decode()
+                        self.root.after(0, lambda msg=message: self.add_message_to_chat("Servidor 🔐", msg, "#ffb900"))
                 else:
+                    # Tras el LCM el servidor cierra después de la confirmación y el ticket final
+                    if self.farewell_requested.is_set():
+                        self.root.after(0, self.finish_disconnect)
+                    else:
+                        self.root.after(0, lambda: self.connection_lost(sock, "El servidor cerró la conexión"))
                     break
             except Exception as e:
-                if self.connected:
+                if self.connected and sock is self.client_socket:
                     error_msg = f"Error recibiendo mensaje: {str(e)}"
-                    self.root.after(0, lambda msg=error_msg: self.add_message_to_chat("Error", msg, "#d13438"))
+                    if self.farewell_requested.is_set():
+                        self.root.after(0, lambda msg=error_msg: self.finish_disconnect(msg))
+                    else:
+                        self.root.after(0, lambda msg=error_msg: self.connection_lost(sock, msg))
                 break
     
-    def disconnect_from_server(self):
-        """Desconectar del servidor"""
-        if self.connected and self.client_socket:
+    def connection_lost(self, sock, reason):
+        """Conexión perdida sin LCM: reconectar en segundo plano conservando P, S y el ticket (hilo de Tk)"""
+        if (not self.connected or self.reconnecting or sock is not self.client_socket
+                or self.farewell_requested.is_set()):
+            return
+        self.link_up.clear()
+        try:
+            sock.close()
+        except OSError:
+            pass
+        self.add_message_to_chat("Error", reason, "#d13438")
+        
+        self.reconnecting = True
+        self.stop_reconnect.clear()
+        self.status_label.config(text="● Reconectando...", foreground="#ff8c00")
+        threading.Thread(target=self.reconnect_loop, daemon=True).start()
+    
+    def reconnect_loop(self):
+        """Hilo de reconexión: reintentos con backoff exponencial y jitter hasta reanudar la sesión"""
+        for attempt, delay in enumerate(backoff_delays(), 1):
+            if attempt > RECONNECT_MAX_ATTEMPTS:
+                break
+            self.post_to_chat("Sistema", f"🔄 Reintento {attempt}/{RECONNECT_MAX_ATTEMPTS} en {delay:.1f} s", "#ff8c00")
+            if self.stop_reconnect.wait(delay):
+                return
+            sock = None
             try:
-                # Verificar que tengamos una tabla de llaves válida
-                if not self.key_table or self.key_index >= len(self.key_table):
-                    # Si no hay tabla de llaves, desconectar sin cifrado
-                    self.add_message_to_chat("Sistema", "⚠️ Desconectando sin tabla de llaves válida", "#ff8c00")
-                    self.connected = False
-                    self.client_socket.close()
-                    self.status_label.config(text="● Desconectado", foreground="#d13438")
-                    return
-                
-                # Mostrar mensaje LCM
-                lcm_msg = format_message_log(MessageType.LCM, "Cerrando conexión y eliminando tabla de llaves")
-                self.add_message_to_chat("Sistema", lcm_msg, get_message_info(MessageType.LCM)["color"])
-                
-                # Obtener clave actual
-                key = self.key_table[self.key_index].to_bytes(8, 'big')
-                
-                # Enviar mensaje de despedida encriptado
-                farewell_message = b"Last Message Contact"
-                ciphertext = encrypt_message(farewell_message, self.next_psn, key)
-                self.client_socket.sendall(ciphertext)
-                
-                # Recibir confirmación con timeout
-                self.client_socket.settimeout(5.0)  # 5 segundos de timeout
-                try:
-                    response = self.client_socket.recv(2048)
-                    if response:
-                        result = decrypt_message(response, key)
-                        message = result["plaintext"].decode()
-                        self.add_message_to_chat("Sistema", f"Respuesta del servidor: {message}", "#d13438")
-                    else:
-                        self.add_message_to_chat("Sistema", "Servidor desconectado sin respuesta", "#ff8c00")
-                except socket.timeout:
-                    self.add_message_to_chat("Sistema", "Timeout esperando respuesta del servidor", "#ff8c00")
-                except Exception as recv_error:
-                    self.add_message_to_chat("Sistema", f"Error recibiendo respuesta: {str(recv_error)}", "#ff8c00")
-                
-                # Limpiar estado
-                self.connected = False
-                if self.client_socket:
-                    self.client_socket.close()
-                    self.client_socket = None
-                
-                # Eliminar tabla de llaves (LCM completado)
-                self.key_table = []
-                self.key_index = 0
-                self.key_regeneration_count = 0
-                
-                lcm_complete = format_message_log(MessageType.LCM, "Tabla de llaves eliminada, conexión cerrada")
-                self.add_message_to_chat("Sistema", lcm_complete, get_message_info(MessageType.LCM)["color"])
-                
-                # Actualizar estado
-                if hasattr(self, 'status_label'):
-                    self.status_label.config(text="● Desconectado", foreground="#d13438")
-                
-                # Mostrar mensaje y cerrar después de 2 segundos
-                self.root.after(2000, self.root.quit)
-                
+                sock = socket.create_connection((self.host, self.port), timeout=RECONNECT_TIMEOUT)
+                # Mismo primo P: [RESUME] con el ticket o FCM de 0.5-RTT, sin generar primos
+                with self.stream_lock:
+                    self.protocol.reset()
+                    self.establish_session(sock, self.post_to_chat)
+                sock.settimeout(None)
             except Exception as e:
-                error_msg = f"Error al desconectar: {str(e)}"
-                if hasattr(self, 'chat_area'):
-                    self.add_message_to_chat("Error", error_msg, "#d13438")
-                else:
-                    messagebox.showerror("Error", error_msg)
-                
-                # Forzar limpieza en caso de error
+                if sock is not None:
+                    sock.close()
+                self.post_to_chat("Sistema", f"Reintento {attempt} fallido: {str(e)}", "#ff8c00")
+                continue
+            self.root.after(0, self.reconnected, sock)
+            return
+        self.root.after(0, self.abandon_reconnect, f"No se pudo reconectar tras {RECONNECT_MAX_ATTEMPTS} intentos")
+    
+    def reconnected(self, sock):
+        """Sesión restablecida: nuevo hilo receptor y ráfaga con lo acumulado (hilo de Tk)"""
+        if not self.reconnecting:
+            sock.close()  # Reconexión cancelada mientras tanto
+            return
+        self.reconnecting = False
+        self.client_socket = sock
+        self.status_label.config(text="● Conectado", foreground="#00ff00")
+        pending = self.outbound.qsize()
+        self.add_message_to_chat("Sistema", f"✅ Reconectado - enviando {pending} mensajes pendientes", "#107c10")
+        self.start_receiving_thread()
+        self.link_up.set()
+    
+    def abandon_reconnect(self, reason):
+        """Dejar de reintentar: se descarta la cola y la sesión queda cerrada (hilo de Tk)"""
+        if not self.reconnecting:
+            return
+        self.reconnecting = False
+        self.stop_reconnect.set()
+        self.connected = False
+        self.client_socket = None
+        self.protocol.reset()
+        # Liberar al hilo de envío, que ve connected=False, descarta lo acumulado y termina
+        self.link_up.set()
+        try:
+            self.outbound.put_nowait(None)
+        except queue.Full:
+            pass
+        self.add_message_to_chat("Error", reason, "#d13438")
+        self.status_label.config(text="● Desconectado", foreground="#d13438")
+    
+    def disconnect_from_server(self):
+        """Pedir el LCM al hilo de envío; la confirmación llega por el hilo receptor"""
+        if self.reconnecting:
+            # Sin enlace no hay LCM posible: se cancela la reconexión
+            self.abandon_reconnect("Reconexión cancelada")
+            return
+        if self.connected and self.client_socket:
+            if self.farewell_requested.is_set():
+                return  # Desconexión ya en curso
+            
+            # Verificar que tengamos una tabla de llaves válida
+            if not self.protocol.key_table or self.protocol.key_index >= len(self.protocol.key_table):
+                # Si no hay tabla de llaves, desconectar sin cifrado
+                self.add_message_to_chat("Sistema", "⚠️ Desconectando sin tabla de llaves válida", "#ff8c00")
                 self.connected = False
-                if self.client_socket:
-                    try:
-                        self.client_socket.close()
-                    except:
-                        pass
-                    self.client_socket = None
+                self.client_socket.close()
+                self.status_label.config(text="● Desconectado", foreground="#d13438")
+                return
+            
+            # Mostrar mensaje LCM
+            lcm_msg = format_message_log(MessageType.LCM, "Cerrando conexión y eliminando tabla de llaves")
+            self.add_message_to_chat("Sistema", lcm_msg, get_message_info(MessageType.LCM)["color"])
+            
+            # El hilo de envío manda el LCM cuando termine con lo ya encolado
+            self.farewell_requested.set()
+            try:
+                self.outbound.put_nowait(None)
+            except queue.Full:
+                pass  # El hilo está ocupado y verá el LCM pedido al vaciar la cola
+            
+            # Si el servidor no confirma a tiempo se cierra igual (sin bloquear la interfaz)
+            self.root.after(int(LCM_TIMEOUT * 1000), self.finish_disconnect,
+                            "Timeout esperando respuesta del servidor")
         else:
             # No hay conexión activa
             if hasattr(self, 'chat_area'):
@@ -559,12 +657,50 @@ class CryptographyClient:
             else:
                 messagebox.showinfo("Info", "No hay conexión activa para cerrar")
     
+    def finish_disconnect(self, problem=None):
+        """Cerrar la conexión tras el LCM (confirmado, con error o por timeout); en el hilo de Tk"""
+        if not self.connected:
+            return
+        if problem:
+            self.add_message_to_chat("Sistema", problem, "#ff8c00")
+        
+        # Limpiar estado (y despertar al hilo de envío si sigue esperando en la cola)
+        self.connected = False
+        if self.client_socket:
+            try:
+                self.client_socket.close()
+            except OSError:
+                pass
+            self.client_socket = None
+        self.link_up.set()
+        try:
+            self.outbound.put_nowait(None)
+        except queue.Full:
+            pass
+        
+        # Eliminar tabla de llaves (LCM completado)
+        self.protocol.reset()
+        
+        if self.destroy_on_disconnect:
+            self.root.destroy()
+            return
+        
+        lcm_complete = format_message_log(MessageType.LCM, "Tabla de llaves eliminada, conexión cerrada")
+        self.add_message_to_chat("Sistema", lcm_complete, get_message_info(MessageType.LCM)["color"])
+        
+        # Actualizar estado
+        if hasattr(self, 'status_label'):
+            self.status_label.config(text="● Desconectado", foreground="#d13438")
+        
+        # Mostrar mensaje y cerrar después de 2 segundos
+        self.root.after(2000, self.root.quit)
+    
     def init_key_monitor_data(self):
         """Inicializar datos para el monitor de llaves"""
-        if self.key_table:
+        if self.protocol.key_table:
             self.key_status_vars = []
-            for i in range(len(self.key_table)):
-                status = "🔑 Disponible" if i != self.key_index else "🎯 Actual"
+            for i in range(len(self.protocol.key_table)):
+                status = "🔑 Disponible" if i != self.protocol.key_index else "🎯 Actual"
                 self.key_status_vars.append(status)
     
     def show_key_monitor(self):
@@ -594,14 +730,14 @@ class CryptographyClient:
         sync_frame.pack(fill='x', padx=10, pady=(0, 10))
         
         self.current_key_label = tk.Label(sync_frame,
-                                         text=f"Llave Actual: K{self.key_index}",
+                                         text=f"Llave Actual: K{self.protocol.key_index}",
                                          font=('Arial', 14, 'bold'),
                                          fg='#ffff00',
                                          bg='#2b2b2b')
         self.current_key_label.pack(side='left')
         
         self.psn_label = tk.Label(sync_frame,
-                                 text=f"PSN Actual: {self.next_psn}",
+                                 text=f"PSN Actual: {self.protocol.next_psn}",
                                  font=('Arial', 14, 'bold'),
                                  fg='#0078d4',
                                  bg='#2b2b2b')
@@ -629,7 +765,7 @@ class CryptographyClient:
         
         # Lista de llaves
         self.key_labels = []
-        for i, key in enumerate(self.key_table):
+        for i, key in enumerate(self.protocol.key_table):
             key_frame = tk.Frame(scrollable_frame, bg='#3c3c3c', relief='raised', bd=1)
             key_frame.pack(fill='x', padx=5, pady=2)
             
@@ -652,9 +788,9 @@ class CryptographyClient:
             hash_label.pack(side='left', padx=20)
             
             # Estado de la llave
-            status_color = '#ffb900' if i == self.key_index else '#107c10'
-            status_text = '🎯 ACTUAL' if i == self.key_index else '🔑 Disponible'
-            if i < self.key_index:
+            status_color = '#ffb900' if i == self.protocol.key_index else '#107c10'
+            status_text = '🎯 ACTUAL' if i == self.protocol.key_index else '🔑 Disponible'
+            if i < self.protocol.key_index:
                 status_text = '✅ Usada'
                 status_color = '#888888'
             
@@ -690,16 +826,16 @@ class CryptographyClient:
         
         try:
             # Actualizar información de sincronización
-            self.current_key_label.config(text=f"Llave Actual: K{self.key_index}")
-            self.psn_label.config(text=f"PSN Actual: {self.next_psn}")
+            self.current_key_label.config(text=f"Llave Actual: K{self.protocol.key_index}")
+            self.psn_label.config(text=f"PSN Actual: {self.protocol.next_psn}")
             
             # Actualizar estado de cada llave
             for i, (frame, name, hash_label, status_label) in enumerate(self.key_labels):
-                if i == self.key_index:
+                if i == self.protocol.key_index:
                     status_text = '🎯 ACTUAL'
                     status_color = '#ffb900'
                     frame.config(bg='#4a4a00')  # Resaltar llave actual
-                elif i < self.key_index:
+                elif i < self.protocol.key_index:
                     status_text = '✅ Usada'
                     status_color = '#888888'
                     frame.config(bg='#3c3c3c')
@@ -722,7 +858,11 @@ class CryptographyClient:
         if self.key_monitor_window is not None and self.key_monitor_window.winfo_exists():
             self.key_monitor_window.destroy()
         if self.connected:
+            # La ventana se cierra cuando termine el LCM (o venza su plazo)
+            self.destroy_on_disconnect = True
             self.disconnect_from_server()
+            if self.connected:
+                return
         self.root.destroy()
     
     def run(self):
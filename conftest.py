@@ -0,0 +1,105 @@
+# conftest.py
+# Fixtures compartidas por las pruebas (pytest las carga solo): motor del servidor con parámetros reproducibles,
+# FCM completo sin sockets y servidores reales (protocolo y métricas HTTP) en 127.0.0.1 que se detienen al terminar
+# cada prueba.
+
+import urllib.request
+
+import pytest
+
+from Metrics import MetricsRegistry, MetricsServer
+from Randomness import SeededRandomness
+from SeedAndPrimes import DEFAULT_PRIME_BITS, generate_node_id, generate_prime, generate_seed
+from ServerEngine import BACKENDS, ServerEngine
+
+# Parámetros del servidor de las pruebas
+SEMILLA_SERVIDOR = 1
+
+# Dirección con la que se abren las sesiones sin sockets
+DIRECCION = ("prueba", 1)
+
+
+def _motor(semilla: int = SEMILLA_SERVIDOR, bits: int = DEFAULT_PRIME_BITS, **opciones) -> ServerEngine:
+    rng = SeededRandomness(semilla)
+    return ServerEngine(generate_node_id(rng=rng), generate_prime(bits, rng=rng), generate_seed(bits, rng=rng),
+                        metrics=MetricsRegistry(), rng=rng, **opciones)
+
+
+def _conectar(engine, protocol, address=DIRECCION) -> tuple:
+    """FCM completo sin sockets; retorna (sesión del servidor, tipos de trama que recibió el cliente)."""
+    session, replies = engine.open_session(address, protocol.hello_frames()[0])
+    kinds = []
+    for frame in protocol.accept_server_params(replies[0]):
+        replies, _ = engine.handle_message(session, frame)
+        kinds += [protocol.receive(reply)[0] for reply in replies]
+    return session, kinds
+
+
+@pytest.fixture
+def motor():
+    """Fábrica de ServerEngine: motor(semilla=1, bits=DEFAULT_PRIME_BITS, **opciones del constructor)."""
+    return _motor
+
+
+@pytest.fixture
+def engine():
+    """ServerEngine con la semilla por defecto y su propio registro de métricas."""
+    return _motor()
+
+
+@pytest.fixture
+def conectar():
+    """conectar(engine, protocol, address=DIRECCION) -> (sesión, tipos de trama recibidos)."""
+    return _conectar
+
+
+@pytest.fixture
+def http_get():
+    """http_get(server, path) -> (status, Content-Type, cuerpo) de un GET a un MetricsServer."""
+
+    def get(server, path):
+        with urllib.request.urlopen(f"http://{server.address[0]}:{server.address[1]}{path}", timeout=5) as response:
+            return response.status, response.headers["Content-Type"], response.read()
+
+    return get
+
+
+@pytest.fixture
+def servidor():
+    """
+    Fábrica de backends escuchando en un puerto libre de 127.0.0.1:
+    servidor(engine, backend="selector", **opciones del backend). Se detienen
+    al terminar la prueba.
+    """
+    started = []
+
+    def start(engine, backend="selector", **opciones):
+        server = BACKENDS[backend](engine, "127.0.0.1", 0, **opciones)
+        server.start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in reversed(started):
+        if server.running:
+            server.stop()
+
+
+@pytest.fixture
+def metrics_server():
+    """
+    Fábrica de MetricsServer en un puerto libre de 127.0.0.1:
+    metrics_server(snapshot_source, profiler=None). Se detienen al terminar
+    la prueba.
+    """
+    started = []
+
+    def start(source, profiler=None):
+        server = MetricsServer(source, port=0, profiler=profiler)
+        server.start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
@@ -0,0 +1,273 @@
+# loadgen.py
+# Generador de carga sin interfaz gráfica: simula N dispositivos concurrentes con la misma
+# lógica de protocolo que client.py (ClientProtocol.py, vía DeviceClient.py) contra un servidor local.
+# Cada dispositivo hace el handshake FCM, envía mensajes RM cifrados del tamaño y a la tasa
+# indicados (esperando cada respuesta) y cierra con el LCM. Con --sesiones > 1 reconecta y,
+# como ya conoce los parámetros del servidor, usa el handshake de 0.5-RTT.
+# Cada dispositivo es un hilo; con --asyncio todos son corrutinas de un mismo event loop (miles por proceso).
+# Con --multiplexar todos son corrientes de una sola conexión TCP (Multiplex.py), como detrás de un gateway.
+# Sin --port levanta un backend de ServerEngine en un puerto libre de 127.0.0.1.
+# Con --semilla cada dispositivo (y el servidor local) usa un flujo determinista (Randomness.py):
+# mismos parámetros, PSN y nonces en cada corrida.
+# Imprime un JSON con handshakes/s, mensajes/s y latencias p50 / p99 / p999 (ms).
+# USO: python loadgen.py [--dispositivos N] [--mensajes M] [--tamano B] [--tasa R] [--duracion S]
+#                        [--sesiones K] [--sin-compresion] [--asyncio | --multiplexar] [--semilla X] [--backend B] [--host H --port P]
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+
+from ClientProtocol import FRAME_RESPONSE
+from DeviceClient import AsyncDeviceClient, DeviceClient
+from Multiplex import MuxClient
+from Randomness import SeededRandomness
+from SeedAndPrimes import generate_node_id, generate_prime, generate_seed
+from ServerEngine import BACKENDS, ServerEngine
+
+MENSAJE = b"sensor=23.5C;hum=41%;bat=3.71V;"
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+def carga(tamano):
+    """Texto de telemetría de `tamano` bytes (comprimible, como las lecturas reales)."""
+    return (MENSAJE * (tamano // len(MENSAJE) + 1))[:tamano]
+
+
+class Resultados:
+    """Acumula las mediciones de todos los dispositivos (protegido por un lock)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handshakes = []   # (inicio, fin) de cada handshake
+        self.mensajes = []     # (inicio, fin) de cada mensaje RM
+        self.errores = []
+
+    def agregar(self, handshakes, mensajes):
+        with self.lock:
+            self.handshakes.extend(handshakes)
+            self.mensajes.extend(mensajes)
+
+    def error(self, e):
+        with self.lock:
+            self.errores.append(f"{type(e).__name__}: {e}")
+
+
+def sesiones(args, fin):
+    """(mensajes, fin del envío) de cada sesión: los mensajes o el tiempo se reparten entre ellas."""
+    for sesion in range(args.sesiones):
+        por_sesion = args.mensajes // args.sesiones + (sesion < args.mensajes % args.sesiones)
+        fin_sesion = fin - (args.sesiones - 1 - sesion) * args.duracion / args.sesiones if fin is not None else None
+        yield por_sesion, fin_sesion
+
+
+def dispositivo(address, args, fin, resultados, rng):
+    """Un dispositivo simulado (un hilo): --sesiones conexiones con sus mensajes repartidos."""
+    client = DeviceClient(*address, compression=not args.sin_compresion, rng=rng)
+    payload = carga(args.tamano)
+    intervalo = 1.0 / args.tasa if args.tasa > 0 else 0.0
+    handshakes, mensajes = [], []
+    try:
+        for por_sesion, fin_sesion in sesiones(args, fin):
+            # Sin ticket: desde la segunda sesión se mide el handshake de 0.5-RTT
+            inicio = time.perf_counter()
+            client.connect(timeout=None, resume=False)
+            handshakes.append((inicio, time.perf_counter()))
+
+            siguiente = time.perf_counter()
+            enviados = 0
+            while time.perf_counter() < fin_sesion if fin_sesion is not None else enviados < por_sesion:
+                if intervalo:
+                    espera = siguiente - time.perf_counter()
+                    if espera > 0:
+                        time.sleep(espera)
+                    siguiente += intervalo
+                inicio = time.perf_counter()
+                client.send(payload)
+                while client.recv()[0] != FRAME_RESPONSE:
+                    pass
+                mensajes.append((inicio, time.perf_counter()))
+                enviados += 1
+            client.close()
+    except Exception as e:
+        resultados.error(e)
+        client.close()
+    resultados.agregar(handshakes, mensajes)
+
+
+async def dispositivo_async(address, args, fin, resultados, rng):
+    """Lo mismo que dispositivo(), como corrutina (--asyncio: todos en un solo event loop)."""
+    client = AsyncDeviceClient(*address, compression=not args.sin_compresion, rng=rng)
+    payload = carga(args.tamano)
+    intervalo = 1.0 / args.tasa if args.tasa > 0 else 0.0
+    handshakes, mensajes = [], []
+    try:
+        for por_sesion, fin_sesion in sesiones(args, fin):
+            inicio = time.perf_counter()
+            await client.connect(timeout=None, resume=False)
+            handshakes.append((inicio, time.perf_counter()))
+
+            siguiente = time.perf_counter()
+            enviados = 0
+            while time.perf_counter() < fin_sesion if fin_sesion is not None else enviados < por_sesion:
+                if intervalo:
+                    espera = siguiente - time.perf_counter()
+                    if espera > 0:
+                        await asyncio.sleep(espera)
+                    siguiente += intervalo
+                inicio = time.perf_counter()
+                await client.send(payload)
+                while (await client.recv())[0] != FRAME_RESPONSE:
+                    pass
+                mensajes.append((inicio, time.perf_counter()))
+                enviados += 1
+            await client.close()
+    except Exception as e:
+        resultados.error(e)
+        await client.close()
+    resultados.agregar(handshakes, mensajes)
+
+
+def dispositivos_mux(address, args, resultados, rng):
+    """
+    --multiplexar: todos los dispositivos como corrientes de una sola conexión (Multiplex.py),
+    desde un solo hilo y por rondas: un mensaje de cada dispositivo y después todas las respuestas.
+    """
+    mux = MuxClient(*address, compression=not args.sin_compresion, rng=rng)
+    payload = carga(args.tamano)
+    handshakes, mensajes = [], []
+    try:
+        mux.connect(timeout=None)
+        corrientes = [mux.stream() for _ in range(args.dispositivos)]
+        for por_sesion, _ in sesiones(args, None):
+            inicio = time.perf_counter()
+            for corriente in corrientes:
+                corriente.connect(timeout=None, resume=False)
+            handshakes.extend([(inicio, time.perf_counter())] * len(corrientes))
+
+            for _ in range(por_sesion):
+                inicio = time.perf_counter()
+                for corriente in corrientes:
+                    corriente.send(payload)
+                for corriente in corrientes:
+                    while corriente.recv()[0] != FRAME_RESPONSE:
+                        pass
+                    mensajes.append((inicio, time.perf_counter()))
+            for corriente in corrientes:
+                corriente.close()
+    except Exception as e:
+        resultados.error(e)
+    mux.close()
+    resultados.agregar(handshakes, mensajes)
+
+
+def tasa(intervalos):
+    """Operaciones por segundo entre el primer inicio y el último fin."""
+    if not intervalos:
+        return 0.0
+    total = max(f for _, f in intervalos) - min(i for i, _ in intervalos)
+    return len(intervalos) / total if total > 0 else 0.0
+
+
+def latencias_ms(intervalos):
+    valores = [f - i for i, f in intervalos]
+    return {f"p{nombre}": None if percentil(valores, p) is None else round(percentil(valores, p) * 1e3, 3)
+            for nombre, p in (("50", 50), ("99", 99), ("999", 99.9))}
+
+
+def ejecutar(address, args):
+    resultados = Resultados()
+    fin = time.perf_counter() + args.duracion if args.duracion else None
+    semilla = SeededRandomness(args.semilla) if args.semilla is not None else None
+    rngs = [semilla.fork(f"dispositivo-{i}") if semilla is not None else None for i in range(args.dispositivos)]
+    inicio = time.perf_counter()
+    if args.multiplexar:
+        dispositivos_mux(address, args, resultados, semilla.fork("gateway") if semilla is not None else None)
+    elif args.asyncio:
+        async def todos():
+            await asyncio.gather(*(dispositivo_async(address, args, fin, resultados, rng) for rng in rngs))
+        asyncio.run(todos())
+    else:
+        hilos = [threading.Thread(target=dispositivo, daemon=True, args=(address, args, fin, resultados, rng))
+                 for rng in rngs]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+    total = time.perf_counter() - inicio
+    return {
+        "dispositivos": args.dispositivos,
+        "tamano_bytes": args.tamano,
+        "tasa_por_dispositivo": args.tasa or None,
+        "sesiones_por_dispositivo": args.sesiones,
+        "compresion": not args.sin_compresion,
+        "modo": "multiplexado" if args.multiplexar else "asyncio" if args.asyncio else "hilos",
+        "semilla": args.semilla,
+        "duracion_s": round(total, 3),
+        "handshakes": len(resultados.handshakes),
+        "handshakes_por_s": round(tasa(resultados.handshakes), 1),
+        "latencia_handshake_ms": latencias_ms(resultados.handshakes),
+        "mensajes": len(resultados.mensajes),
+        "mensajes_por_s": round(tasa(resultados.mensajes), 1),
+        "latencia_ms": latencias_ms(resultados.mensajes),
+        "errores": len(resultados.errores),
+        "primeros_errores": resultados.errores[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga con dispositivos simulados")
+    parser.add_argument("--dispositivos", type=int, default=16, help="dispositivos concurrentes")
+    parser.add_argument("--mensajes", type=int, default=100, help="mensajes RM por dispositivo")
+    parser.add_argument("--tamano", type=int, default=32, help="bytes de cada mensaje")
+    parser.add_argument("--tasa", type=float, default=0.0,
+                        help="mensajes/s por dispositivo (0: cada uno en cuanto llega la respuesta)")
+    parser.add_argument("--duracion", type=float, default=None,
+                        help="segundos de envío (ignora --mensajes)")
+    parser.add_argument("--sesiones", type=int, default=1,
+                        help="conexiones por dispositivo (desde la segunda con 0.5-RTT)")
+    parser.add_argument("--sin-compresion", action="store_true", help="no ofrecer zlib en el FCM")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="todos los dispositivos en un event loop (AsyncDeviceClient) en vez de un hilo cada uno")
+    parser.add_argument("--multiplexar", action="store_true",
+                        help="todos los dispositivos como corrientes de una sola conexión (Multiplex.py)")
+    parser.add_argument("--semilla", type=int, default=None,
+                        help="aleatoriedad determinista (solo para benchmarks; ver Randomness.py)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="selector",
+                        help="backend del servidor local")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="servidor ya en marcha (sin él se levanta uno)")
+    args = parser.parse_args()
+    if args.dispositivos < 1 or args.sesiones < 1 or args.tamano < 1:
+        parser.error("--dispositivos, --sesiones y --tamano deben ser >= 1")
+    if args.multiplexar and (args.asyncio or args.tasa or args.duracion):
+        parser.error("--multiplexar va por rondas: no se combina con --asyncio, --tasa ni --duracion")
+
+    if args.port is not None:
+        reporte = ejecutar((args.host, args.port), args)
+    else:
+        rng = SeededRandomness(args.semilla).fork("servidor") if args.semilla is not None else None
+        engine = ServerEngine(generate_node_id(rng=rng), generate_prime(rng=rng), generate_seed(rng=rng), rng=rng)
+        backend = BACKENDS[args.backend](engine, "127.0.0.1", 0, backlog=max(128, args.dispositivos))
+        backend.start()
+        try:
+            reporte = ejecutar(backend.address, args)
+            reporte["backend"] = args.backend
+            reporte["servidor"] = backend.stats()
+        finally:
+            backend.stop()
+    json.dump(reporte, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# replay.py
+# Reproduce una captura de tramas (Capture.py) lo más rápido posible para medir throughput con la forma
+# real del tráfico grabado.
+#  - Modo "pipeline" (por defecto): sin red. Crea un ServerEngine con los parámetros del servidor que
+#    aparecen en la captura y pasa las tramas de cada conexión por open_session / handle_message
+#    (derivación de llaves, descifrado, funciones reversibles, respuestas cifradas).
+#  - Modo "vivo": envía las tramas de cada conexión por TCP a un backend local levantado con esos mismos
+#    parámetros (o a --host/--port, que debe ser el mismo servidor que grabó) y lee las respuestas.
+# Las conexiones que empiezan con [RESUME] se omiten: el ticket solo lo abre la llave del servidor original.
+# Una captura anexada por varias corridas del servidor se reproduce por corrida: cada una con los parámetros
+# de servidor que grabó (un motor o backend por juego de parámetros).
+# USO: python replay.py captura.bin [--modo pipeline|vivo] [--repeticiones R] [--concurrencia C]
+#                       [--backend B] [--host H --port P]
+
+import argparse
+import queue
+import socket
+import sys
+import threading
+import time
+
+from tabulate import tabulate
+
+from Capture import DIRECTION_IN, group_by_connection, read_capture
+from Framing import encode_frame, recv_frame
+from Handshake import HandshakeError, parse_params
+from Metrics import MetricsRegistry
+from Resumption import RESUME_PREFIX
+from ServerEngine import BACKENDS, ServerEngine
+
+
+def parametros_por_corrida(connections):
+    """corrida -> parámetros (id, Q, S_server) del primer FCM con respuesta del servidor."""
+    params_by_run = {}
+    for (run, _), conn in connections.items():
+        if run in params_by_run or not conn["in"] or not conn["out"] or conn["in"][0].startswith(RESUME_PREFIX):
+            continue
+        try:
+            params = parse_params(conn["out"][0])
+        except HandshakeError:
+            continue
+        params_by_run[run] = (params.node_id, params.prime, params.seed)
+    return params_by_run
+
+
+def cargar(path):
+    """
+    Conexiones reproducibles agrupadas por los parámetros (id, Q, S_server)
+    del servidor que las grabó: {parámetros: [tramas entrantes de cada conexión]}.
+    """
+    records = list(read_capture(path))
+    connections = group_by_connection(records)
+    params_by_run = parametros_por_corrida(connections)
+    grupos, omitidas = {}, 0
+    for (run, _), conn in sorted(connections.items(), key=lambda item: item[1]["start"]):
+        server_params = params_by_run.get(run)
+        if not conn["in"] or conn["in"][0].startswith(RESUME_PREFIX) or server_params is None:
+            omitidas += 1
+            continue
+        grupos.setdefault(server_params, []).append(conn["in"])
+    if not grupos:
+        raise SystemExit(f"{path}: no hay ningún FCM completo con respuesta del servidor")
+    duracion = records[-1].timestamp - records[0].timestamp if records else 0.0
+    entrantes = sum(1 for r in records if r.direction == DIRECTION_IN)
+    return grupos, omitidas, duracion, entrantes
+
+
+def pipeline(grupos, repeticiones):
+    """Pasa las tramas por un motor por juego de parámetros, sin sockets. Retorna (segundos, tramas, errores)."""
+    engines = {server_params: ServerEngine(*server_params, metrics=MetricsRegistry()) for server_params in grupos}
+    tramas = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for server_params, conexiones in grupos.items():
+            engine = engines[server_params]
+            for i, frames in enumerate(conexiones):
+                address = ("replay", i)
+                session = None
+                for frame in frames:
+                    tramas += 1
+                    if session is None:
+                        session, _ = engine.open_session(address, frame)
+                        continue
+                    _, close = engine.handle_message(session, frame)
+                    if close:
+                        break
+                engine.close_session(session)
+    segundos = time.perf_counter() - inicio
+    return segundos, tramas, sum(engine.stats()["errors"] for engine in engines.values())
+
+
+def reproducir_conexion(address, frames):
+    """Envía todas las tramas de una conexión, cierra la escritura y lee hasta que el servidor cierre."""
+    respuestas = 0
+    with socket.create_connection(address) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(b"".join(encode_frame(frame) for frame in frames))
+        sock.shutdown(socket.SHUT_WR)
+        while recv_frame(sock) is not None:
+            respuestas += 1
+    return respuestas
+
+
+def vivo(conexiones, address, repeticiones, concurrencia):
+    """Reproduce las conexiones contra un servidor. Retorna (segundos, tramas, respuestas, errores)."""
+    pendientes = queue.Queue()
+    for _ in range(repeticiones):
+        for frames in conexiones:
+            pendientes.put(frames)
+    totales = {"tramas": 0, "respuestas": 0, "errores": 0}
+    lock = threading.Lock()
+
+    def trabajador():
+        while True:
+            try:
+                frames = pendientes.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                respuestas = reproducir_conexion(address, frames)
+                errores = 0
+            except OSError:
+                respuestas, errores = 0, 1
+            with lock:
+                totales["tramas"] += len(frames)
+                totales["respuestas"] += respuestas
+                totales["errores"] += errores
+
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return time.perf_counter() - inicio, totales["tramas"], totales["respuestas"], totales["errores"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una captura de tramas (Capture.py)")
+    parser.add_argument("captura")
+    parser.add_argument("--modo", choices=["pipeline", "vivo"], default="pipeline")
+    parser.add_argument("--repeticiones", type=int, default=1, help="veces que se reproduce la captura")
+    parser.add_argument("--concurrencia", type=int, default=8, help="conexiones simultáneas (modo vivo)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="selector",
+                        help="backend del servidor local (modo vivo)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None,
+                        help="servidor ya en marcha (modo vivo; debe ser el mismo que grabó)")
+    args = parser.parse_args()
+
+    grupos, omitidas, duracion, entrantes = cargar(args.captura)
+    total = sum(len(conexiones) for conexiones in grupos.values())
+    print(f"Captura: {total} conexiones ({omitidas} omitidas) de {len(grupos)} servidor(es), "
+          f"{entrantes} tramas entrantes en {duracion:.1f} s de tráfico original")
+
+    if args.modo == "pipeline":
+        segundos, tramas, errores = pipeline(grupos, args.repeticiones)
+        fila = ["pipeline", tramas, "-", errores]
+    elif args.port is not None:
+        if len(grupos) > 1:
+            print("Aviso: la captura tiene varios juegos de parámetros de servidor; solo se reproducen bien "
+                  "las conexiones del servidor en marcha")
+        conexiones = [frames for grupo in grupos.values() for frames in grupo]
+        segundos, tramas, respuestas, errores = vivo(conexiones, (args.host, args.port),
+                                                     args.repeticiones, args.concurrencia)
+        fila = [f"vivo {args.host}:{args.port}", tramas, respuestas, errores]
+    else:
+        segundos = tramas = respuestas = errores = 0
+        for server_params, conexiones in grupos.items():
+            engine = ServerEngine(*server_params, metrics=MetricsRegistry())
+            backend = BACKENDS[args.backend](engine, "127.0.0.1", 0, backlog=max(128, args.concurrencia))
+            backend.start()
+            try:
+                resultado = vivo(conexiones, backend.address, args.repeticiones, args.concurrencia)
+                errores += engine.stats()["errors"]
+            finally:
+                backend.stop()
+            segundos += resultado[0]
+            tramas += resultado[1]
+            respuestas += resultado[2]
+        fila = [f"vivo ({args.backend})", tramas, respuestas, errores]
+
+    fila += [f"{segundos:.3f} s", f"{tramas / segundos:.0f}" if segundos > 0 else "-"]
+    print(tabulate([fila], headers=["Modo", "Tramas", "Respuestas", "Errores", "Tiempo", "Tramas/s"],
+                   tablefmt="fancy_grid"))
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,17 @@
-import socket
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import threading
 import time
-from PSN import encrypt_message, decrypt_message, extract_psn_from_plaintext_using_instruction
 from SeedAndPrimes import generate_prime, generate_seed, generate_node_id
-from KeyGenerator import generate_key_table
-from MessageTypes import MessageType, get_message_info, format_message_log
-from dataclasses import dataclass
-
-@dataclass
-class SharedParams:
-    id: int
-    P: int
-    Q: int
-    S: int
-    N: int = 16  # Número de llaves a generar
+from Admission import AdmissionController
+from Capture import CaptureWriter
+from KeyMonitor import KeyMonitorWindow
+from Metrics import MetricsServer
+from ServerEngine import BACKENDS, BROADCAST_PREFIX, DEFAULT_BACKLOG, ServerEngine
+from Session import SessionRegistry
 
 class CryptographyServer:
-    def __init__(self):
+    def __init__(self, backend="threaded", backlog=DEFAULT_BACKLOG, max_sessions=None, metrics_port=None,
+                 idle_timeout=None, memory_budget=None, capture_path=None):
         self.root = tk.Tk()
         self.root.title("Cryptography Server")
         self.root.geometry("700x600")
@@ -29,9 +22,18 @@ class CryptographyServer:
         self.setup_styles()
         
         # Variables
-        self.server_socket = None
-        self.clients = []  # Lista de conexiones de clientes
-        self.client_states = {}  # Almacenar estado por cliente (address -> (next_psn, next_instruction, key_table, key_index))
+        self.engine = None
+        self.backend = None  # Backend de E/S (ver ServerEngine.BACKENDS)
+        self.backend_name = backend
+        self.backlog = backlog  # Cola de conexiones pendientes de listen()
+        self.max_sessions = max_sessions  # Límite de sesiones simultáneas (None = sin límite)
+        self.metrics_port = metrics_port  # Puerto del endpoint /metrics (None = desactivado)
+        self.metrics_server = None
+        self.idle_timeout = idle_timeout  # Expulsar sesiones inactivas tras N segundos (None = nunca)
+        self.memory_budget = memory_budget  # Bytes máximos de sesiones antes de expulsar (None = sin límite)
+        self.capture_path = capture_path  # Archivo de captura de tramas (None = sin captura)
+        self.capture = None
+        self.sessions = SessionRegistry()  # Estado por sesión (session_id -> Session)
         self.running = False
         self.host = '127.0.0.1'
         self.port = 65432
@@ -42,8 +44,7 @@ class CryptographyServer:
         self.S_server = generate_seed(tag="server")  # Semilla del servidor
         
         # Variables para monitoreo visual
-        self.key_monitor_window = None
-        self.selected_client = None
+        self.key_monitor_window = None  # KeyMonitor.KeyMonitorWindow
         
         # Crear la interfaz del servidor
         self.create_server_interface()
@@ -201,9 +202,22 @@ class CryptographyServer:
                                   font=('Arial', 10),
                                   foreground='white',
                                   background='#2b2b2b')
-        broadcast_label.pack(anchor='w')
-        
-        input_frame = tk.Frame(broadcast_frame, bg='#2b2b2b')
+        broadcast_label.pack(side='left')
+        
+        # Broadcast cifrado una sola vez con la tabla de llaves de grupo
+        self.group_broadcast_var = tk.BooleanVar(value=True)
+        group_check = tk.Checkbutton(broadcast_frame,
+                                     text="🔐 Cifrado de grupo",
+                                     variable=self.group_broadcast_var,
+                                     font=('Arial', 10),
+                                     fg='white',
+                                     bg='#2b2b2b',
+                                     selectcolor='#3c3c3c',
+                                     activebackground='#2b2b2b',
+                                     activeforeground='white')
+        group_check.pack(side='right')
+        
+        input_frame = tk.Frame(main_frame, bg='#2b2b2b')
         input_frame.pack(fill='x', pady=(5, 0))
         
         self.broadcast_entry = tk.Entry(input_frame,
@@ -249,10 +263,27 @@ class CryptographyServer:
     def start_server(self):
         """Iniciar el servidor"""
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            # Motor del protocolo + backend de E/S (misma interfaz para todos)
+            self.engine = ServerEngine(self.node_id, self.Q, self.S_server,
+                                       on_log=self.post_log,
+                                       registry=self.sessions)
+            backend_class = BACKENDS[self.backend_name]
+            if self.capture_path is not None:
+                self.capture = CaptureWriter(self.capture_path)
+            self.backend = backend_class(self.engine, self.host, self.port,
+                                         backlog=self.backlog,
+                                         admission=AdmissionController(max_sessions=self.max_sessions),
+                                         idle_timeout=self.idle_timeout,
+                                         memory_budget=self.memory_budget,
+                                         on_connections_changed=lambda: self.root.after(0, self.update_connections_count),
+                                         capture=self.capture)
+            self.backend.start()
+            
+            # Endpoint de métricas (Prometheus) en localhost
+            if self.metrics_port is not None and self.metrics_server is None:
+                self.metrics_server = MetricsServer(port=self.metrics_port)
+                self.metrics_server.start()
+                self.add_log("Servidor", f"Métricas en http://127.0.0.1:{self.metrics_server.address[1]}/metrics", "#107c10")
             
             self.running = True
             
@@ -263,11 +294,7 @@ class CryptographyServer:
             self.monitor_button.config(state='normal')
             self.send_button.config(state='normal')
             
-            self.add_log("Servidor", f"Servidor iniciado en {self.host}:{self.port}", "#107c10")
-            
-            # Iniciar hilo para aceptar conexiones
-            accept_thread = threading.Thread(target=self.accept_connections, daemon=True)
-            accept_thread.start()
+            self.add_log("Servidor", f"Servidor iniciado en {self.host}:{self.port} (backend: {self.backend_name})", "#107c10")
             
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo iniciar el servidor:\n{str(e)}")
@@ -277,21 +304,18 @@ class CryptographyServer:
         """Detener el servidor"""
         self.running = False
         
-        # Cerrar todas las conexiones de clientes
-        for client_socket, client_address in self.clients[:]:
-            try:
-                client_socket.close()
-            except:
-                pass
-        self.clients.clear()
-        self.client_states.clear()
-        
-        # Cerrar socket del servidor
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-            except:
-                pass
+        # Cerrar el backend (socket de escucha y todas las conexiones)
+        if self.backend is not None:
+            self.backend.stop()
+            self.backend = None
+        if self.capture is not None:
+            self.capture.close()
+            self.add_log("Servidor", f"Captura guardada en {self.capture_path} ({self.capture.records} tramas)", "#107c10")
+            self.capture = None
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        self.sessions.clear()
         
         # Actualizar interfaz
         self.status_label.config(text="● Detenido", foreground="#d13438")
@@ -303,415 +327,76 @@ class CryptographyServer:
         
         self.add_log("Servidor", "Servidor detenido", "#d13438")
     
-    def accept_connections(self):
-        """Aceptar conexiones de clientes en un hilo separado"""
-        while self.running:
-            try:
-                client_socket, client_address = self.server_socket.accept()
-                self.clients.append((client_socket, client_address))
-                
-                # Iniciar hilo para manejar este cliente
-                client_thread = threading.Thread(target=self.handle_client, 
-                                               args=(client_socket, client_address), 
-                                               daemon=True)
-                client_thread.start()
-                
-            except Exception as e:
-                if self.running:
-                    error_msg = f"Error aceptando conexión: {str(e)}"
-                    self.root.after(0, lambda msg=error_msg: self.add_log("Error", msg, "#d13438"))
-                break
-    
-    def handle_client(self, client_socket, client_address):
-        """Manejar la comunicación con un cliente específico"""
-        try:
-            # Mostrar mensaje FCM
-            fcm_msg = format_message_log(MessageType.FCM, f"Recibiendo parámetros de {client_address[0]}")
-            self.root.after(0, lambda msg=fcm_msg: self.add_log("Sistema", msg, get_message_info(MessageType.FCM)["color"]))
-            
-            # Recibir parámetros del cliente
-            params_data = client_socket.recv(1024).decode()
-            P_client, S_client = map(int, params_data.split(','))
-            
-            # Calcular semilla compartida
-            S_shared = self.S_server ^ S_client
-            
-            # Crear parámetros compartidos
-            shared_params = SharedParams(
-                id=self.node_id,
-                P=P_client,
-                Q=self.Q,
-                S=S_shared
-            )
-            
-            # Generar tabla de claves
-            key_table = generate_key_table(shared_params)
-            
-            # Almacenar estado del cliente
-            self.client_states[client_address] = {
-                'next_psn': 0,
-                'next_instruction': None,
-                'key_table': key_table,
-                'key_index': 0,
-                'key_regeneration_count': 0
-            }
-            
-            # Enviar parámetros del servidor al cliente
-            server_params = f"{self.Q},{self.S_server}"
-            client_socket.sendall(server_params.encode())
-            
-            # Confirmar FCM completado
-            fcm_complete = format_message_log(MessageType.FCM, f"Handshake completado con {client_address[0]}")
-            self.root.after(0, lambda msg=fcm_complete: self.add_log("Sistema", msg, get_message_info(MessageType.FCM)["color"]))
-            
-            while self.running:
-                data = client_socket.recv(2048)
-                if not data:
-                    break
-                
-                try:
-                    # Verificar si es un mensaje en texto claro
-                    if data.startswith(b"[PLAINTEXT]"):
-                        message = data.decode()[11:]  # Remover prefijo [PLAINTEXT]
-                        response = "Mensaje en texto claro recibido correctamente"
-                        self.root.after(0, lambda msg=message: self.add_log(f"Cliente {client_address[0]} 🔓", f"Dice: {msg}", "#ff9900"))
-                        
-                        # Enviar respuesta en texto claro
-                        plaintext_response = f"[PLAINTEXT]{response}"
-                        client_socket.sendall(plaintext_response.encode())
-                        continue
-                    
-                    # Mensaje cifrado - procesar normalmente
-                    client_state = self.client_states[client_address]
-                    key_index = client_state['key_index']
-                    key = client_state['key_table'][key_index]
-                    
-                    # Verificar si necesitamos regenerar llaves
-                    if key_index == 0 and client_state.get('key_regeneration_count', 0) > 0:
-                        kum_msg = format_message_log(MessageType.KUM, f"Cliente {client_address[0]} regeneró tabla de llaves (ciclo #{client_state['key_regeneration_count'] + 1})")
-                        self.root.after(0, lambda msg=kum_msg: self.add_log("Sistema", msg, get_message_info(MessageType.KUM)["color"]))
-                    
-                    # Mostrar mensaje RM
-                    rm_msg = format_message_log(MessageType.RM, f"Cliente {client_address[0]} - Llave K{key_index:02d}, PSN={client_state['next_psn']}")
-                    self.root.after(0, lambda msg=rm_msg: self.add_log("Sistema", msg, get_message_info(MessageType.RM)["color"]))
-                    
-                    # Desencriptar mensaje
-                    result = decrypt_message(data, key.to_bytes(8, 'big'))
-                    plaintext = result["plaintext"]
-                    message = plaintext.decode()
-                    
-                    # Debug: mostrar estado antes de actualizar
-                    old_psn = client_state['next_psn']
-                    debug_msg = f"Servidor antes: PSN={old_psn}, Key=K{key_index}, Mensaje='{message}'"
-                    self.root.after(0, lambda msg=debug_msg: self.add_log("Debug", msg, "#888888"))
-                    
-                    # Actualizar estado del cliente
-                    current_instruction = result["next_extraction_instruction"]
-                    next_psn = extract_psn_from_plaintext_using_instruction(plaintext, current_instruction)
-                    client_state['next_psn'] = next_psn
-                    client_state['next_instruction'] = current_instruction
-                    old_key_index = key_index
-                    client_state['key_index'] = (key_index + 1) % len(client_state['key_table'])
-                    
-                    # Debug: mostrar estado después de actualizar
-                    debug_msg2 = f"Servidor después: PSN {old_psn}→{next_psn}, Key K{old_key_index}→K{client_state['key_index']}"
-                    self.root.after(0, lambda msg=debug_msg2: self.add_log("Debug", msg, "#888888"))
-                    
-                    # Si volvemos al inicio, incrementar contador de regeneración
-                    if old_key_index == len(client_state['key_table']) - 1:
-                        client_state['key_regeneration_count'] = client_state.get('key_regeneration_count', 0) + 1
-                    
-                    # Manejar mensajes especiales
-                    if message == "First Message Contact":
-                        response = "Conexión establecida correctamente"
-                        self.root.after(0, lambda: self.add_log(f"Cliente {client_address[0]} 🔐", "Mensaje de contacto inicial recibido", "#0078d4"))
-                    elif message == "Last Message Contact":
-                        # Mostrar mensaje LCM
-                        lcm_msg = format_message_log(MessageType.LCM, f"Cliente {client_address[0]} cerrando conexión")
-                        self.root.after(0, lambda msg=lcm_msg: self.add_log("Sistema", msg, get_message_info(MessageType.LCM)["color"]))
-                        
-                        response = "Desconexión confirmada"
-                        # Enviar respuesta encriptada
-                        cipher_response = encrypt_message(response.encode(), client_state['next_psn'], key.to_bytes(8, 'big'))
-                        client_socket.sendall(cipher_response)
-                        
-                        # Eliminar estado del cliente (LCM completado)
-                        if client_address in self.client_states:
-                            del self.client_states[client_address]
-                        
-                        lcm_complete = format_message_log(MessageType.LCM, f"Tabla de llaves de {client_address[0]} eliminada")
-                        self.root.after(0, lambda msg=lcm_complete: self.add_log("Sistema", msg, get_message_info(MessageType.LCM)["color"]))
-                        break
-                    else:
-                        response = "Mensaje cifrado recibido correctamente"
-                        self.root.after(0, lambda msg=message: self.add_log(f"Cliente {client_address[0]} 🔐", f"Dice: {msg}", "#ffffff"))
-                    
-                    # Enviar respuesta encriptada
-                    cipher_response = encrypt_message(response.encode(), client_state['next_psn'], key.to_bytes(8, 'big'))
-                    client_socket.sendall(cipher_response)
-                    
-                except Exception as e:
-                    error_msg = f"Error procesando mensaje de {client_address[0]}: {str(e)}"
-                    self.root.after(0, lambda msg=error_msg: self.add_log("Error", msg, "#d13438"))
-                    try:
-                        error_response = "Error procesando mensaje"
-                        client_socket.sendall(error_response.encode())
-                    except:
-                        pass
-                
-        except Exception as e:
-            if self.running:
-                error_msg = f"Error con cliente {client_address[0]}: {str(e)}"
-                self.root.after(0, lambda msg=error_msg: self.add_log("Error", msg, "#d13438"))
-        finally:
-            # Remover cliente de la lista
-            try:
-                self.clients.remove((client_socket, client_address))
-                if client_address in self.client_states:
-                    del self.client_states[client_address]
-                client_socket.close()
-                self.root.after(0, lambda: self.add_log("Desconexión", f"Cliente {client_address[0]}:{client_address[1]} desconectado", "#ffb900"))
-                self.root.after(0, self.update_connections_count)
-            except:
-                pass
+    def post_log(self, sender, message, color="#ffffff"):
+        """Agregar un mensaje al log desde cualquier hilo (vía root.after)"""
+        self.root.after(0, lambda: self.add_log(sender, message, color))
     
     def update_connections_count(self):
         """Actualizar el contador de conexiones"""
-        count = len(self.clients)
-        self.connections_count_label.config(text=str(count))
+        if self.backend is None:
+            self.connections_count_label.config(text="0")
+            return
+        admission = self.backend.admission.stats()
+        rejected = admission["rejected_sessions"] + admission["rejected_handshakes"]
+        text = str(self.backend.connection_count())
+        if rejected:
+            text += f"  (rechazadas: {rejected})"
+        self.connections_count_label.config(text=text)
     
     def send_broadcast(self, event=None):
         """Enviar mensaje broadcast a todos los clientes conectados"""
         message = self.broadcast_entry.get().strip()
-        if not message or not self.clients:
+        if not message or self.backend is None or not self.backend.connection_count():
             return
         
-        disconnected_clients = []
-        sent_count = 0
-        
-        for client_socket, client_address in self.clients:
-            try:
-                # Enviar mensaje en texto plano (no encriptado para broadcast)
-                client_socket.sendall(f"[BROADCAST] {message}".encode())
-                sent_count += 1
-            except:
-                disconnected_clients.append((client_socket, client_address))
-        
-        # Remover clientes desconectados
-        for client in disconnected_clients:
+        if self.group_broadcast_var.get():
+            # Cifrar una sola vez con la tabla de grupo; los mismos bytes van a todos
             try:
-                self.clients.remove(client)
-                if client[1] in self.client_states:
-                    del self.client_states[client[1]]
-            except:
-                pass
+                payload = self.engine.group.encrypt(message.encode())
+            except Exception as e:
+                self.add_log("Error", f"Error en broadcast: {str(e)}", "#d13438")
+                return
+        else:
+            # Mensaje en texto plano (sin cifrar)
+            payload = BROADCAST_PREFIX + message.encode()
+        
+        # Solo se encola en cada conexión: la GUI no espera a ningún socket.
+        future = self.backend.fanout.broadcast(payload)
+        future.add_done_callback(lambda f, msg=message: self.root.after(0, lambda: self.on_broadcast_done(f, msg)))
         
-        self.add_log("Broadcast", f"Mensaje enviado a {sent_count} cliente(s): {message}", "#ffb900")
         self.broadcast_entry.delete(0, tk.END)
+    
+    def on_broadcast_done(self, future, message):
+        """Registrar en el log las estadísticas de entrega de un broadcast"""
+        try:
+            stats = future.result()
+        except Exception as e:
+            self.add_log("Error", f"Error en broadcast: {str(e)}", "#d13438")
+            return
+        detail = ""
+        if stats.dropped_oldest or stats.disconnected or stats.waiting:
+            detail = (f" (descartes: {stats.dropped_oldest}, desconectados: {stats.disconnected}, "
+                      f"esperando espacio: {stats.waiting})")
+        self.add_log("Broadcast", f"Mensaje encolado para {stats.delivered}/{stats.targets} cliente(s){detail}: {message}", "#ffb900")
         self.update_connections_count()
     
     def show_key_monitor(self):
         """Mostrar ventana de monitoreo de llaves"""
-        if not self.client_states:
+        if not len(self.sessions):
             messagebox.showinfo("Monitor de Llaves", "No hay clientes conectados para monitorear.")
             return
             
-        if self.key_monitor_window is not None and self.key_monitor_window.winfo_exists():
+        if self.key_monitor_window is not None and self.key_monitor_window.exists():
             self.key_monitor_window.lift()
             return
         
-        self.key_monitor_window = tk.Toplevel(self.root)
-        self.key_monitor_window.title("🔑 Monitor de Llaves - Servidor")
-        self.key_monitor_window.geometry("700x600")
-        self.key_monitor_window.configure(bg='#2b2b2b')
-        
-        # Header
-        header_frame = tk.Frame(self.key_monitor_window, bg='#2b2b2b')
-        header_frame.pack(fill='x', padx=10, pady=10)
-        
-        title_label = tk.Label(header_frame,
-                              text="🔑 Monitor de Llaves - Servidor",
-                              font=('Arial', 16, 'bold'),
-                              fg='white',
-                              bg='#2b2b2b')
-        title_label.pack(side='left')
-        
-        # Selector de cliente
-        client_frame = tk.Frame(self.key_monitor_window, bg='#2b2b2b')
-        client_frame.pack(fill='x', padx=10, pady=(0, 10))
-        
-        tk.Label(client_frame,
-                text="Cliente:",
-                font=('Arial', 12, 'bold'),
-                fg='white',
-                bg='#2b2b2b').pack(side='left')
-        
-        self.client_var = tk.StringVar()
-        client_addresses = [f"{addr[0]}:{addr[1]}" for addr in self.client_states.keys()]
-        if client_addresses:
-            self.client_var.set(client_addresses[0])
-            self.selected_client = list(self.client_states.keys())[0]
-        
-        client_combo = ttk.Combobox(client_frame,
-                                   textvariable=self.client_var,
-                                   values=client_addresses,
-                                   state='readonly',
-                                   width=20)
-        client_combo.pack(side='left', padx=(10, 0))
-        client_combo.bind('<<ComboboxSelected>>', self.on_client_selected)
-        
-        # Información de sincronización
-        self.sync_frame = tk.Frame(self.key_monitor_window, bg='#2b2b2b')
-        self.sync_frame.pack(fill='x', padx=10, pady=(0, 10))
-        
-        self.current_key_label = tk.Label(self.sync_frame,
-                                         text="Llave Actual: K0",
-                                         font=('Arial', 12, 'bold'),
-                                         fg='#ffb900',
-                                         bg='#2b2b2b')
-        self.current_key_label.pack(side='left')
-        
-        self.psn_label = tk.Label(self.sync_frame,
-                                 text="PSN Actual: 0",
-                                 font=('Arial', 12, 'bold'),
-                                 fg='#0078d4',
-                                 bg='#2b2b2b')
-        self.psn_label.pack(side='right')
-        
-        # Frame principal con scroll
-        main_frame = tk.Frame(self.key_monitor_window, bg='#2b2b2b')
-        main_frame.pack(expand=True, fill='both', padx=10, pady=(0, 10))
-        
-        # Canvas y scrollbar para la lista de llaves
-        self.canvas = tk.Canvas(main_frame, bg='#1e1e1e', highlightthickness=0)
-        scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = tk.Frame(self.canvas, bg='#1e1e1e')
-        
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        )
-        
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
-        
-        self.canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
-        # Botón de actualizar
-        refresh_button = tk.Button(self.key_monitor_window,
-                                  text="🔄 Actualizar",
-                                  font=('Arial', 10, 'bold'),
-                                  fg='white',
-                                  bg='#0078d4',
-                                  command=self.refresh_server_key_monitor)
-        refresh_button.pack(pady=10)
-        
-        # Cargar datos iniciales
-        self.refresh_server_key_monitor()
-        
-        # Actualizar automáticamente cada segundo
-        self.update_server_key_monitor()
-    
-    def on_client_selected(self, event):
-        """Manejar selección de cliente"""
-        selected_text = self.client_var.get()
-        if selected_text:
-            ip, port = selected_text.split(':')
-            self.selected_client = (ip, int(port))
-            self.refresh_server_key_monitor()
-    
-    def refresh_server_key_monitor(self):
-        """Actualizar manualmente el monitor de llaves del servidor"""
-        if not self.selected_client or self.selected_client not in self.client_states:
-            return
-        
-        # Limpiar frame
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        
-        client_state = self.client_states[self.selected_client]
-        key_table = client_state['key_table']
-        key_index = client_state['key_index']
-        next_psn = client_state['next_psn']
-        
-        # Actualizar información de sincronización
-        self.current_key_label.config(text=f"Llave Actual: K{key_index}")
-        self.psn_label.config(text=f"PSN Actual: {next_psn}")
-        
-        # Lista de llaves
-        self.key_labels = []
-        for i, key in enumerate(key_table):
-            key_frame = tk.Frame(self.scrollable_frame, bg='#3c3c3c', relief='raised', bd=1)
-            key_frame.pack(fill='x', padx=5, pady=2)
-            
-            # Nombre de la llave
-            key_name = tk.Label(key_frame,
-                               text=f"K{i:02d}",
-                               font=('Consolas', 11, 'bold'),
-                               fg='white',
-                               bg='#3c3c3c',
-                               width=5)
-            key_name.pack(side='left', padx=10, pady=5)
-            
-            # Hash visual (primeros 8 caracteres del hash de la llave)
-            key_hash = hex(hash(key) & 0xFFFFFFFF)[2:].upper().zfill(8)
-            hash_label = tk.Label(key_frame,
-                                 text=f"Hash: {key_hash}",
-                                 font=('Consolas', 10),
-                                 fg='#cccccc',
-                                 bg='#3c3c3c')
-            hash_label.pack(side='left', padx=20)
-            
-            # Estado de la llave
-            if i == key_index:
-                status_text = '🎯 ACTUAL'
-                status_color = '#ffb900'
-                key_frame.config(bg='#4a4a00')  # Resaltar llave actual
-            elif i < key_index:
-                status_text = '✅ Usada'
-                status_color = '#888888'
-            else:
-                status_text = '🔑 Disponible'
-                status_color = '#107c10'
-            
-            status_label = tk.Label(key_frame,
-                                   text=status_text,
-                                   font=('Arial', 10, 'bold'),
-                                   fg=status_color,
-                                   bg=key_frame.cget('bg'))
-            status_label.pack(side='right', padx=10, pady=5)
-            
-            self.key_labels.append((key_frame, key_name, hash_label, status_label))
-    
-    def update_server_key_monitor(self):
-        """Actualizar automáticamente el estado del monitor de llaves del servidor"""
-        if self.key_monitor_window is None or not self.key_monitor_window.winfo_exists():
-            return
-        
-        try:
-            # Actualizar lista de clientes en el combobox
-            client_addresses = [f"{addr[0]}:{addr[1]}" for addr in self.client_states.keys()]
-            if hasattr(self, 'client_var'):
-                current_values = self.key_monitor_window.nametowidget('.!toplevel.!frame2.!combobox')['values']
-                if tuple(client_addresses) != current_values:
-                    self.key_monitor_window.nametowidget('.!toplevel.!frame2.!combobox')['values'] = client_addresses
-            
-            # Actualizar datos del cliente seleccionado
-            if self.selected_client and self.selected_client in self.client_states:
-                self.refresh_server_key_monitor()
-            
-            # Programar próxima actualización
-            self.key_monitor_window.after(1000, self.update_server_key_monitor)
-            
-        except Exception as e:
-            # Si hay error, probablemente la ventana se cerró
-            pass
+        # Widgets creados una vez; se actualiza con el feed de eventos del registro
+        self.key_monitor_window = KeyMonitorWindow(self.root, self.sessions)
     
     def on_closing(self):
         """Manejar el cierre de la ventana"""
-        if self.key_monitor_window is not None and self.key_monitor_window.winfo_exists():
-            self.key_monitor_window.destroy()
+        if self.key_monitor_window is not None:
+            self.key_monitor_window.close()
         if self.running:
             self.stop_server()
         self.root.destroy()
@@ -724,5 +409,9 @@ class CryptographyServer:
             self.on_closing()
 
 if __name__ == "__main__":
-    server = CryptographyServer()
+    import sys
+    # USO: python server.py [backend] [puerto_metricas] [archivo_captura]
+    server = CryptographyServer(backend=sys.argv[1] if len(sys.argv) > 1 else "threaded",
+                                metrics_port=int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] != "-" else None,
+                                capture_path=sys.argv[3] if len(sys.argv) > 3 else None)
     server.run()
\ No newline at end of file
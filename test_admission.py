@@ -0,0 +1,239 @@
+# test_admission.py
+# Pruebas del control de admisión (Admission.py): AdmissionController solo (lugares de sesión, turnos de handshake,
+# políticas "queue" y "reject", contadores) y contra ambos backends, incluida una tormenta de reconexiones que supera
+# max_handshakes.
+# USO: python -m pytest test_admission.py
+
+import threading
+import time
+
+import pytest
+
+from Admission import POLICIES, POLICY_QUEUE, POLICY_REJECT, AdmissionController
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from DeviceClient import DeviceClient, backoff_delays
+from Randomness import SeededRandomness
+
+BACKENDS_PRUEBA = ["threaded", "selector"]
+MAX_HANDSHAKES = 2
+TORMENTA = 12
+DERIVACION = 0.05  # segundos extra por derivación de llaves durante la tormenta
+RESPUESTA = (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+
+
+def cliente(address, semilla):
+    return DeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(100 + semilla)))
+
+
+def esperar(condicion, plazo=5.0):
+    """Sondea hasta que se cumpla la condición (el backend libera el lugar al detectar el cierre)."""
+    deadline = time.monotonic() + plazo
+    while not condicion():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def derivacion_lenta(monkeypatch):
+    """Hace más lenta la derivación de llaves del servidor y registra cuántas corren a la vez."""
+    import ServerEngine
+
+    original = ServerEngine.generate_directional_key_tables
+    estado = {"activas": 0, "pico": 0}
+    lock = threading.Lock()
+
+    def lenta(*args, **kwargs):
+        with lock:
+            estado["activas"] += 1
+            estado["pico"] = max(estado["pico"], estado["activas"])
+        try:
+            time.sleep(DERIVACION)
+            return original(*args, **kwargs)
+        finally:
+            with lock:
+                estado["activas"] -= 1
+
+    monkeypatch.setattr(ServerEngine, "generate_directional_key_tables", lenta)
+    return estado
+
+
+# ============================================================
+# AdmissionController
+# ============================================================
+
+def test_parametros_invalidos():
+    with pytest.raises(ValueError):
+        AdmissionController(policy="descartar")
+    with pytest.raises(ValueError):
+        AdmissionController(max_sessions=0)
+    with pytest.raises(ValueError):
+        AdmissionController(max_handshakes=0)
+
+
+def test_try_admit_y_contadores():
+    admission = AdmissionController(max_sessions=2, policy=POLICY_REJECT)
+    assert admission.try_admit() and admission.try_admit()
+    assert not admission.has_capacity()
+    assert not admission.try_admit()
+    admission.release_session()
+    assert admission.try_admit()
+    admission.release_session()
+    assert admission.stats() == {
+        "admitted": 3,
+        "rejected_sessions": 1,
+        "rejected_handshakes": 0,
+        "queued_handshakes": 0,
+        "active_sessions": 1,
+        "active_handshakes": 0,
+        "peak_sessions": 2,
+    }
+
+
+def test_sin_limite_de_sesiones():
+    admission = AdmissionController()
+    assert all(admission.try_admit() for _ in range(100))
+    assert admission.has_capacity() and admission.stats()["peak_sessions"] == 100
+
+
+def test_wait_for_capacity():
+    admission = AdmissionController(max_sessions=1)
+    assert admission.wait_for_capacity(0)
+    admission.try_admit()
+    inicio = time.monotonic()
+    assert not admission.wait_for_capacity(0.1)
+    assert time.monotonic() - inicio >= 0.09
+    # Otro hilo libera el lugar mientras se espera
+    threading.Timer(0.05, admission.release_session).start()
+    assert admission.wait_for_capacity(5)
+    assert admission.try_admit()
+
+
+def test_turnos_de_handshake_con_rechazo():
+    admission = AdmissionController(max_handshakes=MAX_HANDSHAKES, policy=POLICY_REJECT)
+    assert admission.acquire_handshake() and admission.acquire_handshake()
+    inicio = time.monotonic()
+    assert not admission.acquire_handshake()
+    assert time.monotonic() - inicio < 1  # "reject" no espera
+    admission.release_handshake()
+    assert admission.acquire_handshake()
+    stats = admission.stats()
+    assert (stats["active_handshakes"], stats["rejected_handshakes"], stats["queued_handshakes"]) == (2, 1, 0)
+    admission.release_handshake()
+    admission.release_handshake()
+    assert admission.stats()["active_handshakes"] == 0
+
+
+def test_turnos_de_handshake_en_cola():
+    admission = AdmissionController(max_handshakes=1, policy=POLICY_QUEUE, queue_timeout=0.1)
+    assert admission.acquire_handshake()
+    # Sin turno libre espera queue_timeout y luego rechaza
+    assert not admission.acquire_handshake()
+    # Con el turno liberado mientras espera, lo obtiene
+    admission.queue_timeout = 5
+    threading.Timer(0.05, admission.release_handshake).start()
+    assert admission.acquire_handshake()
+    stats = admission.stats()
+    assert (stats["active_handshakes"], stats["rejected_handshakes"], stats["queued_handshakes"]) == (1, 1, 2)
+
+
+# ============================================================
+# Backends
+# ============================================================
+
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_rechazo_por_maximo_de_sesiones(engine, servidor, backend):
+    server = servidor(engine, backend, admission=AdmissionController(max_sessions=2, policy=POLICY_REJECT))
+    clientes = [cliente(server.address, i) for i in range(2)]
+    for client in clientes:
+        client.connect(timeout=5)
+
+    # Sin lugar: la conexión se cierra con [REJECTED] (o el cierre llega antes de leerla)
+    with pytest.raises(ConnectionError):
+        cliente(server.address, 2).connect(timeout=5)
+    for client in clientes:
+        client.send(b"sigo conectado", timeout=5)
+    assert [client.recv(timeout=5) for client in clientes] == [RESPUESTA] * 2
+
+    # Al cerrar una sesión se libera su lugar
+    clientes[0].close()
+    esperar(lambda: server.stats()["admission_active_sessions"] == 1)
+    nuevo = cliente(server.address, 3)
+    nuevo.connect(timeout=5)
+    nuevo.close()
+    clientes[1].close()
+    esperar(lambda: server.stats()["admission_active_sessions"] == 0)
+    stats = server.stats()
+    assert (stats["admission_admitted"], stats["admission_rejected_sessions"], stats["admission_peak_sessions"]) == (3, 1, 2)
+    assert stats["handshakes"] == 3
+
+
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_cola_por_maximo_de_sesiones(engine, servidor, backend):
+    server = servidor(engine, backend, admission=AdmissionController(max_sessions=1, policy=POLICY_QUEUE))
+    primero = cliente(server.address, 0)
+    primero.connect(timeout=5)
+
+    # El segundo queda en la cola del kernel hasta que el primero se va
+    segundo = cliente(server.address, 1)
+    hilo = threading.Thread(target=segundo.connect, kwargs={"timeout": 10})
+    hilo.start()
+    time.sleep(0.3)
+    assert hilo.is_alive() and server.stats()["handshakes"] == 1
+    primero.close()
+    hilo.join(10)
+    assert not hilo.is_alive() and segundo.connected
+    segundo.send(b"atendido tras esperar", timeout=5)
+    assert segundo.recv(timeout=5) == RESPUESTA
+    segundo.close()
+    stats = server.stats()
+    assert (stats["admission_admitted"], stats["admission_rejected_sessions"], stats["admission_peak_sessions"]) == (2, 0, 1)
+
+
+@pytest.mark.parametrize("policy", POLICIES)
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_tormenta_de_reconexiones(engine, servidor, derivacion_lenta, backend, policy):
+    admission = AdmissionController(max_handshakes=MAX_HANDSHAKES, policy=policy, queue_timeout=10)
+    server = servidor(engine, backend, admission=admission)
+    clientes = [cliente(server.address, i) for i in range(TORMENTA)]
+    barrera = threading.Barrier(TORMENTA)
+    errores = []
+
+    def reconectar(client, semilla):
+        barrera.wait()
+        deadline = time.monotonic() + 20
+        for espera in backoff_delays(0.02, 0.2, rng=SeededRandomness(semilla)):
+            try:
+                client.connect(timeout=10)
+                client.send(b"de vuelta tras la tormenta", timeout=5)
+                if client.recv(timeout=5) != RESPUESTA:
+                    errores.append(semilla)
+                return
+            except ConnectionError:
+                if time.monotonic() + espera > deadline:
+                    errores.append(semilla)
+                    return
+                time.sleep(espera)
+
+    hilos = [threading.Thread(target=reconectar, args=(client, i)) for i, client in enumerate(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(30)
+    assert not errores and all(client.connected for client in clientes)
+
+    # Nunca corren más derivaciones a la vez que turnos de handshake
+    assert 1 <= derivacion_lenta["pico"] <= MAX_HANDSHAKES
+    stats = server.stats()
+    assert stats["handshakes"] == TORMENTA and stats["errors"] == 0
+    assert stats["admission_active_handshakes"] == 0
+    if backend == "selector":
+        # Un solo hilo: las derivaciones ya van de a una y nadie espera turno
+        assert derivacion_lenta["pico"] == 1
+        assert (stats["admission_queued_handshakes"], stats["admission_rejected_handshakes"]) == (0, 0)
+    elif policy == POLICY_QUEUE:
+        assert stats["admission_queued_handshakes"] > 0 and stats["admission_rejected_handshakes"] == 0
+    else:
+        assert stats["admission_rejected_handshakes"] > 0 and stats["admission_queued_handshakes"] == 0
+        assert stats["admission_admitted"] == TORMENTA + stats["admission_rejected_handshakes"]
+    for client in clientes:
+        client.close()
@@ -0,0 +1,35 @@
+# test_backoff.py
+# Pruebas de las esperas de reconexión (DeviceClient.backoff_delays): tope exponencial con jitter, límite máximo y
+# reproducibilidad con SeededRandomness.
+# USO: python -m pytest test_backoff.py
+
+import itertools
+
+from DeviceClient import DEFAULT_BACKOFF_INITIAL, DEFAULT_BACKOFF_MAX, backoff_delays
+from Randomness import SeededRandomness
+
+
+def primeras(n, **kwargs):
+    return list(itertools.islice(backoff_delays(**kwargs), n))
+
+
+def test_espera_entre_mitad_del_tope_y_el_tope():
+    cap = DEFAULT_BACKOFF_INITIAL
+    for delay in primeras(30, rng=SeededRandomness(1)):
+        assert cap / 2 <= delay <= cap
+        cap = min(cap * 2, DEFAULT_BACKOFF_MAX)
+    assert cap == DEFAULT_BACKOFF_MAX
+
+
+def test_tope_maximo():
+    delays = primeras(200, initial=1.0, maximum=4.0, rng=SeededRandomness(2))
+    assert all(2.0 <= delay <= 4.0 for delay in delays[2:])
+    assert max(delays) <= 4.0
+
+
+def test_jitter_reproducible_y_distinto_por_dispositivo():
+    assert primeras(20, rng=SeededRandomness(3)) == primeras(20, rng=SeededRandomness(3))
+    # Dispositivos que se cayeron a la vez no vuelven todos en el mismo instante
+    rng = SeededRandomness(4)
+    dispositivos = [primeras(8, rng=rng.fork(f"dispositivo-{i}")) for i in range(10)]
+    assert len({delays[-1] for delays in dispositivos}) > 1
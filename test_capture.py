@@ -0,0 +1,53 @@
+# test_capture.py
+# Pruebas de la captura de tramas (Capture.py) y su reproducción (replay.py): una captura anexada por dos
+# corridas del servidor se agrupa por corrida y se reproduce sin desincronizarse.
+# USO: python -m pytest test_capture.py
+
+from Capture import CaptureWriter, DIRECTION_IN, group_by_connection, read_capture
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from DeviceClient import DeviceClient
+import replay
+
+MENSAJES = [b"temperatura=21.5", b"humedad=40%", b"bateria=3.70V"]
+
+
+def corrida(engine, servidor, path, dispositivos=3):
+    """Un arranque del servidor con captura sobre `path` y algunos dispositivos que conversan y cierran."""
+    capture = CaptureWriter(path)
+    backend = servidor(engine, capture=capture)
+    try:
+        for i in range(dispositivos):
+            client = DeviceClient(*backend.address, protocol=ClientProtocol(rng=engine.rng.fork(f"cliente-{i}")))
+            client.connect(resume=False)
+            for mensaje in MENSAJES:
+                client.send(mensaje)
+                assert client.recv(timeout=5)[0] == FRAME_RESPONSE
+            client.close()
+    finally:
+        # La corrida termina aquí: la captura se cierra con el servidor detenido
+        backend.stop()
+        capture.close()
+
+
+def test_captura_anexada_por_dos_corridas(tmp_path, motor, servidor):
+    path = str(tmp_path / "captura.bin")
+    primero, segundo = motor(1), motor(2)
+    corrida(primero, servidor, path)
+    corrida(segundo, servidor, path)
+    assert primero.Q != segundo.Q
+
+    records = list(read_capture(path))
+    assert {record.run for record in records} == {1, 2}
+    connections = group_by_connection(records)
+    # Ambas corridas numeran sus conexiones desde 1, pero no se mezclan
+    assert len(connections) == 6
+    assert all(len(conn["in"]) == 2 + len(MENSAJES) + 1 for conn in connections.values())
+
+    grupos, omitidas, _, entrantes = replay.cargar(path)
+    assert omitidas == 0
+    assert set(grupos) == {(engine.node_id, engine.Q, engine.S_server) for engine in (primero, segundo)}
+    assert entrantes == sum(1 for record in records if record.direction == DIRECTION_IN)
+
+    _, tramas, errores = replay.pipeline(grupos, repeticiones=2)
+    assert errores == 0
+    assert tramas == 2 * entrantes
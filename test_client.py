@@ -0,0 +1,137 @@
+# test_client.py
+# Pruebas del hilo de envío de client.py sin ventana: si la conexión se cae a mitad de una ráfaga, solo los mensajes
+# que el socket no aceptó completos se vuelven a cifrar con la sesión reanudada; cada mensaje llega una sola vez al
+# servidor y se muestra una sola vez en el chat.
+# USO: python -m pytest test_client.py
+
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from Framing import FRAME_HEADER, recv_frame
+from Randomness import SeededRandomness
+from client import CryptographyClient
+
+MENSAJES = ["lectura uno del sensor", "lectura dos del sensor", "lectura tres del sensor"]
+
+
+class Raiz:
+    """En lugar de la raíz de Tk: root.after() corre la función en otro hilo."""
+
+    def after(self, ms, func, *args):
+        threading.Thread(target=func, args=args, daemon=True).start()
+
+
+class SocketCaido:
+    """
+    Socket cuya conexión se cae en medio de la primera ráfaga: acepta las
+    primeras `tramas` tramas completas y unos bytes de la siguiente, y el
+    envío que sigue falla.
+    """
+
+    def __init__(self, sock, tramas):
+        self.sock = sock
+        self.tramas = tramas
+        self.caido = False
+
+    def send(self, data):
+        if self.caido:
+            self.sock.close()
+            raise ConnectionResetError("Conexión restablecida por el servidor")
+        self.caido = True
+        limite = 0
+        for _ in range(self.tramas):
+            (size,) = FRAME_HEADER.unpack_from(data, limite)
+            limite += FRAME_HEADER.size + size
+        limite += FRAME_HEADER.size + 2  # una trama a medias, que el servidor descarta
+        self.sock.sendall(data[:limite])
+        return limite
+
+    def close(self):
+        self.sock.close()
+
+
+def cliente_sin_ventana(address):
+    """CryptographyClient con el estado que usan el hilo de envío y el handshake, sin crear la ventana."""
+    client = CryptographyClient.__new__(CryptographyClient)
+    client.host, client.port = address
+    client.root = Raiz()
+    client.protocol = ClientProtocol(rng=SeededRandomness(2))
+    client.connected = True
+    client.encryption_enabled = True
+    client.farewell_requested = threading.Event()
+    client.link_up = threading.Event()
+    client.stream_lock = threading.Lock()
+    client.chat = []
+    client.post_to_chat = lambda sender, message, color="#ffffff": client.chat.append((sender, message))
+    return client
+
+
+def leer_hasta_respuestas(client, sock, cuantas):
+    sock.settimeout(5.0)
+    respuestas = []
+    while len(respuestas) < cuantas:
+        kind, value = client.protocol.receive(recv_frame(sock))
+        if kind == FRAME_RESPONSE:
+            respuestas.append(value)
+    return respuestas
+
+
+@pytest.mark.parametrize("entregadas", [0, 1, 2])
+def test_rafaga_reenviada_tras_reconectar(engine, servidor, entregadas):
+    backend = servidor(engine)
+    client = cliente_sin_ventana(backend.address)
+    try:
+        sock = socket.create_connection(backend.address)
+        client.establish_session(sock, client.post_to_chat)
+        sock.settimeout(5.0)
+        while client.protocol.resumption_ticket is None:  # [GROUPKEY] y [TICKET] tras el contacto
+            client.protocol.receive(recv_frame(sock))
+        client.client_socket = SocketCaido(sock, entregadas)
+
+        reconectado = threading.Event()
+
+        def connection_lost(sock, reason):
+            # Lo mismo que reconnect_loop(), sin esperas: reanudar con el ticket y liberar el envío
+            nuevo = socket.create_connection(backend.address)
+            with client.stream_lock:
+                client.protocol.reset()
+                client.establish_session(nuevo, client.post_to_chat)
+            client.client_socket = nuevo
+            reconectado.set()
+            client.link_up.set()
+
+        client.connection_lost = connection_lost
+
+        # Toda la cola sale en una sola ráfaga, que falla a mitad; el resto se reenvía tras reanudar
+        client.outbound = queue.Queue()
+        for mensaje in MENSAJES:
+            client.outbound.put_nowait((True, mensaje))
+        client.link_up.set()
+        sender = threading.Thread(target=client.send_messages, daemon=True)
+        sender.start()
+
+        assert reconectado.wait(5.0)
+        reenviados = len(MENSAJES) - entregadas
+        respuestas = leer_hasta_respuestas(client, client.client_socket, reenviados)
+        assert respuestas == [b"Mensaje cifrado recibido correctamente"] * reenviados
+
+        # Contacto + cada mensaje de la ráfaga una sola vez (los entregados por la conexión caída)
+        deadline = time.monotonic() + 5
+        while engine.stats()["messages_in"] < 1 + len(MENSAJES) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = engine.stats()
+        assert stats["resumptions"] == 1 and stats["errors"] == 0
+        assert stats["messages_in"] == 1 + len(MENSAJES)
+        assert [message for sender, message in client.chat if sender.startswith("Tú")] == MENSAJES
+        assert ("Sistema", f"Reenviando {reenviados} mensajes con la sesión restablecida") in client.chat
+        ya_salieron = ("Sistema", f"{entregadas} mensajes de la ráfaga ya habían salido: no se reenvían")
+        assert (ya_salieron in client.chat) == (entregadas > 0)
+    finally:
+        client.connected = False
+        client.link_up.set()
+        client.outbound.put_nowait(None)
@@ -0,0 +1,144 @@
+# test_coalescing.py
+# Pruebas de la agrupación de mensajes (Coalescing.py): formato del lote, disparo por tamaño y por tiempo,
+# ClientProtocol.seal_batch() y DeviceClient.send_batch(), y un lote que se vuelve a cifrar y enviar tras
+# reanudar la sesión.
+# USO: python -m pytest test_coalescing.py
+
+import threading
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from Coalescing import BatchError, Coalescer, pack_batch, unpack_batch
+from DeviceClient import DeviceClient
+from Randomness import SeededRandomness
+from Resumption import RESUMED_PREFIX
+
+LECTURAS = [b"t=21.5", b"h=40%", b"", b"bateria=3.70V", b"estado=" + b"ok " * 60]
+
+
+def respuesta_lote(mensajes):
+    return FRAME_RESPONSE, f"Lote de {len(mensajes)} mensajes recibido correctamente".encode()
+
+
+def test_empaquetado():
+    for mensajes in (LECTURAS, [b"x"], [b""] * 3, [bytes(range(256)), b"\x00"]):
+        assert unpack_batch(pack_batch(mensajes)) == mensajes
+    with pytest.raises(BatchError):
+        pack_batch([])
+    with pytest.raises(BatchError):
+        pack_batch([bytes(0x10000)])
+    for basura in (b"", b"\x00", b"\x00\x00", b"abc\x00\x09\x00\x01", pack_batch(LECTURAS)[1:]):
+        with pytest.raises(BatchError):
+            unpack_batch(basura)
+
+
+def test_disparo_por_tamano_y_por_tiempo():
+    lotes = []
+    enviado = threading.Event()
+
+    def send_batch(mensajes):
+        lotes.append(mensajes)
+        enviado.set()
+
+    coalescer = Coalescer(send_batch, max_delay=0.05, max_bytes=20)
+    coalescer.add(b"0123456789")
+    assert lotes == []
+    coalescer.add(b"abcdef")  # 10 + 6 + 2 longitudes = 20: lote lleno
+    assert lotes == [[b"0123456789", b"abcdef"]]
+    enviado.clear()
+    coalescer.add(b"solo")  # incompleto: sale por el temporizador
+    assert enviado.wait(2.0)
+    assert lotes[-1] == [b"solo"]
+    coalescer.add(b"al cerrar")
+    coalescer.close()
+    assert lotes[-1] == [b"al cerrar"] and coalescer.batches == 3
+    with pytest.raises(RuntimeError):
+        coalescer.add(b"tarde")
+
+
+def test_error_en_el_temporizador():
+    def send_batch(mensajes):
+        raise ConnectionResetError("Conexión restablecida por el servidor")
+
+    coalescer = Coalescer(send_batch, max_delay=0.01)
+    coalescer.add(b"lectura")
+    coalescer._thread.join(2.0)
+    with pytest.raises(RuntimeError, match="restablecida"):
+        coalescer.add(b"otra")
+
+
+def test_seal_batch(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(2))
+    session, _ = conectar(engine, protocol)
+    posicion = (protocol.key_index, protocol.next_psn)
+    with pytest.raises(BatchError):
+        protocol.seal_batch([])
+    assert (protocol.key_index, protocol.next_psn) == posicion  # un lote inválido no avanza el flujo
+
+    for lote in (LECTURAS, [b"una sola lectura"]):
+        replies, _ = engine.handle_message(session, protocol.seal_batch(lote))
+        assert protocol.receive(replies[0]) == respuesta_lote(lote)
+    # Cada lote consume una sola llave, igual en ambos extremos
+    assert protocol.key_index == posicion[0] + 2
+    assert (session.key_index, session.next_psn) == (protocol.key_index, protocol.next_psn)
+    assert engine.stats()["batched_messages"] == len(LECTURAS) + 1
+
+
+def test_agrupador_sobre_device_client(engine, servidor):
+    address = servidor(engine).address
+    with DeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(3))) as client:
+        lotes = []
+
+        def send_batch(mensajes):
+            lotes.append(len(mensajes))
+            client.send_batch(mensajes)
+
+        coalescer = Coalescer(send_batch, max_delay=0.01, max_bytes=64)
+        for i in range(40):
+            coalescer.add(f"lectura {i}".encode())
+        coalescer.close()
+        assert sum(lotes) == 40 and len(lotes) < 40
+        assert [client.recv(timeout=5) for _ in lotes] == [respuesta_lote(range(n)) for n in lotes]
+    stats = engine.stats()
+    assert stats["batched_messages"] == 40 and stats["errors"] == 0
+
+
+def test_lote_reenviado_tras_reanudar(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(2))
+    session, _ = conectar(engine, protocol)
+    estado = {"session": session, "caida": True}
+    fallidos = []
+
+    def send_batch(mensajes):
+        frame = protocol.seal_batch(mensajes)
+        if estado["caida"]:
+            # La conexión se cae con el lote ya cifrado: se guarda el texto plano, no la trama
+            estado["caida"] = False
+            engine.close_session(estado["session"])
+            fallidos.append(mensajes)
+            return
+        replies, _ = engine.handle_message(estado["session"], frame)
+        assert protocol.receive(replies[0]) == respuesta_lote(mensajes)
+
+    coalescer = Coalescer(send_batch, max_delay=10)
+    for lectura in LECTURAS:
+        coalescer.add(lectura)
+    coalescer.flush()
+    assert fallidos == [LECTURAS]
+
+    # Reanudar con el ticket: el lote se cifra de nuevo con la posición restablecida
+    protocol.reset()
+    session, replies = engine.open_session(("prueba", 2), protocol.resume_frame())
+    assert replies[0] == RESUMED_PREFIX and protocol.accept_resume(replies[0])
+    for reply in replies[1:]:
+        protocol.receive(reply)
+    estado["session"] = session
+    for mensajes in fallidos:
+        for lectura in mensajes:
+            coalescer.add(lectura)
+    coalescer.close()
+
+    stats = engine.stats()
+    assert stats["errors"] == 0 and stats["resumptions"] == 1
+    assert stats["batched_messages"] == len(LECTURAS)
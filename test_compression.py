@@ -0,0 +1,66 @@
+# test_compression.py
+# Pruebas de la compresión opcional (Compression.py): umbral, datos incompresibles, límites al descomprimir,
+# cifrado con compresión y negociación en el FCM.
+# USO: python -m pytest test_compression.py
+
+import json
+import zlib
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from Compression import DEFAULT_COMPRESS_THRESHOLD, FLAG_COMPRESSED, compress_payload, decompress_payload
+from PSN import ESQUEMAS, decrypt_message, encrypt_message
+from Randomness import SeededRandomness
+
+TELEMETRIA = json.dumps([{"sensor": f"temp-{i}", "valor": 21.5, "unidad": "C"} for i in range(20)]).encode()
+LLAVE = (0x1234_5678_9ABC_DEF0).to_bytes(8, "big")
+
+
+def test_umbral_y_datos_incompresibles():
+    assert compress_payload(b"corto" * 5) == (b"corto" * 5, 0)
+    assert compress_payload(TELEMETRIA, threshold=None) == (TELEMETRIA, 0)
+    aleatorio = SeededRandomness(5).bytes(4096)
+    assert compress_payload(aleatorio) == (aleatorio, 0)
+    data, flags = compress_payload(TELEMETRIA)
+    assert flags == FLAG_COMPRESSED and len(data) < len(TELEMETRIA)
+    assert decompress_payload(data) == TELEMETRIA
+
+
+def test_descompresion_limitada():
+    bomba = zlib.compress(bytes(1 << 21))
+    with pytest.raises(ValueError):
+        decompress_payload(bomba)
+    with pytest.raises(ValueError):
+        decompress_payload(zlib.compress(TELEMETRIA)[:-4])
+    with pytest.raises(ValueError):
+        decompress_payload(b"no es zlib")
+
+
+@pytest.mark.parametrize("psn", sorted(ESQUEMAS))
+def test_cifrado_con_compresion(psn):
+    comprimido = encrypt_message(TELEMETRIA, psn, LLAVE, compress_threshold=DEFAULT_COMPRESS_THRESHOLD)
+    plano = encrypt_message(TELEMETRIA, psn, LLAVE)
+    assert len(comprimido) < len(plano)
+    a, b = decrypt_message(comprimido, LLAVE), decrypt_message(plano, LLAVE)
+    assert a["plaintext"] == b["plaintext"] == TELEMETRIA
+    # La extracción del próximo PSN no depende de la compresión
+    assert a["psn"] == b["psn"] == psn
+    assert a["next_extraction_instruction"] == b["next_extraction_instruction"]
+
+
+@pytest.mark.parametrize("umbral, cliente, acordado", [
+    (DEFAULT_COMPRESS_THRESHOLD, True, True),
+    (None, True, False),
+    (DEFAULT_COMPRESS_THRESHOLD, False, False),
+])
+def test_negociacion(motor, conectar, umbral, cliente, acordado):
+    engine = motor(compress_threshold=umbral)
+    protocol = ClientProtocol(compression=cliente, rng=SeededRandomness(2))
+    session, _ = conectar(engine, protocol)
+    assert (protocol.compress_threshold is not None) == (session.compress_threshold is not None) == acordado
+    frame = protocol.seal(TELEMETRIA)
+    assert (len(frame) < len(TELEMETRIA)) == acordado
+    replies, _ = engine.handle_message(session, frame)
+    assert protocol.receive(replies[0]) == (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+    assert engine.stats()["errors"] == 0
@@ -0,0 +1,95 @@
+# test_deviceclient.py
+# Pruebas de la biblioteca de cliente sin ventana (DeviceClient.py): versión bloqueante y asyncio contra un
+# servidor real, reanudación con ticket, datos tempranos y plazos vencidos.
+# USO: python -m pytest test_deviceclient.py
+
+import asyncio
+import socket
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from DeviceClient import AsyncDeviceClient, DeviceClient
+from Randomness import SeededRandomness
+
+RESPUESTA = (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+
+
+@pytest.fixture
+def address(engine, servidor):
+    return servidor(engine).address
+
+
+def test_conversacion_y_reanudacion(engine, address):
+    client = DeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(2)))
+    with client:
+        for i in range(5):
+            client.send(f"lectura {i} del sensor".encode())
+            assert client.recv(timeout=5) == RESPUESTA
+    assert not client.connected and client.protocol.resumption_ticket is not None
+
+    # Segunda conexión con el ticket del LCM: sin derivar llaves
+    client.connect()
+    client.send(b"lectura tras reanudar")
+    assert client.recv(timeout=5) == RESPUESTA
+    client.close()
+    stats = engine.stats()
+    assert (stats["handshakes"], stats["resumptions"], stats["errors"]) == (1, 1, 0)
+
+
+def test_datos_tempranos_sin_ticket(engine, address):
+    client = DeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(3)))
+    client.connect()
+    client.close()
+    # Ya conoce los parámetros del servidor: el contacto viaja con el hello
+    client.connect(resume=False)
+    client.send(b"lectura con datos tempranos")
+    assert client.recv(timeout=5) == RESPUESTA
+    client.close()
+    stats = engine.stats()
+    assert (stats["handshakes"], stats["early_data"], stats["errors"]) == (2, 1, 0)
+
+
+def test_plazo_vencido_no_corta_la_sesion(address):
+    with DeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(4))) as client:
+        with pytest.raises(TimeoutError):
+            client.recv(timeout=0.05)
+        client.send(b"lectura despues del plazo")
+        assert client.recv(timeout=5) == RESPUESTA
+        with pytest.raises(RuntimeError):
+            client.connect()
+
+
+def test_sin_conexion():
+    with socket.socket() as libre:
+        libre.bind(("127.0.0.1", 0))
+        port = libre.getsockname()[1]
+    client = DeviceClient("127.0.0.1", port, protocol=ClientProtocol(rng=SeededRandomness(5)))
+    with pytest.raises(ConnectionError):
+        client.send(b"sin conexion")
+    with pytest.raises(OSError):
+        client.connect(timeout=2)
+    assert not client.connected
+    client.close()
+
+
+def test_version_asyncio(engine, address):
+
+    async def conversar():
+        client = AsyncDeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(6)))
+        async with client:
+            for i in range(5):
+                await client.send(f"lectura {i} del sensor".encode())
+                assert await client.recv(timeout=5) == RESPUESTA
+            with pytest.raises(asyncio.TimeoutError):
+                await client.recv(timeout=0.05)
+            await client.send(b"lectura despues del plazo")
+            assert await client.recv(timeout=5) == RESPUESTA
+        await client.connect()
+        await client.send(b"lectura tras reanudar")
+        assert await client.recv(timeout=5) == RESPUESTA
+        await client.close()
+
+    asyncio.run(conversar())
+    stats = engine.stats()
+    assert (stats["handshakes"], stats["resumptions"], stats["errors"]) == (1, 1, 0)
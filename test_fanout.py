@@ -0,0 +1,85 @@
+# test_fanout.py
+# Pruebas de las colas de salida y el broadcast (FanOut.py): un cliente lento con la política "block" no
+# retrasa el broadcast a los demás, y sus mensajes esperan en su propia cola en orden.
+# USO: python -m pytest test_fanout.py
+
+import time
+
+from FanOut import (CLOSED, DROPPED_OLDEST, OVERFLOW, POLICY_BLOCK, POLICY_DISCONNECT, POLICY_DROP_OLDEST, QUEUED,
+                    WAITING, FanOutService, OutboundQueue)
+
+
+class Conexion:
+    def __init__(self, outbound):
+        self.outbound = outbound
+
+
+class Backend:
+    """Lo mínimo que FanOutService necesita de un backend."""
+
+    def __init__(self, conexiones):
+        self.conexiones = conexiones
+        self.desconectadas = []
+
+    def fanout_targets(self):
+        return list(self.conexiones)
+
+    def wake_writer(self, conn):
+        pass
+
+    def disconnect(self, conn):
+        self.desconectadas.append(conn)
+
+
+def vaciar(queue):
+    items = []
+    while (item := queue.get_nowait()) is not None:
+        items.append(item)
+    return items
+
+
+def test_politicas_de_cola_llena():
+    queue = OutboundQueue(2, POLICY_DROP_OLDEST)
+    assert [queue.put(m) for m in (b"a", b"b", b"c")] == [QUEUED, QUEUED, DROPPED_OLDEST]
+    assert vaciar(queue) == [b"b", b"c"] and queue.dropped == 1
+
+    queue = OutboundQueue(1, POLICY_DISCONNECT)
+    assert [queue.put(m) for m in (b"a", b"b", b"c")] == [QUEUED, OVERFLOW, CLOSED]
+    assert queue.overflowed
+
+
+def test_block_espera_en_la_cola_sin_bloquear():
+    queue = OutboundQueue(2, POLICY_BLOCK, block_timeout=5.0)
+    inicio = time.perf_counter()
+    assert [queue.put(bytes([i])) for i in range(5)] == [QUEUED, QUEUED, WAITING, WAITING, WAITING]
+    assert time.perf_counter() - inicio < 0.1
+    assert len(queue) == 5 and queue.pending_bytes() == 5
+    # El escritor los recibe todos, en orden, a medida que libera espacio
+    assert vaciar(queue) == [bytes([i]) for i in range(5)]
+
+
+def test_block_descarta_al_vencer_el_plazo():
+    queue = OutboundQueue(1, POLICY_BLOCK, block_timeout=0.05)
+    assert [queue.put(m) for m in (b"a", b"b", b"c")] == [QUEUED, WAITING, WAITING]
+    time.sleep(0.1)
+    assert queue.put(b"d") == WAITING
+    assert vaciar(queue) == [b"a", b"d"]
+    assert queue.timed_out == 2
+
+
+def test_cliente_lento_no_retrasa_a_los_demas():
+    lento = Conexion(OutboundQueue(2, POLICY_BLOCK, block_timeout=2.0))
+    rapidos = [Conexion(OutboundQueue(64, POLICY_BLOCK, block_timeout=2.0)) for _ in range(3)]
+    fanout = FanOutService(Backend([lento] + rapidos))
+    try:
+        inicio = time.perf_counter()
+        futures = [fanout.broadcast(f"aviso {i}".encode()) for i in range(10)]
+        stats = [future.result(timeout=1.0) for future in futures]
+        assert time.perf_counter() - inicio < 0.5
+    finally:
+        fanout.shutdown()
+    assert sum(s.waiting for s in stats) == 8 and all(s.targets == 4 for s in stats)
+    esperados = [f"aviso {i}".encode() for i in range(10)]
+    for conn in rapidos:
+        assert vaciar(conn.outbound) == esperados
+    assert vaciar(lento.outbound) == esperados
@@ -0,0 +1,71 @@
+# test_framing.py
+# Pruebas de la delimitación de tramas (Framing.py) y de los dos backends del servidor con tramas partidas.
+# USO: python -m pytest test_framing.py
+
+import socket
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from Framing import MAX_FRAME_SIZE, FRAME_HEADER, FrameDecoder, encode_frame, recv_frame, send_frame
+from Randomness import SeededRandomness
+from ServerEngine import BACKENDS
+
+
+def test_decodificador_incremental():
+    frames = [b"", b"a", b"hola mundo", bytes(range(256)) * 40]
+    data = b"".join(encode_frame(frame) for frame in frames)
+    decoder = FrameDecoder()
+    recibidas = []
+    for i in range(len(data)):  # byte a byte
+        recibidas += decoder.feed(data[i:i + 1])
+    assert recibidas == frames and decoder.pending() == 0
+    # Varias tramas pegadas y media trama al final
+    assert decoder.feed(data + encode_frame(b"resto")[:6]) == frames and decoder.pending() == 6
+
+
+def test_longitud_basura():
+    with pytest.raises(ValueError):
+        FrameDecoder().feed(FRAME_HEADER.pack(MAX_FRAME_SIZE + 1))
+    with pytest.raises(ValueError):
+        encode_frame(bytes(MAX_FRAME_SIZE + 1))
+
+
+def test_sockets_bloqueantes():
+    a, b = socket.socketpair()
+    with a, b:
+        send_frame(a, b"uno")
+        send_frame(a, b"")
+        a.sendall(encode_frame(b"partida")[:5])
+        assert recv_frame(b) == b"uno" and recv_frame(b) == b""
+        a.close()
+        with pytest.raises(ConnectionError):
+            recv_frame(b)
+    a, b = socket.socketpair()
+    with b:
+        a.close()
+        assert recv_frame(b) is None
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_backends_con_tramas_partidas(backend, engine, servidor):
+    server = servidor(engine, backend)
+    protocol = ClientProtocol(rng=SeededRandomness(2))
+    with socket.create_connection(server.address) as sock:
+        sock.settimeout(5.0)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_frame(sock, protocol.hello_frames()[0])
+        for frame in protocol.accept_server_params(recv_frame(sock)):
+            send_frame(sock, frame)
+        assert protocol.receive(recv_frame(sock))[0] == FRAME_RESPONSE
+        # Tres mensajes en un solo envío, cortado en trozos de 7 bytes
+        data = b"".join(encode_frame(protocol.seal(f"lectura numero {i}".encode())) for i in range(3))
+        for i in range(0, len(data), 7):
+            sock.sendall(data[i:i + 7])
+        respuestas = []
+        while len(respuestas) < 3:
+            kind, value = protocol.receive(recv_frame(sock))
+            if kind == FRAME_RESPONSE:
+                respuestas.append(value)
+    assert respuestas == [b"Mensaje cifrado recibido correctamente"] * 3
+    assert engine.stats()["errors"] == 0
@@ -0,0 +1,31 @@
+# test_groupchannel.py
+# Pruebas del canal de broadcast de grupo (GroupChannel.py): broadcasts cortos y tablas de más de 256 llaves.
+# USO: python -m pytest test_groupchannel.py
+
+from ClientProtocol import FRAME_GROUPCAST, FRAME_GROUPKEY, FRAME_RESPONSE, ClientProtocol
+from GroupChannel import GROUPCAST_PREFIX, KEY_INDEX_SIZE, GroupChannel, decrypt_groupcast
+from Randomness import SeededRandomness
+from SeedAndPrimes import generate_prime
+
+
+def test_broadcasts_cortos():
+    group = GroupChannel(7, generate_prime(rng=SeededRandomness(2)), rng=SeededRandomness(3))
+    for mensaje in [b"h", b"ok", b"", b"abc", b"hola mundo", b"x"]:
+        assert decrypt_groupcast(group.encrypt(mensaje), group.key_table) == mensaje
+
+
+def test_tabla_de_grupo_con_mas_de_256_llaves():
+    group = GroupChannel(7, generate_prime(rng=SeededRandomness(2)), n_keys=300, rng=SeededRandomness(3))
+    for i in range(300):
+        frame = group.encrypt(f"aviso {i}".encode())
+        assert int.from_bytes(frame[len(GROUPCAST_PREFIX):len(GROUPCAST_PREFIX) + KEY_INDEX_SIZE], "big") == i
+        assert decrypt_groupcast(frame, group.key_table) == f"aviso {i}".encode()
+    assert group.key_index == 0
+
+
+def test_cliente_recibe_broadcast_corto(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(4))
+    _, kinds = conectar(engine, protocol)
+    assert FRAME_RESPONSE in kinds and FRAME_GROUPKEY in kinds
+    for mensaje in [b"h", b"ok", b"fin"]:
+        assert protocol.receive(engine.group.encrypt(mensaje)) == (FRAME_GROUPCAST, mensaje)
@@ -0,0 +1,63 @@
+# test_handshake.py
+# Pruebas de los parámetros del FCM (Handshake.py) y de la derivación de llaves con primos de más de 64 bits.
+# USO: python -m pytest test_handshake.py
+
+import hashlib
+
+import pytest
+
+from ClientProtocol import FRAME_GROUPKEY, FRAME_RESPONSE, FRAME_TICKET, ClientProtocol
+from Compression import CODEC_ZLIB
+from Handshake import HandshakeError, encode_params, parse_params
+from KeyGenerator import KEY_MASK, fg_generation, generate_key_table
+from Randomness import SeededRandomness
+from SeedAndPrimes import SharedParams, generate_prime, generate_seed
+
+
+def test_parametros_binarios_y_ascii():
+    for binary in (True, False):
+        params = parse_params(encode_params(7, 2**127 - 1, 2**100 + 3, (CODEC_ZLIB,), binary=binary))
+        assert (params.prime, params.seed, params.codecs, params.binary) == (2**127 - 1, 2**100 + 3, (CODEC_ZLIB,), binary)
+    with pytest.raises(HandshakeError):
+        parse_params(encode_params(7, 11, 13)[:-1])
+
+
+def test_version_de_handshake_no_soportada(engine):
+    binario = encode_params(7, 11, 13)
+    # Un primer byte que no es la versión conocida ni un dígito no se interpreta como ASCII
+    for version in (0, 2, 0x2F, 0x3A, 0xFF):
+        with pytest.raises(HandshakeError, match="no soportada"):
+            parse_params(bytes([version]) + binario[1:])
+    with pytest.raises(HandshakeError, match="no soportada"):
+        parse_params(b"[DESCONOCIDO] 11,13")
+    # ASCII con dígito inicial pero mal formado sigue siendo un error de formato
+    with pytest.raises(HandshakeError, match="inválidos"):
+        parse_params(b"11;13")
+    # El servidor no abre la sesión
+    with pytest.raises(HandshakeError):
+        engine.open_session(("prueba", 1), bytes([2]) + binario[1:])
+    assert engine.stats()["handshakes"] == 0
+
+
+def test_llaves_de_64_bits_sin_cambios():
+    # Misma fórmula que antes de aceptar primos grandes: las tablas existentes no cambian
+    p0, q = 0x0123456789ABCDEF, 0xFEDCBA9876543211
+    esperado = int.from_bytes(hashlib.sha256(p0.to_bytes(8, "big") + q.to_bytes(8, "big")
+                                             + (5).to_bytes(4, "big")).digest()[:8], "big")
+    assert fg_generation(p0, q, 5) == esperado
+
+
+def test_primos_de_128_bits(motor, conectar):
+    rng = SeededRandomness(5)
+    shared = SharedParams(id=1, P=generate_prime(128, rng=rng), Q=generate_prime(128, rng=rng),
+                          S=generate_seed(128, rng=rng), N=16)
+    keys = generate_key_table(shared)
+    assert len(set(keys)) == 16 and all(0 <= key <= KEY_MASK for key in keys)
+
+    engine = motor(bits=128)
+    assert engine.Q.bit_length() > 64
+    protocol = ClientProtocol(P=generate_prime(128, rng=rng), S=generate_seed(128, rng=rng), rng=rng)
+    session, kinds = conectar(engine, protocol)
+    assert kinds == [FRAME_RESPONSE, FRAME_GROUPKEY, FRAME_TICKET]
+    replies, _ = engine.handle_message(session, protocol.seal(b"lectura de 128 bits"))
+    assert protocol.receive(replies[0]) == (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
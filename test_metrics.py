@@ -0,0 +1,178 @@
+# test_metrics.py
+# Pruebas de Metrics.py: quantile() sobre histogramas, merge_snapshots() (etiquetas y suma de histogramas),
+# render_prometheus() y los endpoints de MetricsServer (/metrics, /metrics.json y /profile/*).
+# USO: python -m pytest test_metrics.py
+
+import copy
+import json
+from urllib.error import HTTPError
+
+import pytest
+
+from ClientProtocol import ClientProtocol
+from Metrics import PROMETHEUS_CONTENT_TYPE, MetricsRegistry, merge_snapshots, quantile, render_prometheus
+from Profiling import HookRegistry, Profiler
+from Randomness import SeededRandomness
+
+BUCKETS = (1.0, 2.0, 4.0)
+
+
+def histograma(*valores, registry=None):
+    registry = registry if registry is not None else MetricsRegistry()
+    hist = registry.histogram("latencia_seconds", "Latencia", buckets=BUCKETS)
+    for valor in valores:
+        hist.observe(valor)
+    return hist.snapshot()
+
+
+# ============================================================
+# quantile()
+# ============================================================
+
+def test_quantile_interpola_dentro_del_bucket():
+    snap = histograma(0.5, 0.5, 1.5, 1.5)
+    assert snap["counts"] == [2, 2, 0, 0] and snap["count"] == 4 and snap["sum"] == 4.0
+    assert quantile(snap, 0.0) == 0.0
+    assert quantile(snap, 0.25) == pytest.approx(0.5)
+    assert quantile(snap, 0.5) == pytest.approx(1.0)
+    assert quantile(snap, 0.75) == pytest.approx(1.5)
+    assert quantile(snap, 1.0) == pytest.approx(2.0)
+
+
+def test_quantile_casos_limite():
+    assert quantile(histograma(), 0.99) == 0.0
+    # Los valores por encima del último límite caen en +Inf y se reportan como ese límite
+    assert quantile(histograma(10.0, 20.0), 0.5) == BUCKETS[-1]
+    # Un valor igual al límite cuenta en ese bucket (le = "menor o igual")
+    assert histograma(2.0)["counts"] == [0, 1, 0, 0]
+
+
+def test_time_observa_la_duracion():
+    registry = MetricsRegistry()
+    hist = registry.histogram("bloque_seconds")
+    with hist.time():
+        pass
+    snap = hist.snapshot()
+    assert snap["count"] == 1 and 0 <= snap["sum"] < 1
+    assert registry.histogram("bloque_seconds") is hist
+
+
+# ============================================================
+# merge_snapshots()
+# ============================================================
+
+def proceso(worker: int, mensajes: int, sesiones: int, *latencias):
+    registry = MetricsRegistry()
+    registry.counter("crypto_messages_total", "Mensajes").inc(mensajes)
+    registry.register_collector("crypto_sessions", "Sesiones por worker",
+                                lambda: [({"worker": str(worker)}, sesiones), ({}, sesiones)])
+    histograma(*latencias, registry=registry)
+    return registry.snapshot()
+
+
+def test_merge_snapshots_suma_y_combina_etiquetas():
+    snaps = [proceso(0, 3, 1, 0.5, 1.5), proceso(1, 4, 2, 3.0, 10.0)]
+    originales = copy.deepcopy(snaps)
+    merged = merge_snapshots(snaps)
+    assert snaps == originales  # no modifica las instantáneas de entrada
+
+    assert merged["counters"]["crypto_messages_total"] == {"help": "Mensajes", "samples": [({}, 7)]}
+    # Etiquetas distintas quedan separadas; las iguales (aquí sin etiquetas) se suman
+    assert merged["gauges"]["crypto_sessions"]["samples"] == [({"worker": "0"}, 1), ({}, 3), ({"worker": "1"}, 2)]
+    hist = merged["histograms"]["latencia_seconds"]
+    assert hist["counts"] == [1, 1, 1, 1]
+    assert (hist["count"], hist["sum"], hist["buckets"]) == (4, 15.0, list(BUCKETS))
+    assert quantile(hist, 0.5) == pytest.approx(2.0)
+
+
+def test_merge_snapshots_vacio_y_unico():
+    assert merge_snapshots([]) == {"counters": {}, "gauges": {}, "histograms": {}}
+    unico = proceso(0, 1, 1, 0.5)
+    assert merge_snapshots([unico]) == unico
+
+
+# ============================================================
+# render_prometheus()
+# ============================================================
+
+def test_render_prometheus():
+    registry = MetricsRegistry()
+    registry.counter("crypto_errors_total", "Errores").inc(2)
+    registry.register_collector("crypto_peer", "Pares", lambda: [({"addr": 'a"b\\c\nd'}, 1)])
+    registry.register_collector("crypto_lcm_total", "Cierres", lambda: 5, kind="counter")
+    histograma(0.5, 3.0, 9.0, registry=registry)
+    assert render_prometheus(registry.snapshot()) == "\n".join([
+        "# HELP crypto_errors_total Errores",
+        "# TYPE crypto_errors_total counter",
+        "crypto_errors_total 2",
+        "# HELP crypto_lcm_total Cierres",
+        "# TYPE crypto_lcm_total counter",
+        "crypto_lcm_total 5",
+        "# HELP crypto_peer Pares",
+        "# TYPE crypto_peer gauge",
+        'crypto_peer{addr="a\\"b\\\\c\\nd"} 1',
+        "# HELP latencia_seconds Latencia",
+        "# TYPE latencia_seconds histogram",
+        'latencia_seconds_bucket{le="1"} 1',
+        'latencia_seconds_bucket{le="2"} 1',
+        'latencia_seconds_bucket{le="4"} 2',
+        'latencia_seconds_bucket{le="+Inf"} 3',
+        "latencia_seconds_sum 12.5",
+        "latencia_seconds_count 3",
+    ]) + "\n"
+
+
+def test_colector_de_tipo_desconocido():
+    with pytest.raises(ValueError):
+        MetricsRegistry().register_collector("x", "x", lambda: 1, kind="summary")
+
+
+# ============================================================
+# MetricsServer
+# ============================================================
+
+def test_endpoints_de_metricas(metrics_server, http_get):
+    registry = MetricsRegistry()
+    mensajes = registry.counter("crypto_messages_total", "Mensajes")
+    histograma(0.5, registry=registry)
+    server = metrics_server(registry.snapshot)
+
+    mensajes.inc(3)
+    status, content_type, body = http_get(server, "/metrics")
+    assert (status, content_type) == (200, PROMETHEUS_CONTENT_TYPE)
+    assert body.decode() == render_prometheus(registry.snapshot())
+    assert "crypto_messages_total 3\n" in body.decode()
+
+    status, content_type, body = http_get(server, "/metrics.json")
+    assert (status, content_type) == (200, "application/json")
+    assert json.loads(body) == json.loads(json.dumps(registry.snapshot()))
+
+    with pytest.raises(HTTPError) as error:
+        http_get(server, "/otra")
+    assert error.value.code == 404
+    # Sin perfilador, /profile/* no existe
+    with pytest.raises(HTTPError) as error:
+        http_get(server, "/profile/start")
+    assert error.value.code == 404
+
+
+def test_endpoints_de_perfilado(metrics_server, http_get, engine, conectar):
+    hooks = HookRegistry()
+    profiler = Profiler(hooks)
+    server = metrics_server(engine.metrics.snapshot, profiler=profiler)
+
+    status, _, body = http_get(server, "/profile/start?mode=hooks")
+    assert status == 200 and json.loads(body) == {"mode": "hooks", "running": True}
+    assert profiler.running and hooks.active("fcm")
+
+    @hooks.hooked("fcm")
+    def abrir():
+        return conectar(engine, ClientProtocol(rng=SeededRandomness(2)))
+
+    abrir()
+    status, _, body = http_get(server, "/profile/stop?limit=5")
+    report = json.loads(body)
+    assert status == 200 and not profiler.running and not hooks.active("fcm")
+    assert report["mode"] == "hooks" and report["points"]["fcm"]["calls"] == 1
+    # Las métricas del motor siguen disponibles en el mismo servidor
+    assert b"crypto_key_table_seconds_count 1" in http_get(server, "/metrics")[2]
@@ -0,0 +1,134 @@
+# test_multiplex.py
+# Pruebas de la conexión multiplexada (Multiplex.py): varias corrientes sobre un solo socket, broadcast a todas
+# las corrientes, reanudación de corrientes, control de admisión por corriente y tramas inválidas.
+# USO: python -m pytest test_multiplex.py
+
+import time
+
+import pytest
+
+from Admission import POLICY_REJECT, REJECTED_PREFIX, AdmissionController
+from ClientProtocol import BROADCAST_PREFIX, FRAME_BROADCAST, FRAME_RESPONSE, ClientProtocol
+from Multiplex import MUX_ACCEPTED, MUX_PREFIX, MuxClient, MuxError, encode_stream_frame, parse_stream_frame
+from Randomness import SeededRandomness
+from ServerEngine import BACKENDS
+
+RESPUESTA = (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+CORRIENTES = 4
+
+
+def rechazada(replies) -> bool:
+    return parse_stream_frame(replies[0])[1].startswith(REJECTED_PREFIX) and parse_stream_frame(replies[1])[1] == b""
+
+
+def test_tramas_de_corriente():
+    assert parse_stream_frame(encode_stream_frame(7, b"hola")) == (7, b"hola")
+    assert parse_stream_frame(encode_stream_frame(7, b"")) == (7, b"")
+    assert parse_stream_frame(BROADCAST_PREFIX + b"aviso") == (None, BROADCAST_PREFIX + b"aviso")
+    with pytest.raises(MuxError):
+        parse_stream_frame(encode_stream_frame(0, b"hola"))
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_corrientes_independientes(backend, engine, servidor):
+    server = servidor(engine, backend)
+    mux = MuxClient(*server.address, rng=SeededRandomness(2))
+    with mux:
+        streams = [mux.stream() for _ in range(CORRIENTES)]
+        for stream in streams:
+            stream.connect()
+        # Mensajes intercalados; leer una corriente deja en los buzones lo de las demás
+        for i in range(3):
+            for n, stream in enumerate(streams):
+                stream.send(f"lectura {i} del sensor {n}".encode())
+        for stream in reversed(streams):
+            assert [stream.recv(timeout=5) for _ in range(3)] == [RESPUESTA] * 3
+
+        # Broadcast a la conexión: llega a todas sus corrientes
+        server.fanout.broadcast(BROADCAST_PREFIX + b"aviso general").result(timeout=5)
+        for stream in streams:
+            assert stream.recv(timeout=5) == (FRAME_BROADCAST, b"aviso general")
+
+        # Una corriente cierra con LCM sin afectar a las demás
+        streams[0].close()
+        assert not streams[0].connected and streams[0].protocol.resumption_ticket is not None
+        streams[1].send(b"lectura tras cerrar otra corriente")
+        assert streams[1].recv(timeout=5) == RESPUESTA
+        assert engine.stats()["active_sessions"] == CORRIENTES - 1
+    assert all(not stream.connected for stream in streams)
+
+    # Conexión nueva: las corrientes se reanudan con sus tickets
+    with mux:
+        for stream in streams:
+            stream.connect()
+            stream.send(b"lectura tras reanudar la corriente")
+            assert stream.recv(timeout=5) == RESPUESTA
+    stats = engine.stats()
+    assert (stats["handshakes"], stats["resumptions"], stats["errors"]) == (CORRIENTES, CORRIENTES, 0)
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_corrientes_cuentan_como_sesiones(backend, engine, servidor):
+    # La conexión ocupa un lugar y cada corriente abierta otro
+    admission = AdmissionController(max_sessions=3, policy=POLICY_REJECT)
+    server = servidor(engine, backend, admission=admission)
+    with MuxClient(*server.address, rng=SeededRandomness(3)) as mux:
+        primera, segunda, tercera = mux.stream(), mux.stream(), mux.stream()
+        primera.connect()
+        segunda.connect()
+        with pytest.raises(ConnectionError, match="REJECTED"):
+            tercera.connect()
+        assert admission.stats()["rejected_sessions"] == 1
+        assert admission.stats()["active_sessions"] == 3
+        # La conexión sigue: las demás corrientes no se enteran
+        segunda.send(b"lectura tras el rechazo")
+        assert segunda.recv(timeout=5) == RESPUESTA
+
+        # Al cerrar una corriente se libera su lugar
+        primera.close()
+        tercera.connect()
+        tercera.send(b"lectura con lugar liberado")
+        assert tercera.recv(timeout=5) == RESPUESTA
+        assert engine.stats()["handshakes"] == 3
+    # El lugar de la conexión se libera cuando el servidor ve el cierre
+    deadline = time.monotonic() + 5
+    while admission.stats()["active_sessions"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert admission.stats()["active_sessions"] == 0
+
+
+def test_fcm_de_corriente_toma_turno_de_handshake(engine):
+    admission = AdmissionController(max_handshakes=1, policy=POLICY_REJECT)
+    mux, replies = engine.open_session(("prueba", 1), MUX_PREFIX, admission)
+    assert replies == [MUX_ACCEPTED]
+    protocol = ClientProtocol(rng=SeededRandomness(4))
+    hello = encode_stream_frame(1, protocol.hello_frames()[0])
+
+    # Otra derivación de llaves en curso: la corriente se rechaza sin derivar y sin ocupar lugar
+    assert admission.acquire_handshake()
+    replies, close = engine.handle_message(mux, hello)
+    assert not close and rechazada(replies)
+    stats = admission.stats()
+    assert (stats["rejected_handshakes"], stats["active_sessions"]) == (1, 0)
+    assert engine.stats()["handshakes"] == 0
+    admission.release_handshake()
+
+    replies, close = engine.handle_message(mux, hello)
+    assert not close and not rechazada(replies + [b""])
+    assert engine.stats()["handshakes"] == 1
+    assert admission.stats()["active_handshakes"] == 0 and admission.stats()["active_sessions"] == 1
+    engine.close_session(mux)
+    assert admission.stats()["active_sessions"] == 0
+
+
+def test_multiplexer_rechaza_tramas_invalidas(engine):
+    mux, replies = engine.open_session(("prueba", 1), MUX_PREFIX)
+    assert replies == [MUX_ACCEPTED]
+    # Una corriente no puede abrir otra conexión multiplexada
+    replies, close = engine.handle_message(mux, encode_stream_frame(1, MUX_PREFIX))
+    assert not close and rechazada(replies)
+    # Parámetros FCM inválidos en una corriente: solo se cierra la corriente
+    replies, close = engine.handle_message(mux, encode_stream_frame(2, b"no son parametros"))
+    assert not close and rechazada(replies)
+    # Trama sin corriente: se cierra la conexión entera
+    assert engine.handle_message(mux, b"[BROADCAST] suelta") == ([], True)
@@ -0,0 +1,107 @@
+# test_pipeline.py
+# Pruebas del modo segmentado (Pipeline.py): ClientProtocol.seal_seq() con varios mensajes en vuelo, tramas fuera
+# de orden, y DeviceClient con ventana contra un servidor real (también tras reanudar la sesión).
+# USO: python -m pytest test_pipeline.py
+
+import asyncio
+import json
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from DeviceClient import AsyncDeviceClient, DeviceClient
+from Pipeline import SequenceError
+from Randomness import SeededRandomness
+from SeedAndPrimes import DEFAULT_N_KEYS
+
+VENTANA = 4
+RESPUESTA = (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+TELEMETRIA = json.dumps([{"sensor": f"temp-{i}", "valor": 21.5} for i in range(20)]).encode()
+
+
+def posicion(session):
+    return session.key_index, session.next_psn, session.key_regeneration_count, session.next_seq
+
+
+def test_ventana_completa_en_vuelo(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(2))
+    session, _ = conectar(engine, protocol)
+    assert protocol.next_seq == session.next_seq == 1  # el contacto fue la secuencia 0
+    rondas = DEFAULT_N_KEYS // VENTANA + 2  # más de un ciclo de la tabla
+    for ronda in range(rondas):
+        frames = [protocol.seal_seq(f"lectura {ronda}-{i} del sensor".encode()) for i in range(VENTANA)]
+        assert len(protocol.in_flight) == VENTANA
+        # El servidor procesa la ventana entera antes de que el cliente lea una sola respuesta
+        responses = [engine.handle_message(session, frame)[0][0] for frame in frames]
+        assert [protocol.receive(response) for response in responses] == [RESPUESTA] * VENTANA
+    assert not protocol.in_flight and engine.stats()["errors"] == 0
+    assert posicion(session) == (protocol.key_index, protocol.next_psn, protocol.key_regeneration_count,
+                                 protocol.next_seq)
+    assert protocol.key_regeneration_count == 1
+
+
+def test_segmentado_con_compresion(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(3))
+    session, _ = conectar(engine, protocol)
+    frame = protocol.seal_seq(TELEMETRIA)
+    assert len(frame) < len(TELEMETRIA)
+    replies, _ = engine.handle_message(session, frame)
+    assert protocol.receive(replies[0]) == RESPUESTA
+
+
+def test_servidor_rechaza_secuencia_fuera_de_orden(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(4))
+    session, _ = conectar(engine, protocol)
+    protocol.seal_seq(b"lectura uno del sensor")
+    segundo = protocol.seal_seq(b"lectura dos del sensor")
+    replies, close = engine.handle_message(session, segundo)
+    assert close and replies == [b"Error procesando mensaje"]
+    assert engine.stats()["errors"] == 1 and engine.stats()["active_sessions"] == 0
+
+
+def test_cliente_rechaza_respuesta_fuera_de_orden(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(5))
+    session, _ = conectar(engine, protocol)
+    frames = [protocol.seal_seq(f"lectura {i} del sensor".encode()) for i in range(2)]
+    responses = [engine.handle_message(session, frame)[0][0] for frame in frames]
+    with pytest.raises(SequenceError):
+        protocol.receive(responses[1])
+    # Una petición reflejada con la secuencia esperada no pasa la autenticación (la dirección va en el AAD)
+    with pytest.raises(Exception):
+        protocol.receive(frames[0])
+    assert list(protocol.in_flight) == [1, 2]
+    assert [protocol.receive(response) for response in responses] == [RESPUESTA] * 2
+
+
+def test_device_client_con_ventana(engine, servidor):
+    address = servidor(engine).address
+    client = DeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(6)), window=VENTANA)
+    with client:
+        for i in range(50):
+            client.send(f"lectura {i} del sensor".encode(), timeout=5)
+            assert len(client.protocol.in_flight) <= VENTANA
+        assert [client.recv(timeout=5) for _ in range(50)] == [RESPUESTA] * 50
+
+    # La secuencia es por conexión: tras [RESUME] vuelve a 0 y las llaves siguen donde quedaron
+    client.connect()
+    assert client.protocol.next_seq == 0
+    for i in range(10):
+        client.send(f"lectura {i} tras reanudar".encode(), timeout=5)
+    assert [client.recv(timeout=5) for _ in range(10)] == [RESPUESTA] * 10
+    client.close()
+    stats = engine.stats()
+    assert (stats["resumptions"], stats["errors"]) == (1, 0)
+
+
+def test_async_device_client_con_ventana(engine, servidor):
+    address = servidor(engine).address
+
+    async def conversar():
+        client = AsyncDeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(7)), window=VENTANA)
+        async with client:
+            for i in range(20):
+                await client.send(f"lectura {i} del sensor".encode(), timeout=5)
+            return [await client.recv(timeout=5) for _ in range(20)]
+
+    assert asyncio.run(conversar()) == [RESPUESTA] * 20
+    assert engine.stats()["errors"] == 0
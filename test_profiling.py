@@ -0,0 +1,202 @@
+# test_profiling.py
+# Pruebas de Profiling.py: registro de ganchos (HOOKS y HookRegistry), start/stop del perfilador en cada modo y las
+# respuestas 409 de MetricsServer al encenderlo dos veces o apagarlo sin haberlo encendido.
+# USO: python -m pytest test_profiling.py
+
+import json
+import threading
+import tracemalloc
+from urllib.error import HTTPError
+
+import pytest
+
+from ClientProtocol import ClientProtocol
+from Profiling import (HOOK_POINTS, HOOKS, PROFILE_HOOKS, PROFILE_MEMORY, PROFILE_MODES, PROFILE_SAMPLING,
+                       HookRegistry, Profiler)
+from Randomness import SeededRandomness
+
+
+@pytest.fixture
+def hooks():
+    return HookRegistry()
+
+
+@pytest.fixture
+def profiler(hooks):
+    profiler = Profiler(hooks)
+    yield profiler
+    if profiler.running:
+        profiler.stop()
+
+
+def ocupado(evento):
+    """Trabajo para que el modo "sampling" tenga qué muestrear."""
+    total = 0
+    while not evento.is_set():
+        total += sum(range(1000))
+    return total
+
+
+# ============================================================
+# Ganchos
+# ============================================================
+
+def test_pre_y_post_reciben_estado_tiempo_y_error(hooks):
+    llamadas = []
+    handle = hooks.register("rm", pre=lambda point, args, kwargs: (point, args, kwargs),
+                            post=lambda point, state, elapsed, error: llamadas.append((point, state, elapsed, error)))
+
+    @hooks.hooked("rm")
+    def procesar(trama, cerrar=False):
+        """Procesa una trama."""
+        if cerrar:
+            raise ValueError("trama inválida")
+        return len(trama)
+
+    assert procesar.__name__ == "procesar" and procesar.__doc__ == "Procesa una trama."
+    assert procesar(b"hola") == 4
+    with pytest.raises(ValueError):
+        procesar(b"x", cerrar=True)
+
+    (p1, estado1, t1, e1), (p2, estado2, t2, e2) = llamadas
+    assert (p1, estado1, e1) == ("rm", ("rm", (b"hola",), {}), None)
+    assert estado2 == ("rm", (b"x",), {"cerrar": True}) and isinstance(e2, ValueError)
+    assert t1 >= 0 and t2 >= 0
+
+    hooks.unregister(handle)
+    hooks.unregister(handle)  # idempotente
+    assert not hooks.active("rm")
+    assert procesar(b"sin ganchos") == 11 and len(llamadas) == 2
+
+
+def test_registro_invalido(hooks):
+    with pytest.raises(ValueError):
+        hooks.register("inexistente", post=lambda *a: None)
+    with pytest.raises(ValueError):
+        hooks.register("rm")
+    with pytest.raises(ValueError):
+        hooks.hooked("inexistente")
+
+
+def test_hooks_del_proceso_en_el_protocolo(engine, conectar):
+    """Los módulos del protocolo están decorados con el registro del proceso."""
+    assert HOOKS.points == HOOK_POINTS
+    vistos = []
+    handles = [HOOKS.register(point, post=lambda point, *_: vistos.append(point)) for point in HOOK_POINTS]
+    try:
+        conectar(engine, ClientProtocol(rng=SeededRandomness(2)))
+    finally:
+        for handle in handles:
+            HOOKS.unregister(handle)
+    assert {"fcm", "rm", "generate_key_table", "apply_sequence", "encrypt_message", "decrypt_message"} <= set(vistos)
+    assert not any(HOOKS.active(point) for point in HOOK_POINTS)
+
+
+# ============================================================
+# Perfilador
+# ============================================================
+
+def test_modo_hooks(hooks, profiler):
+    @hooks.hooked("encrypt_message")
+    def cifrar(falla=False):
+        if falla:
+            raise RuntimeError("falla")
+
+    profiler.start(PROFILE_HOOKS)
+    assert profiler.running and profiler.mode == PROFILE_HOOKS
+    for _ in range(3):
+        cifrar()
+    with pytest.raises(RuntimeError):
+        cifrar(falla=True)
+    report = profiler.stop()
+    assert not profiler.running and not hooks.active("encrypt_message")
+    assert report["mode"] == PROFILE_HOOKS and report["duration_s"] >= 0
+    puntos = report["points"]
+    assert list(puntos) == ["encrypt_message"]
+    assert (puntos["encrypt_message"]["calls"], puntos["encrypt_message"]["errors"]) == (4, 1)
+
+
+def test_modo_sampling(profiler):
+    evento = threading.Event()
+    hilo = threading.Thread(target=ocupado, args=(evento,))
+    hilo.start()
+    try:
+        profiler.start(PROFILE_SAMPLING, interval=0.001)
+        threading.Event().wait(0.1)
+        report = profiler.stop(limit=3)
+    finally:
+        evento.set()
+        hilo.join()
+    assert report["mode"] == PROFILE_SAMPLING and report["interval_s"] == 0.001
+    assert report["samples"] > 0 and len(report["own"]) <= 3
+    assert any("(ocupado)" in entry["function"] for entry in report["inclusive"])
+    assert all(0 < entry["fraction"] <= 1 for entry in report["own"])
+
+
+def test_modo_tracemalloc(profiler):
+    ya_activo = tracemalloc.is_tracing()
+    profiler.start(PROFILE_MEMORY)
+    assert tracemalloc.is_tracing()
+    retenido = [bytes(1000) for _ in range(200)]
+    report = profiler.stop(limit=5)
+    assert report["mode"] == PROFILE_MEMORY
+    assert report["peak_bytes"] >= report["traced_bytes"] > 0
+    assert 0 < len(report["top"]) <= 5
+    assert any("test_profiling.py" in entry["location"] and entry["size_diff"] >= 200 * 1000
+               for entry in report["top"])
+    # Solo detiene tracemalloc si lo encendió él
+    assert tracemalloc.is_tracing() == ya_activo
+    del retenido
+
+
+@pytest.mark.parametrize("mode", PROFILE_MODES)
+def test_doble_start_y_stop_sin_start(profiler, mode):
+    with pytest.raises(RuntimeError):
+        profiler.stop()
+    profiler.start(mode, interval=0.01)
+    with pytest.raises(RuntimeError):
+        profiler.start(PROFILE_HOOKS)
+    assert profiler.mode == mode
+    profiler.stop()
+    with pytest.raises(RuntimeError):
+        profiler.stop()
+
+
+def test_modo_desconocido(profiler):
+    with pytest.raises(ValueError):
+        profiler.start("cprofile")
+    assert not profiler.running
+
+
+# ============================================================
+# MetricsServer: /profile/*
+# ============================================================
+
+@pytest.mark.parametrize("mode", PROFILE_MODES)
+def test_endpoints_409(metrics_server, http_get, profiler, mode):
+    server = metrics_server(lambda: {}, profiler=profiler)
+
+    with pytest.raises(HTTPError) as error:
+        http_get(server, "/profile/stop")
+    assert error.value.code == 409
+
+    status, _, body = http_get(server, f"/profile/start?mode={mode}&interval=0.01")
+    assert status == 200 and json.loads(body) == {"mode": mode, "running": True}
+    with pytest.raises(HTTPError) as error:
+        http_get(server, "/profile/start?mode=hooks")
+    assert error.value.code == 409
+    assert profiler.mode == mode
+
+    status, _, body = http_get(server, "/profile/stop?limit=2")
+    assert status == 200 and json.loads(body)["mode"] == mode
+    with pytest.raises(HTTPError) as error:
+        http_get(server, "/profile/stop")
+    assert error.value.code == 409
+
+
+def test_endpoint_modo_desconocido(metrics_server, http_get, profiler):
+    server = metrics_server(lambda: {}, profiler=profiler)
+    with pytest.raises(HTTPError) as error:
+        http_get(server, "/profile/start?mode=cprofile")
+    assert error.value.code == 409
+    assert not profiler.running
@@ -0,0 +1,110 @@
+# test_randomness.py
+# Pruebas de Randomness.py: SeededRandomness reproduce los mismos bytes con la misma semilla, fork() da flujos
+# independientes por etiqueta y SecureRandomness es el proveedor del proceso por defecto.
+# USO: python -m pytest test_randomness.py
+
+import threading
+
+import pytest
+
+from Randomness import SecureRandomness, SeededRandomness, get_randomness, set_randomness
+from SeedAndPrimes import generate_prime, generate_seed
+
+
+@pytest.fixture
+def proveedor_del_proceso():
+    """Restaura el proveedor del proceso al terminar la prueba."""
+    previous = get_randomness()
+    yield
+    set_randomness(previous)
+
+
+# ============================================================
+# SeededRandomness
+# ============================================================
+
+def test_misma_semilla_mismos_bytes():
+    a, b = SeededRandomness(42), SeededRandomness(42)
+    assert a.bytes(100) == b.bytes(100)
+    assert [a.below(1000) for _ in range(50)] == [b.below(1000) for _ in range(50)]
+    assert SeededRandomness(42).bytes(32) != SeededRandomness(43).bytes(32)
+    # str se codifica a bytes; int se convierte a bytes big endian con signo
+    assert SeededRandomness("42").bytes(32) == SeededRandomness(b"42").bytes(32)
+    assert SeededRandomness(42).bytes(32) == SeededRandomness((42).to_bytes(1, "big")).bytes(32)
+    assert SeededRandomness(-1).bytes(16) != SeededRandomness(255).bytes(16)
+
+
+def test_flujo_continuo_sin_importar_el_tamano_de_las_lecturas():
+    entero = SeededRandomness(7).bytes(100)
+    trozos = SeededRandomness(7)
+    assert b"".join(trozos.bytes(n) for n in (1, 31, 32, 0, 36)) == entero
+
+
+def test_below():
+    rng = SeededRandomness(8)
+    valores = [rng.below(10) for _ in range(2000)]
+    assert set(valores) == set(range(10))
+    assert all(rng.below(1) == 0 for _ in range(10))
+    grande = 2 ** 127 + 1
+    assert all(0 <= rng.below(grande) < grande for _ in range(100))
+    with pytest.raises(ValueError):
+        rng.below(0)
+
+
+def test_fork_independiente_por_etiqueta():
+    padre = SeededRandomness(9)
+    sesion, dispositivo = padre.fork("sesion"), padre.fork("dispositivo")
+    assert sesion.bytes(32) != dispositivo.bytes(32)
+    # Misma etiqueta -> mismo flujo, aunque el hermano ya haya consumido
+    assert padre.fork("sesion").bytes(32) == SeededRandomness(9).fork("sesion").bytes(32)
+    # fork() no consume del padre ni depende de lo que el padre ya consumió
+    assert padre.bytes(32) == SeededRandomness(9).bytes(32)
+    assert padre.fork("sesion").bytes(16) == SeededRandomness(9).fork("sesion").bytes(16)
+    # El flujo hijo no coincide con el del padre
+    assert padre.fork("sesion").bytes(32) != SeededRandomness(9).bytes(32)
+
+
+def test_forks_reproducibles_con_varios_hilos():
+    """Cada hilo con su propio fork: el resultado no depende del orden en que corren los hilos."""
+    def correr():
+        padre = SeededRandomness(10)
+        resultados = {}
+
+        def dispositivo(i):
+            rng = padre.fork(f"dispositivo-{i}")
+            resultados[i] = b"".join(rng.bytes(7) for _ in range(50))
+
+        hilos = [threading.Thread(target=dispositivo, args=(i,)) for i in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados
+
+    assert correr() == correr()
+
+
+# ============================================================
+# Proveedor del proceso
+# ============================================================
+
+def test_secure_es_el_proveedor_por_defecto():
+    assert isinstance(get_randomness(), SecureRandomness)
+    assert not SecureRandomness.deterministic and SeededRandomness.deterministic
+    rng = SecureRandomness()
+    assert rng.fork("cualquiera") is rng
+    assert len(rng.bytes(32)) == 32 and rng.bytes(32) != rng.bytes(32)
+    assert all(0 <= rng.below(5) < 5 for _ in range(100))
+
+
+def test_set_randomness_reemplaza_y_restaura(proveedor_del_proceso):
+    original = get_randomness()
+    assert set_randomness(SeededRandomness(11)) is original
+    # Sin rng, las funciones usan el proveedor del proceso en el momento de la llamada
+    primo, semilla = generate_prime(64), generate_seed(64)
+    set_randomness(SeededRandomness(11))
+    assert (generate_prime(64), generate_seed(64)) == (primo, semilla)
+    assert generate_prime(64, rng=SeededRandomness(11)) == primo
+
+    previo = set_randomness(original)
+    assert isinstance(previo, SeededRandomness) and get_randomness() is original
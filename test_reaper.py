@@ -0,0 +1,177 @@
+# test_reaper.py
+# Pruebas de la expulsión de sesiones (Reaper.py) contra ambos backends: inactividad, handshake incompleto y
+# presupuesto de memoria (LRU), con el reloj controlado por la prueba (reap(now=...)) y con el hilo periódico real.
+# USO: python -m pytest test_reaper.py
+
+import socket
+import time
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from DeviceClient import DeviceClient
+from Randomness import SeededRandomness
+from Reaper import connection_bytes
+
+BACKENDS_PRUEBA = ["threaded", "selector"]
+RESPUESTA = (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+INACTIVIDAD = 30.0
+
+
+def conectar_cliente(address, semilla):
+    client = DeviceClient(*address, protocol=ClientProtocol(rng=SeededRandomness(200 + semilla)))
+    client.connect(timeout=5)
+    return client
+
+
+def del_servidor(server, client):
+    """Conexión del servidor que corresponde al cliente."""
+    local = client.sock.getsockname()
+    for conn in server.connections():
+        if conn.address == local:
+            return conn
+    raise AssertionError("conexión no encontrada en el servidor")
+
+
+def esperar(condicion, plazo=5.0):
+    deadline = time.monotonic() + plazo
+    while not condicion():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.01)
+
+
+def expulsado(client) -> bool:
+    """True si el servidor cerró la conexión del cliente."""
+    try:
+        client.recv(timeout=5)
+    except ConnectionError:
+        return True
+    return False
+
+
+def sigue_activo(client) -> bool:
+    client.send(b"sigo aqui", timeout=5)
+    return client.recv(timeout=5) == RESPUESTA
+
+
+@pytest.fixture
+def reaper_manual(servidor):
+    """servidor(...) con el hilo del reaper detenido: la prueba llama a reap(now=...) a mano."""
+
+    def start(engine, backend, **opciones):
+        server = servidor(engine, backend, **opciones)
+        server.reaper.stop()
+        return server
+
+    return start
+
+
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_expulsion_por_inactividad(engine, reaper_manual, backend):
+    server = reaper_manual(engine, backend, idle_timeout=INACTIVIDAD)
+    viejo = conectar_cliente(server.address, 0)
+    time.sleep(0.1)
+    nuevo = conectar_cliente(server.address, 1)
+    visto_viejo = del_servidor(server, viejo).session.last_activity
+    visto_nuevo = del_servidor(server, nuevo).session.last_activity
+    assert visto_nuevo - visto_viejo >= 0.1
+
+    # Antes del plazo no se expulsa a nadie
+    assert server.reaper.reap(now=visto_viejo + INACTIVIDAD) == 0
+    # Vencido solo el plazo del más viejo
+    assert server.reaper.reap(now=visto_viejo + INACTIVIDAD + 0.05) == 1
+    assert expulsado(viejo) and sigue_activo(nuevo)
+    esperar(lambda: server.connection_count() == 1)
+
+    # La actividad reinicia el plazo
+    visto_nuevo = del_servidor(server, nuevo).session.last_activity
+    assert server.reaper.reap(now=visto_nuevo + INACTIVIDAD) == 0
+    assert server.reaper.reap(now=visto_nuevo + INACTIVIDAD + 1) == 1
+    assert expulsado(nuevo)
+    esperar(lambda: server.connection_count() == 0)
+
+    stats = server.stats()
+    assert (stats["reaper_evicted_idle"], stats["reaper_evicted_handshake"], stats["reaper_evicted_memory"]) == (2, 0, 0)
+    assert stats["evictions"] == 2 and stats["active_sessions"] == 0
+    assert stats["admission_active_sessions"] == 0
+
+
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_expulsion_por_handshake_incompleto(engine, reaper_manual, backend):
+    server = reaper_manual(engine, backend, idle_timeout=INACTIVIDAD)
+    client = conectar_cliente(server.address, 0)
+    # Conexión abierta que nunca envía el FCM
+    mudo = socket.create_connection(server.address, timeout=5)
+    esperar(lambda: server.connection_count() == 2)
+    pendiente = next(conn for conn in server.connections() if conn.session is None)
+
+    assert server.reaper.reap(now=pendiente.accepted_at + INACTIVIDAD + 1) == 2
+    assert mudo.recv(1) == b""
+    mudo.close()
+    assert expulsado(client)
+    esperar(lambda: server.connection_count() == 0)
+    stats = server.stats()
+    assert (stats["reaper_evicted_idle"], stats["reaper_evicted_handshake"]) == (1, 1)
+    assert stats["evictions"] == 2
+
+
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_expulsion_lru_por_presupuesto_de_memoria(engine, reaper_manual, backend):
+    server = reaper_manual(engine, backend, memory_budget=10 ** 9)
+    clientes = []
+    for i in range(3):
+        clientes.append(conectar_cliente(server.address, i))
+        time.sleep(0.02)
+    primero, segundo, tercero = clientes
+    # El primero vuelve a tener actividad: el orden LRU queda segundo, tercero, primero
+    assert sigue_activo(primero)
+    tamanos = {client: connection_bytes(del_servidor(server, client)) for client in clientes}
+    total = sum(tamanos.values())
+    assert server.reaper.reap() == 0
+
+    # Un byte por encima del presupuesto: sale solo la menos reciente
+    server.reaper.memory_budget = total - 1
+    assert server.reaper.reap() == 1
+    assert expulsado(segundo)
+    esperar(lambda: server.connection_count() == 2)
+
+    # Lugar para una sola conexión: sale la siguiente menos reciente y queda la última activa
+    server.reaper.memory_budget = tamanos[primero]
+    assert server.reaper.reap() == 1
+    assert expulsado(tercero) and sigue_activo(primero)
+    esperar(lambda: server.connection_count() == 1)
+
+    stats = server.stats()
+    assert (stats["reaper_evicted_memory"], stats["reaper_evicted_idle"]) == (2, 0)
+    assert stats["reaper_live_sessions"] == 1
+    primero.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_estadisticas_de_memoria(engine, servidor, backend):
+    server = servidor(engine, backend)
+    assert not server.reaper.enabled
+    assert server.stats()["reaper_resident_bytes_per_session"] == 0
+    clientes = [conectar_cliente(server.address, i) for i in range(2)]
+    stats = server.reaper.stats()
+    assert stats["live_sessions"] == 2
+    assert stats["resident_bytes"] == sum(connection_bytes(conn) for conn in server.connections())
+    assert stats["resident_bytes_per_session"] == stats["resident_bytes"] // 2
+    # Incluye las tablas de llaves de cada sesión
+    assert stats["resident_bytes_per_session"] >= min(conn.session.resident_bytes() for conn in server.connections())
+    assert server.reaper.reap() == 0
+    for client in clientes:
+        client.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS_PRUEBA)
+def test_hilo_periodico_expulsa_por_inactividad(engine, servidor, backend):
+    server = servidor(engine, backend, idle_timeout=0.2)
+    # Revisar más seguido que el intervalo por defecto
+    server.reaper.stop()
+    server.reaper.interval = 0.05
+    server.reaper.start()
+    client = conectar_cliente(server.address, 0)
+    assert expulsado(client)
+    esperar(lambda: server.connection_count() == 0)
+    assert server.stats()["reaper_evicted_idle"] == 1
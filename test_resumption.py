@@ -0,0 +1,95 @@
+# test_resumption.py
+# Pruebas de los tickets de reanudación (Resumption.py): tablas de más de 255 llaves, ciclos de regeneración y
+# reanudación tras una caída sin LCM (sin volver a llaves ya usadas).
+# USO: python -m pytest test_resumption.py
+
+import dataclasses
+
+import ServerEngine as server_engine
+from ClientProtocol import FRAME_RESPONSE, FRAME_TICKET, ClientProtocol
+from Randomness import SeededRandomness
+from Resumption import (RESUME_FAILED_PREFIX, RESUME_PREFIX, RESUMED_PREFIX, TicketIssuer, parse_ticket_frame,
+                        resume_frame)
+from SeedAndPrimes import DEFAULT_N_KEYS
+from Session import SessionRegistry
+
+MENSAJE = b"lectura del sensor 42"
+
+
+def conversar(engine, session, protocol, mensajes):
+    for _ in range(mensajes):
+        replies, _ = engine.handle_message(session, protocol.seal(MENSAJE))
+        assert protocol.receive(replies[0]) == (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+
+
+def reanudar(engine, protocol):
+    session, replies = engine.open_session(("prueba", 2), protocol.resume_frame())
+    assert replies[0] == RESUMED_PREFIX
+    assert protocol.accept_resume(replies[0])
+    for reply in replies[1:]:
+        protocol.receive(reply)
+    return session
+
+
+def posicion(session):
+    return session.key_index, session.next_psn, session.send_index, session.send_psn, session.key_regeneration_count
+
+
+def test_ticket_con_mas_de_255_llaves():
+    tabla = list(range(1, 301))
+    session = SessionRegistry().create(("prueba", 1), tabla, [key + 1000 for key in tabla])
+    session.restore(280, 7, 290, 3, 2)
+    issuer = TicketIssuer(1)
+    ticket = parse_ticket_frame(issuer.ticket_frame(session), tabla, session.send_table)
+    assert (ticket.key_index, ticket.recv_index, ticket.key_regeneration_count) == (280, 290, 2)
+    state = issuer.resume(resume_frame(ticket)[len(RESUME_PREFIX):])
+    assert (state.key_index, state.next_psn, state.send_index, state.send_psn, state.key_regeneration_count) == \
+        (280, 7, 290, 3, 2)
+    assert state.key_table == tabla
+
+
+def test_reanudacion_con_mas_de_255_llaves(monkeypatch, engine, conectar):
+    monkeypatch.setattr(server_engine, "DEFAULT_N_KEYS", 300)
+    protocol = ClientProtocol(n_keys=300, rng=SeededRandomness(2))
+    session, kinds = conectar(engine, protocol)
+    assert FRAME_TICKET in kinds
+    conversar(engine, session, protocol, 280)
+    replies, close = engine.handle_message(session, protocol.farewell())
+    assert close and [protocol.receive(reply)[0] for reply in replies] == [FRAME_RESPONSE, FRAME_TICKET]
+    final = posicion(session)
+    assert final[0] > 255
+    protocol.reset()
+
+    resumed = reanudar(engine, protocol)
+    assert posicion(resumed)[:2] == final[:2]
+    conversar(engine, resumed, protocol, 30)
+    assert resumed.key_regeneration_count == protocol.key_regeneration_count == 1
+
+
+def test_caida_sin_lcm_no_repite_llaves(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(3))
+    session, _ = conectar(engine, protocol)
+    # Más de un ciclo de la tabla después del ticket del FCM, y la conexión se cae sin LCM
+    conversar(engine, session, protocol, DEFAULT_N_KEYS + 5)
+    caida = posicion(session)
+    engine.close_session(session)
+    protocol.reset()
+
+    resumed = reanudar(engine, protocol)
+    # Mismo punto del flujo cliente->servidor; el de servidor->cliente ya entregó la tabla de grupo
+    assert posicion(resumed)[:2] + posicion(resumed)[4:] == caida[:2] + caida[4:]
+    assert (protocol.recv_index, protocol.recv_psn) == (resumed.send_index, resumed.send_psn)
+    conversar(engine, resumed, protocol, DEFAULT_N_KEYS)
+    assert resumed.key_regeneration_count == protocol.key_regeneration_count == 2
+
+
+def test_posicion_anterior_al_ticket_rechazada(engine, conectar):
+    protocol = ClientProtocol(rng=SeededRandomness(4))
+    session, _ = conectar(engine, protocol)
+    conversar(engine, session, protocol, 3)
+    for reply in engine.handle_message(session, protocol.farewell())[0]:
+        protocol.receive(reply)
+    # Un [RESUME] que intenta volver a llaves ya usadas
+    atrasado = dataclasses.replace(protocol.resumption_ticket, key_index=1)
+    _, replies = engine.open_session(("prueba", 2), resume_frame(atrasado))
+    assert replies[0].startswith(RESUME_FAILED_PREFIX)
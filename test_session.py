@@ -0,0 +1,70 @@
+# test_session.py
+# Pruebas del estado por sesión y del registro particionado (Session.py).
+# USO: python -m pytest test_session.py
+
+import threading
+
+from PSN import ESQUEMAS
+from Session import EVENT_ADVANCED, EVENT_CLOSED, EVENT_OPENED, SessionEvents, SessionRegistry
+
+TABLA = list(range(100, 116))
+
+
+def test_registro_crea_busca_y_elimina():
+    registry = SessionRegistry(shards=4)
+    sessions = [registry.create(("cliente", i), list(TABLA), list(TABLA)) for i in range(10)]
+    assert len(registry) == 10
+    assert [s.session_id for s in registry.sessions()] == list(range(1, 11))
+    assert registry.get(7) is sessions[6] and 7 in registry
+    assert registry.remove(7) is sessions[6]
+    assert registry.remove(7) is None and 7 not in registry and len(registry) == 9
+    registry.clear()
+    assert len(registry) == 0
+
+
+def test_ids_unicos_con_varios_hilos():
+    registry = SessionRegistry()
+
+    def crear():
+        for _ in range(200):
+            registry.create(("cliente", 0), TABLA, TABLA)
+
+    hilos = [threading.Thread(target=crear) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert len(registry) == 1600
+    assert len({s.session_id for s in registry.sessions()}) == 1600
+
+
+def test_avance_circular_y_ciclos():
+    session = SessionRegistry().create(("cliente", 0), list(TABLA), list(TABLA))
+    mensaje = b"lectura de prueba"
+    for i in range(len(TABLA)):
+        old_psn, old_index = session.advance(mensaje, ESQUEMAS[session.next_psn]["next_extraction"])
+        assert old_index == i
+    assert (session.key_index, session.key_regeneration_count, session.next_seq) == (0, 1, len(TABLA))
+    psn, index = session.advance_send(mensaje)
+    assert (psn, index, session.send_index) == (0, 0, 1)
+    session.restore(20, 3, 17, 5, 4)
+    assert (session.key_index, session.next_psn, session.send_index, session.send_psn,
+            session.key_regeneration_count) == (4, 3, 1, 5, 4)
+
+
+def test_feed_de_eventos():
+    registry = SessionRegistry()
+    registry.create(("cliente", 0), TABLA, TABLA)  # sin observador: no se guarda nada
+    registry.events.watch()
+    session = registry.create(("cliente", 1), list(TABLA), list(TABLA))
+    session.advance(b"hola mundo", ESQUEMAS[0]["next_extraction"])
+    registry.remove(session.session_id)
+    events, overflowed = registry.events.drain()
+    assert [e[0] for e in events] == [EVENT_OPENED, EVENT_ADVANCED, EVENT_CLOSED] and not overflowed
+
+    feed = SessionEvents(maxlen=2)
+    feed.watch()
+    for i in range(3):
+        feed.publish(EVENT_OPENED, i)
+    events, overflowed = feed.drain()
+    assert overflowed and [e[1] for e in events] == [1, 2]
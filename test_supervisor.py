@@ -0,0 +1,93 @@
+# test_supervisor.py
+# Prueba de humo del supervisor multi-proceso (ServerSupervisor.py): arranque de los workers con SO_REUSEPORT,
+# estadísticas y métricas agregadas, relanzamiento de un worker caído y vaciado ordenado al detener.
+# USO: python -m pytest test_supervisor.py
+
+import socket
+import time
+
+import pytest
+
+from ClientProtocol import FRAME_RESPONSE, ClientProtocol
+from DeviceClient import DeviceClient
+from Randomness import SeededRandomness
+from ServerSupervisor import STATS_INTERVAL, ServerSupervisor
+
+WORKERS = 2
+CLIENTES = 6
+RESPUESTA = (FRAME_RESPONSE, b"Mensaje cifrado recibido correctamente")
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="requiere SO_REUSEPORT")
+
+
+def puerto_libre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def esperar(condicion, plazo=10 * STATS_INTERVAL):
+    deadline = time.monotonic() + plazo
+    while not condicion():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.05)
+
+
+def conversar(port, semilla, mensajes=3):
+    client = DeviceClient("127.0.0.1", port, protocol=ClientProtocol(rng=SeededRandomness(300 + semilla)))
+    with client:
+        for i in range(mensajes):
+            client.send(f"lectura {i} del sensor".encode(), timeout=5)
+            assert client.recv(timeout=5) == RESPUESTA
+
+
+@pytest.fixture
+def supervisor():
+    supervisor = ServerSupervisor("127.0.0.1", puerto_libre(), workers=WORKERS, drain_timeout=2.0)
+    supervisor.start()
+    yield supervisor
+    if supervisor.alive():
+        supervisor.stop()
+
+
+def test_arranque_agregacion_relanzamiento_y_vaciado(supervisor):
+    # Arranque: todos los workers reportan
+    esperar(lambda: supervisor.poll_stats()["workers"] == WORKERS)
+    assert supervisor.alive() == WORKERS
+
+    for i in range(CLIENTES):
+        conversar(supervisor.port, i)
+    esperar(lambda: supervisor.poll_stats()["handshakes"] == CLIENTES)
+    stats = supervisor.poll_stats()
+    assert stats["messages_in"] >= 3 * CLIENTES and stats["errors"] == 0
+    assert sum(worker["handshakes"] for worker in stats["per_worker"].values()) == CLIENTES
+    assert set(stats["per_worker"]) == set(range(WORKERS))
+    assert all(worker["state"] == "running" for worker in stats["per_worker"].values())
+    # Métricas: los histogramas de los workers se suman
+    metrics = supervisor.metrics_snapshot()
+    assert metrics["histograms"]["crypto_key_table_seconds"]["count"] == CLIENTES
+
+    # Un worker que muere se relanza en el mismo puerto
+    assert supervisor.restart_dead() == 0
+    caido = supervisor._processes[0]
+    caido.terminate()
+    caido.join(5)
+    assert supervisor.alive() == WORKERS - 1
+    assert supervisor.restart_dead() == 1
+    assert supervisor.alive() == WORKERS and supervisor._processes[0] is not caido
+    assert supervisor.poll_stats()["restarts"] == 1
+    for i in range(CLIENTES):
+        conversar(supervisor.port, CLIENTES + i, mensajes=1)
+
+    # Vaciado: todos los workers terminan y reportan "stopped"; ya no se relanzan
+    stats = supervisor.stop()
+    assert supervisor.alive() == 0 and supervisor.restart_dead() == 0
+    assert all(worker["state"] == "stopped" for worker in stats["per_worker"].values())
+    assert stats["active_sessions"] == 0 and stats["errors"] == 0
+    with pytest.raises(OSError):
+        socket.create_connection(("127.0.0.1", supervisor.port), timeout=1).close()
+
+
+def test_backend_desconocido():
+    with pytest.raises(ValueError):
+        ServerSupervisor(backend="asyncio")